@@ -0,0 +1,330 @@
+import argparse
+import contextlib
+import io
+import json
+import math
+import multiprocessing
+import os
+import platform
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import numpy as np
+from convert_stl import convert_stl_to_binary, triangle_normals
+from feature_edges import write_surface_features
+from generate_snappyHexMeshDict import generate_snappyHexMeshDict
+from generate_surfaceFeatureExtractDict import write_surfaceFeatureExtractDict
+from geometry_cache import compute_stl_metadata, hash_file
+from metrics import StageMetrics
+from setup_mesh_dirs import setup_case
+from stl_scan import BINARY_HEADER_SIZE, BINARY_RECORD_DTYPE, binary_header, scan_stl_bounding_box
+
+DEFAULT_SIZES = (1000, 10000, 100000)
+DEFAULT_FORMATS = ('ascii', 'binary')
+STAGES = ('scan_bbox', 'metadata', 'hash', 'convert_binary', 'feature_edges', 'render_dicts', 'setup_case',
+          'setup_case_rerun')
+
+# Rows of torus triangles generated at a time, bounding memory for huge surfaces
+ROWS_PER_CHUNK = 64
+
+ASCII_FACET = ("  facet normal %.7e %.7e %.7e\n"
+               "    outer loop\n"
+               "      vertex %.7e %.7e %.7e\n"
+               "      vertex %.7e %.7e %.7e\n"
+               "      vertex %.7e %.7e %.7e\n"
+               "    endloop\n"
+               "  endfacet")
+
+
+def _torus_chunks(n_triangles, center=(0.0, 0.0, 0.0), major_radius=1.0, minor_radius=0.3):
+    """
+    Yield the triangles of a closed torus with about n_triangles triangles, in chunks.
+    """
+    nu = max(3, int(round(math.sqrt(n_triangles / 2 * major_radius / minor_radius))))
+    nv = max(3, int(math.ceil(n_triangles / 2 / nu)))
+    # Wrapping the indices makes the last ring and column identical to the first,
+    # so the surface is exactly closed
+    v = (np.arange(nv + 1) % nv) * 2 * math.pi / nv
+    center = np.asarray(center, dtype=np.float64)
+
+    for first in range(0, nu, ROWS_PER_CHUNK):
+        last = min(first + ROWS_PER_CHUNK, nu)
+        u = (np.arange(first, last + 1) % nu) * 2 * math.pi / nu
+        radius = major_radius + minor_radius * np.cos(v)
+        rings = np.stack([
+            radius[None, :] * np.cos(u)[:, None],
+            radius[None, :] * np.sin(u)[:, None],
+            np.broadcast_to(minor_radius * np.sin(v), (len(u), len(v))),
+        ], axis=2) + center
+        a, b = rings[:-1, :-1], rings[1:, :-1]
+        c, d = rings[1:, 1:], rings[:-1, 1:]
+        chunk = np.concatenate([np.stack([a, b, c], axis=2), np.stack([a, c, d], axis=2)], axis=1)
+        yield chunk.reshape(-1, 3, 3)
+
+
+def write_synthetic_stl(path, n_triangles, binary=True, name=None, center=(0.0, 0.0, 0.0)):
+    """
+    Write a closed synthetic surface (a torus) with about n_triangles triangles.
+
+    The surface is generated and written in chunks, so files with tens of
+    millions of triangles can be generated in bounded memory.
+
+    Args:
+        path (str): Path of the STL file to write
+        n_triangles (int): Approximate number of triangles
+        binary (bool): Write a binary STL file instead of an ASCII one
+        name (str): Solid name, defaults to the file name without extension
+        center (tuple): Center of the torus
+
+    Returns:
+        int: Number of triangles written
+    """
+    path = Path(path)
+    name = name or path.stem
+    count = 0
+    with open(path, 'wb') as f:
+        if binary:
+            f.write(binary_header(name))
+            f.write(b'\x00\x00\x00\x00')
+        else:
+            f.write(f"solid {name}\n".encode())
+        for chunk in _torus_chunks(n_triangles, center):
+            normals = triangle_normals(chunk)
+            if binary:
+                records = np.zeros(len(chunk), dtype=BINARY_RECORD_DTYPE)
+                records['normal'] = normals
+                records['vectors'] = chunk
+                f.write(records.tobytes())
+            else:
+                rows = np.concatenate([normals.astype(np.float64), chunk.reshape(-1, 9)], axis=1)
+                text = io.StringIO()
+                np.savetxt(text, rows, fmt=ASCII_FACET)
+                f.write(text.getvalue().encode())
+            count += len(chunk)
+        if binary:
+            f.seek(BINARY_HEADER_SIZE)
+            f.write(np.uint32(count).astype('<u4').tobytes())
+        else:
+            f.write(f"endsolid {name}\n".encode())
+    return count
+
+
+def make_case(case_dir, n_triangles, binary=True, n_surfaces=1):
+    """
+    Create a synthetic geometry case of several surfaces sharing n_triangles triangles.
+
+    The surfaces are tori placed side by side along x. Existing files are
+    reused, since generating the largest cases takes a while.
+
+    Args:
+        case_dir (str): Geometry subdirectory to create
+        n_triangles (int): Total number of triangles over all surfaces
+        binary (bool): Write binary STL files
+        n_surfaces (int): Number of surfaces
+
+    Returns:
+        list: Paths of the STL files
+    """
+    case_dir = Path(case_dir)
+    case_dir.mkdir(parents=True, exist_ok=True)
+    stl_files = []
+    for i in range(n_surfaces):
+        stl_file = case_dir / f'surface{i}.stl'
+        if not stl_file.exists():
+            tmp_path = stl_file.with_name(f'.{stl_file.name}.tmp')
+            write_synthetic_stl(tmp_path, n_triangles // n_surfaces, binary, stl_file.stem, (3.0 * i, 0.0, 0.0))
+            os.replace(tmp_path, stl_file)
+        stl_files.append(stl_file)
+    return stl_files
+
+
+def _stage_scan_bbox(case_dir, work_dir):
+    for stl_file in sorted(Path(case_dir).glob('*.stl')):
+        scan_stl_bounding_box(str(stl_file))
+
+
+def _stage_metadata(case_dir, work_dir):
+    for stl_file in sorted(Path(case_dir).glob('*.stl')):
+        compute_stl_metadata(stl_file)
+
+
+def _stage_hash(case_dir, work_dir):
+    for stl_file in sorted(Path(case_dir).glob('*.stl')):
+        hash_file(stl_file)
+
+
+def _stage_convert_binary(case_dir, work_dir):
+    for stl_file in sorted(Path(case_dir).glob('*.stl')):
+        convert_stl_to_binary(stl_file, Path(work_dir) / stl_file.name)
+
+
+def _stage_feature_edges(case_dir, work_dir):
+    for stl_file in sorted(Path(case_dir).glob('*.stl')):
+        write_surface_features(stl_file, work_dir, 150)
+
+
+def _stage_render_dicts(case_dir, work_dir):
+    generate_snappyHexMeshDict(case_dir, str(Path(work_dir) / 'snappyHexMeshDict'), surface_levels=(1, 2),
+                               feature_levels=1)
+    write_surfaceFeatureExtractDict(str(Path(work_dir) / 'surfaceFeatureExtractDict'), case_dir)
+
+
+def _stage_setup_case(case_dir, work_dir):
+    setup_case(case_dir, Path(work_dir) / 'meshes', force=True, cell_size=0.1)
+
+
+def _stage_setup_case_rerun(case_dir, work_dir):
+    setup_case(case_dir, Path(work_dir) / 'meshes', cell_size=0.1)
+
+
+def _measure(stage, case_dir, work_dir):
+    """
+    Run one stage in this (fresh) process and return its metrics record.
+    """
+    metrics = StageMetrics()
+    with contextlib.redirect_stdout(io.StringIO()):
+        with metrics.stage(stage):
+            globals()[f'_stage_{stage}'](case_dir, work_dir)
+    return metrics.records[0]
+
+
+def run_benchmarks(sizes=DEFAULT_SIZES, formats=DEFAULT_FORMATS, n_surfaces=1, stages=STAGES, data_dir=None):
+    """
+    Time and memory-profile each pipeline stage on synthetic cases of increasing size.
+
+    Every stage runs in a freshly spawned process, so its peak RSS is its own.
+
+    Args:
+        sizes (tuple): Total triangle counts of the cases
+        formats (tuple): 'ascii' and/or 'binary'
+        n_surfaces (int): Number of surfaces per case
+        stages (tuple): Stages to run, see STAGES
+        data_dir (str): Directory keeping the generated STL files between runs,
+            defaults to a temporary directory
+
+    Returns:
+        dict: Case key '<triangles>/<format>/<surfaces>' to stage name to record
+    """
+    results = {}
+    context = multiprocessing.get_context('spawn')
+    with contextlib.ExitStack() as stack:
+        if data_dir is None:
+            data_dir = stack.enter_context(tempfile.TemporaryDirectory(prefix='stl_bench_'))
+        for n_triangles in sizes:
+            for fmt in formats:
+                key = f'{n_triangles}/{fmt}/{n_surfaces}'
+                case_dir = Path(data_dir) / f'{fmt}_{n_triangles}_{n_surfaces}'
+                print(f"Generating {key}")
+                make_case(case_dir, n_triangles, fmt == 'binary', n_surfaces)
+                results[key] = {}
+                with tempfile.TemporaryDirectory(prefix='stl_bench_work_') as work_dir:
+                    for stage in stages:
+                        if stage == 'convert_binary' and fmt == 'binary':
+                            continue
+                        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                            record = pool.submit(_measure, stage, str(case_dir), work_dir).result()
+                        results[key][stage] = {k: record[k] for k in ('wall_s', 'cpu_s', 'peak_rss_bytes')}
+                        rss = record['peak_rss_bytes']
+                        print(f"  {stage:<18} {record['wall_s']:10.3f} s wall {record['cpu_s']:10.3f} s CPU"
+                              + (f" {rss / 2**20:10.1f} MiB peak" if rss is not None else ""))
+    return results
+
+
+def environment():
+    """
+    Describe the machine and library versions a benchmark ran with.
+    """
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def find_regressions(results, baseline, threshold=0.2, min_seconds=0.05):
+    """
+    Compare benchmark results against a baseline.
+
+    A stage regressed if its wall time grew by more than threshold (and by at
+    least min_seconds, to ignore noise on tiny cases) or its peak RSS grew by
+    more than threshold.
+
+    Args:
+        results (dict): Results from run_benchmarks
+        baseline (dict): Earlier results, in the same form
+        threshold (float): Allowed relative growth
+        min_seconds (float): Wall time growth always tolerated
+
+    Returns:
+        list: Messages describing each regression
+    """
+    regressions = []
+    for key, stages in results.items():
+        for stage, record in stages.items():
+            base = baseline.get(key, {}).get(stage)
+            if base is None:
+                continue
+            if (record['wall_s'] > base['wall_s'] * (1 + threshold)
+                    and record['wall_s'] - base['wall_s'] > min_seconds):
+                regressions.append(f"{key} {stage}: wall time {base['wall_s']:.3f} s -> {record['wall_s']:.3f} s")
+            if (record['peak_rss_bytes'] and base.get('peak_rss_bytes')
+                    and record['peak_rss_bytes'] > base['peak_rss_bytes'] * (1 + threshold)):
+                regressions.append(f"{key} {stage}: peak RSS {base['peak_rss_bytes'] / 2**20:.1f} MiB -> "
+                                   f"{record['peak_rss_bytes'] / 2**20:.1f} MiB")
+    return regressions
+
+
+def main(argv=None):
+    """
+    Command line entry point for running the benchmarks.
+
+    Args:
+        argv (list): Command line arguments, defaults to sys.argv[1:]
+    """
+    parser = argparse.ArgumentParser(description="Benchmark the setup pipeline on synthetic STL files.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES),
+                        help="total triangle counts, e.g. 1000 1000000 50000000")
+    parser.add_argument('--formats', nargs='+', choices=DEFAULT_FORMATS, default=list(DEFAULT_FORMATS))
+    parser.add_argument('--surfaces', type=int, default=1, help="number of surfaces per case")
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=list(STAGES))
+    parser.add_argument('--data-dir', help="keep generated STL files here for reuse")
+    parser.add_argument('--output', help="write the results to this JSON file")
+    parser.add_argument('--baseline', default='benchmark_baseline.json', help="baseline file to compare against")
+    parser.add_argument('--save-baseline', action='store_true', help="store the results as the new baseline")
+    parser.add_argument('--threshold', type=float, default=0.2, help="relative growth flagged as a regression")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.sizes, args.formats, args.surfaces, args.stages, args.data_dir)
+    report = {'environment': environment(), 'results': results}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    baseline_path = Path(args.baseline)
+    if args.save_baseline:
+        baseline = {}
+        if baseline_path.exists():
+            with open(baseline_path) as f:
+                baseline = json.load(f)
+        baseline.setdefault('results', {}).update(results)
+        baseline['environment'] = environment()
+        with open(baseline_path, 'w') as f:
+            json.dump(baseline, f, indent=2)
+        print(f"Saved baseline to {baseline_path}")
+        return 0
+
+    if baseline_path.exists():
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+        regressions = find_regressions(results, baseline.get('results', {}), args.threshold)
+        for regression in regressions:
+            print(f"Regression: {regression}")
+        if regressions:
+            return 1
+        print(f"No regressions against {baseline_path}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
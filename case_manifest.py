@@ -0,0 +1,136 @@
+import hashlib
+import json
+import os
+import sys
+from pathlib import Path
+
+MANIFEST_VERSION = 1
+MANIFEST_NAME = '.setup_manifest.json'
+
+
+def generator_fingerprint(func):
+    """
+    Fingerprint the module that defines a generator function.
+
+    Outputs record this fingerprint so that editing a generator regenerates the
+    files it produced, even if none of their inputs changed.
+
+    Args:
+        func (callable): Generator or writer function
+
+    Returns:
+        str: '<module>:<sha256 of the module source>'
+    """
+    module = sys.modules[func.__module__]
+    with open(module.__file__, 'rb') as f:
+        source_hash = hashlib.sha256(f.read()).hexdigest()
+    return f"{func.__module__}:{source_hash}"
+
+
+class CaseManifest:
+    """
+    Record of the inputs and parameters each output of a mesh case was generated from.
+
+    The manifest is stored as JSON in the case directory. An output is up to date
+    when it still exists with the size and mtime it was written with, and was
+    produced from the same input hashes and generator parameters.
+
+    Args:
+        case_dir (str): Path to the mesh case directory, e.g. meshes/<case>
+    """
+
+    def __init__(self, case_dir):
+        self.case_dir = Path(case_dir)
+        self.path = self.case_dir / MANIFEST_NAME
+        self.outputs = {}
+        self._touched = set()
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+            if data.get('version') == MANIFEST_VERSION:
+                self.outputs = data.get('outputs', {})
+        except (OSError, ValueError):
+            pass
+
+    def _key(self, output_path):
+        return Path(output_path).relative_to(self.case_dir).as_posix()
+
+    def is_current(self, output_path, inputs, params):
+        """
+        Check whether an output is up to date with respect to its inputs and parameters.
+
+        Args:
+            output_path (str): Path of the output file inside the case directory
+            inputs (dict): Input name to content hash
+            params (dict): JSON-serialisable generator parameters
+
+        Returns:
+            bool: True if the output can be left untouched
+        """
+        key = self._key(output_path)
+        self._touched.add(key)
+        record = self.outputs.get(key)
+        if record is None:
+            return False
+        try:
+            stat = os.stat(output_path)
+        except OSError:
+            return False
+        return (record['size'] == stat.st_size
+                and record['mtime_ns'] == stat.st_mtime_ns
+                and record['inputs'] == inputs
+                and record['params'] == _normalise(params))
+
+    def record(self, output_path, inputs, params):
+        """
+        Record that an output was just generated from the given inputs and parameters.
+
+        Args:
+            output_path (str): Path of the output file inside the case directory
+            inputs (dict): Input name to content hash
+            params (dict): JSON-serialisable generator parameters
+        """
+        key = self._key(output_path)
+        stat = os.stat(output_path)
+        self._touched.add(key)
+        self.outputs[key] = {
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'inputs': inputs,
+            'params': _normalise(params),
+        }
+
+    def prune(self):
+        """
+        Delete outputs recorded by a previous run that this run no longer produces.
+
+        Only files listed in the manifest are removed, e.g. the staged copy of an
+        STL that was deleted from the geometry directory.
+
+        Returns:
+            list: Relative paths of the removed outputs
+        """
+        removed = []
+        for key in sorted(set(self.outputs) - self._touched):
+            output_path = self.case_dir / key
+            if output_path.is_file() or output_path.is_symlink():
+                output_path.unlink()
+            del self.outputs[key]
+            removed.append(key)
+        return removed
+
+    def save(self):
+        """
+        Write the manifest to the case directory.
+        """
+        tmp_path = self.path.with_name(f"{self.path.name}.tmp")
+        with open(tmp_path, 'w') as f:
+            json.dump({'version': MANIFEST_VERSION, 'outputs': self.outputs}, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+
+def _normalise(params):
+    """
+    Round-trip parameters through JSON so tuples and lists compare equal.
+    """
+    return json.loads(json.dumps(params, sort_keys=True))
@@ -0,0 +1,122 @@
+import os
+import shlex
+import subprocess
+import uuid
+
+
+class ShellWorker:
+    """
+    A long-lived shell, typically inside a container, fed one command at a time.
+
+    Each command is written to the shell's stdin as a subshell that changes to
+    the command's directory, followed by a line printing a marker and the exit
+    code. Output up to the marker is streamed to the command's log, so a
+    container is started once and reused for any number of commands.
+
+    Args:
+        launch_argv (list): Command starting the shell, e.g. a 'docker run -i ... bash -s'
+        cwd (str): Working directory for launching the shell; command directories
+            are given relative to the shell's own working directory
+    """
+
+    def __init__(self, launch_argv, cwd=None):
+        self.launch_argv = list(launch_argv)
+        self.cwd = cwd
+        self.marker = f'__shell_worker_{uuid.uuid4().hex}__'
+        self.process = None
+        self.commands_run = 0
+
+    def start(self):
+        self.process = subprocess.Popen(self.launch_argv, cwd=self.cwd, stdin=subprocess.PIPE,
+                                        stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+
+    @property
+    def alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    def run(self, rel_dir, argv, log_file):
+        """
+        Run one command in the shell.
+
+        Args:
+            rel_dir (str): Directory to run the command in, relative to the shell's
+                working directory
+            argv (list): Command and arguments
+            log_file (file): Open binary file receiving the command's output
+
+        Returns:
+            int: Exit code of the command, or 125 if the shell itself died
+        """
+        if not self.alive:
+            self.start()
+        command = (f"(cd {shlex.quote(rel_dir)} && exec {shlex.join(argv)}) 2>&1 < /dev/null; "
+                   f"printf '\\n{self.marker} %d\\n' $?\n")
+        try:
+            self.process.stdin.write(command.encode())
+            self.process.stdin.flush()
+        except BrokenPipeError:
+            return self._died(log_file)
+
+        # The line before the marker holds the newline printed ahead of it
+        held = None
+        for line in self.process.stdout:
+            if line.startswith(self.marker.encode()):
+                if held is not None:
+                    log_file.write(held[:-1])
+                self.commands_run += 1
+                return int(line.split()[1])
+            if held is not None:
+                log_file.write(held)
+            held = line
+        if held is not None:
+            log_file.write(held)
+        return self._died(log_file)
+
+    def _died(self, log_file):
+        returncode = self.process.wait()
+        log_file.write(f"\nWorker shell exited with code {returncode}\n".encode())
+        self.process = None
+        return 125
+
+    def close(self):
+        """
+        Ask the shell to exit, killing it if it does not.
+        """
+        if not self.alive:
+            return
+        try:
+            self.process.stdin.write(b'exit\n')
+            self.process.stdin.close()
+            self.process.wait(timeout=30)
+        except (BrokenPipeError, subprocess.TimeoutExpired):
+            self.process.kill()
+            self.process.wait()
+
+
+def docker_shell_argv(workspace, image='opencfd/openfoam-run:latest', docker='docker', mount='/home/openfoam',
+                      options=()):
+    """
+    Build the command starting a long-lived OpenFOAM container shell.
+
+    Mirrors what the openfoam-docker script runs, without a terminal, with the
+    workspace mounted as the container user's home directory and used as the
+    working directory.
+
+    Args:
+        workspace (str): Host directory mounted into the container
+        image (str): Container image
+        docker (str): docker or podman executable, or a stand-in script for tests
+        mount (str): Mount point of the workspace inside the container
+        options (list): Extra options for the run command
+
+    Returns:
+        list: Command and arguments
+    """
+    return [
+        docker, 'run', '--rm', '-i',
+        f'--user={os.getuid()}:{os.getgid()}',
+        f'--volume={os.path.abspath(workspace)}:{mount}',
+        f'--workdir={mount}',
+        *options,
+        image, 'bash', '-s',
+    ]
@@ -0,0 +1,170 @@
+import argparse
+import gzip
+import os
+import shutil
+from pathlib import Path
+import numpy as np
+from stl_scan import (
+    BINARY_HEADER_SIZE,
+    BINARY_RECORD_DTYPE,
+    DEFAULT_ASCII_BLOCK_SIZE,
+    binary_header,
+    binary_solid_name,
+    is_binary_stl,
+    iter_ascii_blocks,
+    iter_ascii_triangles,
+    parse_ascii_solid_names,
+)
+
+
+def triangle_normals(triangles):
+    """
+    Compute unit normals of a batch of triangles from their vertex winding.
+
+    Degenerate triangles get a zero normal.
+
+    Args:
+        triangles (numpy.ndarray): Array of shape (n, 3, 3) with triangle vertices
+
+    Returns:
+        numpy.ndarray: float32 array of shape (n, 3)
+    """
+    normals = np.cross(triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0])
+    lengths = np.linalg.norm(normals, axis=1, keepdims=True)
+    np.divide(normals, lengths, out=normals, where=lengths > 0)
+    normals[lengths[:, 0] == 0] = 0
+    return normals.astype(np.float32)
+
+
+def _count_ascii_facets(stl_path, block_size=DEFAULT_ASCII_BLOCK_SIZE):
+    """
+    Count the facets of an ASCII STL file without parsing any coordinates.
+    """
+    return sum(block.count(b'endfacet') for block in iter_ascii_blocks(stl_path, block_size))
+
+
+def first_ascii_solid_name(stl_path):
+    """
+    Read the name of the first solid of an ASCII STL file.
+
+    Args:
+        stl_path (str): Path of the ASCII STL file
+
+    Returns:
+        str: Name of the first solid, empty if it has none
+    """
+    for block in iter_ascii_blocks(stl_path, 1 << 16):
+        names = parse_ascii_solid_names(block)
+        if names:
+            return names[0]
+    return ''
+
+
+def write_binary_records(f, triangles):
+    """
+    Write a batch of triangles as binary STL facet records with computed normals.
+
+    Args:
+        f (file): Binary file object positioned after the header and count
+        triangles (numpy.ndarray): Array of shape (n, 3, 3) with triangle vertices
+    """
+    records = np.zeros(len(triangles), dtype=BINARY_RECORD_DTYPE)
+    records['normal'] = triangle_normals(triangles)
+    records['vectors'] = triangles
+    f.write(records.tobytes())
+
+
+def convert_stl_to_binary(src, dst, compress=False, name=None,
+                          block_size=DEFAULT_ASCII_BLOCK_SIZE):
+    """
+    Convert an STL file to binary, optionally gzip-compressed, in a streaming pass.
+
+    ASCII input is parsed block by block and written out as it goes, so memory
+    use is bounded by the block size. The solid name is kept in the binary
+    header. Binary input is copied (or compressed) unchanged.
+
+    Plain output has its triangle count patched into the header at the end.
+    Gzip output can't be seeked, so the facets are counted in a cheap first pass.
+    OpenFOAM reads '<name>.stl.gz' transparently when a dictionary refers to
+    '<name>.stl'.
+
+    Args:
+        src (str): Path of the STL file to convert
+        dst (str): Path of the binary STL file to write
+        compress (bool): Whether to gzip-compress the output
+        name (str): Solid name for the header, defaults to the first solid name
+            of the input, or the input filename without extension
+        block_size (int): Approximate number of bytes parsed per ASCII block
+
+    Returns:
+        int: Number of bytes written to dst
+    """
+    src = Path(src)
+    dst = Path(dst)
+    tmp_path = dst.with_name(f".{dst.name}.{os.getpid()}.tmp")
+
+    try:
+        if is_binary_stl(src):
+            if name is not None and name != binary_solid_name(src):
+                header = binary_header(name)
+            else:
+                header = None
+            opener = gzip.open if compress else open
+            with open(src, 'rb') as fsrc, opener(tmp_path, 'wb') as fdst:
+                if header is not None:
+                    fsrc.seek(BINARY_HEADER_SIZE)
+                    fdst.write(header)
+                shutil.copyfileobj(fsrc, fdst, 1 << 20)
+        else:
+            if name is None:
+                name = first_ascii_solid_name(src) or src.stem
+            triangles = iter_ascii_triangles(src, block_size)
+            if compress:
+                n_triangles = _count_ascii_facets(src, block_size)
+                with gzip.open(tmp_path, 'wb') as fdst:
+                    fdst.write(binary_header(name))
+                    fdst.write(np.uint32(n_triangles).astype('<u4').tobytes())
+                    written = 0
+                    for chunk in triangles:
+                        write_binary_records(fdst, chunk)
+                        written += len(chunk)
+                if written != n_triangles:
+                    raise ValueError(f"Found {written} vertex triplets but {n_triangles} facets in {src}")
+            else:
+                with open(tmp_path, 'wb') as fdst:
+                    fdst.write(binary_header(name))
+                    fdst.write(b'\x00\x00\x00\x00')
+                    n_triangles = 0
+                    for chunk in triangles:
+                        write_binary_records(fdst, chunk)
+                        n_triangles += len(chunk)
+                    fdst.seek(BINARY_HEADER_SIZE)
+                    fdst.write(np.uint32(n_triangles).astype('<u4').tobytes())
+        os.replace(tmp_path, dst)
+    except BaseException:
+        if tmp_path.exists():
+            tmp_path.unlink()
+        raise
+
+    return os.path.getsize(dst)
+
+
+def main(argv=None):
+    """
+    Command line entry point for converting a single STL file.
+
+    Args:
+        argv (list): Command line arguments, defaults to sys.argv[1:]
+    """
+    parser = argparse.ArgumentParser(description="Convert an STL file to binary.")
+    parser.add_argument('src', help="STL file to convert")
+    parser.add_argument('dst', help="binary STL file to write")
+    parser.add_argument('--gzip', action='store_true', help="gzip-compress the output")
+    parser.add_argument('--name', help="solid name to store in the header")
+    args = parser.parse_args(argv)
+
+    n_bytes = convert_stl_to_binary(args.src, args.dst, compress=args.gzip, name=args.name)
+    print(f"Converted {args.src} to {args.dst} ({n_bytes} bytes)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,321 @@
+import argparse
+import gzip
+import os
+from pathlib import Path
+import numpy as np
+from convert_stl import first_ascii_solid_name, write_binary_records
+from feature_edges import unique_rows, weld_stl_files, weld_vertices
+from generate_snappyHexMeshDict import MERGE_TOLERANCE, feature_level, surface_level
+from stl_scan import binary_header, binary_solid_name, is_binary_stl, iter_stl_triangles, scan_stl_bounding_box
+
+# Eigenvalues of a cluster quadric below this fraction of the largest are
+# treated as zero: the cluster is flat or a ridge along those directions, and
+# its point stays at the mean of the face corners in it there
+EIGENVALUE_RATIO = 1e-3
+
+# Triangles clustered at a time; a chunk takes a few hundred bytes per triangle
+CHUNK_TRIANGLES = 1 << 18
+
+
+def merge_distance(min_coords, max_coords, tolerance=MERGE_TOLERANCE):
+    """
+    Distance below which points are merged, as snappyHexMesh does with mergeTolerance.
+
+    Args:
+        min_coords (array): Minimum corner of the mesh bounding box
+        max_coords (array): Maximum corner of the mesh bounding box
+        tolerance (float): mergeTolerance, a fraction of the bounding box diagonal
+
+    Returns:
+        float: Merge distance
+    """
+    return tolerance * float(np.linalg.norm(np.asarray(max_coords, dtype=np.float64) - np.asarray(min_coords)))
+
+
+def target_edge_lengths(stl_files, min_coords, max_coords, cells, surface_levels=None, feature_levels=None):
+    """
+    Take each surface's target edge lengths from the finest cells that refine it.
+
+    Background cells need not be cubic, so the lengths are per axis, and the
+    surface is decimated on a grid of the same shape as the cells refining it.
+
+    Args:
+        stl_files (list): Paths of the STL files
+        min_coords (array): Minimum corner of the background block
+        max_coords (array): Maximum corner of the background block
+        cells (array): Number of background cells in x, y, z
+        surface_levels (dict or tuple): Surface refinement levels, see surface_level
+        feature_levels (dict or int): Feature edge refinement levels, see feature_level
+
+    Returns:
+        dict: STL file name to [x, y, z] edge lengths, the background cell size
+            divided by 2 ** the highest surface or feature level of the surface
+    """
+    extent = np.asarray(max_coords, dtype=np.float64) - np.asarray(min_coords, dtype=np.float64)
+    cell_size = extent / np.asarray(cells, dtype=np.float64)
+    lengths = {}
+    for stl_file in stl_files:
+        stem = Path(stl_file).stem
+        level = max(surface_level(surface_levels, stem)[1], feature_level(feature_levels, stem))
+        lengths[Path(stl_file).name] = [float(size) / 2 ** level for size in cell_size]
+    return lengths
+
+
+def clean_surface(triangles, merge_distance=0.0):
+    """
+    Merge coincident vertices and drop degenerate and duplicate faces.
+
+    Args:
+        triangles (numpy.ndarray): Array of shape (n, 3, 3) with triangle vertices
+        merge_distance (float): Vertices closer than about this are merged, see weld_vertices
+
+    Returns:
+        tuple: (points, faces) indexed mesh
+    """
+    points, faces = weld_vertices(np.asarray(triangles, dtype=np.float64), merge_distance)
+    return _drop_bad_faces(points, faces)
+
+
+def _drop_bad_faces(points, faces):
+    """
+    Remove collapsed, zero-area and repeated faces, and the points no face uses.
+    """
+    collapsed = (faces[:, 0] == faces[:, 1]) | (faces[:, 1] == faces[:, 2]) | (faces[:, 2] == faces[:, 0])
+    corners = points[faces]
+    cross = np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0])
+    faces = faces[~collapsed & np.any(cross != 0, axis=1)]
+
+    faces = _first_faces(faces)
+
+    used, faces = np.unique(faces, return_inverse=True)
+    return points[used], faces.reshape(-1, 3)
+
+
+def _first_faces(faces):
+    """
+    Keep the first of faces on the same three points, whatever their order.
+    """
+    _, first, _ = unique_rows(np.sort(faces, axis=1))
+    return faces[np.sort(first)]
+
+
+class _ClusterQuadrics:
+    """
+    Grid clusters of a surface with their quadrics, fed one chunk of triangles at a time.
+
+    Only the sums per cluster and the faces spanning three clusters are kept,
+    both about the size of the decimated surface (a face repeated across
+    chunks is dropped at the end), so a surface of any size is
+    decimated out of core, as in Lindstrom's algorithm.
+
+    Args:
+        min_coords (array): Minimum corner of the surface, the grid origin
+        max_coords (array): Maximum corner of the surface
+        edge_length (float or array): Grid spacing, one for all axes or per axis
+    """
+
+    # Columns of the sums: the quadric matrix A (xx, xy, xz, yy, yz, zz), the
+    # vector b, the summed vertex coordinates and the vertex count
+    A_COLUMNS = ((0, 0), (0, 1), (0, 2), (1, 1), (1, 2), (2, 2))
+
+    def __init__(self, min_coords, max_coords, edge_length):
+        self.origin = np.asarray(min_coords, dtype=np.float64)
+        self.spacing = np.broadcast_to(np.asarray(edge_length, dtype=np.float64), (3,)).copy()
+        extent = np.asarray(max_coords, dtype=np.float64) - self.origin
+        self.shape = np.floor(extent / self.spacing).astype(np.int64) + 1
+        if np.prod(self.shape.astype(np.float64)) >= 2.0 ** 62:
+            raise ValueError(f"Edge length {edge_length} is too small for a surface of extent {extent}")
+        self.keys = np.empty(0, dtype=np.int64)
+        self.sums = np.empty((0, 13))
+        self.faces = []
+
+    def _cell_keys(self, vertices):
+        ijk = np.clip(np.floor((vertices - self.origin) / self.spacing).astype(np.int64), 0, self.shape - 1)
+        return ijk[:, 0] + self.shape[0] * (ijk[:, 1] + self.shape[1] * ijk[:, 2])
+
+    def add(self, triangles):
+        """
+        Add a chunk of triangles.
+
+        Args:
+            triangles (numpy.ndarray): Array of shape (n, 3, 3) with triangle vertices
+        """
+        vertices = triangles.reshape(-1, 3)
+        corner_keys = self._cell_keys(vertices)
+        # np.unique(corner_keys, return_inverse=True) hashes, which is slower
+        order = np.argsort(corner_keys)
+        starts = np.ones(len(order), dtype=bool)
+        starts[1:] = corner_keys[order[1:]] != corner_keys[order[:-1]]
+        keys = corner_keys[order[starts]]
+        inverse = np.empty(len(order), dtype=np.int64)
+        inverse[order] = np.cumsum(starts) - 1
+
+        # Plane of each face, weighted by its area: n.x + d = 0
+        corners = triangles.astype(np.float64)
+        cross = np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0])
+        double_area = np.linalg.norm(cross, axis=1)
+        normals = cross / np.maximum(double_area, np.finfo(float).tiny)[:, None]
+        offsets = -np.einsum('ij,ij->i', normals, corners[:, 0])
+        weights = 0.5 * double_area
+
+        # Sum the face quadrics into the cluster of each corner; the quadric of a
+        # cluster is x.A.x + 2 b.x + c with A = sum(w n n^T) and b = sum(w d n)
+        sums = np.empty((len(keys), 13))
+        for column, (i, j) in enumerate(self.A_COLUMNS):
+            sums[:, column] = np.bincount(inverse, np.repeat(weights * normals[:, i] * normals[:, j], 3), len(keys))
+        for i in range(3):
+            sums[:, 6 + i] = np.bincount(inverse, np.repeat(weights * offsets * normals[:, i], 3), len(keys))
+
+        # Average the face corners rather than the distinct vertices, which a
+        # chunk cannot tell from those of other chunks
+        for i in range(3):
+            sums[:, 9 + i] = np.bincount(inverse, vertices[:, i], len(keys))
+        sums[:, 12] = np.bincount(inverse, minlength=len(keys))
+
+        merged = np.union1d(self.keys, keys)
+        merged_sums = np.zeros((len(merged), 13))
+        merged_sums[np.searchsorted(merged, self.keys)] = self.sums
+        merged_sums[np.searchsorted(merged, keys)] += sums
+        self.keys, self.sums = merged, merged_sums
+
+        # Faces whose corners fall into fewer than three clusters disappear
+        faces = corner_keys.reshape(-1, 3)
+        faces = faces[(faces[:, 0] != faces[:, 1]) & (faces[:, 1] != faces[:, 2]) & (faces[:, 2] != faces[:, 0])]
+        self.faces.append(_first_faces(faces))
+
+    def result(self):
+        """
+        Place the point of every cluster and index the faces with them.
+
+        Returns:
+            tuple: (points, faces) decimated mesh
+        """
+        A = np.empty((len(self.keys), 3, 3))
+        for column, (i, j) in enumerate(self.A_COLUMNS):
+            A[:, i, j] = A[:, j, i] = self.sums[:, column]
+        b = self.sums[:, 6:9]
+        mean = self.sums[:, 9:12] / np.maximum(self.sums[:, 12:], 1)
+
+        # Minimise around the mean with a truncated pseudo-inverse, moving only
+        # along the directions the quadric constrains
+        eigenvalues, eigenvectors = np.linalg.eigh(A)
+        keep = eigenvalues > EIGENVALUE_RATIO * eigenvalues[:, -1:]
+        inverse = np.where(keep, 1.0 / np.where(keep, eigenvalues, 1.0), 0.0)
+        residual = -b - np.einsum('kij,kj->ki', A, mean)
+        step = np.einsum('kij,kj->ki', eigenvectors, inverse * np.einsum('kji,kj->ki', eigenvectors, residual))
+        ijk = np.stack([self.keys % self.shape[0], (self.keys // self.shape[0]) % self.shape[1],
+                        self.keys // (self.shape[0] * self.shape[1])], axis=1)
+        cell_min = self.origin + ijk * self.spacing
+        points = np.clip(mean + step, cell_min, cell_min + self.spacing)
+
+        faces = np.concatenate(self.faces) if self.faces else np.empty((0, 3), dtype=np.int64)
+        return _drop_bad_faces(points, np.searchsorted(self.keys, faces))
+
+
+def decimate_surface(points, faces, edge_length):
+    """
+    Decimate a mesh to edges of roughly a target length by quadric vertex clustering.
+
+    Vertices are clustered on a uniform grid with the target edge length as
+    spacing, as in Lindstrom's out-of-core simplification. Each cluster is
+    replaced by the point minimising the summed squared distance to the
+    planes of the faces around it (their area-weighted quadric error), which
+    keeps sharp edges and corners in place; the point is clamped to the
+    cluster's grid cell. Faces whose corners fall into fewer than three
+    clusters disappear.
+
+    Details thinner than a grid cell, such as both sides of a thin wall, are
+    merged, which can leave non-manifold edges; snappyHexMesh cannot resolve
+    them at that cell size anyway.
+
+    Args:
+        points (numpy.ndarray): Array of shape (m, 3) with vertex coordinates
+        faces (numpy.ndarray): Array of shape (n, 3) with vertex indices
+        edge_length (float or array): Target edge length, i.e. the grid
+            spacing, for all axes or per axis
+
+    Returns:
+        tuple: (points, faces) decimated mesh
+    """
+    points = np.asarray(points, dtype=np.float64)
+    clusters = _ClusterQuadrics(points.min(axis=0), points.max(axis=0), edge_length)
+    clusters.add(points[faces])
+    return clusters.result()
+
+
+def decimate_stl(src, dst, edge_length=None, merge_distance=0.0, compress=False, name=None):
+    """
+    Clean and decimate an STL file into a binary, optionally gzip-compressed, STL file.
+
+    All solids of the input are written as one solid. A decimated surface is
+    streamed through the clustering chunk by chunk (see decimate_surface), so
+    only the decimated surface is held in memory; the clustering merges
+    vertices and drops degenerate and duplicate faces on its much coarser
+    grid. A surface that is only cleaned is welded chunk by chunk in float32.
+
+    Args:
+        src (str): Path of the STL file to decimate
+        dst (str): Path of the binary STL file to write
+        edge_length (float or array): Target edge length, for all axes or per
+            axis, None to only clean the surface
+        merge_distance (float): Vertices closer than about this are merged when
+            only cleaning
+        compress (bool): Whether to gzip-compress the output
+        name (str): Solid name for the header, defaults to the input's solid
+            name or the filename without extension
+
+    Returns:
+        dict: 'triangles_in', 'triangles_out' and the number of 'bytes' written
+    """
+    src = Path(src)
+    dst = Path(dst)
+    if edge_length is not None and np.all(np.asarray(edge_length) > 0):
+        clusters = _ClusterQuadrics(*scan_stl_bounding_box(str(src)), edge_length)
+        triangles_in = 0
+        for triangles in iter_stl_triangles(str(src), CHUNK_TRIANGLES):
+            triangles_in += len(triangles)
+            clusters.add(triangles)
+        points, faces = clusters.result()
+    else:
+        points, faces = weld_stl_files([src], merge_distance)
+        triangles_in = len(faces)
+        points, faces = _drop_bad_faces(points, faces)
+    if name is None:
+        name = (binary_solid_name(src) if is_binary_stl(src) else first_ascii_solid_name(src)) or src.stem
+
+    tmp_path = dst.with_name(f".{dst.name}.{os.getpid()}.tmp")
+    opener = gzip.open if compress else open
+    try:
+        with opener(tmp_path, 'wb') as f:
+            f.write(binary_header(name))
+            f.write(np.uint32(len(faces)).astype('<u4').tobytes())
+            write_binary_records(f, points[faces].astype(np.float32))
+        os.replace(tmp_path, dst)
+    except BaseException:
+        if tmp_path.exists():
+            tmp_path.unlink()
+        raise
+
+    return {'triangles_in': int(triangles_in), 'triangles_out': int(len(faces)), 'bytes': os.path.getsize(dst)}
+
+
+def main(argv=None):
+    """
+    Command line entry point for decimating an STL file.
+
+    Args:
+        argv (list): Command line arguments, defaults to sys.argv[1:]
+    """
+    parser = argparse.ArgumentParser(description="Clean an STL file and decimate it to a target edge length.")
+    parser.add_argument('src', help="STL file to decimate")
+    parser.add_argument('dst', help="binary STL file to write")
+    parser.add_argument('--edge-length', type=float, help="target edge length, omit to only clean the surface")
+    parser.add_argument('--merge-distance', type=float, default=0.0, help="distance below which vertices are merged")
+    parser.add_argument('--gzip', action='store_true', help="gzip-compress the output")
+    args = parser.parse_args(argv)
+
+    result = decimate_stl(args.src, args.dst, args.edge_length, args.merge_distance, args.gzip)
+    print(f"Wrote {result['triangles_out']} of {result['triangles_in']} triangles to {args.dst} ({result['bytes']} bytes)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,296 @@
+import argparse
+import contextlib
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import numpy as np
+from convert_stl import triangle_normals
+from foam_dict import FOAM_FOOTER, foam_header
+from stl_scan import DEFAULT_CHUNK_TRIANGLES, iter_stl_triangles
+
+
+def weld_vertices(triangles, tolerance=0.0):
+    """
+    Merge coincident triangle vertices into an indexed mesh.
+
+    Args:
+        triangles (numpy.ndarray): Array of shape (n, 3, 3) with triangle vertices
+        tolerance (float): Vertices are merged when they fall in the same cell of
+            a grid with this spacing; 0 merges only exactly equal vertices
+
+    Returns:
+        tuple: (points, faces) with points of shape (m, 3) and faces of shape
+            (n, 3) indexing into points
+    """
+    vertices = triangles.reshape(-1, 3)
+    _, first, inverse = unique_rows(_vertex_keys(vertices, tolerance))
+    return vertices[first], inverse.reshape(-1, 3)
+
+
+def _vertex_keys(vertices, tolerance):
+    if tolerance > 0:
+        return np.floor(vertices / tolerance).astype(np.int64)
+    return vertices
+
+
+def unique_rows(rows):
+    """
+    np.unique(rows, axis=0, return_index=True, return_inverse=True), several times faster.
+
+    A stable lexsort over the three columns replaces the sort of whole rows,
+    so the first index of each row is its first occurrence, as with np.unique.
+
+    Args:
+        rows (numpy.ndarray): Array of shape (n, 3)
+
+    Returns:
+        tuple: (unique, first, inverse) as returned by np.unique
+    """
+    order = np.lexsort((rows[:, 2], rows[:, 1], rows[:, 0]))
+    sorted_rows = rows[order]
+    starts = np.ones(len(rows), dtype=bool)
+    starts[1:] = np.any(sorted_rows[1:] != sorted_rows[:-1], axis=1)
+    group = np.cumsum(starts) - 1
+    inverse = np.empty(len(rows), dtype=np.int64)
+    inverse[order] = group
+    first = order[starts]
+    return rows[first], first, inverse
+
+
+def weld_stl_files(stl_files, tolerance=0.0, chunk_triangles=DEFAULT_CHUNK_TRIANGLES):
+    """
+    Read STL files into one indexed mesh, welding the vertices chunk by chunk.
+
+    Each chunk of triangles is welded on its own and only its unique vertices
+    are kept, then the vertices of all chunks are welded once more. The
+    triangles of a whole surface are never held in memory, only the faces and
+    the float32 points. The result equals weld_vertices on all triangles.
+
+    Args:
+        stl_files (list): Paths of the STL files
+        tolerance (float): Merge distance, see weld_vertices
+        chunk_triangles (int): Number of triangles welded at a time
+
+    Returns:
+        tuple: (points, faces) with float32 points of shape (m, 3) and faces
+            of shape (n, 3) indexing into points
+    """
+    chunk_keys = []
+    chunk_points = []
+    chunk_faces = []
+    for stl_file in stl_files:
+        for triangles in iter_stl_triangles(str(stl_file), chunk_triangles):
+            vertices = triangles.reshape(-1, 3)
+            keys, first, inverse = unique_rows(_vertex_keys(vertices, tolerance))
+            chunk_keys.append(keys)
+            chunk_points.append(vertices[first])
+            chunk_faces.append(inverse.reshape(-1, 3).astype(np.int32 if len(keys) < 2**31 else np.int64))
+    if not chunk_keys:
+        return np.empty((0, 3), dtype=np.float32), np.empty((0, 3), dtype=np.int32)
+    if len(chunk_keys) == 1:
+        return chunk_points[0], chunk_faces[0]
+
+    _, first, inverse = unique_rows(np.concatenate(chunk_keys))
+    points = np.concatenate(chunk_points)[first]
+    index_dtype = np.int32 if len(points) < 2**31 else np.int64
+    inverse = inverse.reshape(-1).astype(index_dtype)
+    offset = 0
+    for i, keys in enumerate(chunk_keys):
+        chunk_faces[i] = inverse[offset + chunk_faces[i]]
+        offset += len(keys)
+    return points, np.concatenate(chunk_faces)
+
+
+def edge_table(faces, return_half_edges=False):
+    """
+    Hash the edges of an indexed triangle mesh.
+
+    Args:
+        faces (numpy.ndarray): Array of shape (n, 3) with vertex indices
+        return_half_edges (bool): Also return the half-edges grouped by edge
+
+    Returns:
+        tuple: (edges, edge_faces, edge_counts) where edges has shape (m, 2) with
+            sorted vertex indices, edge_faces lists the face of each of the 3n
+            half-edges grouped by edge, and edge_counts is the number of faces
+            on each edge. The faces of edge i are
+            edge_faces[offsets[i]:offsets[i] + edge_counts[i]] with offsets the
+            exclusive cumulative sum of edge_counts. With return_half_edges a
+            fourth array holds the half-edges in the same order, shape (3n, 2)
+            with the vertex indices in the direction their face runs.
+    """
+    half_edges = np.sort(faces[:, [0, 1, 1, 2, 2, 0]].reshape(-1, 2), axis=1)
+    n_points = int(faces.max()) + 1 if len(faces) else 1
+    keys = half_edges[:, 0].astype(np.int64) * n_points + half_edges[:, 1]
+    order = np.argsort(keys, kind='stable')
+    unique_keys, counts = np.unique(keys[order], return_counts=True)
+    edges = np.stack([unique_keys // n_points, unique_keys % n_points], axis=1)
+    edge_faces = order // 3
+    if return_half_edges:
+        return edges, edge_faces, counts, faces[:, [0, 1, 1, 2, 2, 0]].reshape(-1, 2)[order]
+    return edges, edge_faces, counts
+
+
+def extract_feature_edges(points, faces, included_angle=180.0):
+    """
+    Select the feature edges of an indexed triangle mesh.
+
+    Open edges (one face) and non-manifold edges (more than two faces) are
+    always features. Edges between two faces are features when the angle
+    between the face normals is at least 180 - included_angle degrees, as in
+    OpenFOAM's surfaceFeatureExtract: 180 selects all edges, 0 selects none.
+
+    Args:
+        points (numpy.ndarray): Array of shape (m, 3) with vertex coordinates
+        faces (numpy.ndarray): Array of shape (n, 3) with vertex indices
+        included_angle (float): Included angle in degrees
+
+    Returns:
+        numpy.ndarray: Array of shape (k, 2) with the vertex indices of the feature edges
+    """
+    edges, edge_faces, counts = edge_table(faces)
+    offsets = np.cumsum(counts) - counts
+
+    is_feature = counts != 2
+    manifold = np.flatnonzero(counts == 2)
+    if included_angle >= 180:
+        is_feature[manifold] = True
+    elif included_angle > 0 and len(manifold):
+        normals = triangle_normals(points[faces])
+        n0 = normals[edge_faces[offsets[manifold]]]
+        n1 = normals[edge_faces[offsets[manifold] + 1]]
+        cos_angle = np.clip((n0 * n1).sum(axis=1), -1.0, 1.0)
+        is_feature[manifold] = cos_angle <= np.cos(np.radians(180.0 - included_angle))
+
+    return edges[is_feature]
+
+
+def write_eMesh(output_path, points, edges):
+    """
+    Write feature edges as an OpenFOAM featureEdgeMesh (.eMesh) file.
+
+    Only the points used by the edges are written, renumbered from zero.
+
+    Args:
+        output_path (str): Path of the .eMesh file
+        points (numpy.ndarray): Array of shape (m, 3) with vertex coordinates
+        edges (numpy.ndarray): Array of shape (k, 2) with vertex indices
+    """
+    used, local_edges = np.unique(edges, return_inverse=True)
+    local_edges = local_edges.reshape(-1, 2)
+    used_points = points[used]
+    object_name = os.path.basename(output_path)
+
+    tmp_path = f"{output_path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        f.write(foam_header(object_name, 'featureEdgeMesh', 'constant/triSurface'))
+        f.write(f"""
+// points:
+
+{len(used_points)}
+(
+""")
+        np.savetxt(f, used_points, fmt='(%.10g %.10g %.10g)')
+        f.write(f""")
+
+// edges:
+
+{len(local_edges)}
+(
+""")
+        np.savetxt(f, local_edges, fmt='(%d %d)')
+        f.write(")\n\n")
+        f.write(FOAM_FOOTER + "\n")
+    os.replace(tmp_path, output_path)
+
+
+def write_surface_features(stl_path, output_dir, included_angle=180.0):
+    """
+    Extract the feature edges of one STL file into '<output_dir>/<stem>.eMesh'.
+
+    Args:
+        stl_path (str): Path to the STL file
+        output_dir (str): Directory to write the .eMesh file to, normally constant/triSurface
+        included_angle (float): Included angle in degrees, see extract_feature_edges
+
+    Returns:
+        tuple: (output_path, n_edges)
+    """
+    stl_path = Path(stl_path)
+    points, faces = weld_stl_files([stl_path])
+    edges = extract_feature_edges(points, faces, included_angle)
+    output_path = Path(output_dir) / f"{stl_path.name.split('.')[0]}.eMesh"
+    write_eMesh(str(output_path), points, edges)
+    return str(output_path), len(edges)
+
+
+@contextlib.contextmanager
+def feature_extractor(workers=1, n_surfaces=None):
+    """
+    Extract the feature edges of several surfaces, optionally one process per surface.
+
+    Inside the block, extract(stl_path, output_dir, included_angle) starts
+    write_surface_features for one surface and returns a function waiting for
+    its (output_path, n_edges). All started surfaces run in one process pool.
+
+    Args:
+        workers (int): Number of worker processes, 0 for one per CPU core
+        n_surfaces (int): Number of surfaces that will be extracted, caps the pool
+
+    Yields:
+        callable: extract(stl_path, output_dir, included_angle)
+    """
+    if workers == 0:
+        workers = os.cpu_count() or 1
+    if n_surfaces is not None:
+        workers = min(workers, n_surfaces)
+    if workers <= 1:
+        def extract_now(*args):
+            result = write_surface_features(*args)
+            return lambda: result
+        yield extract_now
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        yield lambda *args: pool.submit(write_surface_features, *args).result
+
+
+def write_case_features(stl_files, output_dir, included_angle=180.0, workers=1):
+    """
+    Extract the feature edges of several STL files, optionally one process per surface.
+
+    Args:
+        stl_files (list): Paths of the STL files
+        output_dir (str): Directory to write the .eMesh files to
+        included_angle (float): Included angle in degrees, see extract_feature_edges
+        workers (int): Number of worker processes, 0 for one per CPU core
+
+    Returns:
+        list: (output_path, n_edges) per STL file
+    """
+    with feature_extractor(workers, len(stl_files)) as extract:
+        pending = [extract(f, output_dir, included_angle) for f in stl_files]
+        return [result() for result in pending]
+
+
+def main(argv=None):
+    """
+    Command line entry point writing .eMesh files for a mesh case.
+
+    Args:
+        argv (list): Command line arguments, defaults to sys.argv[1:]
+    """
+    parser = argparse.ArgumentParser(description="Extract feature edges of a case's STL files into .eMesh files.")
+    parser.add_argument('case_dir', help="mesh case directory containing constant/triSurface")
+    parser.add_argument('--included-angle', type=float, default=180.0, help="included angle in degrees")
+    parser.add_argument('-j', '--workers', type=int, default=1, help="number of worker processes, 0 for one per CPU core")
+    args = parser.parse_args(argv)
+
+    tri_surface = Path(args.case_dir) / 'constant' / 'triSurface'
+    stl_files = sorted(list(tri_surface.glob('*.stl')) + list(tri_surface.glob('*.stl.gz')))
+    if not stl_files:
+        raise ValueError(f"No STL files found in {tri_surface}")
+    for output_path, n_edges in write_case_features(stl_files, tri_surface, args.included_angle, args.workers):
+        print(f"Wrote {n_edges} feature edges to {output_path}")
+
+if __name__ == "__main__":
+    main()
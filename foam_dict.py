@@ -0,0 +1,315 @@
+import filecmp
+import os
+import stat
+
+# Banner opening every file, as written by OpenFOAM itself
+FOAM_BANNER = r"""/*--------------------------------*- C++ -*----------------------------------*\
+| =========                 |                                                 |
+| \\      /  F ield         | OpenFOAM: The Open Source CFD Toolbox           |
+|  \\    /   O peration     | Version:  4.0                                   |
+|   \\  /    A nd           | Web:      www.OpenFOAM.org                      |
+|    \\/     M anipulation  |                                                 |
+\*---------------------------------------------------------------------------*/
+"""
+FOAM_SEPARATOR = "// * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * //\n"
+# Last line of every file; dictionaries end without a newline after it
+FOAM_FOOTER = "// ************************************************************************* //"
+
+# Values start at this column, as in OpenFOAM's own output, for keywords given as Keyword
+KEYWORD_WIDTH = 16
+INDENT = '    '
+
+_SCALAR_TYPES = (bool, int, float, tuple)
+
+# Rendered text of static dictionaries, see write_static_foam_file
+_static_text = {}
+
+
+class Keyword(str):
+    """
+    A keyword whose value is aligned to a column instead of following a single space.
+
+    Behaves as the plain keyword string everywhere else, so it can be used as
+    any other dictionary key.
+    """
+    def __new__(cls, name, column=KEYWORD_WIDTH):
+        keyword = super().__new__(cls, name)
+        keyword.column = column
+        return keyword
+
+
+class TerminatedDict(dict):
+    """
+    A sub-dictionary closed by '};' instead of '}', which OpenFOAM reads the same.
+    """
+
+
+def foam_value(value):
+    """
+    Render a single value inline.
+
+    Strings are written as they are, so words, quoted file names and
+    numbers whose spelling matters need no special casing. Booleans become
+    true/false, floats keep ten significant digits, and tuples become inline
+    lists.
+
+    Args:
+        value: str, bool, int, float or tuple of those
+
+    Returns:
+        str: Rendered value
+    """
+    if type(value) is str:
+        return value
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, float):
+        return f"{value:.10g}"
+    if isinstance(value, tuple):
+        return '(' + ' '.join([foam_value(item) for item in value]) + ')'
+    return str(value)
+
+
+def foam_header(object_name, foam_class='dictionary', location=None, blank_line=False):
+    """
+    Render the banner and FoamFile header of an OpenFOAM file.
+
+    Args:
+        object_name (str): Name of the object, normally the file name
+        foam_class (str): Class of the object, e.g. 'dictionary' or 'featureEdgeMesh'
+        location (str): Optional location, e.g. 'system'
+        blank_line (bool): Whether a blank line precedes the separator line
+
+    Returns:
+        str: Header text ending with the separator line
+    """
+    header = {Keyword('version'): '2.0', Keyword('format'): 'ascii', Keyword('class'): foam_class}
+    if location:
+        header[Keyword('location')] = f'"{location}"'
+    header[Keyword('object')] = object_name
+    entries = {'FoamFile': header, '\n': None} if blank_line else {'FoamFile': header}
+    return FOAM_BANNER + ''.join(iter_foam_entries(entries)) + FOAM_SEPARATOR
+
+
+def iter_foam_entries(entries):
+    """
+    Render a dictionary body from nested Python structures, one top-level entry at a time.
+
+    Each key of entries becomes a keyword. A dict value is a sub-dictionary
+    and a list value a list with one item per line; inside lists, a dict is an
+    anonymous '{ }' dictionary and a (name, dict) pair a named one. Other
+    values are rendered with foam_value, after a single space or, for a
+    Keyword, aligned to its column. A None value writes the keyword alone.
+
+    Nothing is laid out implicitly: every leading newline of a key is a blank
+    line before the entry, and a key of newlines only is just blank lines.
+    Keys starting with '//' are comments, which may span several lines, and
+    keys starting with '#' directives such as '#include', written without a
+    semicolon.
+
+    A sub-dictionary object used for several entries, e.g. the same settings
+    for every surface, is rendered only once.
+
+    Args:
+        entries (dict): Keyword to value
+
+    Yields:
+        str: Rendered text of each top-level entry
+    """
+    memo = {}
+    for key, value in entries.items():
+        out = []
+        _render_entry(key, value, '', out, memo)
+        yield ''.join(out)
+
+
+def _render_entry(key, value, indent, out, memo):
+    name = key.lstrip("\n")
+    if len(name) < len(key):
+        out.append("\n" * (len(key) - len(name)))
+    if not name:
+        return
+    if name[0] == '/':
+        out.append(''.join([f"{indent}{line}\n" for line in name.split("\n")]))
+    elif name[0] == '#':
+        out.append(f"{indent}{name} {foam_value(value)}\n" if value is not None else f"{indent}{name}\n")
+    elif isinstance(value, dict):
+        out.append(f"{indent}{name}\n")
+        out.append(_render_dict(value, indent, memo))
+    elif isinstance(value, list):
+        out.append(f"{indent}{name}\n{indent}(\n")
+        _render_items(value, indent + INDENT, out, memo)
+        out.append(f"{indent});\n")
+    elif value is None:
+        out.append(f"{indent}{name};\n")
+    else:
+        space = ' ' * max(1, key.column - len(indent) - len(name)) if isinstance(key, Keyword) else ' '
+        out.append(f"{indent}{name}{space}{foam_value(value)};\n")
+
+
+def _render_dict(entries, indent, memo):
+    """
+    Render a braced dictionary at an indentation, reusing an earlier rendering of the same object.
+
+    Only dictionaries holding more than plain values are kept, as the others
+    are rendered about as fast as they are looked up.
+    """
+    rendered = memo.get(id(entries))
+    if rendered is not None and rendered[0] == indent:
+        return rendered[1]
+    inner = indent + INDENT
+    out = []
+    nested = False
+    for key, value in entries.items():
+        # Plain keywords with a word or a sub-dictionary make up most entries, so skip the dispatch for them
+        if type(key) is str and key[0] not in '\n/#':
+            kind = type(value)
+            if kind is str:
+                out.append(f"{inner}{key} {value};\n")
+                continue
+            if kind in _SCALAR_TYPES:
+                out.append(f"{inner}{key} {foam_value(value)};\n")
+                continue
+            if kind is dict:
+                out.append(f"{inner}{key}\n{_render_dict(value, inner, memo)}")
+                nested = True
+                continue
+        _render_entry(key, value, inner, out, memo)
+        nested = True
+    close = '};' if isinstance(entries, TerminatedDict) else '}'
+    text = f"{indent}{{\n{''.join(out)}{indent}{close}\n"
+    if nested:
+        memo[id(entries)] = (indent, text)
+    return text
+
+
+def _render_items(items, indent, out, memo):
+    for item in items:
+        if type(item) is dict:
+            out.append(_render_dict(item, indent, memo))
+        elif type(item) is tuple and len(item) == 2 and isinstance(item[1], dict):
+            out.append(f"{indent}{item[0]}\n")
+            out.append(_render_dict(item[1], indent, memo))
+        else:
+            out.append(f"{indent}{foam_value(item)}\n")
+
+
+def iter_foam_file(object_name, entries, foam_class='dictionary', location=None, blank_line=False):
+    """
+    Render a complete OpenFOAM dictionary file, one piece at a time.
+
+    A blank line separates the entries from the header and from the footer,
+    which ends the file without a newline.
+
+    Args:
+        object_name (str): Name of the object, normally the file name
+        entries (dict): Body of the dictionary, see iter_foam_entries
+        foam_class (str): Class of the object
+        location (str): Optional location, e.g. 'system'
+        blank_line (bool): Whether a blank line precedes the separator line
+
+    Yields:
+        str: Rendered text
+    """
+    yield foam_header(object_name, foam_class, location, blank_line)
+    yield "\n"
+    yield from iter_foam_entries(entries)
+    if entries:
+        yield "\n"
+    yield FOAM_FOOTER
+
+
+def render_foam_file(object_name, entries, foam_class='dictionary', location=None, blank_line=False):
+    """
+    Render a complete OpenFOAM dictionary file into a string.
+
+    Returns:
+        str: File contents, see iter_foam_file for the arguments
+    """
+    return ''.join(iter_foam_file(object_name, entries, foam_class, location, blank_line))
+
+
+def write_text(output_path, pieces, executable=False):
+    """
+    Write text pieces to a file atomically, creating its directory.
+
+    An executable file gets its execute bits before it replaces the old one,
+    so it is never visible without them. A file that would come out byte for
+    byte and mode for mode the same is left alone, keeping its mtime, e.g.
+    when a generator was edited in a way that does not change its output.
+
+    Args:
+        output_path (str): Path of the file to write
+        pieces (iterable): Text pieces, written in order
+        executable (bool): Whether to make the file executable, e.g. for scripts
+    """
+    output_path = str(output_path)
+    directory = os.path.dirname(output_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = os.path.join(directory, f".{os.path.basename(output_path)}.{os.getpid()}.tmp")
+    try:
+        with open(tmp_path, 'w') as f:
+            f.writelines(pieces)
+        if executable:
+            os.chmod(tmp_path, os.stat(tmp_path).st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+        if _unchanged(tmp_path, output_path):
+            os.unlink(tmp_path)
+        else:
+            os.replace(tmp_path, output_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+def _unchanged(new_path, old_path):
+    """
+    Check whether a freshly written file matches an existing one in mode and contents.
+    """
+    try:
+        if os.stat(new_path).st_mode != os.stat(old_path).st_mode:
+            return False
+    except FileNotFoundError:
+        return False
+    return filecmp.cmp(new_path, old_path, shallow=False)
+
+
+def write_foam_file(output_path, object_name, entries, foam_class='dictionary', location=None, blank_line=False):
+    """
+    Stream an OpenFOAM dictionary file to disk without building it in memory.
+
+    Entries are rendered while they are written, so dictionaries with
+    thousands of surfaces take time linear in their size.
+
+    Args:
+        output_path (str): Path of the file to write
+        object_name (str): Name of the object, normally the file name
+        entries (dict): Body of the dictionary, see iter_foam_entries
+        foam_class (str): Class of the object
+        location (str): Optional location, e.g. 'system'
+        blank_line (bool): Whether a blank line precedes the separator line
+    """
+    write_text(output_path, iter_foam_file(object_name, entries, foam_class, location, blank_line))
+
+
+def write_static_foam_file(output_path, object_name, entries, foam_class='dictionary', location=None, blank_line=False):
+    """
+    Write a dictionary whose contents never change, rendering it once per process.
+
+    entries must be a module-level constant: its rendered text is kept keyed
+    by its identity and reused for every case set up by this process.
+
+    Args:
+        output_path (str): Path of the file to write
+        object_name (str): Name of the object, normally the file name
+        entries (dict): Constant body of the dictionary, see iter_foam_entries
+        foam_class (str): Class of the object
+        location (str): Optional location, e.g. 'system'
+        blank_line (bool): Whether a blank line precedes the separator line
+    """
+    key = (id(entries), object_name, foam_class, location, blank_line)
+    text = _static_text.get(key)
+    if text is None:
+        text = _static_text[key] = render_foam_file(object_name, entries, foam_class, location, blank_line)
+    write_text(output_path, [text])
@@ -1,9 +1,9 @@
 import numpy as np
-from stl import mesh
-import os
 from pathlib import Path
+from foam_dict import render_foam_file, write_foam_file
+from stl_scan import scan_stl_bounding_box
 
-def get_stl_bounding_box(stl_dir='geometry/basic_box', padding=1.0):
+def get_stl_bounding_box(stl_dir='geometry/basic_box', padding=1.0, cache=None):
     """
     Calculate the bounding box that envelopes all STL files in the specified directory
     with additional padding.
@@ -11,6 +11,7 @@ def get_stl_bounding_box(stl_dir='geometry/basic_box', padding=1.0):
     Args:
         stl_dir (str): Directory containing STL files
         padding (float): Padding to add to the bounding box in all directions
+        cache (GeometryCache): Optional metadata cache to read bounding boxes from
         
     Returns:
         tuple: (min_coords, max_coords) where each is a numpy array of [x, y, z]
@@ -27,12 +28,16 @@ def get_stl_bounding_box(stl_dir='geometry/basic_box', padding=1.0):
     
     # Process each STL file
     for stl_file in stl_files:
-        # Read the STL file
-        stl_mesh = mesh.Mesh.from_file(str(stl_file))
+        if cache is not None:
+            # Reuse the cached bounding box unless the file changed
+            stl_min, stl_max = (np.array(c, dtype=np.float32)
+                                for c in cache.get_metadata(stl_file)['bounding_box'])
+        else:
+            # Stream the STL file in chunks to get its min and max coordinates
+            stl_min, stl_max = scan_stl_bounding_box(str(stl_file))
         
-        # Get the min and max coordinates for this mesh
-        min_coords = np.minimum(min_coords, stl_mesh.vectors.min(axis=(0, 1)))
-        max_coords = np.maximum(max_coords, stl_mesh.vectors.max(axis=(0, 1)))
+        min_coords = np.minimum(min_coords, stl_min)
+        max_coords = np.maximum(max_coords, stl_max)
     
     # Add padding
     min_coords -= padding
@@ -40,7 +45,79 @@ def get_stl_bounding_box(stl_dir='geometry/basic_box', padding=1.0):
     
     return min_coords, max_coords
 
-def generate_blockMeshDict(stl_dir='geometry/basic_box', padding=1.0, cells=(20, 20, 30)):
+def compute_block_cells(min_coords, max_coords, cell_size=None, cell_budget=None):
+    """
+    Size a background block with cubic cells from a target cell size or cell budget.
+    
+    The per-axis cell counts are rounded up and the block is grown symmetrically
+    so every cell is exactly cell_size in all three directions.
+    
+    Args:
+        min_coords (numpy.ndarray): Minimum [x, y, z] of the block
+        max_coords (numpy.ndarray): Maximum [x, y, z] of the block
+        cell_size (float): Target edge length of the background cells
+        cell_budget (int): Maximum total number of background cells, used when
+            cell_size is not given
+        
+    Returns:
+        tuple: (min_coords, max_coords, cells, cell_size) with the grown block,
+            the cell counts in x, y, z and the cell edge length
+    """
+    min_coords = np.asarray(min_coords, dtype=np.float64)
+    max_coords = np.asarray(max_coords, dtype=np.float64)
+    extent = max_coords - min_coords
+    
+    if cell_size is None:
+        if not cell_budget or cell_budget < 1:
+            raise ValueError("Either cell_size or a positive cell_budget is required")
+        # Start from the cube root of the volume per cell, then coarsen until
+        # the rounded-up counts fit in the budget
+        volume = np.prod(np.maximum(extent, extent.max() * 1e-6))
+        cell_size = (volume / cell_budget) ** (1.0 / 3.0)
+        while np.prod(np.maximum(1, np.ceil(extent / cell_size - 1e-9))) > cell_budget:
+            cell_size *= 1.01
+    elif cell_size <= 0:
+        raise ValueError(f"cell_size must be positive, got {cell_size}")
+    
+    cells = np.maximum(1, np.ceil(extent / cell_size - 1e-9)).astype(int)
+    grow = cells * cell_size - extent
+    return min_coords - grow / 2, max_coords + grow / 2, tuple(int(c) for c in cells), float(cell_size)
+
+def compute_block_mesh(stl_dir='geometry/basic_box', padding=1.0, cells=(20, 20, 30), cache=None,
+                       cell_size=None, cell_budget=None, relative_padding=None):
+    """
+    Compute the extent and cell counts of the background block around the STL files.
+    
+    With neither cell_size nor cell_budget given, the fixed cells are used as
+    they are, which generally gives non-cubic cells.
+    
+    Args:
+        stl_dir (str): Directory containing STL files
+        padding (float): Padding to add to the bounding box in all directions
+        cells (tuple): Number of cells in x, y, z directions
+        cache (GeometryCache): Optional metadata cache to read bounding boxes from
+        cell_size (float): Target edge length of cubic background cells
+        cell_budget (int): Maximum total number of cubic background cells
+        relative_padding (float): Padding as a fraction of the largest bounding box
+            dimension, used instead of padding
+        
+    Returns:
+        tuple: (min_coords, max_coords, cells) with the block extent and cell counts
+    """
+    if relative_padding is not None:
+        min_coords, max_coords = get_stl_bounding_box(stl_dir, 0.0, cache)
+        pad = relative_padding * float((max_coords - min_coords).max())
+        min_coords, max_coords = min_coords - pad, max_coords + pad
+    else:
+        min_coords, max_coords = get_stl_bounding_box(stl_dir, padding, cache)
+    
+    if cell_size is not None or cell_budget is not None:
+        min_coords, max_coords, cells, _ = compute_block_cells(min_coords, max_coords, cell_size, cell_budget)
+    
+    return min_coords, max_coords, tuple(cells)
+
+def generate_blockMeshDict(stl_dir='geometry/basic_box', padding=1.0, cells=(20, 20, 30), cache=None,
+                           cell_size=None, cell_budget=None, relative_padding=None):
     """
     Generate a complete blockMeshDict file based on STL files.
     
@@ -48,80 +125,70 @@ def generate_blockMeshDict(stl_dir='geometry/basic_box', padding=1.0, cells=(20,
         stl_dir (str): Directory containing STL files
         padding (float): Padding to add to the bounding box in all directions
         cells (tuple): Number of cells in x, y, z directions
+        cache (GeometryCache): Optional metadata cache to read bounding boxes from
+        cell_size (float): Target edge length of cubic background cells, overrides cells
+        cell_budget (int): Maximum total number of cubic background cells, overrides cells
+        relative_padding (float): Padding as a fraction of the largest bounding box
+            dimension, overrides padding
         
     Returns:
         str: Complete blockMeshDict content
     """
-    min_coords, max_coords = get_stl_bounding_box(stl_dir, padding)
-    
-    # Format the vertices
-    vertices_str = f"""    ( {min_coords[0]:.1f} {min_coords[1]:.1f} {min_coords[2]:.1f})
-    ( {max_coords[0]:.1f} {min_coords[1]:.1f} {min_coords[2]:.1f})
-    ( {max_coords[0]:.1f} {max_coords[1]:.1f} {min_coords[2]:.1f})
-    ( {min_coords[0]:.1f} {max_coords[1]:.1f} {min_coords[2]:.1f})
-    ( {min_coords[0]:.1f} {min_coords[1]:.1f} {max_coords[2]:.1f})
-    ( {max_coords[0]:.1f} {min_coords[1]:.1f} {max_coords[2]:.1f})
-    ( {max_coords[0]:.1f} {max_coords[1]:.1f} {max_coords[2]:.1f})
-    ( {min_coords[0]:.1f} {max_coords[1]:.1f} {max_coords[2]:.1f})"""
-
-    # Generate the complete blockMeshDict content
-    blockMeshDict_content = f"""/*--------------------------------*- C++ -*----------------------------------*\\
-| =========                 |                                                 |
-| \\\\      /  F ield         | OpenFOAM: The Open Source CFD Toolbox           |
-|  \\\\    /   O peration     | Version:  4.0                                   |
-|   \\\\  /    A nd           | Web:      www.OpenFOAM.org                      |
-|    \\\\/     M anipulation  |                                                 |
-\\*---------------------------------------------------------------------------*/
-FoamFile
-{{
-    version     2.0;
-    format      ascii;
-    class       dictionary;
-    object      blockMeshDict;
-}}
-// * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * //
-
-convertToMeters 1;
-
-//These vertices define the block below. It envelopes the stl files. The block can be even bigger than the stl files
-//Watch out if the stl files are created in mm or m!
-
-vertices
-(
-{vertices_str}
-);
-
-blocks
-(
-    hex (0 1 2 3 4 5 6 7) ({cells[0]} {cells[1]} {cells[2]}) simpleGrading (1 1 1)//coarse grid - we will refine in snappyHexMeshDict
-);
-
-edges
-(
-);
+    min_coords, max_coords, cells = compute_block_mesh(
+        stl_dir, padding, cells, cache, cell_size, cell_budget, relative_padding)
+    
+    return render_foam_file('blockMeshDict', blockMeshDict_body(min_coords, max_coords, cells))
 
-boundary
-(
-    allBoundary//Don't worry about these settings
-    {{
-        type patch;
-        faces
-        (
-            (3 7 6 2)
-            (0 4 7 3)
-            (2 6 5 1)
-            (1 5 4 0)
-            (0 3 2 1)
-            (4 5 6 7)
-        );
-    }}
-);
+def _format_point(point):
+    """
+    Format a point in OpenFOAM list syntax without rounding away small-scale geometry.
+    """
+    return f"( {point[0]:.10g} {point[1]:.10g} {point[2]:.10g})"
 
-// ************************************************************************* //"""
+def blockMeshDict_body(min_coords, max_coords, cells):
+    """
+    Generate the body of a blockMeshDict with a single hex block.
+    
+    Args:
+        min_coords (array): Minimum corner of the block
+        max_coords (array): Maximum corner of the block
+        cells (tuple): Number of cells in x, y, z directions
+        
+    Returns:
+        dict: Dictionary entries, see foam_dict.iter_foam_entries
+    """
+    # Vertices of the block, in blockMesh's hex ordering
+    corners = [
+        (min_coords[0], min_coords[1], min_coords[2]),
+        (max_coords[0], min_coords[1], min_coords[2]),
+        (max_coords[0], max_coords[1], min_coords[2]),
+        (min_coords[0], max_coords[1], min_coords[2]),
+        (min_coords[0], min_coords[1], max_coords[2]),
+        (max_coords[0], min_coords[1], max_coords[2]),
+        (max_coords[0], max_coords[1], max_coords[2]),
+        (min_coords[0], max_coords[1], max_coords[2]),
+    ]
     
-    return blockMeshDict_content
+    return {
+        'convertToMeters': 1,
+        '\n//These vertices define the block below. It envelopes the stl files. The block can be even bigger than the stl files\n'
+        '//Watch out if the stl files are created in mm or m!': None,
+        '\nvertices': [_format_point(corner) for corner in corners],
+        '\nblocks': [
+            f"hex (0 1 2 3 4 5 6 7) ({cells[0]} {cells[1]} {cells[2]}) simpleGrading (1 1 1)"
+            "//coarse grid - we will refine in snappyHexMeshDict",
+        ],
+        '\nedges': [],
+        '\nboundary': [
+            ("allBoundary//Don't worry about these settings", {
+                'type': 'patch',
+                'faces': [(3, 7, 6, 2), (0, 4, 7, 3), (2, 6, 5, 1), (1, 5, 4, 0), (0, 3, 2, 1), (4, 5, 6, 7)],
+            }),
+        ],
+    }
 
-def write_blockMeshDict(output_path='mesh/system/blockMeshDict', stl_dir='geometry/basic_box', padding=1.0, cells=(20, 20, 30)):
+def write_blockMeshDict(output_path='mesh/system/blockMeshDict', stl_dir='geometry/basic_box', padding=1.0, cells=(20, 20, 30), cache=None,
+                        cell_size=None, cell_budget=None, relative_padding=None):
     """
     Generate and write the blockMeshDict file.
     
@@ -130,15 +197,15 @@ def write_blockMeshDict(output_path='mesh/system/blockMeshDict', stl_dir='geomet
         stl_dir (str): Directory containing STL files
         padding (float): Padding to add to the bounding box in all directions
         cells (tuple): Number of cells in x, y, z directions
+        cache (GeometryCache): Optional metadata cache to read bounding boxes from
+        cell_size (float): Target edge length of cubic background cells, overrides cells
+        cell_budget (int): Maximum total number of cubic background cells, overrides cells
+        relative_padding (float): Padding as a fraction of the largest bounding box
+            dimension, overrides padding
     """
-    content = generate_blockMeshDict(stl_dir, padding, cells)
-    
-    # Ensure the directory exists
-    os.makedirs(os.path.dirname(output_path), exist_ok=True)
-    
-    # Write the file
-    with open(output_path, 'w') as f:
-        f.write(content)
+    min_coords, max_coords, cells = compute_block_mesh(
+        stl_dir, padding, cells, cache, cell_size, cell_budget, relative_padding)
+    write_foam_file(output_path, 'blockMeshDict', blockMeshDict_body(min_coords, max_coords, cells))
     
     print(f"blockMeshDict file has been written to: {output_path}")
 
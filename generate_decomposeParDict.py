@@ -0,0 +1,157 @@
+import math
+import os
+from foam_dict import Keyword, render_foam_file, write_foam_file, write_text
+
+DECOMPOSITION_METHODS = ('scotch', 'hierarchical', 'simple')
+
+# snappyHexMesh scales well down to roughly this many cells per processor
+DEFAULT_CELLS_PER_PROC = 100000
+
+def choose_subdomains(estimated_cells, available_cores=None, cells_per_proc=DEFAULT_CELLS_PER_PROC):
+    """
+    Choose the number of subdomains for a mesh of a given size.
+
+    Args:
+        estimated_cells (int): Estimated final cell count
+        available_cores (int): Cores available to the run, defaults to all CPU cores
+        cells_per_proc (int): Target number of cells per processor
+
+    Returns:
+        int: Number of subdomains, between 1 and available_cores
+    """
+    if available_cores is None:
+        available_cores = os.cpu_count() or 1
+    return max(1, min(available_cores, int(math.ceil(estimated_cells / cells_per_proc))))
+
+def split_counts(n_subdomains, extent):
+    """
+    Split a number of subdomains into (nx, ny, nz) matching the shape of a box.
+
+    Every factorisation of n_subdomains is tried, and the one whose subdomains
+    are closest to cubes, i.e. with the smallest ratio between the longest and
+    shortest subdomain edge, is returned.
+
+    Args:
+        n_subdomains (int): Total number of subdomains
+        extent (tuple): Size of the box in x, y, z
+
+    Returns:
+        tuple: (nx, ny, nz) with nx * ny * nz == n_subdomains
+    """
+    extent = [max(float(e), 1e-12) for e in extent]
+    best = None
+    for nx in range(1, n_subdomains + 1):
+        if n_subdomains % nx:
+            continue
+        for ny in range(1, n_subdomains // nx + 1):
+            if (n_subdomains // nx) % ny:
+                continue
+            nz = n_subdomains // (nx * ny)
+            edges = [extent[0] / nx, extent[1] / ny, extent[2] / nz]
+            ratio = max(edges) / min(edges)
+            if best is None or ratio < best[0]:
+                best = (ratio, (nx, ny, nz))
+    return best[1]
+
+def parallel_commands(n_subdomains, extract_features=True):
+    """
+    List the shell commands that mesh a case on n_subdomains processors.
+
+    Args:
+        n_subdomains (int): Number of subdomains
+        extract_features (bool): Whether surfaceFeatureExtract still has to be run
+
+    Returns:
+        list: Commands, run in order from the case directory
+    """
+    commands = ['surfaceFeatureExtract'] if extract_features else []
+    commands.append('blockMesh')
+    if n_subdomains > 1:
+        commands += [
+            'decomposePar -force',
+            f'mpirun -np {n_subdomains} snappyHexMesh -parallel -overwrite',
+            'reconstructParMesh -constant',
+        ]
+    else:
+        commands.append('snappyHexMesh -overwrite')
+    return commands
+
+def generate_decomposeParDict(n_subdomains, method='scotch', extent=None, extract_features=True):
+    """
+    Generate a decomposeParDict file.
+
+    Args:
+        n_subdomains (int): Number of subdomains
+        method (str): 'scotch', 'hierarchical' or 'simple'
+        extent (tuple): Size of the background block in x, y, z, used to size the
+            splits of the hierarchical and simple methods
+        extract_features (bool): Whether the listed run commands include surfaceFeatureExtract
+
+    Returns:
+        str: Complete decomposeParDict content
+    """
+    return render_foam_file('decomposeParDict', decomposeParDict_body(n_subdomains, method, extent, extract_features),
+                            location='system')
+
+def decomposeParDict_body(n_subdomains, method='scotch', extent=None, extract_features=True):
+    """
+    Generate the body of a decomposeParDict, see generate_decomposeParDict.
+
+    Returns:
+        dict: Dictionary entries, see foam_dict.iter_foam_entries
+    """
+    if method not in DECOMPOSITION_METHODS:
+        raise ValueError(f"Unknown decomposition method '{method}', expected one of {DECOMPOSITION_METHODS}")
+
+    entries = {
+        '// Mesh the case in parallel with (see also ./Allrun):\n' + "\n".join(
+            f"//     {command}" for command in parallel_commands(n_subdomains, extract_features)): None,
+        '\nnumberOfSubdomains': n_subdomains,
+        Keyword('\nmethod'): method,
+    }
+
+    if method in ('hierarchical', 'simple'):
+        if extent is None:
+            raise ValueError(f"The {method} method needs the extent of the background block")
+        coeffs = {Keyword('n'): split_counts(n_subdomains, extent), Keyword('delta'): 0.001}
+        if method == 'hierarchical':
+            coeffs[Keyword('order')] = 'xyz'
+        entries[f"\n{method}Coeffs"] = coeffs
+
+    return entries
+
+def write_decomposeParDict(output_path, n_subdomains, method='scotch', extent=None, extract_features=True):
+    """
+    Generate and write the decomposeParDict file.
+
+    Args:
+        output_path (str): Path where to write the decomposeParDict file
+        n_subdomains (int): Number of subdomains
+        method (str): 'scotch', 'hierarchical' or 'simple'
+        extent (tuple): Size of the background block in x, y, z
+        extract_features (bool): Whether the run commands include surfaceFeatureExtract
+    """
+    write_foam_file(output_path, 'decomposeParDict',
+                    decomposeParDict_body(n_subdomains, method, extent, extract_features), location='system')
+
+    print(f"decomposeParDict file has been written to: {output_path}")
+
+def write_allrun(case_dir, n_subdomains, extract_features=True):
+    """
+    Write an executable Allrun script that meshes the case, in parallel if n_subdomains > 1.
+
+    Args:
+        case_dir (str): Mesh case directory
+        n_subdomains (int): Number of subdomains
+        extract_features (bool): Whether to run surfaceFeatureExtract
+    """
+    output_path = os.path.join(case_dir, 'Allrun')
+    lines = ['#!/bin/sh', 'cd "${0%/*}" || exit 1', 'set -e', '']
+    for command in parallel_commands(n_subdomains, extract_features):
+        log_name = 'log.' + command.split()[3 if command.startswith('mpirun') else 0]
+        lines.append(f'{command} > {log_name} 2>&1')
+    write_text(output_path, ["\n".join(lines) + "\n"], executable=True)
+
+if __name__ == "__main__":
+    # Example usage
+    write_decomposeParDict('mesh/system/decomposeParDict', 4, 'hierarchical', (1.0, 1.0, 2.0))
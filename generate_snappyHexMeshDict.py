@@ -1,13 +1,195 @@
-import os
 from pathlib import Path
+from foam_dict import Keyword, TerminatedDict, write_foam_file
+
+# Points closer than this fraction of the mesh bounding box are merged; the
+# text is written into the dictionary as it is
+MERGE_TOLERANCE_TEXT = '1E-6'
+MERGE_TOLERANCE = float(MERGE_TOLERANCE_TEXT)
+
+# Sections following castellatedMeshControls, the same for every case
+_CONTROLS = {
+    '\n// Settings for the snapping.': None,
+    'snapControls': {
+        'nSmoothPatch': 3,
+        'tolerance': '1.0',
+        'nSolveIter': 300,
+        'nRelaxIter': 5,
+        '\n// Feature snapping': None,
+        'nFeatureSnapIter': 10,
+        'implicitFeatureSnap': False,
+        'explicitFeatureSnap': True,
+        'multiRegionFeatureSnap': True,
+    },
+    '\n// Settings for the layer addition.': None,
+    'addLayersControls': {
+        'relativeSizes': True,
+        '\nlayers': {
+            '"flange_.*"': {
+                'nSurfaceLayers': 1,
+            },
+        },
+        '\nexpansionRatio': '1.0',
+        'finalLayerThickness': 0.3,
+        'minThickness': 0.25,
+        'nGrow': 0,
+        '\n// Advanced settings': None,
+        'featureAngle': 30,
+        'nRelaxIter': 5,
+        'nSmoothSurfaceNormals': 1,
+        'nSmoothNormals': 3,
+        'nSmoothThickness': 10,
+        'maxFaceThicknessRatio': 0.5,
+        'maxThicknessToMedialRatio': 0.3,
+        'minMedianAxisAngle': 90,
+        'nBufferCellsNoExtrude': 0,
+        'nLayerIter': 50,
+        'nRelaxedIter': 20,
+    },
+    '\n// Generic mesh quality settings': None,
+    'meshQualityControls': {
+        '#include': '"meshQualityDict"',
+        '\nrelaxed': {
+            'maxNonOrtho': 75,
+        },
+        '\nnSmoothScale': 4,
+        'errorReduction': 0.75,
+    },
+    '\n// Advanced': None,
+    'writeFlags': ['scalarLevels', 'layerSets', 'layerFields'],
+    '\nmergeTolerance': MERGE_TOLERANCE_TEXT,
+}
+
+def surface_level(surface_levels, stl_name):
+    """
+    Look up the (min, max) refinement level of a surface.
+    
+    Args:
+        surface_levels (dict or tuple): Surface name to (min, max) level, or a
+            single (min, max) used for every surface. None means (0, 0).
+        stl_name (str): Name of the surface, i.e. the STL file stem
+        
+    Returns:
+        tuple: (min_level, max_level)
+    """
+    if surface_levels is None:
+        return (0, 0)
+    if isinstance(surface_levels, dict):
+        return tuple(surface_levels.get(stl_name, (0, 0)))
+    return tuple(surface_levels)
 
-def generate_snappyHexMeshDict(stl_dir='geometry/basic_box', output_path='mesh/system/snappyHexMeshDict'):
+def feature_level(feature_levels, stl_name):
+    """
+    Look up the refinement level of a surface's feature edges.
+    
+    Args:
+        feature_levels (dict or int): Surface name to level, or a single level
+            used for every surface. None means 0.
+        stl_name (str): Name of the surface, i.e. the STL file stem
+        
+    Returns:
+        int: Feature edge refinement level
+    """
+    if feature_levels is None:
+        return 0
+    if isinstance(feature_levels, dict):
+        return int(feature_levels.get(stl_name, 0))
+    return int(feature_levels)
+
+def snappyHexMeshDict_body(stl_files, surface_levels=None, max_local_cells=100000, max_global_cells=2000000,
+                           location_in_mesh=(0, 0, 0), feature_levels=None, refinement_regions=None):
+    """
+    Generate the body of a snappyHexMeshDict.
+    
+    Surfaces with the same refinement level share one level entry, so it is
+    rendered once however many surfaces there are.
+    
+    Args:
+        stl_files (list): Paths of the STL files, one surface each
+        See generate_snappyHexMeshDict for the other arguments.
+        
+    Returns:
+        dict: Dictionary entries, see foam_dict.iter_foam_entries
+    """
+    # Path.name and Path.stem are slow enough to show with thousands of surfaces
+    file_names = [stl_file.name for stl_file in stl_files]
+    stl_names = [file_name.rsplit('.', 1)[0] for file_name in file_names]
+    refinement_regions = refinement_regions or []
+    
+    geometry = TerminatedDict([
+        (file_name, {'type': 'triSurfaceMesh', 'name': stl_name})
+        for file_name, stl_name in zip(file_names, stl_names)])
+    geometry.update([
+        (region['name'], {'type': 'searchableBox', 'min': _point(region['min']), 'max': _point(region['max'])})
+        for region in refinement_regions if 'min' in region])
+    
+    level_entries = {}
+    refinement_surfaces = {}
+    for stl_name in stl_names:
+        level = surface_level(surface_levels, stl_name)
+        entry = level_entries.get(level)
+        if entry is None:
+            entry = level_entries[level] = {'// Surface-wise min and max refinement level': None, 'level': level}
+        refinement_surfaces[stl_name] = entry
+    
+    entries = {
+        '// Which of the steps to run': None,
+        Keyword('castellatedMesh'): True,
+        Keyword('snap'): True,
+        Keyword('addLayers'): False,
+        '\ngeometry': geometry,
+        '\n\n\n// Settings for the castellatedMesh generation.': None,
+        'castellatedMeshControls': {
+            '// Refinement parameters\n// ~~~~~~~~~~~~~~~~~~~~~': None,
+            '\nmaxLocalCells': max_local_cells,
+            'maxGlobalCells': max_global_cells,
+            'minRefinementCells': 0,
+            'nCellsBetweenLevels': 10,
+            '\n// Explicit feature edge refinement\n// ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~': None,
+            'features': [{'file': f'"{stl_name}.eMesh"', 'level': feature_level(feature_levels, stl_name)}
+                         for stl_name in stl_names],
+            '\n\n\n// Surface based refinement\n// ~~~~~~~~~~~~~~~~~~~~~~~~': None,
+            'refinementSurfaces': refinement_surfaces,
+            '\n\nresolveFeatureAngle': 30,
+            '\n// Region-wise refinement\n// ~~~~~~~~~~~~~~~~~~~~~~': None,
+            'refinementRegions': {
+                region['name']: {'mode': region['mode'],
+                                 'levels': ((float(region.get('distance', 1E15)), region['level']),)}
+                for region in refinement_regions
+            },
+            '\n// Mesh selection\n// ~~~~~~~~~~~~~~': None,
+            'locationInMesh': _point(location_in_mesh),
+            'allowFreeStandingZoneFaces': True,
+        },
+    }
+    entries.update(_CONTROLS)
+    return entries
+
+def _point(point):
+    """
+    Convert a point to floats, which keep ten significant digits when rendered.
+    """
+    return (float(point[0]), float(point[1]), float(point[2]))
+
+def generate_snappyHexMeshDict(stl_dir='geometry/basic_box', output_path='mesh/system/snappyHexMeshDict',
+                               surface_levels=None, max_local_cells=100000, max_global_cells=2000000,
+                               location_in_mesh=(0, 0, 0), feature_levels=None, refinement_regions=None):
     """
     Generate a snappyHexMeshDict file based on STL files in the directory.
     
     Args:
         stl_dir (str): Directory containing STL files
         output_path (str): Path where to write the snappyHexMeshDict file
+        surface_levels (dict or tuple): Surface name to (min, max) refinement level,
+            or one (min, max) for every surface. Defaults to (0, 0).
+        max_local_cells (int): Per-processor cell limit during refinement
+        max_global_cells (int): Total cell limit during refinement
+        location_in_mesh (tuple): Point (x, y, z) inside the region to be meshed
+        feature_levels (dict or int): Surface name to feature edge refinement level,
+            or one level for every surface. Defaults to 0.
+        refinement_regions (list): Region-wise refinements, each a dict with a
+            'name', a 'level' and a 'mode' of 'inside', with 'min' and 'max'
+            corners of a searchableBox, or 'distance', with the 'distance' from
+            the surface or box named 'name'
     """
     # Get all STL files in the directory
     stl_files = list(Path(stl_dir).glob('*.stl'))
@@ -15,178 +197,9 @@ def generate_snappyHexMeshDict(stl_dir='geometry/basic_box', output_path='mesh/s
     if not stl_files:
         raise ValueError(f"No STL files found in {stl_dir}")
     
-    # Generate geometry section
-    geometry_section = "geometry\n{\n"
-    for stl_file in stl_files:
-        stl_name = stl_file.stem
-        geometry_section += f"""    {stl_file.name}
-    {{
-        type triSurfaceMesh;
-        name {stl_name};
-    }}
-"""
-    geometry_section += "};\n\n"
-    
-    # Generate features section
-    features_section = "    features\n    (\n"
-    for stl_file in stl_files:
-        stl_name = stl_file.stem
-        features_section += f"""        {{
-            file "{stl_name}.eMesh";
-            level 0;
-        }}
-"""
-    features_section += "    );\n\n"
-    
-    # Generate refinementSurfaces section
-    refinement_section = "    refinementSurfaces\n    {\n"
-    for stl_file in stl_files:
-        stl_name = stl_file.stem
-        refinement_section += f"""        {stl_name}
-        {{
-            // Surface-wise min and max refinement level
-            level (0 0);
-        }}
-"""
-    refinement_section += "    }\n"
-    
-    # Generate the complete snappyHexMeshDict content
-    snappyHexMeshDict_content = f"""/*--------------------------------*- C++ -*----------------------------------*\\
-| =========                 |                                                 |
-| \\\\      /  F ield         | OpenFOAM: The Open Source CFD Toolbox           |
-|  \\\\    /   O peration     | Version:  4.0                                   |
-|   \\\\  /    A nd           | Web:      www.OpenFOAM.org                      |
-|    \\\\/     M anipulation  |                                                 |
-\\*---------------------------------------------------------------------------*/
-FoamFile
-{{
-    version     2.0;
-    format      ascii;
-    class       dictionary;
-    object      snappyHexMeshDict;
-}}
-
-// * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * //
-
-// Which of the steps to run
-castellatedMesh true;
-snap            true;
-addLayers       false;
-
-{geometry_section}
-
-// Settings for the castellatedMesh generation.
-castellatedMeshControls
-{{
-    // Refinement parameters
-    // ~~~~~~~~~~~~~~~~~~~~~
-
-    maxLocalCells 100000;
-    maxGlobalCells 2000000;
-    minRefinementCells 0;
-    nCellsBetweenLevels 10;
-
-    // Explicit feature edge refinement
-    // ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
-{features_section}
-
-    // Surface based refinement
-    // ~~~~~~~~~~~~~~~~~~~~~~~~
-{refinement_section}
-
-    resolveFeatureAngle 30;
-
-    // Region-wise refinement
-    // ~~~~~~~~~~~~~~~~~~~~~~
-    refinementRegions
-    {{
-    }}
-
-    // Mesh selection
-    // ~~~~~~~~~~~~~~
-    locationInMesh (0 0 0);
-    allowFreeStandingZoneFaces true;
-}}
-
-// Settings for the snapping.
-snapControls
-{{
-    nSmoothPatch 3;
-    tolerance 1.0;
-    nSolveIter 300;
-    nRelaxIter 5;
-
-    // Feature snapping
-    nFeatureSnapIter 10;
-    implicitFeatureSnap false;
-    explicitFeatureSnap true;
-    multiRegionFeatureSnap true;
-}}
-
-// Settings for the layer addition.
-addLayersControls
-{{
-    relativeSizes true;
-
-    layers
-    {{
-        "flange_.*"
-        {{
-            nSurfaceLayers 1;
-        }}
-    }}
-
-    expansionRatio 1.0;
-    finalLayerThickness 0.3;
-    minThickness 0.25;
-    nGrow 0;
-
-    // Advanced settings
-    featureAngle 30;
-    nRelaxIter 5;
-    nSmoothSurfaceNormals 1;
-    nSmoothNormals 3;
-    nSmoothThickness 10;
-    maxFaceThicknessRatio 0.5;
-    maxThicknessToMedialRatio 0.3;
-    minMedianAxisAngle 90;
-    nBufferCellsNoExtrude 0;
-    nLayerIter 50;
-    nRelaxedIter 20;
-}}
-
-// Generic mesh quality settings
-meshQualityControls
-{{
-    #include "meshQualityDict"
-
-    relaxed
-    {{
-        maxNonOrtho 75;
-    }}
-
-    nSmoothScale 4;
-    errorReduction 0.75;
-}}
-
-// Advanced
-writeFlags
-(
-    scalarLevels
-    layerSets
-    layerFields
-);
-
-mergeTolerance 1E-6;
-
-// ************************************************************************* //"""
-    
-    # Ensure the directory exists
-    os.makedirs(os.path.dirname(output_path), exist_ok=True)
-    
-    # Write the file
-    with open(output_path, 'w') as f:
-        f.write(snappyHexMeshDict_content)
+    body = snappyHexMeshDict_body(stl_files, surface_levels, max_local_cells, max_global_cells,
+                                  location_in_mesh, feature_levels, refinement_regions)
+    write_foam_file(output_path, 'snappyHexMeshDict', body, blank_line=True)
     
     print(f"snappyHexMeshDict file has been written to: {output_path}")
 
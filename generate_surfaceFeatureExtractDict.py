@@ -1,37 +1,49 @@
-import os
 from pathlib import Path
+from foam_dict import Keyword, iter_foam_entries, render_foam_file, write_foam_file
 
-def generate_stl_section(stl_name):
+def generate_stl_section(stl_name, included_angle=180):
     """
     Generate the section for a single STL file in surfaceFeatureExtractDict format.
     
     Args:
         stl_name (str): Name of the STL file
+        included_angle (float): Edges whose faces meet at less than this angle are features
         
     Returns:
         str: Section for the STL file
     """
-    return f"""{stl_name}
-{{
-    extractionMethod    extractFromSurface;
+    return ''.join(iter_foam_entries({stl_name: stl_section(included_angle)})).rstrip("\n")
 
-    extractFromSurfaceCoeffs
-    {{
-        includedAngle   180;
-    }}
-
-        writeObj                yes;
-}}"""
+def stl_section(included_angle=180):
+    """
+    Build the settings of one STL file in surfaceFeatureExtractDict, the same for every file.
+    
+    Args:
+        included_angle (float): Edges whose faces meet at less than this angle are features
+        
+    Returns:
+        dict: Entries of the section, see foam_dict.iter_foam_entries
+    """
+    return {
+        Keyword('extractionMethod', 24): 'extractFromSurface',
+        '\nextractFromSurfaceCoeffs': {
+            Keyword('includedAngle', 24): f"{included_angle:g}",
+        },
+        Keyword('\n    writeObj', 32): 'yes',
+    }
 
-def generate_surfaceFeatureExtractDict(stl_dir='geometry/basic_box'):
+def surfaceFeatureExtractDict_body(stl_dir='geometry/basic_box', included_angle=180):
     """
-    Generate a complete surfaceFeatureExtractDict file based on STL files.
+    Generate the body of a surfaceFeatureExtractDict for the STL files in a directory.
+    
+    Every file shares the same section object, so it is rendered only once.
     
     Args:
         stl_dir (str): Directory containing STL files
+        included_angle (float): includedAngle used for every STL file
         
     Returns:
-        str: Complete surfaceFeatureExtractDict content
+        dict: Dictionary entries, see foam_dict.iter_foam_entries
     """
     # Get all STL files in the directory
     stl_files = list(Path(stl_dir).glob('*.stl'))
@@ -39,55 +51,35 @@ def generate_surfaceFeatureExtractDict(stl_dir='geometry/basic_box'):
     if not stl_files:
         raise ValueError(f"No STL files found in {stl_dir}")
     
-    # Generate sections for each STL file
-    stl_sections = []
-    for stl_file in stl_files:
-        stl_sections.append(generate_stl_section(stl_file.name))
-    
-    # Combine all sections
-    stl_content = "\n\n".join(stl_sections)
-    
-    # Generate the complete surfaceFeatureExtractDict content
-    surfaceFeatureExtractDict_content = f"""/*--------------------------------*- C++ -*----------------------------------*\\
-| =========                 |                                                 |
-| \\\\      /  F ield         | OpenFOAM: The Open Source CFD Toolbox           |
-|  \\\\    /   O peration     | Version:  4.0                                   |
-|   \\\\  /    A nd           | Web:      www.OpenFOAM.org                      |
-|    \\\\/     M anipulation  |                                                 |
-\\*---------------------------------------------------------------------------*/
-FoamFile
-{{
-    version     2.0;
-    format      ascii;
-    class       dictionary;
-    object      surfaceFeatureExtractDict;
-}}
-// * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * //
+    section = stl_section(included_angle)
+    entries = {'//JN: Here we define, which edges we want to use as features for the geometry. Usually we use all of them': None}
+    entries.update([(f"\n{stl_file.name}", section) for stl_file in stl_files])
+    return entries
 
-//JN: Here we define, which edges we want to use as features for the geometry. Usually we use all of them
-
-{stl_content}
-
-// ************************************************************************* //"""
+def generate_surfaceFeatureExtractDict(stl_dir='geometry/basic_box', included_angle=180):
+    """
+    Generate a complete surfaceFeatureExtractDict file based on STL files.
     
-    return surfaceFeatureExtractDict_content
+    Args:
+        stl_dir (str): Directory containing STL files
+        included_angle (float): includedAngle used for every STL file
+        
+    Returns:
+        str: Complete surfaceFeatureExtractDict content
+    """
+    return render_foam_file('surfaceFeatureExtractDict', surfaceFeatureExtractDict_body(stl_dir, included_angle))
 
-def write_surfaceFeatureExtractDict(output_path='mesh/system/surfaceFeatureExtractDict', stl_dir='geometry/basic_box'):
+def write_surfaceFeatureExtractDict(output_path='mesh/system/surfaceFeatureExtractDict', stl_dir='geometry/basic_box',
+                                    included_angle=180):
     """
     Generate and write the surfaceFeatureExtractDict file.
     
     Args:
         output_path (str): Path where to write the surfaceFeatureExtractDict file
         stl_dir (str): Directory containing STL files
+        included_angle (float): includedAngle used for every STL file
     """
-    content = generate_surfaceFeatureExtractDict(stl_dir)
-    
-    # Ensure the directory exists
-    os.makedirs(os.path.dirname(output_path), exist_ok=True)
-    
-    # Write the file
-    with open(output_path, 'w') as f:
-        f.write(content)
+    write_foam_file(output_path, 'surfaceFeatureExtractDict', surfaceFeatureExtractDict_body(stl_dir, included_angle))
     
     print(f"surfaceFeatureExtractDict file has been written to: {output_path}")
 
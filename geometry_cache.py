@@ -0,0 +1,401 @@
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from pathlib import Path
+import numpy as np
+from stl_scan import (
+    binary_solid_name,
+    is_binary_stl,
+    iter_ascii_blocks,
+    iter_binary_triangles,
+    parse_ascii_solid_names,
+    parse_ascii_vertices,
+)
+
+CACHE_VERSION = 1
+DEFAULT_CACHE_NAME = '.stl_metadata_cache.json'
+
+
+def hash_file(file_path, block_size=1 << 20):
+    """
+    Compute the SHA-256 hash of a file's contents.
+
+    Args:
+        file_path (str): Path to the file
+        block_size (int): Number of bytes read at a time
+
+    Returns:
+        str: Hex digest of the file contents
+    """
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def file_signature(file_path):
+    """
+    Identify a file's contents by its size and modification time, without reading it.
+
+    This is the cheap stand-in for a content hash where no metadata cache keeps
+    hashes between runs: a file that is rewritten or touched gets a new signature.
+
+    Args:
+        file_path (str): Path to the file
+
+    Returns:
+        str: '<size>:<mtime_ns>'
+    """
+    stat = os.stat(file_path)
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def triangle_area(triangles):
+    """
+    Compute the total area of a batch of triangles in double precision.
+
+    Args:
+        triangles (numpy.ndarray): Array of shape (n, 3, 3) with triangle vertices
+
+    Returns:
+        float: Sum of the triangle areas
+    """
+    triangles = triangles.astype(np.float64)
+    cross = np.cross(triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0])
+    return 0.5 * float(np.linalg.norm(cross, axis=1).sum())
+
+
+def compute_stl_metadata(stl_path):
+    """
+    Compute the metadata of a single STL file in one streaming pass.
+
+    Args:
+        stl_path (str): Path to the STL file
+
+    Returns:
+        dict: Metadata with keys 'format', 'triangle_count', 'bounding_box'
+            ([min_xyz, max_xyz]), 'surface_area' and 'solid_names'
+    """
+    min_coords = None
+    max_coords = None
+    triangle_count = 0
+    surface_area = 0.0
+
+    def fold(triangles):
+        nonlocal min_coords, max_coords, triangle_count, surface_area
+        if len(triangles) == 0:
+            return
+        chunk_min = triangles.min(axis=(0, 1))
+        chunk_max = triangles.max(axis=(0, 1))
+        min_coords = chunk_min if min_coords is None else np.minimum(min_coords, chunk_min)
+        max_coords = chunk_max if max_coords is None else np.maximum(max_coords, chunk_max)
+        triangle_count += len(triangles)
+        surface_area += triangle_area(triangles)
+
+    if is_binary_stl(stl_path):
+        stl_format = 'binary'
+        solid_names = [binary_solid_name(stl_path)]
+        for triangles in iter_binary_triangles(stl_path):
+            fold(triangles)
+    else:
+        stl_format = 'ascii'
+        solid_names = []
+        leftover = np.empty((0, 3), dtype=np.float32)
+        for block in iter_ascii_blocks(stl_path):
+            solid_names.extend(parse_ascii_solid_names(block))
+            vertices = np.concatenate([leftover, parse_ascii_vertices(block)])
+            n_complete = len(vertices) - len(vertices) % 3
+            leftover = vertices[n_complete:]
+            fold(vertices[:n_complete].reshape(-1, 3, 3))
+        if len(leftover):
+            raise ValueError(f"Incomplete facet at the end of {stl_path}")
+
+    if min_coords is None:
+        raise ValueError(f"No triangles found in {stl_path}")
+
+    return {
+        'format': stl_format,
+        'triangle_count': triangle_count,
+        'bounding_box': [min_coords.tolist(), max_coords.tolist()],
+        'surface_area': surface_area,
+        'solid_names': solid_names,
+    }
+
+
+def _read_cache_file(cache_path):
+    """
+    Read the entries of a cache file, or none if it is missing or unreadable.
+
+    Args:
+        cache_path (Path): Path of the JSON cache file
+
+    Returns:
+        dict: Cache entries keyed by absolute STL path
+    """
+    try:
+        with open(cache_path) as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if data.get('version') != CACHE_VERSION:
+        return {}
+    return data.get('entries', {})
+
+
+class GeometryCache:
+    """
+    On-disk cache of per-STL metadata.
+
+    Entries are keyed by absolute path and are valid while the file size and
+    modification time are unchanged. With hash_contents enabled a SHA-256 of the
+    file is stored as well, so a file whose mtime changed but whose contents did
+    not (e.g. after a copy or checkout) is still a cache hit.
+
+    Metadata lookups are counted in hits and misses and hash lookups in
+    hash_hits and hash_misses, each file once per kind on its first lookup, so
+    the counts are per file however often a run asks for the same one.
+
+    Args:
+        cache_path (str): Path of the JSON cache file
+        hash_contents (bool): Whether to key entries on a content hash as well
+    """
+
+    def __init__(self, cache_path=DEFAULT_CACHE_NAME, hash_contents=False):
+        self.cache_path = Path(cache_path)
+        self.hash_contents = hash_contents
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+        self.hash_hits = 0
+        self.hash_misses = 0
+        self._counted = set()
+        self._evicted = set()
+        self._dirty = False
+        self.load()
+
+    def load(self):
+        """
+        Load the cache file, starting empty if it is missing or unreadable.
+        """
+        self.entries = _read_cache_file(self.cache_path)
+
+    def save(self):
+        """
+        Write the cache file atomically if any entry changed.
+
+        Entries written by other processes since this cache was loaded are
+        merged in rather than overwritten.
+        """
+        if not self._dirty:
+            return
+        merged = {**_read_cache_file(self.cache_path), **self.entries}
+        for key in self._evicted:
+            merged.pop(key, None)
+
+        os.makedirs(self.cache_path.parent, exist_ok=True)
+        tmp_path = self.cache_path.with_name(f"{self.cache_path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, 'w') as f:
+            json.dump({'version': CACHE_VERSION, 'entries': merged}, f, indent=1)
+        os.replace(tmp_path, self.cache_path)
+        self.entries = merged
+        self._evicted = set()
+        self._dirty = False
+
+    def _is_current(self, entry, stat, stl_path):
+        """
+        Check whether a cache entry still describes the file on disk.
+        """
+        if entry.get('size') != stat.st_size:
+            return False
+        if entry.get('mtime_ns') == stat.st_mtime_ns:
+            if self.hash_contents and 'sha256' not in entry:
+                entry['sha256'] = hash_file(stl_path)
+                self._dirty = True
+            return True
+        if self.hash_contents and entry.get('sha256'):
+            if entry['sha256'] == hash_file(stl_path):
+                entry['mtime_ns'] = stat.st_mtime_ns
+                self._dirty = True
+                return True
+        return False
+
+    def _entry(self, key):
+        """
+        Get the entry of an STL file, starting a new one if it is missing or out of date.
+
+        Returns:
+            tuple: (entry, current) where current tells whether the entry was
+                already valid for the file on disk
+        """
+        stat = os.stat(key)
+        entry = self.entries.get(key)
+        if entry is not None and self._is_current(entry, stat, key):
+            return entry, True
+        entry = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+        self.entries[key] = entry
+        self._evicted.discard(key)
+        self._dirty = True
+        return entry, False
+
+    def _count(self, kind, key, hit):
+        """
+        Count the first lookup of a file for metadata or its hash as a hit or miss.
+        """
+        if (kind, key) in self._counted:
+            return
+        self._counted.add((kind, key))
+        prefix = 'hash_' if kind == 'hash' else ''
+        name = prefix + ('hits' if hit else 'misses')
+        setattr(self, name, getattr(self, name) + 1)
+
+    def get_metadata(self, stl_path):
+        """
+        Get the metadata of an STL file, computing it on a cache miss.
+
+        Args:
+            stl_path (str): Path to the STL file
+
+        Returns:
+            dict: Metadata as returned by compute_stl_metadata
+        """
+        key = str(Path(stl_path).resolve())
+        entry, current = self._entry(key)
+        if current and 'metadata' in entry:
+            self._count('metadata', key, True)
+            return entry['metadata']
+
+        self._count('metadata', key, False)
+        entry['metadata'] = compute_stl_metadata(key)
+        if self.hash_contents and 'sha256' not in entry:
+            entry['sha256'] = hash_file(key)
+        self._dirty = True
+        return entry['metadata']
+
+    def get_hash(self, stl_path):
+        """
+        Get the SHA-256 content hash of an STL file, caching it with its metadata.
+
+        The file is only hashed, not parsed, so the metadata of a file whose
+        hash is all that is needed is left to be computed when first asked for.
+
+        Args:
+            stl_path (str): Path to the STL file
+
+        Returns:
+            str: Hex digest of the file contents
+        """
+        key = str(Path(stl_path).resolve())
+        entry, current = self._entry(key)
+        if current and 'sha256' in entry:
+            self._count('hash', key, True)
+            return entry['sha256']
+
+        self._count('hash', key, False)
+        entry['sha256'] = hash_file(key)
+        self._dirty = True
+        return entry['sha256']
+
+    def merge(self, entries):
+        """
+        Add entries computed elsewhere, e.g. by a worker process, to this cache.
+
+        Args:
+            entries (dict): Cache entries keyed by absolute STL path
+        """
+        for key, entry in entries.items():
+            if self.entries.get(key) != entry:
+                self.entries[key] = entry
+                self._evicted.discard(key)
+                self._dirty = True
+
+    def evict_stale(self):
+        """
+        Remove entries whose files were deleted or changed since they were cached.
+
+        Returns:
+            int: Number of evicted entries
+        """
+        stale = []
+        for key, entry in self.entries.items():
+            try:
+                stat = os.stat(key)
+            except OSError:
+                stale.append(key)
+                continue
+            if entry.get('size') != stat.st_size or entry.get('mtime_ns') != stat.st_mtime_ns:
+                stale.append(key)
+
+        for key in stale:
+            del self.entries[key]
+        if stale:
+            self._evicted.update(stale)
+            self._dirty = True
+        return len(stale)
+
+
+class ResultCache:
+    """
+    Bounded in-memory cache of results derived from the STL files of a geometry.
+
+    Cases set up from the same surfaces in one process, such as the variants
+    of a parameter sweep, compute each analysis (background block, refinement
+    levels, gap regions, estimate, locationInMesh) once and share it. Results
+    are keyed by the analysis name, the content hashes of the STL files and
+    the analysis parameters, and only the max_entries most recently used are
+    kept, so memory does not grow with the number of cases.
+
+    Args:
+        max_entries (int): Number of results kept
+    """
+
+    def __init__(self, max_entries=64):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._results = OrderedDict()
+
+    def get(self, name, inputs, params, compute):
+        """
+        Look up a result, computing and keeping it if it is not cached.
+
+        Args:
+            name (str): Name of the analysis, e.g. 'refinement_levels'
+            inputs (dict): STL file name to content hash
+            params (dict): JSON-serialisable parameters of the analysis
+            compute (callable): Computes the result on a miss
+
+        Returns:
+            The result, shared with later callers, who must not modify it
+        """
+        key = (name, json.dumps(inputs, sort_keys=True), json.dumps(params, sort_keys=True))
+        if key in self._results:
+            self.hits += 1
+            self._results.move_to_end(key)
+            return self._results[key]
+        self.misses += 1
+        result = compute()
+        self._results[key] = result
+        if len(self._results) > self.max_entries:
+            self._results.popitem(last=False)
+        return result
+
+    def __len__(self):
+        return len(self._results)
+
+
+def get_stl_metadata(stl_path, cache=None):
+    """
+    Get the metadata of an STL file, through the cache if one is given.
+
+    Args:
+        stl_path (str): Path to the STL file
+        cache (GeometryCache): Optional metadata cache
+
+    Returns:
+        dict: Metadata as returned by compute_stl_metadata
+    """
+    if cache is None:
+        return compute_stl_metadata(str(stl_path))
+    return cache.get_metadata(stl_path)
@@ -0,0 +1,304 @@
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import numpy as np
+from stl_scan import DEFAULT_ASCII_BLOCK_SIZE, DEFAULT_CHUNK_TRIANGLES, iter_stl_triangles
+
+# Edge lengths are binned by their binary exponent: bin e holds lengths in
+# [2**(e-1), 2**e), which lines up with cell sizes halving per refinement level
+EDGE_EXPONENT_RANGE = (-40, 40)
+
+# Normals are binned on an equal-area grid of the unit sphere: bands of equal
+# height in z, split into sectors of equal azimuth
+NORMAL_BANDS = 6
+NORMAL_SECTORS = 12
+
+# Peak working memory of GeometryStats.update per triangle of a batch, on top
+# of the float32 batch itself (36 bytes per triangle); measured at about 335
+BYTES_PER_TRIANGLE = 360
+
+
+def memory_ceiling(batch_triangles=DEFAULT_CHUNK_TRIANGLES, block_size=DEFAULT_ASCII_BLOCK_SIZE):
+    """
+    Upper bound of the memory used by geometry_statistics per worker process.
+
+    The statistics pass holds one batch of triangles and the temporaries
+    computed from it. Reading an ASCII file also holds one text block and its
+    parsed vertices, about twice the block size. Neither depends on the size
+    of the file. Pages of memory-mapped binary files also show up in the
+    resident set size, but they are page cache the kernel reclaims under
+    memory pressure.
+
+    Args:
+        batch_triangles (int): Maximum number of triangles per batch
+        block_size (int): Approximate number of bytes per ASCII block
+
+    Returns:
+        int: Bytes
+    """
+    return (36 + BYTES_PER_TRIANGLE) * batch_triangles + 2 * block_size
+
+
+def iter_triangle_batches(stl_files, batch_triangles=DEFAULT_CHUNK_TRIANGLES, block_size=DEFAULT_ASCII_BLOCK_SIZE):
+    """
+    Iterate over the triangles of STL files in batches of bounded size.
+
+    Binary files are memory-mapped and ASCII files streamed, see
+    stl_scan.iter_stl_triangles; larger ASCII blocks are split into views,
+    so no batch exceeds batch_triangles whatever the format.
+
+    Args:
+        stl_files (list): Paths of the STL files
+        batch_triangles (int): Maximum number of triangles per batch
+        block_size (int): Approximate number of bytes per ASCII block
+
+    Yields:
+        tuple: (stl_file, triangles) with a float32 array of shape (n, 3, 3)
+    """
+    for stl_file in stl_files:
+        for chunk in iter_stl_triangles(str(stl_file), batch_triangles, block_size):
+            for start in range(0, len(chunk), batch_triangles):
+                yield stl_file, chunk[start:start + batch_triangles]
+
+
+class GeometryStats:
+    """
+    Geometry statistics accumulated one batch of triangles at a time.
+
+    Sums are kept in double precision. The signed volume is taken about the
+    origin, so it is only meaningful for closed surfaces (or for the
+    surfaces of a case summed together), and it is positive when the
+    normals point outwards. Edge lengths are counted per triangle, so an
+    edge shared by two triangles is counted twice. Statistics of separate
+    passes, e.g. of several files read in parallel, combine with merge.
+    """
+
+    def __init__(self):
+        self.triangle_count = 0
+        self.degenerate_count = 0
+        self.min_coords = None
+        self.max_coords = None
+        self.area = 0.0
+        self.area_moment = np.zeros(3)
+        self.volume = 0.0
+        self.area_vector = np.zeros(3)
+        self.edge_sum = 0.0
+        self.edge_min = np.inf
+        self.edge_max = 0.0
+        self.edge_histogram = np.zeros(EDGE_EXPONENT_RANGE[1] - EDGE_EXPONENT_RANGE[0] + 1, dtype=np.int64)
+        self.normal_histogram = np.zeros((NORMAL_BANDS, NORMAL_SECTORS))
+
+    def update(self, triangles):
+        """
+        Add a batch of triangles.
+
+        Args:
+            triangles (numpy.ndarray): Array of shape (n, 3, 3) with triangle vertices
+        """
+        if len(triangles) == 0:
+            return
+        batch_min = triangles.min(axis=(0, 1))
+        batch_max = triangles.max(axis=(0, 1))
+        self.min_coords = batch_min if self.min_coords is None else np.minimum(self.min_coords, batch_min)
+        self.max_coords = batch_max if self.max_coords is None else np.maximum(self.max_coords, batch_max)
+        self.triangle_count += len(triangles)
+
+        v0 = triangles[:, 0].astype(np.float64)
+        v1 = triangles[:, 1].astype(np.float64)
+        v2 = triangles[:, 2].astype(np.float64)
+        edges = np.stack([v1 - v0, v2 - v1, v0 - v2], axis=1)
+        cross = np.cross(edges[:, 0], -edges[:, 2])
+        double_area = np.linalg.norm(cross, axis=1)
+        areas = 0.5 * double_area
+
+        self.area += float(areas.sum())
+        self.area_moment += areas @ (v0 + v1 + v2) / 3.0
+        self.volume += float(np.einsum('ij,ij->', v0, cross)) / 6.0
+        self.area_vector += 0.5 * cross.sum(axis=0)
+
+        lengths = np.linalg.norm(edges, axis=2).reshape(-1)
+        self.edge_sum += float(lengths.sum())
+        self.edge_min = min(self.edge_min, float(lengths.min()))
+        self.edge_max = max(self.edge_max, float(lengths.max()))
+        positive = lengths[lengths > 0]
+        _, exponents = np.frexp(positive)
+        exponents = np.clip(exponents, *EDGE_EXPONENT_RANGE) - EDGE_EXPONENT_RANGE[0]
+        self.edge_histogram += np.bincount(exponents, minlength=len(self.edge_histogram))
+
+        degenerate = double_area == 0
+        self.degenerate_count += int(np.count_nonzero(degenerate))
+        normals = cross[~degenerate] / double_area[~degenerate, None]
+        bands = np.minimum(((normals[:, 2] + 1.0) * 0.5 * NORMAL_BANDS).astype(np.int64), NORMAL_BANDS - 1)
+        azimuth = np.arctan2(normals[:, 1], normals[:, 0]) + np.pi
+        sectors = np.minimum((azimuth * NORMAL_SECTORS / (2 * np.pi)).astype(np.int64), NORMAL_SECTORS - 1)
+        self.normal_histogram += np.bincount(
+            bands * NORMAL_SECTORS + sectors, areas[~degenerate], NORMAL_BANDS * NORMAL_SECTORS
+        ).reshape(NORMAL_BANDS, NORMAL_SECTORS)
+
+    def merge(self, other):
+        """
+        Add the statistics of another pass to these.
+
+        Args:
+            other (GeometryStats): Statistics to add
+        """
+        if other.triangle_count == 0:
+            return
+        if self.min_coords is None:
+            self.min_coords, self.max_coords = other.min_coords, other.max_coords
+        else:
+            self.min_coords = np.minimum(self.min_coords, other.min_coords)
+            self.max_coords = np.maximum(self.max_coords, other.max_coords)
+        self.triangle_count += other.triangle_count
+        self.degenerate_count += other.degenerate_count
+        self.area += other.area
+        self.area_moment += other.area_moment
+        self.volume += other.volume
+        self.area_vector += other.area_vector
+        self.edge_sum += other.edge_sum
+        self.edge_min = min(self.edge_min, other.edge_min)
+        self.edge_max = max(self.edge_max, other.edge_max)
+        self.edge_histogram += other.edge_histogram
+        self.normal_histogram += other.normal_histogram
+
+    def to_dict(self):
+        """
+        Summarise the statistics as JSON-serialisable values.
+
+        Returns:
+            dict: 'triangle_count', 'degenerate_triangles', 'bounding_box'
+                ([min_xyz, max_xyz]), 'surface_area', 'centroid' (area-weighted),
+                'volume', 'closure' (length of the summed area vector relative to
+                the area, zero for a closed surface), 'edge_length' with 'min',
+                'mean', 'max' and a 'histogram' of [lower, upper, count] bins,
+                and 'normals' with the area per 'bands' x 'sectors' bin
+        """
+        if self.triangle_count == 0:
+            raise ValueError("No triangles to summarise")
+        counts = np.nonzero(self.edge_histogram)[0]
+        histogram = [
+            [2.0 ** (int(i) + EDGE_EXPONENT_RANGE[0] - 1), 2.0 ** (int(i) + EDGE_EXPONENT_RANGE[0]),
+             int(self.edge_histogram[i])]
+            for i in counts
+        ]
+        return {
+            'triangle_count': self.triangle_count,
+            'degenerate_triangles': self.degenerate_count,
+            'bounding_box': [self.min_coords.tolist(), self.max_coords.tolist()],
+            'surface_area': self.area,
+            'centroid': (self.area_moment / self.area).tolist() if self.area > 0 else None,
+            'volume': self.volume,
+            'closure': float(np.linalg.norm(self.area_vector)) / self.area if self.area > 0 else None,
+            'edge_length': {
+                'min': self.edge_min,
+                'mean': self.edge_sum / (3 * self.triangle_count),
+                'max': self.edge_max,
+                'histogram': histogram,
+            },
+            'normals': {
+                'bands': NORMAL_BANDS,
+                'sectors': NORMAL_SECTORS,
+                'area': self.normal_histogram.tolist(),
+            },
+        }
+
+
+def surface_stats(stl_file, batch_triangles=DEFAULT_CHUNK_TRIANGLES, block_size=DEFAULT_ASCII_BLOCK_SIZE):
+    """
+    Compute the statistics of one STL file in a single pass.
+
+    Args:
+        stl_file (str): Path of the STL file
+        batch_triangles (int): Maximum number of triangles per batch
+        block_size (int): Approximate number of bytes per ASCII block
+
+    Returns:
+        GeometryStats: Accumulated statistics
+    """
+    stats = GeometryStats()
+    for _, triangles in iter_triangle_batches([stl_file], batch_triangles, block_size):
+        stats.update(triangles)
+    return stats
+
+
+def geometry_statistics(stl_files, workers=1, batch_triangles=DEFAULT_CHUNK_TRIANGLES,
+                        block_size=DEFAULT_ASCII_BLOCK_SIZE):
+    """
+    Compute the statistics of each STL file, and of all of them together, in one pass per file.
+
+    Memory use stays below memory_ceiling(batch_triangles, block_size) per
+    worker, however large the files are.
+
+    Args:
+        stl_files (list): Paths of the STL files
+        workers (int): Number of worker processes, 0 for one per CPU core
+        batch_triangles (int): Maximum number of triangles per batch
+        block_size (int): Approximate number of bytes per ASCII block
+
+    Returns:
+        dict: 'surfaces' maps each file name to its statistics, see
+            GeometryStats.to_dict, and 'combined' holds those of all files
+    """
+    stl_files = [Path(f) for f in stl_files]
+    if workers == 0:
+        workers = os.cpu_count() or 1
+    if workers <= 1 or len(stl_files) <= 1:
+        results = [surface_stats(f, batch_triangles, block_size) for f in stl_files]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(stl_files))) as pool:
+            futures = [pool.submit(surface_stats, f, batch_triangles, block_size) for f in stl_files]
+            results = [future.result() for future in futures]
+
+    combined = GeometryStats()
+    for stats in results:
+        combined.merge(stats)
+    return {
+        'surfaces': {f.name: stats.to_dict() for f, stats in zip(stl_files, results)},
+        'combined': combined.to_dict(),
+    }
+
+
+def write_statistics(statistics, output_path):
+    """
+    Write geometry statistics as JSON.
+
+    Args:
+        statistics (dict): Statistics returned by geometry_statistics
+        output_path (str): Path of the JSON file
+    """
+    with open(output_path, 'w') as f:
+        json.dump(statistics, f, indent=2)
+
+
+def main(argv=None):
+    """
+    Command line entry point computing geometry statistics of STL files.
+
+    Args:
+        argv (list): Command line arguments, defaults to sys.argv[1:]
+    """
+    parser = argparse.ArgumentParser(description="Compute bounding box, area, centroid, volume, edge lengths and "
+                                                 "normal distribution of STL files in one out-of-core pass.")
+    parser.add_argument('stl_files', nargs='+', help="STL files forming one geometry")
+    parser.add_argument('-j', '--workers', type=int, default=1, help="number of worker processes, 0 for one per CPU core")
+    parser.add_argument('--batch-triangles', type=int, default=DEFAULT_CHUNK_TRIANGLES,
+                        help="maximum number of triangles held per batch")
+    parser.add_argument('--output', help="also write the statistics as JSON to this file")
+    args = parser.parse_args(argv)
+
+    print(f"Memory ceiling: {memory_ceiling(args.batch_triangles) / 2**20:.0f} MiB per worker")
+    statistics = geometry_statistics(args.stl_files, args.workers, args.batch_triangles)
+    for name, entry in list(statistics['surfaces'].items()) + [('all surfaces', statistics['combined'])]:
+        edges = entry['edge_length']
+        print(f"{name}: {entry['triangle_count']} triangles, area {entry['surface_area']:.6g}, "
+              f"volume {entry['volume']:.6g}, edge length {edges['min']:.3g}-{edges['max']:.3g} "
+              f"(mean {edges['mean']:.3g})")
+    if args.output:
+        write_statistics(statistics, args.output)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,280 @@
+import numpy as np
+from mesh_estimate import surface_cell_keys
+from stl_scan import iter_stl_triangles
+
+# Offset of the seed point inside its background cell, as a fraction of the
+# cell size. 1/3 is not a dyadic fraction, so the point stays at least a third
+# of a cell away from the faces of the background cells and of every cell
+# produced by refining them.
+CELL_OFFSET = 1.0 / 3.0
+
+# Tolerance on barycentric coordinates below which a ray is considered to
+# graze a triangle edge, making its parity unreliable
+EDGE_TOLERANCE = 1e-9
+
+MAX_CANDIDATES = 200000
+
+# Triangles voxelized at a time; the sample points of a chunk take a few
+# hundred bytes per triangle
+CHUNK_TRIANGLES = 1 << 18
+MAX_PAIRS = 1 << 23
+
+
+class RayGrid:
+    """
+    Uniform grid over the plane across one axis for casting rays along that axis.
+
+    Each triangle is registered in every bin its bounding box overlaps in that
+    plane, so a ray only needs to be tested against the triangles of the bin it
+    starts in. The triangles are indexed in place rather than copied.
+
+    Args:
+        triangles (numpy.ndarray): Array of shape (n, 3, 3) with triangle vertices
+        axis (int): Direction of the rays, 0, 1 or 2 for +x, +y or +z
+        target_per_bin (float): Average number of triangles aimed for per bin
+    """
+
+    def __init__(self, triangles, axis=0, target_per_bin=4.0):
+        self.triangles = triangles
+        self.axis = axis
+        self.plane = [(axis + 1) % 3, (axis + 2) % 3]
+        lo = np.empty((len(triangles), 2))
+        hi = np.empty((len(triangles), 2))
+        for i, column in enumerate(self.plane):
+            lo[:, i] = triangles[:, :, column].min(axis=1)
+            hi[:, i] = triangles[:, :, column].max(axis=1)
+        self.lo = lo.min(axis=0)
+        extent = np.maximum(hi.max(axis=0) - self.lo, 1e-12)
+
+        n_bins = int(np.clip(len(triangles) / target_per_bin, 1, 1 << 22))
+        bin_size = np.sqrt(extent.prod() / n_bins)
+        self.shape = np.maximum(1, np.ceil(extent / bin_size)).astype(np.int64)
+        self.bin_size = extent / self.shape
+
+        # Bin ranges covered by each triangle's bounding box in the plane
+        first = self._bin_index(lo)
+        last = self._bin_index(hi)
+        span = last - first + 1
+        counts = span[:, 0] * span[:, 1]
+        tri_ids = np.repeat(np.arange(len(triangles)), counts)
+        local = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        bu = first[tri_ids, 0] + local % span[tri_ids, 0]
+        bv = first[tri_ids, 1] + local // span[tri_ids, 0]
+        bins = bu + self.shape[0] * bv
+
+        order = np.argsort(bins, kind='stable')
+        self.bin_triangles = tri_ids[order]
+        self.bin_start = np.searchsorted(bins[order], np.arange(self.shape.prod() + 1))
+
+    def _bin_index(self, uv):
+        index = np.floor((uv - self.lo) / self.bin_size).astype(np.int64)
+        return np.clip(index, 0, self.shape - 1)
+
+    def parity(self, points):
+        """
+        Count ray crossings along the grid's axis from each point, modulo 2.
+
+        Args:
+            points (numpy.ndarray): Array of shape (n, 3) with ray origins
+
+        Returns:
+            tuple: (odd, ambiguous) boolean arrays. odd is True for an odd number
+                of crossings; ambiguous is True where a ray grazed an edge or vertex.
+        """
+        odd = np.zeros(len(points), dtype=bool)
+        ambiguous = np.zeros(len(points), dtype=bool)
+        uv = points[:, self.plane]
+        outside = np.any((uv < self.lo) | (uv > self.lo + self.shape * self.bin_size), axis=1)
+        bins = self._bin_index(uv)
+        bins = bins[:, 0] + self.shape[0] * bins[:, 1]
+        counts = np.where(outside, 0, self.bin_start[bins + 1] - self.bin_start[bins])
+
+        # Test rays in batches so the (ray, triangle) pairs fit in memory
+        start = 0
+        cumulative = np.cumsum(counts)
+        while start < len(points):
+            done = cumulative[start - 1] if start else 0
+            stop = max(start + 1, int(np.searchsorted(cumulative, done + MAX_PAIRS, side='right')))
+            self._parity_batch(points, bins, counts, start, min(stop, len(points)), odd, ambiguous)
+            start = stop
+        return odd, ambiguous
+
+    def _parity_batch(self, points, bins, counts, start, stop, odd, ambiguous):
+        batch_counts = counts[start:stop]
+        total = int(batch_counts.sum())
+        if total == 0:
+            return
+        ray = np.repeat(np.arange(start, stop), batch_counts)
+        local = np.arange(total) - np.repeat(np.cumsum(batch_counts) - batch_counts, batch_counts)
+        tri = self.bin_triangles[self.bin_start[bins[ray]] + local]
+
+        t = self.triangles[tri].astype(np.float64)
+        p = points[ray]
+        u, v = self.plane
+        y0, z0 = t[:, 0, u], t[:, 0, v]
+        e1y, e1z = t[:, 1, u] - y0, t[:, 1, v] - z0
+        e2y, e2z = t[:, 2, u] - y0, t[:, 2, v] - z0
+        py, pz = p[:, u] - y0, p[:, v] - z0
+
+        det = e1y * e2z - e2y * e1z
+        valid = np.abs(det) > 0
+        det = np.where(valid, det, 1.0)
+        l1 = (py * e2z - e2y * pz) / det
+        l2 = (e1y * pz - py * e1z) / det
+        l0 = 1.0 - l1 - l2
+        lam = np.stack([l0, l1, l2], axis=1)
+
+        inside = valid & np.all(lam > EDGE_TOLERANCE, axis=1)
+        grazing = valid & np.all(lam > -EDGE_TOLERANCE, axis=1) & ~inside
+        hit = (lam * t[:, :, self.axis]).sum(axis=1)
+        ahead = hit > p[:, self.axis]
+
+        crossings = np.bincount(ray[inside & ahead] - start, minlength=stop - start)
+        odd[start:stop] ^= (crossings % 2).astype(bool)
+        ambiguous[start:stop] |= np.bincount(ray[grazing & ahead] - start, minlength=stop - start) > 0
+
+
+def ray_parity(triangles, points):
+    """
+    Classify points as inside or outside a set of surfaces by voting over x, y and z rays.
+
+    For closed surfaces the three rays agree. Where they disagree, e.g. near a
+    hole in an open surface, the point is reported as ambiguous.
+
+    Args:
+        triangles (numpy.ndarray or list): Array of shape (n, 3, 3) with triangle
+            vertices, or three such arrays holding at least the triangles that
+            can cross the rays along x, y and z
+        points (numpy.ndarray): Array of shape (m, 3) with query points
+
+    Returns:
+        tuple: (odd, ambiguous) boolean arrays, as for RayGrid.parity
+    """
+    if isinstance(triangles, np.ndarray):
+        triangles = [triangles] * 3
+    votes = []
+    ambiguous = np.zeros(len(points), dtype=bool)
+    for axis in range(3):
+        if len(triangles[axis]):
+            odd, grazing = RayGrid(triangles[axis], axis).parity(points)
+        else:
+            odd, grazing = np.zeros(len(points), dtype=bool), np.zeros(len(points), dtype=bool)
+        votes.append(odd)
+        ambiguous |= grazing
+    votes = np.stack(votes)
+    ambiguous |= votes.any(axis=0) != votes.all(axis=0)
+    return votes[0], ambiguous
+
+
+def _crossing_lattice_rays(triangles, axis, min_coords, cell_size):
+    """
+    Select the triangles that can cross a ray along an axis from a candidate point.
+
+    Candidates sit CELL_OFFSET into their background cell, so the rays along
+    an axis all run on one lattice of lines. A triangle can only cross a ray if
+    its bounding box in the plane across the axis contains one of those lines.
+
+    Returns:
+        numpy.ndarray: Boolean mask over triangles
+    """
+    keep = np.ones(len(triangles), dtype=bool)
+    for column in ((axis + 1) % 3, (axis + 2) % 3):
+        coords = (triangles[:, :, column] - min_coords[column]) / cell_size[column] - CELL_OFFSET
+        # Widen the boxes slightly, since the vertices are stored in float32
+        first = np.ceil(coords.min(axis=1) - 1e-4)
+        last = np.floor(coords.max(axis=1) + 1e-4)
+        keep &= first <= last
+    return keep
+
+
+def _distance_from_surface(touched, max_steps=64):
+    """
+    City-block distance, in cells, from every cell to the nearest touched cell.
+    """
+    distance = np.full(touched.shape, max_steps, dtype=np.int32)
+    front = touched.copy()
+    distance[front] = 0
+    for step in range(1, max_steps):
+        grown = front.copy()
+        for axis in range(3):
+            grown[(slice(None),) * axis + (slice(1, None),)] |= front[(slice(None),) * axis + (slice(None, -1),)]
+            grown[(slice(None),) * axis + (slice(None, -1),)] |= front[(slice(None),) * axis + (slice(1, None),)]
+        new = grown & ~front
+        if not new.any():
+            break
+        distance[new] = step
+        front = grown
+    return distance
+
+
+def find_location_in_mesh(stl_files, min_coords, max_coords, cells, region='inside', seed=0):
+    """
+    Find a locationInMesh point in the region to be meshed.
+
+    Candidate points sit a third of a cell from the corner of background cells
+    that no surface touches, so they are clear of both the surfaces and any
+    block-mesh cell face. The inside/outside status of candidates is decided
+    by ray parity against all surfaces along all three axes, accelerated with
+    a RayGrid, and the candidate farthest from the surfaces is returned.
+
+    Args:
+        stl_files (list): Paths of the STL files
+        min_coords (numpy.ndarray): Minimum [x, y, z] of the background block
+        max_coords (numpy.ndarray): Maximum [x, y, z] of the background block
+        cells (tuple): Number of background cells in x, y, z directions
+        region (str): 'inside' to mesh the volume enclosed by the surfaces
+            (internal flow), 'outside' to mesh around them (external flow).
+            Falls back to the other region if no candidate is found.
+        seed (int): Seed for subsampling candidates on very large grids
+
+    Returns:
+        tuple: (x, y, z) of the seed point
+    """
+    if region not in ('inside', 'outside'):
+        raise ValueError(f"region must be 'inside' or 'outside', got '{region}'")
+
+    min_coords = np.asarray(min_coords, dtype=np.float64)
+    max_coords = np.asarray(max_coords, dtype=np.float64)
+    cells = np.asarray(cells, dtype=np.int64)
+    cell_size = (max_coords - min_coords) / cells
+
+    # One streaming pass marks the background cells touched by any surface and
+    # keeps only the triangles that can cross a candidate's rays
+    touched = np.zeros(tuple(cells), dtype=bool)
+    ray_triangles = [[], [], []]
+    n_triangles = 0
+    for stl_file in stl_files:
+        for triangles in iter_stl_triangles(str(stl_file), CHUNK_TRIANGLES):
+            n_triangles += len(triangles)
+            keys = surface_cell_keys(triangles, min_coords, cell_size, cells)
+            touched[keys % cells[0], (keys // cells[0]) % cells[1], keys // (cells[0] * cells[1])] = True
+            for axis in range(3):
+                crossing = triangles[_crossing_lattice_rays(triangles, axis, min_coords, cell_size)]
+                if len(crossing):
+                    ray_triangles[axis].append(crossing)
+    if n_triangles == 0:
+        raise ValueError("No triangles found to place locationInMesh against")
+    ray_triangles = [np.concatenate(chunks) if chunks else np.empty((0, 3, 3), dtype=np.float32)
+                     for chunks in ray_triangles]
+
+    distance = _distance_from_surface(touched)
+    # Every untouched cell is a candidate, since a thin region may hold no cell
+    # two cells from the surfaces while the other region holds many
+    candidates = np.argwhere(distance >= 1)
+    if len(candidates) > MAX_CANDIDATES:
+        rng = np.random.default_rng(seed)
+        candidates = candidates[rng.choice(len(candidates), MAX_CANDIDATES, replace=False)]
+
+    points = min_coords + (candidates + CELL_OFFSET) * cell_size
+    odd, ambiguous = ray_parity(ray_triangles, points)
+
+    for wanted in (region, 'outside' if region == 'inside' else 'inside'):
+        mask = ~ambiguous & (odd if wanted == 'inside' else ~odd)
+        if mask.any():
+            if wanted != region:
+                print(f"Warning: no point found {region} the surfaces, using a point {wanted} them")
+            depth = distance[tuple(candidates[mask].T)]
+            best = np.flatnonzero(mask)[np.argmax(depth)]
+            return tuple(float(c) for c in points[best])
+
+    raise ValueError("Could not find a valid locationInMesh point")
@@ -0,0 +1,349 @@
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import stat
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from geometry_cache import hash_file
+
+CACHE_FORMAT = 1
+DEFAULT_CACHE_NAME = '.mesh_cache'
+DEFAULT_MAX_BYTES = 50 * 2**30
+ENTRY_JSON = 'entry.json'
+
+# Files written into constant/triSurface by the pipeline itself
+PIPELINE_OUTPUT_SUFFIXES = ('.eMesh',)
+
+_READ_ONLY = ~(stat.S_IWUSR | stat.S_IWGRP | stat.S_IWOTH)
+
+
+def _tree_bytes(path):
+    return sum(p.stat().st_size for p in Path(path).rglob('*') if p.is_file())
+
+
+class MeshCache:
+    """
+    Content-addressed store of finished constant/polyMesh directories.
+
+    A mesh is keyed by the SHA-256 of the staged surfaces in the case's
+    constant/triSurface and every file in its system directory, plus the
+    OpenFOAM version, so it is only reused when snappyHexMesh would be run on
+    exactly the same inputs. The .eMesh feature edge files are left out: they
+    follow from the surfaces and surfaceFeatureExtractDict, and would otherwise
+    change the key as soon as surfaceFeatureExtract has run once. Entries live in
+    '<cache_dir>/<key[:2]>/<key>' with an entry.json recording their size and
+    when they were last used, which drives the least-recently-used eviction.
+
+    Stored files are made read-only and restored as hardlinks where the case
+    and the cache share a file system, so a restore costs no copying.
+
+    Args:
+        cache_dir (str): Cache directory
+        max_bytes (int): Size the cache is evicted down to after storing a mesh
+    """
+
+    def __init__(self, cache_dir, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self._hashes = {}
+        # Inputs each key was computed from, recorded with the mesh on store()
+        self._key_inputs = {}
+
+    def _hash(self, path):
+        # Cases of a sweep share their surfaces, so hash each file once
+        file_stat = os.stat(path)
+        identity = (os.path.realpath(path), file_stat.st_size, file_stat.st_mtime_ns)
+        if identity not in self._hashes:
+            self._hashes[identity] = hash_file(path)
+        return self._hashes[identity]
+
+    def inputs(self, case_dir):
+        """
+        Hash the files of a case that determine its mesh.
+
+        Args:
+            case_dir (str): Mesh case directory
+
+        Returns:
+            dict: Path relative to the case, e.g. 'system/snappyHexMeshDict', to content hash
+        """
+        case_dir = Path(case_dir)
+        inputs = {}
+        for subdir in ('constant/triSurface', 'system'):
+            for path in sorted((case_dir / subdir).glob('*')):
+                # Skips temporary files of atomic writes as well
+                if path.name.startswith('.') or path.name.endswith(PIPELINE_OUTPUT_SUFFIXES):
+                    continue
+                if path.is_file():
+                    inputs[f"{subdir}/{path.name}"] = self._hash(path)
+        return inputs
+
+    def key(self, case_dir, openfoam_version):
+        """
+        Compute the cache key of a case, before it is meshed.
+
+        Args:
+            case_dir (str): Mesh case directory
+            openfoam_version (str): OpenFOAM version or image the case is meshed with
+
+        Returns:
+            str: Hex digest identifying the mesh
+        """
+        inputs = self.inputs(case_dir)
+        data = {'format': CACHE_FORMAT, 'openfoam': openfoam_version, 'inputs': inputs}
+        key = hashlib.sha256(json.dumps(data, sort_keys=True).encode()).hexdigest()
+        self._key_inputs[key] = inputs
+        return key
+
+    def _entry_dir(self, key):
+        return self.cache_dir / key[:2] / key
+
+    def _read_entry(self, entry_dir):
+        try:
+            with open(entry_dir / ENTRY_JSON) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_entry(self, entry_dir, entry):
+        tmp_path = entry_dir / f"{ENTRY_JSON}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(entry, f, indent=1)
+        os.replace(tmp_path, entry_dir / ENTRY_JSON)
+
+    def entries(self):
+        """
+        List the cached meshes.
+
+        Returns:
+            list: Entry dicts with keys 'key', 'case', 'openfoam_version', 'size',
+                'created', 'last_used' and 'inputs', least recently used first
+        """
+        entries = []
+        for entry_json in self.cache_dir.glob(f'??/*/{ENTRY_JSON}'):
+            entry = self._read_entry(entry_json.parent)
+            if entry is not None:
+                entries.append(entry)
+        return sorted(entries, key=lambda entry: entry['last_used'])
+
+    def restore(self, key, case_dir):
+        """
+        Restore a cached mesh into a case's constant/polyMesh, replacing any mesh there.
+
+        Args:
+            key (str): Cache key from key()
+            case_dir (str): Mesh case directory
+
+        Returns:
+            str: 'hardlink' or 'copy' for a hit, None for a miss
+        """
+        entry_dir = self._entry_dir(key)
+        entry = self._read_entry(entry_dir)
+        if entry is None:
+            return None
+
+        poly_mesh = Path(case_dir) / 'constant' / 'polyMesh'
+        tmp_dir = poly_mesh.with_name(f"polyMesh.{os.getpid()}.tmp")
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        mode = 'hardlink'
+        source_root = entry_dir / 'polyMesh'
+        for source in sorted(source_root.rglob('*')):
+            target = tmp_dir / source.relative_to(source_root)
+            if source.is_dir():
+                os.makedirs(target, exist_ok=True)
+                continue
+            os.makedirs(target.parent, exist_ok=True)
+            try:
+                os.link(source, target)
+            except OSError:
+                # Different file system, or links not supported
+                shutil.copy2(source, target)
+                mode = 'copy'
+        os.makedirs(tmp_dir, exist_ok=True)
+        self._remove_mesh(poly_mesh)
+        os.replace(tmp_dir, poly_mesh)
+
+        entry['last_used'] = time.time()
+        self._write_entry(entry_dir, entry)
+        return mode
+
+    @staticmethod
+    def _remove_mesh(poly_mesh):
+        if poly_mesh.is_symlink() or poly_mesh.is_file():
+            poly_mesh.unlink()
+        elif poly_mesh.exists():
+            shutil.rmtree(poly_mesh)
+
+    def detach(self, case_dir):
+        """
+        Remove a mesh restored from the cache from a case that is about to be re-meshed.
+
+        blockMesh and snappyHexMesh overwrite the polyMesh files in place, which
+        would write through hardlinks into the cache. A mesh meshed in the case
+        itself is left alone.
+
+        Args:
+            case_dir (str): Mesh case directory
+
+        Returns:
+            bool: Whether a restored mesh was removed
+        """
+        poly_mesh = Path(case_dir) / 'constant' / 'polyMesh'
+        if not poly_mesh.is_dir():
+            return False
+        if not any(p.is_file() and p.stat().st_nlink > 1 for p in poly_mesh.rglob('*')):
+            return False
+        self._remove_mesh(poly_mesh)
+        return True
+
+    def store(self, key, case_dir, openfoam_version):
+        """
+        Copy a case's finished constant/polyMesh into the cache, then evict down to max_bytes.
+
+        Args:
+            key (str): Cache key computed before the case was meshed
+            case_dir (str): Mesh case directory
+            openfoam_version (str): OpenFOAM version or image the case was meshed with
+
+        Returns:
+            bool: Whether the mesh was stored; False if it is already cached or
+                the case has no mesh
+        """
+        poly_mesh = Path(case_dir) / 'constant' / 'polyMesh'
+        entry_dir = self._entry_dir(key)
+        if not poly_mesh.is_dir() or entry_dir.exists():
+            return False
+
+        # Build the entry next to its final place and move it in whole, so a
+        # concurrent reader never sees a partial mesh
+        tmp_dir = self.cache_dir / 'tmp' / uuid.uuid4().hex
+        shutil.copytree(poly_mesh, tmp_dir / 'polyMesh')
+        for path in (tmp_dir / 'polyMesh').rglob('*'):
+            if path.is_file():
+                os.chmod(path, path.stat().st_mode & _READ_ONLY)
+        now = time.time()
+        self._write_entry(tmp_dir, {
+            'key': key,
+            'case': Path(case_dir).name,
+            'openfoam_version': openfoam_version,
+            'size': _tree_bytes(tmp_dir / 'polyMesh'),
+            'created': now,
+            'last_used': now,
+            'inputs': self._key_inputs.get(key) or self.inputs(case_dir),
+        })
+        os.makedirs(entry_dir.parent, exist_ok=True)
+        try:
+            os.rename(tmp_dir, entry_dir)
+        except OSError:
+            # Stored by someone else in the meantime
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            return False
+        if self.max_bytes is not None:
+            self.evict(self.max_bytes)
+        return True
+
+    def remove(self, key):
+        """
+        Remove one entry from the cache.
+
+        Args:
+            key (str): Cache key
+        """
+        shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+
+    def evict(self, max_bytes):
+        """
+        Remove least recently used entries until the cache is at most max_bytes.
+
+        Args:
+            max_bytes (int): Size limit in bytes
+
+        Returns:
+            list: Removed entries
+        """
+        entries = self.entries()
+        total = sum(entry['size'] for entry in entries)
+        removed = []
+        for entry in entries:
+            if total <= max_bytes:
+                break
+            self.remove(entry['key'])
+            total -= entry['size']
+            removed.append(entry)
+        return removed
+
+    def purge(self, keys=None, older_than=None):
+        """
+        Remove entries by key prefix or age, or every entry.
+
+        Args:
+            keys (list): Key prefixes of the entries to remove
+            older_than (float): Remove entries not used for this many seconds
+
+        Returns:
+            list: Removed entries
+        """
+        removed = []
+        now = time.time()
+        for entry in self.entries():
+            if keys and not any(entry['key'].startswith(prefix) for prefix in keys):
+                continue
+            if older_than is not None and now - entry['last_used'] < older_than:
+                continue
+            self.remove(entry['key'])
+            removed.append(entry)
+        shutil.rmtree(self.cache_dir / 'tmp', ignore_errors=True)
+        return removed
+
+
+def _format_time(timestamp):
+    return datetime.fromtimestamp(timestamp, timezone.utc).isoformat(timespec='seconds')
+
+
+def main(argv=None):
+    """
+    Command line entry point for inspecting and purging the mesh cache.
+
+    Args:
+        argv (list): Command line arguments, defaults to sys.argv[1:]
+    """
+    parser = argparse.ArgumentParser(description="Inspect or purge the cache of finished polyMesh directories.")
+    parser.add_argument('--cache-dir', default=os.path.join('meshes', DEFAULT_CACHE_NAME), help="mesh cache directory")
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('list', help="list the cached meshes, least recently used first")
+    purge = commands.add_parser('purge', help="remove cached meshes")
+    purge.add_argument('keys', nargs='*', help="key prefixes of the meshes to remove")
+    purge.add_argument('--older-than', type=float, metavar='DAYS', help="only remove meshes unused for this many days")
+    purge.add_argument('--all', action='store_true', help="remove every cached mesh")
+    evict = commands.add_parser('evict', help="remove least recently used meshes down to a size")
+    evict.add_argument('--max-gb', type=float, required=True, help="cache size to evict down to, in GiB")
+    args = parser.parse_args(argv)
+
+    cache = MeshCache(args.cache_dir, max_bytes=None)
+    if args.command == 'list':
+        entries = cache.entries()
+        for entry in entries:
+            print(f"{entry['key'][:16]}  {entry['size'] / 2**20:10.1f} MiB  last used {_format_time(entry['last_used'])}  "
+                  f"{entry['case']}  ({entry['openfoam_version']})")
+        print(f"{len(entries)} meshes, {sum(e['size'] for e in entries) / 2**30:.2f} GiB in {cache.cache_dir}")
+        return 0
+
+    if args.command == 'purge':
+        if not (args.keys or args.older_than is not None or args.all):
+            parser.error("purge needs key prefixes, --older-than or --all")
+        older_than = args.older_than * 86400 if args.older_than is not None else None
+        removed = cache.purge(args.keys or None, older_than)
+    else:
+        removed = cache.evict(int(args.max_gb * 2**30))
+    for entry in removed:
+        print(f"Removed {entry['key'][:16]} ({entry['case']}, {entry['size'] / 2**20:.1f} MiB)")
+    print(f"Removed {len(removed)} meshes, {sum(e['size'] for e in removed) / 2**30:.2f} GiB freed")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,231 @@
+import json
+import math
+from pathlib import Path
+import numpy as np
+from generate_snappyHexMeshDict import surface_level
+from stl_scan import iter_stl_triangles
+
+# Rules of thumb for snappyHexMesh's peak memory use: roughly 1 kB per final
+# cell, plus the triSurface data and its search trees per surface triangle
+BYTES_PER_CELL = 1024
+BYTES_PER_TRIANGLE = 256
+
+# Upper bound on sample points generated per batch while voxelizing
+MAX_SAMPLE_POINTS = 1 << 22
+
+
+def barycentric_grid(k):
+    """
+    Barycentric (u, v) coordinates of a triangular grid with k segments per edge.
+
+    Args:
+        k (int): Number of segments per triangle edge
+
+    Returns:
+        tuple: (u, v) arrays of the (k + 1) * (k + 2) / 2 grid points
+    """
+    i, j = np.meshgrid(np.arange(k + 1), np.arange(k + 1), indexing='ij')
+    mask = i + j <= k
+    return i[mask] / k, j[mask] / k
+
+
+def surface_cell_keys(triangles, origin, cell_size, shape):
+    """
+    Find the grid cells touched by a batch of triangles.
+
+    Each triangle is sampled on a barycentric grid fine enough that samples are
+    at most half a cell apart, and the samples are binned into the grid.
+
+    Args:
+        triangles (numpy.ndarray): Array of shape (n, 3, 3) with triangle vertices
+        origin (numpy.ndarray): Minimum corner of the grid
+        cell_size (float or numpy.ndarray): Edge length of the grid cells, one
+            for cubic cells or one per axis
+        shape (tuple): Number of grid cells in x, y, z
+
+    Returns:
+        numpy.ndarray: Sorted unique int64 keys ix + nx * (iy + ny * iz)
+    """
+    triangles = triangles.astype(np.float64)
+    a = triangles[:, 0]
+    ab = triangles[:, 1] - a
+    ac = triangles[:, 2] - a
+    edges = np.stack([ab, ac, triangles[:, 2] - triangles[:, 1]], axis=1)
+    longest = np.linalg.norm(edges, axis=2).max(axis=1)
+    cell_size = np.asarray(cell_size, dtype=np.float64)
+    segments = np.maximum(1, np.ceil(longest / (0.5 * cell_size.min()))).astype(np.int64)
+
+    shape = np.asarray(shape, dtype=np.int64)
+    keys = []
+    for k in np.unique(segments):
+        idx = np.flatnonzero(segments == k)
+        u, v = barycentric_grid(int(k))
+        batch = max(1, MAX_SAMPLE_POINTS // len(u))
+        for start in range(0, len(idx), batch):
+            sel = idx[start:start + batch]
+            points = (a[sel, None, :] + u[None, :, None] * ab[sel, None, :]
+                      + v[None, :, None] * ac[sel, None, :]).reshape(-1, 3)
+            ijk = np.floor((points - origin) / cell_size).astype(np.int64)
+            np.clip(ijk, 0, shape - 1, out=ijk)
+            keys.append(np.unique(ijk[:, 0] + shape[0] * (ijk[:, 1] + shape[1] * ijk[:, 2])))
+
+    if not keys:
+        return np.empty(0, dtype=np.int64)
+    return np.unique(np.concatenate(keys))
+
+
+class _KeySet:
+    """
+    Union of sorted key arrays, merged in bulk rather than once per array.
+
+    Arrays are collected until they hold as many keys as the merged set, then
+    merged with one np.unique, so every key is sorted a logarithmic number of
+    times instead of once per added array.
+    """
+
+    def __init__(self):
+        self.keys = np.empty(0, dtype=np.int64)
+        self._pending = []
+        self._n_pending = 0
+
+    def add(self, keys):
+        self._pending.append(keys)
+        self._n_pending += len(keys)
+        if self._n_pending > max(len(self.keys), MAX_SAMPLE_POINTS):
+            self._merge()
+
+    def _merge(self):
+        if self._pending:
+            self.keys = np.unique(np.concatenate([self.keys] + self._pending))
+            self._pending = []
+            self._n_pending = 0
+
+    def __len__(self):
+        self._merge()
+        return len(self.keys)
+
+
+def estimate_mesh(stl_files, min_coords, max_coords, cells, surface_levels=None,
+                  n_cells_between_levels=10):
+    """
+    Predict the cell count and peak memory of a snappyHexMesh run before running it.
+
+    The background grid is refined level by level. At each level l the cells
+    touched by surfaces with a higher refinement level are found by voxelizing
+    those surfaces, grown by the nCellsBetweenLevels buffer on either side, and
+    split into 8. Surfaces are treated as refined to their max level everywhere
+    and cells later removed by the region selection are counted, so the
+    estimate errs on the high side.
+
+    Args:
+        stl_files (list): Paths of the STL files
+        min_coords (numpy.ndarray): Minimum [x, y, z] of the background block
+        max_coords (numpy.ndarray): Maximum [x, y, z] of the background block
+        cells (tuple): Number of background cells in x, y, z directions
+        surface_levels (dict or tuple): Surface name to (min, max) refinement
+            level, as passed to generate_snappyHexMeshDict
+        n_cells_between_levels (int): nCellsBetweenLevels of the snappyHexMeshDict
+
+    Returns:
+        dict: Estimate with keys 'background_cells', 'surface_cells' and
+            'refined_cells' (per level), 'triangles', 'estimated_cells' and
+            'estimated_memory_bytes'
+    """
+    min_coords = np.asarray(min_coords, dtype=np.float64)
+    max_coords = np.asarray(max_coords, dtype=np.float64)
+    cells = np.asarray(cells, dtype=np.int64)
+    # Background cells are only cubic when sized by cell size or budget
+    cell_size = (max_coords - min_coords) / cells
+    background_cells = int(np.prod(cells))
+
+    max_levels = {Path(f).name: surface_level(surface_levels, Path(f).stem)[1] for f in stl_files}
+    top_level = max(max_levels.values(), default=0)
+    level_keys = [_KeySet() for _ in range(top_level)]
+    triangles_total = 0
+
+    for stl_file in stl_files:
+        max_level = max_levels[Path(stl_file).name]
+        for triangles in iter_stl_triangles(str(stl_file)):
+            triangles_total += len(triangles)
+            for level in range(max_level):
+                scale = 2 ** level
+                level_keys[level].add(surface_cell_keys(triangles, min_coords, cell_size / scale, cells * scale))
+
+    surface_cells = [int(len(keys)) for keys in level_keys]
+    refined_cells = []
+    estimated_cells = background_cells
+    for level, n_surface in enumerate(surface_cells):
+        available = background_cells * 8 ** level
+        refined = min(n_surface * (1 + 2 * n_cells_between_levels), available)
+        refined_cells.append(int(refined))
+        estimated_cells += 7 * refined
+
+    return {
+        'background_cells': background_cells,
+        'surface_cells': surface_cells,
+        'refined_cells': refined_cells,
+        'triangles': triangles_total,
+        'estimated_cells': int(estimated_cells),
+        'estimated_memory_bytes': int(estimated_cells * BYTES_PER_CELL + triangles_total * BYTES_PER_TRIANGLE),
+    }
+
+
+def check_budget(estimate, max_cells=None, max_memory_bytes=None, on_exceed='warn'):
+    """
+    Compare a mesh estimate against cell and memory budgets.
+
+    Args:
+        estimate (dict): Estimate returned by estimate_mesh
+        max_cells (int): Cell budget, None for no limit
+        max_memory_bytes (int): Memory budget in bytes, None for no limit
+        on_exceed (str): 'warn' to print a warning, 'error' to raise ValueError
+
+    Returns:
+        list: Messages describing each exceeded budget, empty if within budget
+    """
+    problems = []
+    if max_cells is not None and estimate['estimated_cells'] > max_cells:
+        problems.append(f"estimated {estimate['estimated_cells']} cells exceeds the budget of {max_cells}")
+    if max_memory_bytes is not None and estimate['estimated_memory_bytes'] > max_memory_bytes:
+        problems.append(f"estimated {estimate['estimated_memory_bytes'] / 2**30:.2f} GiB exceeds "
+                        f"the memory budget of {max_memory_bytes / 2**30:.2f} GiB")
+
+    if problems and on_exceed == 'error':
+        raise ValueError("Mesh over budget: " + "; ".join(problems))
+    for problem in problems:
+        print(f"Warning: {problem}")
+    return problems
+
+
+def tune_cell_limits(estimate, n_procs=1, headroom=1.25, min_local_cells=100000, min_global_cells=2000000):
+    """
+    Choose maxLocalCells and maxGlobalCells so refinement is not cut short.
+
+    Args:
+        estimate (dict): Estimate returned by estimate_mesh
+        n_procs (int): Number of processors snappyHexMesh runs on
+        headroom (float): Factor applied on top of the estimated cell count
+        min_local_cells (int): Lower bound for maxLocalCells
+        min_global_cells (int): Lower bound for maxGlobalCells
+
+    Returns:
+        tuple: (max_local_cells, max_global_cells)
+    """
+    def round_up(n):
+        return int(math.ceil(n / 100000.0) * 100000)
+
+    max_global = max(min_global_cells, round_up(estimate['estimated_cells'] * headroom))
+    max_local = max(min_local_cells, round_up(max_global / max(1, n_procs)))
+    return max_local, max_global
+
+
+def write_estimate(estimate, output_path):
+    """
+    Write a mesh estimate to a JSON file.
+
+    Args:
+        estimate (dict): Estimate returned by estimate_mesh
+        output_path (str): Path of the JSON file
+    """
+    with open(output_path, 'w') as f:
+        json.dump(estimate, f, indent=2)
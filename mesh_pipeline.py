@@ -0,0 +1,547 @@
+import argparse
+import json
+import os
+import queue
+import re
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+from container_worker import ShellWorker, docker_shell_argv
+from mesh_cache import DEFAULT_CACHE_NAME, DEFAULT_MAX_BYTES, MeshCache
+from metrics import case_summary, parse_openfoam_log, step_records, write_batch_summary, write_case_metrics
+
+
+class NativeBackend:
+    """
+    Run OpenFOAM applications installed on the host, from the case directory.
+    """
+    name = 'native'
+
+    def run(self, case_dir, argv, log_file):
+        """
+        Run one command for a case.
+
+        Args:
+            case_dir (str): Mesh case directory, used as working directory
+            argv (list): Command and arguments, e.g. ['blockMesh']
+            log_file (file): Open binary file receiving stdout and stderr
+
+        Returns:
+            int: Exit code of the command
+        """
+        return subprocess.run(argv, cwd=case_dir, stdout=log_file, stderr=subprocess.STDOUT,
+                              stdin=subprocess.DEVNULL).returncode
+
+    def close(self):
+        pass
+
+
+class DockerBackend(NativeBackend):
+    """
+    Run each command in a fresh container through the openfoam-docker script,
+    with the case directory mounted as the container's home directory. The
+    script is run with -no-tty, since the commands run without a terminal.
+
+    Args:
+        script (str): Path of the openfoam-docker script
+        options (list): Extra options for the script, e.g. ['-2112']
+    """
+    name = 'openfoam-docker'
+
+    def __init__(self, script='openfoam-docker', options=()):
+        self.script = str(Path(script).resolve()) if os.path.sep in str(script) else script
+        self.options = list(options)
+
+    def run(self, case_dir, argv, log_file):
+        command = [self.script, '-no-tty', f'-dir={Path(case_dir).resolve()}', *self.options, '--', *argv]
+        return super().run(case_dir, command, log_file)
+
+
+class FakeBackend(NativeBackend):
+    """
+    Run every command through a stand-in executable, which gets the OpenFOAM
+    command line as its arguments. Used to test pipelines without OpenFOAM.
+
+    Args:
+        executable (str): Path of the stand-in executable
+    """
+    name = 'fake'
+
+    def __init__(self, executable):
+        self.executable = str(Path(executable).resolve())
+
+    def run(self, case_dir, argv, log_file):
+        return super().run(case_dir, [self.executable, *argv], log_file)
+
+
+class ContainerBackend(NativeBackend):
+    """
+    Run commands in long-lived containers, one per concurrently running step.
+
+    Instead of starting a container for every command, each container runs a
+    shell that is fed commands one after the other (see ShellWorker). The
+    workspace, which must contain all cases, is mounted into every container.
+
+    Args:
+        workspace (str): Directory containing the cases, e.g. meshes
+        launch_argv (list): Command starting a container shell, defaults to
+            docker_shell_argv(workspace)
+        max_workers (int): Maximum number of containers, None for one per
+            concurrently running step
+    """
+    name = 'openfoam-container'
+
+    def __init__(self, workspace, launch_argv=None, max_workers=None):
+        self.workspace = Path(workspace).resolve()
+        self.launch_argv = launch_argv or docker_shell_argv(self.workspace)
+        self.max_workers = max_workers
+        self.idle = queue.Queue()
+        self.workers = []
+        self.lock = threading.Lock()
+
+    def _checkout(self):
+        try:
+            return self.idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self.lock:
+            if self.max_workers is None or len(self.workers) < self.max_workers:
+                worker = ShellWorker(self.launch_argv, cwd=str(self.workspace))
+                self.workers.append(worker)
+                return worker
+        return self.idle.get()
+
+    def run(self, case_dir, argv, log_file):
+        rel_dir = os.path.relpath(Path(case_dir).resolve(), self.workspace)
+        if rel_dir.startswith('..'):
+            raise ValueError(f"Case {case_dir} is outside the container workspace {self.workspace}")
+        worker = self._checkout()
+        try:
+            return worker.run(rel_dir, argv, log_file)
+        finally:
+            self.idle.put(worker)
+
+    def close(self):
+        for worker in self.workers:
+            worker.close()
+        print(f"Ran {sum(w.commands_run for w in self.workers)} commands in {len(self.workers)} container(s)")
+
+
+class Step:
+    """
+    One OpenFOAM command of a case, run once the steps it depends on succeeded.
+
+    Args:
+        case_dir (Path): Mesh case directory
+        name (str): Step name, also used for the log file 'log.<name>'
+        argv (list): Command and arguments
+        cores (int): Number of cores the command occupies
+        depends (list): Names of steps of the same case that must succeed first
+    """
+
+    def __init__(self, case_dir, name, argv, cores=1, depends=()):
+        self.case_dir = Path(case_dir)
+        self.name = name
+        self.argv = list(argv)
+        self.cores = cores
+        self.depends = list(depends)
+        self.status = 'pending'
+        self.returncode = None
+        self.attempts = 0
+        self.seconds = 0.0
+        self.log_metrics = None
+
+    @property
+    def log_path(self):
+        return self.case_dir / f'log.{self.name}'
+
+    def to_dict(self):
+        return {
+            'step': self.name,
+            'command': ' '.join(self.argv),
+            'cores': self.cores,
+            'status': self.status,
+            'returncode': self.returncode,
+            'attempts': self.attempts,
+            'seconds': round(self.seconds, 3),
+            'log': str(self.log_path),
+            'log_metrics': self.log_metrics,
+        }
+
+
+def read_number_of_subdomains(case_dir):
+    """
+    Read numberOfSubdomains from a case's decomposeParDict.
+
+    Args:
+        case_dir (str): Mesh case directory
+
+    Returns:
+        int: Number of subdomains, 1 if the case has no decomposeParDict
+    """
+    path = Path(case_dir) / 'system' / 'decomposeParDict'
+    if not path.exists():
+        return 1
+    match = re.search(r'^\s*numberOfSubdomains\s+(\d+)\s*;', path.read_text(), re.MULTILINE)
+    return int(match.group(1)) if match else 1
+
+
+def validation_blocked(case_dir):
+    """
+    Check whether the STL validation done during setup blocks meshing a case.
+
+    Args:
+        case_dir (str): Mesh case directory
+
+    Returns:
+        bool: True if stl_validation.json found issues and was run with 'error'
+    """
+    try:
+        with open(Path(case_dir) / 'stl_validation.json') as f:
+            return bool(json.load(f).get('blocked'))
+    except (OSError, ValueError):
+        return False
+
+
+def _has_feature_edges(case_dir):
+    """
+    Check whether every STL file of a case already has its .eMesh file.
+    """
+    tri_surface = Path(case_dir) / 'constant' / 'triSurface'
+    stems = {p.name.split('.')[0] for p in tri_surface.glob('*.stl*')}
+    return bool(stems) and all((tri_surface / f'{stem}.eMesh').exists() for stem in stems)
+
+
+def case_steps(case_dir):
+    """
+    Build the steps that mesh one case.
+
+    surfaceFeatureExtract and blockMesh are independent, and snappyHexMesh
+    needs both. surfaceFeatureExtract is left out if the .eMesh files were
+    already extracted during setup. Cases with a decomposeParDict for more
+    than one subdomain are decomposed, meshed in parallel and reconstructed.
+
+    Args:
+        case_dir (str): Mesh case directory
+
+    Returns:
+        list: Step objects in dependency order
+    """
+    steps = []
+    snappy_depends = ['blockMesh']
+    if not _has_feature_edges(case_dir):
+        steps.append(Step(case_dir, 'surfaceFeatureExtract', ['surfaceFeatureExtract']))
+        snappy_depends.append('surfaceFeatureExtract')
+    steps.append(Step(case_dir, 'blockMesh', ['blockMesh']))
+
+    n_subdomains = read_number_of_subdomains(case_dir)
+    if n_subdomains > 1:
+        steps.append(Step(case_dir, 'decomposePar', ['decomposePar', '-force'], depends=['blockMesh']))
+        snappy_depends[0] = 'decomposePar'
+        steps.append(Step(case_dir, 'snappyHexMesh',
+                          ['mpirun', '-np', str(n_subdomains), 'snappyHexMesh', '-parallel', '-overwrite'],
+                          cores=n_subdomains, depends=snappy_depends))
+        steps.append(Step(case_dir, 'reconstructParMesh', ['reconstructParMesh', '-constant'],
+                          depends=['snappyHexMesh']))
+    else:
+        steps.append(Step(case_dir, 'snappyHexMesh', ['snappyHexMesh', '-overwrite'], depends=snappy_depends))
+    return steps
+
+
+def find_cases(meshes_dir='meshes'):
+    """
+    Find the mesh cases set up under a directory.
+
+    Args:
+        meshes_dir (str): Directory containing one subdirectory per case
+
+    Returns:
+        list: Sorted case directories that have a system/blockMeshDict
+    """
+    return sorted(d for d in Path(meshes_dir).iterdir() if (d / 'system' / 'blockMeshDict').exists())
+
+
+def _log_completed(log_path):
+    """
+    Check whether an OpenFOAM log ends with 'End', i.e. the run completed.
+    """
+    if not log_path.exists():
+        return False
+    with open(log_path, 'rb') as f:
+        f.seek(max(0, log_path.stat().st_size - 4096))
+        lines = [line.strip() for line in f.read().splitlines() if line.strip()]
+    return bool(lines) and lines[-1] == b'End'
+
+
+def _run_step(backend, step):
+    start = time.perf_counter()
+    with open(step.log_path, 'wb') as log_file:
+        try:
+            returncode = backend.run(str(step.case_dir), step.argv, log_file)
+        except OSError as e:
+            log_file.write(f"Could not run {' '.join(step.argv)}: {e}\n".encode())
+            returncode = 127
+    return returncode, time.perf_counter() - start
+
+
+def run_pipeline(case_dirs, backend, cores=None, retries=0, resume=False, mesh_cache=None, openfoam_version=None):
+    """
+    Mesh several cases, scheduling their steps across a shared core budget.
+
+    Ready steps are started in case order as long as their cores fit in the
+    budget. A step that does not fit, such as a large parallel snappyHexMesh,
+    holds back the steps after it until enough cores are free, so it cannot be
+    starved by a stream of small steps. Each step writes 'log.<step>' into its
+    case. A failed step is retried up to retries times; after that the rest
+    of its case is skipped while other cases carry on.
+
+    With a mesh cache, a case whose surfaces, system dicts and OpenFOAM version
+    match a cached mesh gets that constant/polyMesh restored instead of being
+    meshed, and the meshes of cases that succeed are added to the cache.
+
+    Args:
+        case_dirs (list): Mesh case directories
+        backend (NativeBackend): Backend running the commands
+        cores (int): Total cores available, defaults to all CPU cores. Steps
+            needing more cores than this run alone.
+        retries (int): Number of times a failed step is retried
+        resume (bool): Skip steps whose log shows they already completed
+        mesh_cache (MeshCache): Cache of finished meshes, or None to always mesh
+        openfoam_version (str): OpenFOAM version or image, part of the cache key
+
+    Returns:
+        list: Per case dicts with keys 'case', 'ok', 'cached' and 'steps'. Timings and
+            cell counts parsed from the logs are also written to each case's
+            metrics files and summarised in the meshes directory.
+    """
+    start = time.perf_counter()
+    if cores is None:
+        cores = os.cpu_count() or 1
+    cases = {Path(case_dir): case_steps(case_dir) for case_dir in case_dirs}
+
+    # Cases whose geometry failed validation are not worth any OpenFOAM time
+    for case_dir, steps in cases.items():
+        if validation_blocked(case_dir):
+            for step in steps:
+                step.status = 'skipped'
+            print(f"{case_dir.name}: STL validation failed, see {case_dir / 'stl_validation.json'}; skipping")
+
+    # Restore cached meshes; the other cases are meshed and cached under the
+    # key of the inputs they were meshed from
+    cache_keys = {}
+    if mesh_cache is not None:
+        for case_dir, steps in cases.items():
+            if steps[0].status == 'skipped':
+                continue
+            key = mesh_cache.key(case_dir, openfoam_version)
+            mode = mesh_cache.restore(key, case_dir)
+            if mode is not None:
+                for step in steps:
+                    step.status = 'cached'
+                print(f"{case_dir.name}: restored constant/polyMesh from the mesh cache ({mode}), skipping")
+                continue
+            cache_keys[case_dir] = key
+            if mesh_cache.detach(case_dir):
+                print(f"{case_dir.name}: removed the mesh previously restored from the cache")
+    pending = [step for steps in cases.values() for step in steps if step.status == 'pending']
+    failed_cases = set()
+    free = cores
+    running = {}
+
+    def finished(step):
+        return all(s.status in ('ok', 'resumed') for s in cases[step.case_dir] if s.name in step.depends)
+
+    with ThreadPoolExecutor(max_workers=max(1, cores)) as pool:
+        while pending or running:
+            for step in list(pending):
+                if step.case_dir in failed_cases:
+                    step.status = 'skipped'
+                    pending.remove(step)
+                    continue
+                if not finished(step):
+                    continue
+                if resume and step.attempts == 0 and _log_completed(step.log_path):
+                    step.status = 'resumed'
+                    pending.remove(step)
+                    print(f"{step.case_dir.name}: {step.name} already completed, skipping")
+                    continue
+                needed = min(step.cores, cores)
+                if needed > free:
+                    break
+                free -= needed
+                step.attempts += 1
+                step.status = 'running'
+                pending.remove(step)
+                print(f"{step.case_dir.name}: running {' '.join(step.argv)}"
+                      + (f" (attempt {step.attempts})" if step.attempts > 1 else ""))
+                running[pool.submit(_run_step, backend, step)] = step
+
+            if not running:
+                # Only resumed or skipped steps changed; look again for ready steps
+                if pending and not any(finished(s) and s.case_dir not in failed_cases for s in pending):
+                    for step in pending:
+                        step.status = 'skipped'
+                    pending = []
+                continue
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                step = running.pop(future)
+                free += min(step.cores, cores)
+                step.returncode, seconds = future.result()
+                step.seconds += seconds
+                step.log_metrics = parse_openfoam_log(step.log_path)
+                if step.returncode == 0:
+                    step.status = 'ok'
+                    print(f"{step.case_dir.name}: {step.name} finished in {seconds:.1f} s")
+                elif step.attempts <= retries:
+                    step.status = 'pending'
+                    pending.insert(0, step)
+                    print(f"{step.case_dir.name}: {step.name} failed with exit code {step.returncode}, retrying")
+                else:
+                    step.status = 'failed'
+                    failed_cases.add(step.case_dir)
+                    print(f"{step.case_dir.name}: {step.name} failed with exit code {step.returncode}, "
+                          f"see {step.log_path}")
+
+    backend.close()
+    results = []
+    summaries = {}
+    for case_dir, steps in cases.items():
+        result = {
+            'case': case_dir.name,
+            'ok': all(step.status in ('ok', 'resumed', 'cached') for step in steps),
+            'cached': all(step.status == 'cached' for step in steps),
+            'steps': [step.to_dict() for step in steps],
+        }
+        if result['ok'] and case_dir in cache_keys:
+            if mesh_cache.store(cache_keys[case_dir], case_dir, openfoam_version):
+                print(f"{case_dir.name}: stored constant/polyMesh in the mesh cache")
+        records = [r for step in result['steps'] if step['attempts'] for r in step_records(step)]
+        # Cases restored from the cache, skipped or fully resumed ran nothing,
+        # so the metrics of the run that meshed them stay in place
+        if records:
+            resumed = [step['step'] for step in result['steps'] if step['status'] == 'resumed']
+            write_case_metrics(case_dir, 'mesh', records, keep_stages=resumed)
+        summaries.setdefault(case_dir.parent, []).append(case_summary(case_dir.name, result['ok'], records))
+        results.append(result)
+    for meshes_dir, case_summaries in summaries.items():
+        write_batch_summary(meshes_dir, 'mesh', case_summaries, time.perf_counter() - start)
+    return results
+
+
+def make_backend(name, docker_script='openfoam-docker', fake_executable=None, docker_options=(),
+                 workspace='meshes', docker='docker', image='opencfd/openfoam-run:latest'):
+    """
+    Create a backend by name.
+
+    Args:
+        name (str): 'native', 'openfoam-docker', 'openfoam-container' or 'fake'
+        docker_script (str): Path of the openfoam-docker script
+        fake_executable (str): Stand-in executable for the 'fake' backend
+        docker_options (list): Extra options for the openfoam-docker script
+        workspace (str): Directory mounted into the containers of the
+            'openfoam-container' backend
+        docker (str): docker or podman executable for the 'openfoam-container'
+            backend, or a stand-in script taking its place
+        image (str): Container image for the 'openfoam-container' backend
+
+    Returns:
+        NativeBackend: The backend
+    """
+    if name == 'native':
+        return NativeBackend()
+    if name == 'openfoam-docker':
+        return DockerBackend(docker_script, docker_options)
+    if name == 'openfoam-container':
+        return ContainerBackend(workspace, docker_shell_argv(workspace, image, docker))
+    if name == 'fake':
+        if fake_executable is None:
+            raise ValueError("The fake backend needs a stand-in executable")
+        return FakeBackend(fake_executable)
+    raise ValueError(f"Unknown backend '{name}'")
+
+
+def openfoam_version(backend_name, docker_script='openfoam-docker', image='opencfd/openfoam-run:latest'):
+    """
+    Identify the OpenFOAM a backend runs, for the mesh cache key.
+
+    Native runs use the sourced OpenFOAM environment, container runs the
+    image. Moving image tags such as 'latest' cannot tell versions apart, so
+    pin the image or pass an explicit version in that case.
+
+    Args:
+        backend_name (str): Backend name, see make_backend
+        docker_script (str): openfoam-docker script, whose name may carry the version
+        image (str): Image of the 'openfoam-container' backend
+
+    Returns:
+        str: Version string
+    """
+    if backend_name == 'native':
+        return f"{os.environ.get('WM_PROJECT', 'OpenFOAM')}-{os.environ.get('WM_PROJECT_VERSION', 'unknown')}"
+    if backend_name == 'openfoam-docker':
+        return f"openfoam-docker:{Path(docker_script).name}"
+    if backend_name == 'openfoam-container':
+        return image
+    return backend_name
+
+
+def main(argv=None):
+    """
+    Command line entry point for meshing all set up cases.
+
+    Args:
+        argv (list): Command line arguments, defaults to sys.argv[1:]
+    """
+    parser = argparse.ArgumentParser(description="Run surfaceFeatureExtract, blockMesh and snappyHexMesh for all mesh cases.")
+    parser.add_argument('cases', nargs='*', help="case names to run, defaults to all cases")
+    parser.add_argument('--meshes-dir', default='meshes', help="directory containing the mesh cases")
+    parser.add_argument('--cores', type=int, help="total core budget, defaults to all CPU cores")
+    parser.add_argument('--retries', type=int, default=0, help="number of times a failed step is retried")
+    parser.add_argument('--resume', action='store_true', help="skip steps whose log shows they completed")
+    parser.add_argument('--backend', choices=('native', 'openfoam-docker', 'openfoam-container', 'fake'),
+                        default='native', help="how OpenFOAM commands are run")
+    parser.add_argument('--docker-script', default=str(Path(__file__).with_name('openfoam-docker')),
+                        help="openfoam-docker script for the openfoam-docker backend")
+    parser.add_argument('--fake-executable', help="stand-in executable for the fake backend")
+    parser.add_argument('--docker', default='docker',
+                        help="docker or podman executable for the openfoam-container backend, or a stand-in script")
+    parser.add_argument('--image', default='opencfd/openfoam-run:latest', help="image for the openfoam-container backend")
+    parser.add_argument('--no-mesh-cache', action='store_true', help="always mesh, without restoring or storing cached meshes")
+    parser.add_argument('--mesh-cache-dir', help=f"mesh cache directory, defaults to {DEFAULT_CACHE_NAME} in the meshes directory")
+    parser.add_argument('--mesh-cache-max-gb', type=float, default=DEFAULT_MAX_BYTES / 2**30,
+                        help="size the mesh cache is evicted down to, least recently used first")
+    parser.add_argument('--openfoam-version', help="OpenFOAM version for the mesh cache key, detected from the backend by default")
+    args = parser.parse_args(argv)
+
+    case_dirs = find_cases(args.meshes_dir)
+    if args.cases:
+        case_dirs = [d for d in case_dirs if d.name in args.cases]
+    if not case_dirs:
+        print(f"No mesh cases found in {args.meshes_dir}")
+        return 1
+
+    backend = make_backend(args.backend, args.docker_script, args.fake_executable,
+                           workspace=args.meshes_dir, docker=args.docker, image=args.image)
+    mesh_cache = None
+    if not args.no_mesh_cache:
+        mesh_cache = MeshCache(args.mesh_cache_dir or Path(args.meshes_dir) / DEFAULT_CACHE_NAME,
+                               int(args.mesh_cache_max_gb * 2**30))
+    version = args.openfoam_version or openfoam_version(args.backend, args.docker_script, args.image)
+    results = run_pipeline(case_dirs, backend, args.cores, args.retries, args.resume, mesh_cache, version)
+
+    n_ok = sum(r['ok'] for r in results)
+    n_cached = sum(r['cached'] for r in results)
+    print(f"\nMeshed {n_ok} of {len(results)} cases" + (f" ({n_cached} restored from the mesh cache)" if n_cached else ""))
+    for result in results:
+        if not result['ok']:
+            failed = [s['step'] for s in result['steps'] if s['status'] == 'failed']
+            print(f"Failed: {result['case']} ({', '.join(failed) or 'skipped'})")
+    return 0 if n_ok == len(results) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
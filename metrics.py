@@ -0,0 +1,276 @@
+import contextlib
+import csv
+import json
+import os
+import re
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+CASE_METRICS_JSON = 'metrics.json'
+CASE_METRICS_CSV = 'metrics.csv'
+BATCH_SUMMARY_JSON = 'metrics_summary.json'
+BATCH_HISTORY_CSV = 'metrics_history.csv'
+
+CSV_FIELDS = ['section', 'stage', 'target', 'wall_s', 'cpu_s', 'peak_rss_bytes', 'cells']
+HISTORY_FIELDS = ['timestamp', 'section', 'case', 'ok', 'wall_s', 'cpu_s', 'peak_rss_bytes', 'cells']
+
+# snappyHexMesh reports the duration of each of its phases
+SNAPPY_PHASES = {
+    'castellation': re.compile(r'^Mesh refined in\s*=\s*([\d.eE+-]+)\s*s', re.MULTILINE),
+    'snapping': re.compile(r'^Mesh snapped in\s*=\s*([\d.eE+-]+)\s*s', re.MULTILINE),
+    'layers': re.compile(r'^Layers added in\s*=\s*([\d.eE+-]+)\s*s', re.MULTILINE),
+    'total': re.compile(r'^Finished meshing in\s*=\s*([\d.eE+-]+)\s*s', re.MULTILINE),
+}
+EXECUTION_TIME = re.compile(r'ExecutionTime\s*=\s*([\d.eE+-]+)\s*s\s+ClockTime\s*=\s*([\d.eE+-]+)\s*s')
+# 'nCells: 24000' from blockMesh/checkMesh, 'Snapped mesh : cells:24000 ...' from snappyHexMesh
+CELL_COUNTS = re.compile(r'(?:^\s*nCells:\s*(\d+))|(?:[Mm]esh\s*:\s*cells:\s*(\d+))', re.MULTILINE)
+
+
+def peak_rss_bytes():
+    """
+    Peak resident set size of this process so far, None where it can't be measured.
+    """
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+
+class StageMetrics:
+    """
+    Record wall time, CPU time and peak RSS of the stages of a Python process.
+
+    Peak RSS is the process high-water mark at the end of each stage, so a stage
+    that raises it is the one whose value jumps. A stage started inside another
+    one is recorded on its own and its time is left out of the outer stage, so
+    the records add up to the time actually spent.
+    """
+
+    def __init__(self):
+        self.records = []
+        self._nested = []
+
+    @contextlib.contextmanager
+    def stage(self, stage, target=None):
+        """
+        Context manager timing one stage.
+
+        Args:
+            stage (str): Stage name, e.g. 'hash', 'copy' or 'render'
+            target (str): What the stage worked on, e.g. a file name
+        """
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        # Wall and CPU time of the stages nested in this one
+        inner = [0.0, 0.0]
+        self._nested.append(inner)
+        try:
+            yield
+        finally:
+            self._nested.pop()
+            wall = time.perf_counter() - wall
+            cpu = time.process_time() - cpu
+            if self._nested:
+                self._nested[-1][0] += wall
+                self._nested[-1][1] += cpu
+            self.records.append({
+                'section': 'setup',
+                'stage': stage,
+                'target': target,
+                'wall_s': round(wall - inner[0], 6),
+                'cpu_s': round(cpu - inner[1], 6),
+                'peak_rss_bytes': peak_rss_bytes(),
+                'cells': None,
+            })
+
+    def totals(self):
+        """
+        Sum wall and CPU time per stage name.
+
+        Returns:
+            dict: Stage name to {'wall_s', 'cpu_s', 'count'}
+        """
+        totals = {}
+        for record in self.records:
+            total = totals.setdefault(record['stage'], {'wall_s': 0.0, 'cpu_s': 0.0, 'count': 0})
+            total['wall_s'] += record['wall_s']
+            total['cpu_s'] += record['cpu_s']
+            total['count'] += 1
+        return totals
+
+
+def parse_openfoam_log(log_path):
+    """
+    Extract timings and cell counts from an OpenFOAM application log.
+
+    Args:
+        log_path (str): Path of the log, e.g. log.snappyHexMesh
+
+    Returns:
+        dict: 'execution_time_s' and 'clock_time_s' (last reported), 'cells'
+            (last reported cell count) and 'phases' (snappyHexMesh phase
+            durations in seconds); values are None or empty when not found
+    """
+    with open(log_path, 'r', errors='replace') as f:
+        text = f.read()
+
+    times = EXECUTION_TIME.findall(text)
+    cells = CELL_COUNTS.findall(text)
+    phases = {}
+    for phase, pattern in SNAPPY_PHASES.items():
+        found = pattern.findall(text)
+        if found:
+            phases[phase] = float(found[-1])
+
+    return {
+        'execution_time_s': float(times[-1][0]) if times else None,
+        'clock_time_s': float(times[-1][1]) if times else None,
+        'cells': int(cells[-1][0] or cells[-1][1]) if cells else None,
+        'phases': phases,
+    }
+
+
+def step_records(step):
+    """
+    Turn a mesh pipeline step, with its parsed log, into metrics records.
+
+    Args:
+        step (dict): Step dict from mesh_pipeline.run_pipeline
+
+    Returns:
+        list: One record for the step and one per snappyHexMesh phase
+    """
+    log = step.get('log_metrics') or {}
+    records = [{
+        'section': 'mesh',
+        'stage': step['step'],
+        'target': None,
+        'wall_s': step['seconds'],
+        'cpu_s': log.get('execution_time_s'),
+        'peak_rss_bytes': None,
+        'cells': log.get('cells'),
+    }]
+    for phase, seconds in log.get('phases', {}).items():
+        records.append({
+            'section': 'mesh',
+            'stage': step['step'],
+            'target': phase,
+            'wall_s': seconds,
+            'cpu_s': None,
+            'peak_rss_bytes': None,
+            'cells': None,
+        })
+    return records
+
+
+def _write_json(path, data):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def write_case_metrics(case_dir, section, records, keep_stages=()):
+    """
+    Store the metrics of one section ('setup' or 'mesh') of a case.
+
+    The case's metrics.json keeps the latest records of every section, and
+    metrics.csv holds the same records as a table.
+
+    Args:
+        case_dir (str): Mesh case directory
+        section (str): Section the records belong to
+        records (list): Metrics records
+        keep_stages (list): Stages whose previously stored records are kept,
+            e.g. steps that were not run again
+    """
+    json_path = Path(case_dir) / CASE_METRICS_JSON
+    data = {}
+    if json_path.exists():
+        try:
+            with open(json_path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            data = {}
+    kept = [r for r in data.get(section, {}).get('records', []) if r['stage'] in keep_stages]
+    data[section] = {
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'records': kept + records,
+    }
+    _write_json(json_path, data)
+
+    with open(Path(case_dir) / CASE_METRICS_CSV, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=CSV_FIELDS)
+        writer.writeheader()
+        for name in sorted(data):
+            writer.writerows(data[name]['records'])
+
+
+def case_summary(case, ok, records):
+    """
+    Summarise the metrics records of one case.
+
+    Returns:
+        dict: Totals with keys 'case', 'ok', 'wall_s', 'cpu_s', 'peak_rss_bytes' and 'cells'
+    """
+    # Phase records repeat time already counted in their step's record
+    top = [r for r in records if r['section'] == 'setup' or r['target'] is None]
+    rss = [r['peak_rss_bytes'] for r in top if r['peak_rss_bytes'] is not None]
+    cells = [r['cells'] for r in top if r['cells'] is not None]
+    return {
+        'case': case,
+        'ok': ok,
+        'wall_s': round(sum(r['wall_s'] or 0.0 for r in top), 6),
+        'cpu_s': round(sum(r['cpu_s'] or 0.0 for r in top), 6),
+        'peak_rss_bytes': max(rss) if rss else None,
+        'cells': cells[-1] if cells else None,
+    }
+
+
+def write_batch_summary(meshes_dir, section, summaries, wall_s):
+    """
+    Write the summary of a batch and append it to the history kept for trending.
+
+    metrics_summary.json holds the latest batch of each section, and
+    metrics_history.csv gets one row per case per batch.
+
+    Args:
+        meshes_dir (str): Directory containing the mesh cases
+        section (str): 'setup' or 'mesh'
+        summaries (list): Per case summaries from case_summary
+        wall_s (float): Wall time of the whole batch
+    """
+    timestamp = datetime.now(timezone.utc).isoformat(timespec='seconds')
+    summary_path = Path(meshes_dir) / BATCH_SUMMARY_JSON
+    data = {}
+    if summary_path.exists():
+        try:
+            with open(summary_path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            data = {}
+    data[section] = {
+        'timestamp': timestamp,
+        'wall_s': round(wall_s, 6),
+        'cases': len(summaries),
+        'failed': sum(not s['ok'] for s in summaries),
+        'per_case': summaries,
+    }
+    _write_json(summary_path, data)
+
+    history_path = Path(meshes_dir) / BATCH_HISTORY_CSV
+    new_file = not history_path.exists()
+    with open(history_path, 'a', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=HISTORY_FIELDS)
+        if new_file:
+            writer.writeheader()
+        for summary in summaries:
+            writer.writerow(dict(summary, timestamp=timestamp, section=section))
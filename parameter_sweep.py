@@ -0,0 +1,223 @@
+import argparse
+import hashlib
+import inspect
+import itertools
+import json
+import os
+import re
+import sys
+import time
+from pathlib import Path
+from geometry_cache import DEFAULT_CACHE_NAME, GeometryCache, ResultCache
+from metrics import case_summary, write_batch_summary
+from setup_mesh_dirs import (
+    case_option_parser,
+    case_options,
+    report_case,
+    run_case,
+    setup_case,
+    stage_shared_surfaces,
+)
+
+# Shared surfaces live in meshes/.shared/<geometry>/triSurface, outside any case
+SHARED_DIR = '.shared'
+
+# Options deciding the contents of the shared triSurface directory, which every
+# variant of a sweep uses as is
+SURFACE_OPTIONS = ('staging', 'to_binary', 'compress', 'extract_features', 'included_angle', 'decimate',
+                   'feature_workers')
+
+# setup_case arguments that the sweep sets itself
+RESERVED_OPTIONS = ('geom_subdir', 'meshes_dir', 'cache', 'case_name', 'surface_dir', 'result_cache')
+
+_NAME_UNSAFE = re.compile(r'[^A-Za-z0-9.+-]')
+
+
+def expand_grid(grid):
+    """
+    Expand a parameter grid into the list of its combinations.
+
+    Args:
+        grid (dict): setup_case argument name to list of values
+
+    Returns:
+        list: One dict of argument values per variant, in grid order with the
+            last parameter varying fastest
+    """
+    for name in grid:
+        if name in RESERVED_OPTIONS or name not in inspect.signature(setup_case).parameters:
+            raise ValueError(f"'{name}' is not a setup_case option that can be swept")
+        if name in SURFACE_OPTIONS:
+            raise ValueError(f"'{name}' decides the shared surfaces and must be the same for every variant")
+        if not grid[name]:
+            raise ValueError(f"No values given for '{name}'")
+    names = list(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+
+def _format_value(value):
+    if isinstance(value, float):
+        return f"{value:g}"
+    if isinstance(value, (list, tuple)):
+        return '-'.join(_format_value(v) for v in value)
+    if isinstance(value, dict):
+        return hashlib.sha1(json.dumps(value, sort_keys=True).encode()).hexdigest()[:8]
+    return str(value)
+
+
+def variant_name(case, params):
+    """
+    Name the case directory of one variant, e.g. 'pipe_cell_size0.05_padding1'.
+
+    Args:
+        case (str): Name of the geometry subdirectory
+        params (dict): Swept argument values of the variant
+
+    Returns:
+        str: Case directory name
+    """
+    parts = [case] + [f"{name}{_NAME_UNSAFE.sub('', _format_value(value))}" for name, value in params.items()]
+    return '_'.join(parts)
+
+
+def run_sweep(geom_subdir, grid, meshes_dir='meshes', cache_path=None, hash_contents=False, result_cache_size=64,
+              **case_options):
+    """
+    Set up one mesh case per combination of a parameter grid for a single geometry.
+
+    The STL files are staged, and their feature edges extracted, once into a
+    shared triSurface directory whose files every variant hardlinks. The
+    variants are set up one after the other in this process and share a
+    ResultCache, so an analysis of the surfaces (background block, refinement
+    levels, gap regions, estimate, locationInMesh) runs once for all variants
+    that use the same parameters for it, while the surfaces themselves are
+    only ever streamed. The variants and their parameters are listed in
+    '<geometry>_sweep.json' in meshes_dir.
+
+    Args:
+        geom_subdir (str): Path to the geometry subdirectory containing the STL files
+        grid (dict): setup_case argument name to list of values, e.g.
+            {'cell_size': [0.1, 0.05], 'surface_levels': [(2, 3), (3, 4)]}
+        meshes_dir (str): Path to the meshes directory
+        cache_path (str): Path of the STL metadata cache file, defaults to
+            '.stl_metadata_cache.json' next to geom_subdir. Pass False to disable caching.
+        hash_contents (bool): Whether cache entries are also keyed by a content hash
+        result_cache_size (int): Number of analysis results kept for reuse by later variants
+        **case_options: Options passed on to setup_case for every variant
+
+    Returns:
+        list: One result dict per variant, see setup_mesh_dirs.run_case
+    """
+    start = time.perf_counter()
+    geom_subdir = Path(geom_subdir)
+    if not geom_subdir.is_dir():
+        raise ValueError(f"Geometry directory '{geom_subdir}' does not exist")
+    variants = expand_grid(grid)
+    os.makedirs(meshes_dir, exist_ok=True)
+
+    cache = None
+    if cache_path is not False:
+        cache_path = str(cache_path or geom_subdir.parent / DEFAULT_CACHE_NAME)
+        cache = GeometryCache(cache_path, hash_contents)
+    else:
+        cache_path = None
+
+    surface_options = {name: case_options[name] for name in SURFACE_OPTIONS if name in case_options}
+    surface_dir = Path(meshes_dir) / SHARED_DIR / geom_subdir.name / 'triSurface'
+    names = [variant_name(geom_subdir.name, params) for params in variants]
+    if len(set(names)) != len(names):
+        raise ValueError("The parameter grid repeats a value")
+
+    print(f"Staging the surfaces of {geom_subdir.name} into {surface_dir}")
+    staged = stage_shared_surfaces(geom_subdir, surface_dir, cache, case_options.get('force', False),
+                                   **surface_options)
+    print(f"{len(staged['written'])} files written, {len(staged['skipped'])} up to date "
+          f"({staged['bytes_staged']} STL bytes staged)")
+
+    results = []
+    result_cache = ResultCache(result_cache_size)
+    for name, params in zip(names, variants):
+        options = dict(case_options, **params, case_name=name, surface_dir=str(surface_dir),
+                       result_cache=result_cache)
+        result = run_case(str(geom_subdir), meshes_dir, cache_path, hash_contents, options, cache)
+        report_case(result)
+        results.append(result)
+    print(f"Analyses of the surfaces: {result_cache.misses} computed, {result_cache.hits} reused")
+
+    if cache is not None:
+        cache.evict_stale()
+        cache.save()
+
+    index_path = Path(meshes_dir) / f"{geom_subdir.name}_sweep.json"
+    with open(index_path, 'w') as f:
+        json.dump({
+            'geometry': str(geom_subdir),
+            'surface_dir': str(surface_dir),
+            'grid': grid,
+            'variants': {name: params for name, params in zip(names, variants)},
+        }, f, indent=2)
+
+    failed = [r for r in results if not r['ok']]
+    print(f"\nSet up {len(results) - len(failed)} of {len(results)} variants of {geom_subdir.name}, "
+          f"listed in {index_path}")
+    for result in failed:
+        print(f"Failed: {result['case']}")
+
+    write_batch_summary(
+        meshes_dir,
+        'setup',
+        [case_summary(r['case'], r['ok'], r['metrics']) for r in results],
+        time.perf_counter() - start
+    )
+    return results
+
+
+def _parse_value(text):
+    """
+    Parse one swept value given on the command line: JSON if possible, else a string.
+    """
+    try:
+        value = json.loads(text)
+    except ValueError:
+        return text
+    return tuple(value) if isinstance(value, list) else value
+
+
+def main(argv=None):
+    """
+    Command line entry point for setting up a parameter sweep.
+
+    Args:
+        argv (list): Command line arguments, defaults to sys.argv[1:]
+    """
+    parser = argparse.ArgumentParser(description="Set up one mesh case per combination of swept setup parameters.",
+                                     parents=[case_option_parser()])
+    parser.add_argument('geometry', help="geometry subdirectory with the STL files, e.g. geometry/pipe")
+    parser.add_argument('--param', nargs='+', action='append', default=[], metavar=('NAME', 'VALUE'),
+                        help="setup_case option and its values, e.g. --param cell_size 0.1 0.05 "
+                             "--param surface_levels [2,3] [3,4]; repeat for a grid")
+    parser.add_argument('--meshes-dir', default='meshes', help="directory to create the variant cases in")
+    parser.add_argument('--no-cache', action='store_true', help="do not use the STL metadata cache")
+    parser.add_argument('--hash-contents', action='store_true', help="also key the metadata cache on file content hashes")
+    args = parser.parse_args(argv)
+
+    grid = {}
+    for name, *values in args.param:
+        grid[name.replace('-', '_')] = [_parse_value(value) for value in values]
+    if not grid:
+        parser.error("give at least one --param to sweep")
+    if args.decimate == 'auto':
+        parser.error("--decimate needs an edge length for the shared surfaces of a sweep")
+
+    results = run_sweep(
+        args.geometry,
+        grid,
+        meshes_dir=args.meshes_dir,
+        cache_path=False if args.no_cache else None,
+        hash_contents=args.hash_contents,
+        **case_options(args)
+    )
+    return 0 if all(r['ok'] for r in results) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,347 @@
+import json
+import math
+from pathlib import Path
+import numpy as np
+from convert_stl import triangle_normals
+from mesh_estimate import barycentric_grid
+from stl_scan import iter_stl_triangles
+
+# Two sample points face each other across a gap when their normals are within
+# 45 degrees of (anti)parallel and the line between them is within 45 degrees
+# of both normals. This rejects neighbours on the same flat or curved surface.
+PARALLEL_COS = math.cos(math.radians(45))
+
+# Upper bound on candidate pairs tested per batch
+MAX_PAIRS = 1 << 23
+
+# Upper bound on connected gap components merged pairwise into boxes
+MAX_COMPONENTS = 256
+
+
+def sample_surface(triangles, spacing):
+    """
+    Sample points on triangles no more than about spacing apart.
+
+    Small triangles are represented by their centroid, larger ones by a
+    barycentric grid. Points closer than spacing / 2 with a similar normal are
+    merged, which bounds the number of samples on finely tessellated surfaces.
+
+    Args:
+        triangles (numpy.ndarray): Array of shape (n, 3, 3) with triangle vertices
+        spacing (float): Target distance between samples
+
+    Returns:
+        tuple: (points, normals) arrays of shape (m, 3), in the dtype of triangles
+    """
+    normals = triangle_normals(triangles).astype(triangles.dtype)
+    longest = np.linalg.norm(triangles - np.roll(triangles, 1, axis=1), axis=2).max(axis=1)
+    segments = np.ceil(longest / spacing).astype(np.int64)
+
+    points = [triangles.mean(axis=1)[segments <= 1]]
+    point_normals = [normals[segments <= 1]]
+    for k in np.unique(segments[segments > 1]):
+        idx = np.flatnonzero(segments == k)
+        u, v = (w.astype(triangles.dtype) for w in barycentric_grid(int(k)))
+        a = triangles[idx, 0]
+        samples = (a[:, None] + u[None, :, None] * (triangles[idx, 1] - a)[:, None]
+                   + v[None, :, None] * (triangles[idx, 2] - a)[:, None])
+        points.append(samples.reshape(-1, 3))
+        point_normals.append(np.repeat(normals[idx], len(u), axis=0))
+    return thin_samples(np.concatenate(points), np.concatenate(point_normals), spacing)
+
+
+def thin_samples(points, normals, spacing):
+    """
+    Keep one sample per half-spacing voxel and dominant normal direction.
+
+    Both sides of a thin plate survive, since their normals point in opposite
+    directions. Thinning the samples of several chunks again gives the same
+    voxels as sampling them together.
+
+    Args:
+        points (numpy.ndarray): Array of shape (n, 3) with sample points
+        normals (numpy.ndarray): Array of shape (n, 3) with unit normals
+        spacing (float): Target distance between samples
+
+    Returns:
+        tuple: (points, normals) arrays of shape (m, 3)
+    """
+    voxel = np.floor(points / (0.5 * spacing)).astype(np.int64)
+    dominant = np.abs(normals).argmax(axis=1)
+    direction = 2 * dominant + (normals[np.arange(len(points)), dominant] > 0)
+    _, keep = np.unique(np.column_stack([voxel, direction]), axis=0, return_index=True)
+    return points[keep], normals[keep]
+
+
+def find_gap_pairs(points, normals, max_gap):
+    """
+    Find pairs of sample points facing each other across a gap narrower than max_gap.
+
+    Points are hashed into a uniform grid with cells of size max_gap, so each
+    point only needs to be compared with the points of its 27 neighbouring cells.
+
+    Args:
+        points (numpy.ndarray): Array of shape (n, 3) with sample points
+        normals (numpy.ndarray): Array of shape (n, 3) with unit normals
+        max_gap (float): Largest gap width reported
+
+    Returns:
+        tuple: (i, j, width) arrays, with i < j indexing into points
+    """
+    origin = points.min(axis=0)
+    ijk = np.floor((points - origin) / max_gap).astype(np.int64)
+    shape = ijk.max(axis=0) + 3
+    ijk += 1
+    keys = ijk[:, 0] + shape[0] * (ijk[:, 1] + shape[1] * ijk[:, 2])
+    order = np.argsort(keys, kind='stable')
+    sorted_keys = keys[order]
+
+    found_i, found_j, found_width = [], [], []
+    offsets = [(dx, dy, dz) for dx in (-1, 0, 1) for dy in (-1, 0, 1) for dz in (-1, 0, 1)]
+    for dx, dy, dz in offsets:
+        neighbour = keys + dx + shape[0] * (dy + shape[1] * dz)
+        start = np.searchsorted(sorted_keys, neighbour, side='left')
+        counts = np.searchsorted(sorted_keys, neighbour, side='right') - start
+
+        # Expand (point, neighbour) pairs in batches that fit in memory
+        cumulative = np.cumsum(counts)
+        first = 0
+        while first < len(points):
+            done = cumulative[first - 1] if first else 0
+            last = max(first + 1, int(np.searchsorted(cumulative, done + MAX_PAIRS, side='right')))
+            last = min(last, len(points))
+            batch_counts = counts[first:last]
+            total = int(batch_counts.sum())
+            if total:
+                i = np.repeat(np.arange(first, last), batch_counts)
+                local = np.arange(total) - np.repeat(np.cumsum(batch_counts) - batch_counts, batch_counts)
+                j = order[start[i] + local]
+                keep = i < j
+                i, j = i[keep], j[keep]
+
+                d = points[j] - points[i]
+                width = np.linalg.norm(d, axis=1)
+                keep = (width > 0) & (width < max_gap)
+                i, j, d, width = i[keep], j[keep], d[keep], width[keep]
+                d /= width[:, None]
+                facing = ((np.abs((normals[i] * normals[j]).sum(axis=1)) >= PARALLEL_COS)
+                          & (np.abs((d * normals[i]).sum(axis=1)) >= PARALLEL_COS)
+                          & (np.abs((d * normals[j]).sum(axis=1)) >= PARALLEL_COS))
+                found_i.append(i[facing])
+                found_j.append(j[facing])
+                found_width.append(width[facing])
+            first = last
+
+    if not found_i:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0)
+    return np.concatenate(found_i), np.concatenate(found_j), np.concatenate(found_width)
+
+
+def _connected_components(keys, shape):
+    """
+    Label 26-connected components of a sparse set of grid cell keys.
+    """
+    labels = np.arange(len(keys))
+    offsets = [dx + shape[0] * (dy + shape[1] * dz)
+               for dx in (-1, 0, 1) for dy in (-1, 0, 1) for dz in (-1, 0, 1)
+               if (dx, dy, dz) > (0, 0, 0)]
+    neighbour_pairs = []
+    for offset in offsets:
+        idx = np.searchsorted(keys, keys + offset)
+        idx = np.minimum(idx, len(keys) - 1)
+        present = keys[idx] == keys + offset
+        neighbour_pairs.append(np.column_stack([np.flatnonzero(present), idx[present]]))
+    pairs = np.concatenate(neighbour_pairs)
+
+    while True:
+        lowest = np.minimum(labels[pairs[:, 0]], labels[pairs[:, 1]])
+        new = labels.copy()
+        np.minimum.at(new, pairs[:, 0], lowest)
+        np.minimum.at(new, pairs[:, 1], lowest)
+        new = new[new]
+        if np.array_equal(new, labels):
+            return labels
+        labels = new
+
+
+def _merge_boxes(boxes, slack, max_regions):
+    """
+    Greedily merge boxes whose union wastes little volume.
+
+    Two boxes are merged when the volume of their bounding box is at most slack
+    times the sum of their volumes. Beyond max_regions boxes, the pair wasting
+    the least volume is merged regardless.
+    """
+    lo = np.array([box['min'] for box in boxes], dtype=np.float64)
+    hi = np.array([box['max'] for box in boxes], dtype=np.float64)
+    levels = [box['level'] for box in boxes]
+    gaps = [box['gap'] for box in boxes]
+
+    while len(lo) > 1:
+        volumes = np.prod(hi - lo, axis=1)
+        merged = np.prod(np.maximum(hi[:, None], hi[None]) - np.minimum(lo[:, None], lo[None]), axis=2)
+        separate = volumes[:, None] + volumes[None]
+        waste = merged - separate
+        allowed = merged <= slack * separate if len(lo) <= max_regions else np.ones_like(merged, dtype=bool)
+        allowed &= np.triu(np.ones_like(allowed), k=1).astype(bool)
+        if not allowed.any():
+            break
+        a, b = np.unravel_index(np.argmin(np.where(allowed, waste, np.inf)), waste.shape)
+        lo[a] = np.minimum(lo[a], lo[b])
+        hi[a] = np.maximum(hi[a], hi[b])
+        levels[a] = max(levels[a], levels[b])
+        gaps[a] = min(gaps[a], gaps[b])
+        lo, hi = np.delete(lo, b, axis=0), np.delete(hi, b, axis=0)
+        del levels[b], gaps[b]
+
+    return [{'min': lo[n], 'max': hi[n], 'level': levels[n], 'gap': gaps[n]} for n in range(len(lo))]
+
+
+def find_gap_regions(stl_files, min_coords, max_coords, cells, gap_cells=3.0, cells_across_gap=3.0,
+                     max_level=6, slack=1.5, max_regions=20):
+    """
+    Find narrow gaps between (or within) surfaces and cover them with refinement boxes.
+
+    Surfaces are streamed in chunks and sampled in single precision about a
+    quarter of the gap threshold apart, so only the samples are held. Sample
+    points facing each other across less than gap_cells background cells are
+    paired with a uniform grid hash. The background cells on those gaps are
+    grouped into connected components, each bounded by a box refined so that
+    cells_across_gap cells fit across its narrowest gap, and boxes are merged
+    where that costs little extra volume.
+
+    Args:
+        stl_files (list): Paths of the STL files
+        min_coords (numpy.ndarray): Minimum [x, y, z] of the background block
+        max_coords (numpy.ndarray): Maximum [x, y, z] of the background block
+        cells (tuple): Number of background cells in x, y, z directions
+        gap_cells (float): Gaps narrower than this many background cells are refined
+        cells_across_gap (float): Cells wanted across each gap
+        max_level (int): Highest refinement level assigned
+        slack (float): Volume ratio up to which neighbouring boxes are merged
+        max_regions (int): Maximum number of boxes
+
+    Returns:
+        dict: 'base_size', the background cell size, 'regions', a list of boxes with keys 'name', 'min', 'max', 'level'
+            and 'gap' (the narrowest gap width), and 'surfaces', the surface
+            name to narrowest gap width of every surface on a gap
+    """
+    min_coords = np.asarray(min_coords, dtype=np.float64)
+    max_coords = np.asarray(max_coords, dtype=np.float64)
+    cells = np.asarray(cells, dtype=np.int64)
+    cell_size = (max_coords - min_coords) / cells
+    base_size = float(np.cbrt(np.prod(cell_size)))
+    max_gap = gap_cells * base_size
+
+    points, normals, surface_ids = [], [], []
+    names = [Path(f).name.split('.')[0] for f in stl_files]
+    for surface_id, stl_file in enumerate(stl_files):
+        chunks = [sample_surface(triangles, 0.25 * max_gap)
+                  for triangles in iter_stl_triangles(str(stl_file)) if len(triangles)]
+        if chunks:
+            p, n = thin_samples(np.concatenate([c[0] for c in chunks]),
+                                np.concatenate([c[1] for c in chunks]), 0.25 * max_gap)
+            points.append(p)
+            normals.append(n)
+            surface_ids.append(np.full(len(p), surface_id))
+    if not points:
+        return {'base_size': base_size, 'regions': [], 'surfaces': {}}
+    points = np.concatenate(points)
+    normals = np.concatenate(normals)
+    surface_ids = np.concatenate(surface_ids)
+
+    i, j, width = find_gap_pairs(points, normals, max_gap)
+    if len(width) == 0:
+        return {'base_size': base_size, 'regions': [], 'surfaces': {}}
+
+    surfaces = {}
+    for ids in (surface_ids[i], surface_ids[j]):
+        for surface_id in np.unique(ids):
+            narrowest = float(width[ids == surface_id].min())
+            surfaces[names[surface_id]] = min(narrowest, surfaces.get(names[surface_id], narrowest))
+
+    # Mark the background cells along each gap, at its ends and middle
+    levels = np.clip(np.ceil(np.log2(cells_across_gap * base_size / width)), 1, max_level).astype(np.int64)
+    gap_points = np.concatenate([points[i], 0.5 * (points[i] + points[j]), points[j]])
+    gap_levels = np.tile(levels, 3)
+    gap_widths = np.tile(width, 3)
+    ijk = np.clip(np.floor((gap_points - min_coords) / cell_size).astype(np.int64), 0, cells - 1)
+    keys = ijk[:, 0] + cells[0] * (ijk[:, 1] + cells[1] * ijk[:, 2])
+    unique_keys, inverse = np.unique(keys, return_inverse=True)
+    cell_levels = np.zeros(len(unique_keys), dtype=np.int64)
+    np.maximum.at(cell_levels, inverse, gap_levels)
+    cell_widths = np.full(len(unique_keys), np.inf)
+    np.minimum.at(cell_widths, inverse, gap_widths)
+
+    cell_ijk = np.column_stack([unique_keys % cells[0], (unique_keys // cells[0]) % cells[1],
+                                unique_keys // (cells[0] * cells[1])])
+
+    # Group gap cells into connected components, on a coarser grid if there are
+    # too many components to merge pairwise
+    factor = 1
+    while True:
+        # Pad by one cell on each side so neighbour offsets never wrap around
+        coarse = cell_ijk // factor + 1
+        coarse_shape = cells // factor + 3
+        coarse_keys, coarse_inverse = np.unique(
+            coarse[:, 0] + coarse_shape[0] * (coarse[:, 1] + coarse_shape[1] * coarse[:, 2]), return_inverse=True)
+        labels = _connected_components(coarse_keys, coarse_shape)[coarse_inverse.ravel()]
+        if len(np.unique(labels)) <= MAX_COMPONENTS or factor >= cells.max():
+            break
+        factor *= 2
+
+    boxes = []
+    for label in np.unique(labels):
+        member = labels == label
+        boxes.append({
+            'min': min_coords + cell_ijk[member].min(axis=0) * cell_size,
+            'max': min_coords + (cell_ijk[member].max(axis=0) + 1) * cell_size,
+            'level': int(cell_levels[member].max()),
+            'gap': float(cell_widths[member].min()),
+        })
+    boxes = _merge_boxes(boxes, slack, max_regions)
+
+    regions = []
+    for n, box in enumerate(sorted(boxes, key=lambda b: tuple(b['min']))):
+        regions.append({
+            'name': f'gap{n}',
+            'min': [float(c) for c in box['min']],
+            'max': [float(c) for c in box['max']],
+            'level': box['level'],
+            'gap': box['gap'],
+        })
+    return {'base_size': base_size, 'regions': regions, 'surfaces': surfaces}
+
+
+def gap_refinement_regions(gaps, distance_refinement=False, cells_across_gap=3.0, max_level=6):
+    """
+    Turn the result of find_gap_regions into refinementRegions entries.
+
+    Args:
+        gaps (dict): Result of find_gap_regions
+        distance_refinement (bool): Also refine within one gap width of every
+            surface on a gap, in addition to the boxes
+        cells_across_gap (float): Cells wanted across each gap
+        max_level (int): Highest refinement level assigned
+
+    Returns:
+        list: Entries as taken by generate_snappyHexMeshDict's refinement_regions
+    """
+    regions = [dict(region, mode='inside') for region in gaps['regions']]
+    if distance_refinement:
+        for name, width in sorted(gaps['surfaces'].items()):
+            level = int(np.clip(math.ceil(math.log2(cells_across_gap * gaps['base_size'] / width)), 1, max_level))
+            regions.append({'name': name, 'mode': 'distance', 'distance': width, 'level': level})
+    return regions
+
+
+def write_gap_regions(gaps, output_path):
+    """
+    Write the result of find_gap_regions to a JSON file.
+
+    Args:
+        gaps (dict): Result of find_gap_regions
+        output_path (str): Path of the JSON file
+    """
+    with open(output_path, 'w') as f:
+        json.dump(gaps, f, indent=2)
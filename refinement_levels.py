@@ -0,0 +1,230 @@
+import json
+import math
+from pathlib import Path
+import numpy as np
+from feature_edges import edge_table, weld_stl_files
+
+# Voxelized surfaces touch about this many cells per cell face of area
+SURFACE_CELLS_PER_AREA = 1.5
+
+# Faces whose normals and centroids are computed at a time
+FACE_CHUNK = 1 << 20
+
+
+def _face_geometry(points, faces):
+    """
+    Unit normals and centroids of the faces as float32, and the total area.
+
+    Faces are processed in chunks, so only one chunk of triangles is ever
+    expanded to its vertex coordinates in double precision.
+    """
+    normals = np.empty((len(faces), 3), dtype=np.float32)
+    centroids = np.empty((len(faces), 3), dtype=np.float32)
+    area = 0.0
+    for start in range(0, len(faces), FACE_CHUNK):
+        triangles = points[faces[start:start + FACE_CHUNK]].astype(np.float64)
+        cross = np.cross(triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0])
+        norm = np.linalg.norm(cross, axis=1)
+        area += 0.5 * float(norm.sum())
+        normals[start:start + FACE_CHUNK] = cross / np.where(norm > 0, norm, 1.0)[:, None]
+        centroids[start:start + FACE_CHUNK] = triangles.mean(axis=1)
+    return normals, centroids, area
+
+
+def surface_statistics(points, faces, feature_angle=30.0):
+    """
+    Measure the geometric detail of an indexed triangle surface.
+
+    Curvature is estimated per manifold edge as the angle between the normals
+    of its two faces divided by the distance between their centroids. Edges
+    sharper than feature_angle, and non-manifold edges, are counted as feature
+    edges instead of curvature. Open edges are only the rim of a patch, such
+    as a flat inlet, and are measured separately so they do not drive feature
+    refinement.
+
+    Args:
+        points (numpy.ndarray): Array of shape (m, 3) with vertex coordinates
+        faces (numpy.ndarray): Array of shape (n, 3) with vertex indices
+        feature_angle (float): Angle in degrees between face normals above which
+            an edge is a feature edge, as resolveFeatureAngle in snappyHexMeshDict
+
+    Returns:
+        dict: Statistics with keys 'triangles', 'area', 'edge_length' (p10,
+            median and p90), 'curvature' (median and p90, in 1/length),
+            'feature_length', 'open_length' and 'feature_spacing' (area per
+            feature length)
+    """
+    normals, centroids, area = _face_geometry(points, faces)
+
+    edges, edge_faces, counts = edge_table(faces)
+    lengths = np.linalg.norm(points[edges[:, 1]] - points[edges[:, 0]], axis=1)
+    offsets = np.cumsum(counts) - counts
+
+    manifold = np.flatnonzero(counts == 2)
+    f0 = edge_faces[offsets[manifold]]
+    f1 = edge_faces[offsets[manifold] + 1]
+    angles = np.arccos(np.clip((normals[f0] * normals[f1]).sum(axis=1), -1.0, 1.0))
+    is_sharp = angles >= np.radians(feature_angle)
+
+    smooth = ~is_sharp
+    spacing = np.linalg.norm(centroids[f0[smooth]] - centroids[f1[smooth]], axis=1)
+    curvature = angles[smooth][spacing > 0] / spacing[spacing > 0]
+    if len(curvature) == 0:
+        curvature = np.zeros(1)
+
+    feature_length = float(lengths[counts > 2].sum() + lengths[manifold[is_sharp]].sum())
+
+    return {
+        'triangles': int(len(faces)),
+        'area': area,
+        'edge_length': [float(x) for x in np.percentile(lengths, [10, 50, 90])] if len(lengths) else [0.0] * 3,
+        'curvature': [float(x) for x in np.percentile(curvature, [50, 90])],
+        'feature_length': feature_length,
+        'open_length': float(lengths[counts == 1].sum()),
+        'feature_spacing': area / feature_length if feature_length > 0 else None,
+    }
+
+
+def _level_for_size(base_size, size, max_level):
+    """
+    Lowest refinement level whose cell size is at most size, capped at max_level.
+    """
+    if size is None or size <= 0 or size >= base_size:
+        return 0
+    return int(min(max_level, math.ceil(math.log2(base_size / size))))
+
+
+def _refinement_cost(stats, levels, base_size, n_cells_between_levels):
+    """
+    Rough number of cells a surface's refinement adds, in the spirit of estimate_mesh.
+    """
+    buffer = 1 + 2 * n_cells_between_levels
+    cost = 0.0
+    for level in range(levels['surface'][1]):
+        size = base_size / 2 ** level
+        cost += 7 * buffer * SURFACE_CELLS_PER_AREA * stats['area'] / size ** 2
+    for level in range(levels['feature']):
+        size = base_size / 2 ** level
+        cost += 7 * buffer ** 2 * stats['feature_length'] / size
+    return cost
+
+
+def assign_refinement_levels(surface_stats, base_size, background_cells, cell_budget=None,
+                             n_cells_between_levels=10, cells_per_radius=4.0, cells_per_feature_spacing=2.0,
+                             max_level=6):
+    """
+    Choose surface and feature refinement levels from surface statistics.
+
+    The max surface level resolves the tighter (p90) curvature radius with
+    cells_per_radius cells, the min level the typical (median) one. Feature
+    edges are refined so that neighbouring feature lines are at least
+    cells_per_feature_spacing cells apart. If the estimated cell count exceeds
+    cell_budget, the level costing the most cells is lowered one step at a
+    time until the estimate fits.
+
+    Args:
+        surface_stats (dict): Surface name to statistics from surface_statistics
+        base_size (float): Edge length of the background cells
+        background_cells (int): Number of background cells
+        cell_budget (int): Maximum estimated cell count, None for no limit
+        n_cells_between_levels (int): nCellsBetweenLevels of the snappyHexMeshDict
+        cells_per_radius (float): Cells across a curvature radius
+        cells_per_feature_spacing (float): Cells between neighbouring feature lines
+        max_level (int): Highest level ever assigned
+
+    Returns:
+        dict: Surface name to {'surface': [min, max], 'feature': level, 'cost': cells}
+    """
+    levels = {}
+    for name, stats in surface_stats.items():
+        median_curvature, tight_curvature = stats['curvature']
+        min_level = _level_for_size(base_size, 1.0 / median_curvature / cells_per_radius
+                                    if median_curvature > 0 else None, max_level)
+        surface_max = _level_for_size(base_size, 1.0 / tight_curvature / cells_per_radius
+                                      if tight_curvature > 0 else None, max_level)
+        feature_spacing = stats['feature_spacing']
+        feature = _level_for_size(base_size, feature_spacing / cells_per_feature_spacing
+                                  if feature_spacing else None, max_level)
+        levels[name] = {'surface': [min(min_level, surface_max), surface_max], 'feature': feature}
+
+    def total_cells():
+        return background_cells + sum(
+            _refinement_cost(surface_stats[name], levels[name], base_size, n_cells_between_levels)
+            for name in levels)
+
+    if cell_budget is not None:
+        while total_cells() > cell_budget:
+            # Lower whichever level contributes the most cells at its finest step
+            candidates = []
+            for name, entry in levels.items():
+                stats = surface_stats[name]
+                if entry['surface'][1] > 0:
+                    size = base_size / 2 ** (entry['surface'][1] - 1)
+                    candidates.append((stats['area'] / size ** 2, name, 'surface'))
+                if entry['feature'] > 0:
+                    size = base_size / 2 ** (entry['feature'] - 1)
+                    candidates.append(((1 + 2 * n_cells_between_levels) * stats['feature_length'] / size, name, 'feature'))
+            if not candidates:
+                print(f"Warning: background mesh alone exceeds the budget of {cell_budget} cells")
+                break
+            _, name, kind = max(candidates)
+            if kind == 'surface':
+                surface_min, surface_max = levels[name]['surface']
+                levels[name]['surface'] = [min(surface_min, surface_max - 1), surface_max - 1]
+            else:
+                levels[name]['feature'] -= 1
+
+    for name, entry in levels.items():
+        entry['cost'] = int(_refinement_cost(surface_stats[name], entry, base_size, n_cells_between_levels))
+    return levels
+
+
+def compute_refinement_levels(stl_files, min_coords, max_coords, cells, cell_budget=None,
+                              n_cells_between_levels=10, feature_angle=30.0, **kwargs):
+    """
+    Compute geometry-aware refinement levels for the surfaces of a case.
+
+    Levels are counted from the coarsest axis of the background cells, so the
+    sizes they target are reached in every direction of anisotropic cells.
+
+    Args:
+        stl_files (list): Paths of the STL files
+        min_coords (numpy.ndarray): Minimum [x, y, z] of the background block
+        max_coords (numpy.ndarray): Maximum [x, y, z] of the background block
+        cells (tuple): Number of background cells in x, y, z directions
+        cell_budget (int): Maximum estimated cell count, None for no limit
+        n_cells_between_levels (int): nCellsBetweenLevels of the snappyHexMeshDict
+        feature_angle (float): resolveFeatureAngle of the snappyHexMeshDict
+        **kwargs: Passed on to assign_refinement_levels
+
+    Returns:
+        dict: Surface name to {'surface': [min, max], 'feature': level, 'cost':
+            cells, 'statistics': dict}
+    """
+    min_coords = np.asarray(min_coords, dtype=np.float64)
+    max_coords = np.asarray(max_coords, dtype=np.float64)
+    cells = np.asarray(cells, dtype=np.int64)
+    base_size = float(np.max((max_coords - min_coords) / cells))
+
+    surface_stats = {}
+    for stl_file in stl_files:
+        points, faces = weld_stl_files([stl_file])
+        surface_stats[Path(stl_file).name.split('.')[0]] = surface_statistics(points, faces, feature_angle)
+
+    levels = assign_refinement_levels(surface_stats, base_size, int(np.prod(cells)), cell_budget,
+                                      n_cells_between_levels, **kwargs)
+    for name, entry in levels.items():
+        entry['statistics'] = surface_stats[name]
+    return levels
+
+
+def write_refinement_levels(levels, output_path):
+    """
+    Write computed refinement levels to a JSON file.
+
+    Args:
+        levels (dict): Levels returned by compute_refinement_levels
+        output_path (str): Path of the JSON file
+    """
+    with open(output_path, 'w') as f:
+        json.dump(levels, f, indent=2)
@@ -1,36 +1,153 @@
 import os
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from stl_scan import BINARY_HEADER_SIZE, binary_header, is_binary_stl
 
-def rename_stl_first_line(directory):
+# Bytes read from the end of an ASCII file to find its last line
+TAIL_SIZE = 4096
+
+
+def _rename_binary(file_path, new_name):
+    """
+    Patch the 80 byte header of a binary STL file in place.
+
+    Returns:
+        bool: True if the header was changed
+    """
+    header = binary_header(new_name)
+    with open(file_path, 'r+b') as f:
+        if f.read(BINARY_HEADER_SIZE) == header:
+            return False
+        f.seek(0)
+        f.write(header)
+    return True
+
+
+def _ascii_line_spans(f, size):
+    """
+    Find the first and last lines of an ASCII file without reading the middle.
+
+    Returns:
+        tuple: (first_line, last_start, last_line) where last_start is the byte
+            offset of the last line. For single line files, or a last line too
+            long to be an 'endsolid' line, last_line is empty and last_start is
+            the file size.
+    """
+    f.seek(0)
+    first_line = f.readline()
+    if len(first_line) >= size:
+        return first_line, size, b''
+
+    f.seek(max(len(first_line), size - TAIL_SIZE))
+    tail_start = f.tell()
+    tail = f.read()
+    search_end = len(tail) - 1 if tail.endswith(b'\n') else len(tail)
+    cut = tail.rfind(b'\n', 0, search_end) + 1
+    if cut == 0 and tail_start > len(first_line):
+        return first_line, size, b''
+    return first_line, tail_start + cut, tail[cut:]
+
+
+def _rename_ascii(file_path, new_name):
+    """
+    Rewrite the first 'solid' line and the last 'endsolid' line of an ASCII STL file.
+
+    Lines of unchanged length are patched in place. Otherwise the file is
+    streamed through a temporary file that atomically replaces the original.
+
+    Returns:
+        bool: True if the file was changed
+    """
+    size = os.path.getsize(file_path)
+    with open(file_path, 'rb') as f:
+        first_line, last_start, last_line = _ascii_line_spans(f, size)
+
+    new_first = f'solid {new_name}\n'.encode('utf-8')
+    new_last = f'endsolid {new_name}\n'.encode('utf-8') if b'endsolid' in last_line else last_line
+
+    if new_first == first_line and new_last == last_line:
+        return False
+
+    # Same-length lines can be patched without touching the rest of the file
+    if len(new_first) == len(first_line) and len(new_last) == len(last_line):
+        with open(file_path, 'r+b') as f:
+            f.write(new_first)
+            f.seek(last_start)
+            f.write(new_last)
+        return True
+
+    directory = os.path.dirname(os.path.abspath(file_path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.rename_stl_', suffix='.tmp')
+    try:
+        with open(file_path, 'rb') as src, os.fdopen(fd, 'wb') as dst:
+            dst.write(new_first)
+            src.seek(len(first_line))
+            remaining = last_start - len(first_line)
+            while remaining > 0:
+                block = src.read(min(remaining, 1 << 20))
+                if not block:
+                    break
+                dst.write(block)
+                remaining -= len(block)
+            dst.write(new_last)
+        shutil.copymode(file_path, tmp_path)
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+    return True
+
+
+def rename_stl_file(file_path):
+    """
+    Set the solid name of an STL file to its filename without extension.
+
+    ASCII files get 'solid <name>' as their first line and, if the last line is
+    an 'endsolid' line, 'endsolid <name>' as their last line. Binary files get
+    <name> written into their 80 byte header in place.
+
+    Args:
+        file_path (str): Path to the STL file
+
+    Returns:
+        bool: True if the file was changed, False if it already had the name
+    """
+    new_name = os.path.splitext(os.path.basename(file_path))[0]
+    if is_binary_stl(file_path):
+        return _rename_binary(file_path, new_name)
+    return _rename_ascii(file_path, new_name)
+
+
+def _process(file_path):
+    try:
+        changed = rename_stl_file(file_path)
+        return f'Processed: {file_path}' if changed else f'Unchanged: {file_path}'
+    except Exception as e:
+        return f'Error processing {file_path}: {str(e)}'
+
+
+def rename_stl_first_line(directory, workers=8):
+    """
+    Rename the solids of all STL files under a directory after their filenames.
+
+    Args:
+        directory (str): Directory to search recursively for STL files
+        workers (int): Number of files processed concurrently
+    """
     # Walk through all directories and subdirectories
+    file_paths = []
     for root, dirs, files in os.walk(directory):
         # Get all STL files in current directory
         stl_files = [f for f in files if f.endswith('.stl')]
-        
-        for stl_file in stl_files:
-            file_path = os.path.join(root, stl_file)
-            new_name = os.path.splitext(stl_file)[0]  # Get filename without extension
-            
-            try:
-                # Read the file
-                with open(file_path, 'r') as file:
-                    lines = file.readlines()
-                
-                # Replace the first line
-                if lines:
-                    lines[0] = f'solid {new_name}\n'
-                
-                # Replace the last line if it contains 'endsolid'
-                if lines and 'endsolid' in lines[-1]:
-                    lines[-1] = f'endsolid {new_name}\n'
-                
-                # Write back to the file
-                with open(file_path, 'w') as file:
-                    file.writelines(lines)
-                
-                print(f'Processed: {file_path}')
-            except Exception as e:
-                print(f'Error processing {file_path}: {str(e)}')
+        file_paths.extend(os.path.join(root, stl_file) for stl_file in stl_files)
+
+    # The work is almost all I/O, so threads are enough to overlap it
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        for message in pool.map(_process, file_paths):
+            print(message)
 
 if __name__ == '__main__':
     stl_directory = 'geometry'  # Directory containing STL files
-    rename_stl_first_line(stl_directory) 
\ No newline at end of file
+    rename_stl_first_line(stl_directory)
@@ -1,9 +1,65 @@
+import argparse
+import contextlib
+import io
+import json
 import os
-import shutil
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
-from generate_blockMeshDict import write_blockMeshDict
+from generate_blockMeshDict import blockMeshDict_body, compute_block_mesh, write_blockMeshDict
 from generate_surfaceFeatureExtractDict import write_surfaceFeatureExtractDict
 from generate_snappyHexMeshDict import generate_snappyHexMeshDict
+from geometry_cache import DEFAULT_CACHE_NAME, GeometryCache, file_signature
+from case_manifest import CaseManifest, generator_fingerprint
+from stl_staging import STAGING_MODES, stage_file
+from convert_stl import convert_stl_to_binary
+from decimate_stl import decimate_stl, merge_distance, target_edge_lengths
+from mesh_estimate import check_budget, estimate_mesh, tune_cell_limits, write_estimate
+from location_in_mesh import find_location_in_mesh
+from feature_edges import feature_extractor, write_surface_features
+from refinement_levels import compute_refinement_levels, write_refinement_levels
+from proximity import find_gap_regions, gap_refinement_regions, write_gap_regions
+from stl_validation import check_validation, validate_stl_files, write_validation
+from geometry_stats import geometry_statistics, write_statistics
+from foam_dict import Keyword, write_foam_file, write_static_foam_file
+from metrics import StageMetrics, case_summary, write_batch_summary, write_case_metrics
+from generate_decomposeParDict import DEFAULT_CELLS_PER_PROC, choose_subdomains, write_allrun, write_decomposeParDict
+
+# Dictionaries that are the same for every case
+MESH_QUALITY_DICT = {
+    '//Here we use standard mesh quality settings': None,
+    '\n// Include defaults parameters from master dictionary': None,
+    '#includeEtc': '"caseDicts/meshQualityDict"',
+    '\n': None,
+}
+FV_SOLUTION = {}
+FV_SCHEMES = {
+    '//Forget this dictionary': None,
+    '\ngradSchemes': {},
+    '\ndivSchemes': {},
+    '\nlaplacianSchemes': {},
+}
+CONTROL_DICT = {
+    '//Just dummy entries, don\'t worry': None,
+    Keyword('\napplication'): 'icoFoam',
+    Keyword('\nstartFrom'): 'startTime',
+    Keyword('\nstartTime'): 0,
+    Keyword('\nstopAt'): 'endTime',
+    Keyword('\nendTime'): 50,
+    Keyword('\ndeltaT'): 1,
+    Keyword('\nwriteControl'): 'timeStep',
+    Keyword('\nwriteInterval'): 20,
+    Keyword('\npurgeWrite'): 0,
+    Keyword('\nwriteFormat'): 'ascii',
+    Keyword('\nwritePrecision'): 6,
+    Keyword('\nwriteCompression'): 'uncompressed',
+    Keyword('\ntimeFormat'): 'general',
+    Keyword('\ntimePrecision'): 6,
+    Keyword('\nrunTimeModifiable'): 'yes',
+    '\n': None,
+}
 
 def create_meshQualityDict(output_path):
     """
@@ -12,33 +68,7 @@ def create_meshQualityDict(output_path):
     Args:
         output_path (str): Path where to write the meshQualityDict file
     """
-    meshQualityDict_content = """/*--------------------------------*- C++ -*----------------------------------*\\
-| =========                 |                                                 |
-| \\\\      /  F ield         | OpenFOAM: The Open Source CFD Toolbox           |
-|  \\\\    /   O peration     | Version:  4.0                                   |
-|   \\\\  /    A nd           | Web:      www.OpenFOAM.org                      |
-|    \\\\/     M anipulation  |                                                 |
-\\*---------------------------------------------------------------------------*/
-FoamFile
-{
-    version     2.0;
-    format      ascii;
-    class       dictionary;
-    object      meshQualityDict;
-}
-
-// * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * //
-
-//Here we use standard mesh quality settings
-
-// Include defaults parameters from master dictionary
-#includeEtc "caseDicts/meshQualityDict"
-
-
-// ************************************************************************* //"""
-    
-    with open(output_path, 'w') as f:
-        f.write(meshQualityDict_content)
+    write_static_foam_file(output_path, 'meshQualityDict', MESH_QUALITY_DICT, blank_line=True)
 
 def create_fvSolution(output_path):
     """
@@ -47,27 +77,7 @@ def create_fvSolution(output_path):
     Args:
         output_path (str): Path where to write the fvSolution file
     """
-    fvSolution_content = """/*--------------------------------*- C++ -*----------------------------------*\\
-| =========                 |                                                 |
-| \\\\      /  F ield         | OpenFOAM: The Open Source CFD Toolbox           |
-|  \\\\    /   O peration     | Version:  4.0                                   |
-|   \\\\  /    A nd           | Web:      www.OpenFOAM.org                      |
-|    \\\\/     M anipulation  |                                                 |
-\\*---------------------------------------------------------------------------*/
-FoamFile
-{
-    version     2.0;
-    format      ascii;
-    class       dictionary;
-    location    "system";
-    object      fvSolution;
-}
-// * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * //
-
-// ************************************************************************* //"""
-    
-    with open(output_path, 'w') as f:
-        f.write(fvSolution_content)
+    write_static_foam_file(output_path, 'fvSolution', FV_SOLUTION, location='system')
 
 def create_fvSchemes(output_path):
     """
@@ -76,41 +86,7 @@ def create_fvSchemes(output_path):
     Args:
         output_path (str): Path where to write the fvSchemes file
     """
-    fvSchemes_content = """/*--------------------------------*- C++ -*----------------------------------*\\
-| =========                 |                                                 |
-| \\\\      /  F ield         | OpenFOAM: The Open Source CFD Toolbox           |
-|  \\\\    /   O peration     | Version:  4.0                                   |
-|   \\\\  /    A nd           | Web:      www.OpenFOAM.org                      |
-|    \\\\/     M anipulation  |                                                 |
-\\*---------------------------------------------------------------------------*/
-FoamFile
-{
-    version     2.0;
-    format      ascii;
-    class       dictionary;
-    location    "system";
-    object      fvSchemes;
-}
-// * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * //
-
-//Forget this dictionary
-
-gradSchemes
-{
-}
-
-divSchemes
-{
-}
-
-laplacianSchemes
-{
-}
-
-// ************************************************************************* //"""
-    
-    with open(output_path, 'w') as f:
-        f.write(fvSchemes_content)
+    write_static_foam_file(output_path, 'fvSchemes', FV_SCHEMES, location='system')
 
 def create_controlDict(output_path):
     """
@@ -119,69 +95,726 @@ def create_controlDict(output_path):
     Args:
         output_path (str): Path where to write the controlDict file
     """
-    controlDict_content = """/*--------------------------------*- C++ -*----------------------------------*\\
-| =========                 |                                                 |
-| \\\\      /  F ield         | OpenFOAM: The Open Source CFD Toolbox           |
-|  \\\\    /   O peration     | Version:  4.0                                   |
-|   \\\\  /    A nd           | Web:      www.OpenFOAM.org                      |
-|    \\\\/     M anipulation  |                                                 |
-\\*---------------------------------------------------------------------------*/
-FoamFile
-{
-    version     2.0;
-    format      ascii;
-    class       dictionary;
-    location    "system";
-    object      controlDict;
-}
-// * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * //
-
-//Just dummy entries, don't worry
-
-application     icoFoam;
-
-startFrom       startTime;
-
-startTime       0;
-
-stopAt          endTime;
+    write_static_foam_file(output_path, 'controlDict', CONTROL_DICT, location='system')
 
-endTime         50;
-
-deltaT          1;
-
-writeControl    timeStep;
-
-writeInterval   20;
-
-purgeWrite      0;
-
-writeFormat     ascii;
+def setup_case(geom_subdir, meshes_dir='meshes', cache=None, force=False, staging='copy', to_binary=False, compress=False,
+               padding=1.0, cells=(20, 20, 30), cell_size=None, cell_budget=None, relative_padding=None,
+               surface_levels=None, estimate=False, max_cells=None, max_memory_gb=None, on_over_budget='warn',
+               tune_limits=False, location_in_mesh='outside', extract_features=False, included_angle=180,
+               auto_levels=False, level_cell_budget=None, detect_gaps=False, gap_cells=3.0,
+               gap_distance_refinement=False, decompose_method=None, n_procs=None,
+               cells_per_proc=DEFAULT_CELLS_PER_PROC, case_name=None, surface_dir=None, validate=None,
+               validate_workers=1, decimate=None, statistics=False, feature_workers=1, result_cache=None):
+    """
+    Set up the mesh directory and configuration files for a single geometry subdirectory.
+    
+    Outputs are tracked in a manifest inside the case directory. A file is only
+    rewritten when the hashes of its inputs or its generator parameters changed,
+    so re-running on unchanged geometry leaves every mtime untouched.
+    
+    Args:
+        geom_subdir (str): Path to the geometry subdirectory containing the STL files
+        meshes_dir (str): Path to the meshes directory
+        cache (GeometryCache): Optional STL metadata cache, also used for content hashes
+        force (bool): Regenerate every output even if it is up to date
+        staging (str): How STL files are staged into constant/triSurface, one of
+            'hardlink', 'reflink', 'symlink' or 'copy'
+        to_binary (bool): Convert the STL files to binary while staging them
+        compress (bool): Gzip-compress the converted STL files, as '<name>.stl.gz'
+        padding (float): Padding added around the geometry for the background block
+        cells (tuple): Fixed number of background cells in x, y, z directions
+        cell_size (float): Target edge length of cubic background cells, overrides cells
+        cell_budget (int): Maximum total number of cubic background cells, overrides cells
+        relative_padding (float): Padding as a fraction of the largest bounding box
+            dimension, overrides padding
+        surface_levels (dict or tuple): Surface name to (min, max) refinement level,
+            or one (min, max) for every surface
+        estimate (bool): Estimate the final cell count and memory into mesh_estimate.json.
+            Implied by max_cells, max_memory_gb and tune_limits.
+        max_cells (int): Cell budget checked against the estimate
+        max_memory_gb (float): Memory budget in GiB checked against the estimate
+        on_over_budget (str): 'warn' to print a warning or 'error' to fail the case
+            when the estimate exceeds a budget
+        tune_limits (bool): Set maxLocalCells and maxGlobalCells from the estimate
+        location_in_mesh (str or tuple): 'outside' to compute a point around the
+            surfaces (external flow), 'inside' to compute one inside them
+            (internal flow), or an explicit (x, y, z) point
+        extract_features (bool): Write the '<name>.eMesh' feature edge files directly,
+            so surfaceFeatureExtract does not have to be run
+        included_angle (float): includedAngle for feature edge extraction
+        auto_levels (bool): Compute surface and feature refinement levels from the
+            curvature, edge lengths and feature density of each surface into
+            refinement_levels.json, instead of using surface_levels
+        level_cell_budget (int): Cell budget the computed levels are fitted to,
+            defaults to max_cells
+        detect_gaps (bool): Find gaps narrower than gap_cells background cells
+            between the surfaces into gap_regions.json, and refine them with
+            searchableBox refinementRegions
+        gap_cells (float): Gap width threshold in background cells
+        gap_distance_refinement (bool): Also refine within the gap width of every
+            surface on a gap
+        decompose_method (str): Write a decomposeParDict using 'scotch', 'hierarchical'
+            or 'simple' decomposition, and an Allrun script meshing in parallel
+        n_procs (int): Cores available to each case, defaults to all CPU cores
+        cells_per_proc (int): Target cells per subdomain, applied to the estimated
+            cell count if there is one and the background cell count otherwise
+        case_name (str): Name of the case directory, defaults to the name of geom_subdir
+        surface_dir (str): Directory already holding the staged STL and .eMesh files,
+            see stage_shared_surfaces. Its files are hardlinked (or, where that is not
+            possible, copied) into constant/triSurface, and nothing is staged or
+            extracted for the case itself.
+        validate (str): Check the STL files for open, non-manifold and flipped edges
+            and degenerate or duplicate triangles into stl_validation.json before
+            anything else, then 'warn' about issues or fail the case with 'error'
+        validate_workers (int): Processes validating the surfaces in parallel,
+            0 for one per CPU core
+        decimate (str or float): Clean the surfaces (merge vertices within the
+            mergeTolerance distance, drop degenerate and duplicate faces) and
+            decimate them to this edge length, or with 'auto' to the size of the
+            finest cells refining each surface, before staging them as binary STL
+        statistics (bool): Compute the bounding box, area, centroid, volume, edge
+            length histogram and normal distribution of each surface in one
+            out-of-core pass into geometry_stats.json
+        feature_workers (int): Processes extracting the feature edges of the
+            surfaces in parallel, 0 for one per CPU core
+        result_cache (ResultCache): Optional cache of the background block and the
+            analyses of the surfaces, shared with other cases of the same geometry
+        
+    Returns:
+        dict: Lists of output paths under the keys 'written', 'skipped' and 'removed',
+            the number of STL bytes written under 'bytes_staged', and the wall time,
+            CPU time and peak RSS of each stage under 'metrics'
+    """
+    geom_subdir = Path(geom_subdir)
+    print(f"\nProcessing geometry subdirectory: {geom_subdir.name}")
+    
+    # Create corresponding mesh directory structure
+    mesh_subdir = Path(meshes_dir) / (case_name or geom_subdir.name)
+    constant_dir = mesh_subdir / 'constant' / 'triSurface'
+    system_dir = mesh_subdir / 'system'
+    
+    # Create directories; cases set up by earlier versions may have
+    # constant/triSurface as a link to a shared surface directory
+    if constant_dir.is_symlink():
+        constant_dir.unlink()
+    os.makedirs(constant_dir, exist_ok=True)
+    os.makedirs(system_dir, exist_ok=True)
+    
+    # Create empty foam.foam file
+    foam_file = mesh_subdir / 'foam.foam'
+    if not foam_file.exists():
+        foam_file.touch()
+        print(f"Created foam.foam in {mesh_subdir}")
+    
+    stl_files = sorted(geom_subdir.glob('*.stl'))
+    if not stl_files:
+        print(f"Warning: No STL files found in {geom_subdir}")
+        return {'written': [], 'skipped': [], 'removed': [], 'bytes_staged': 0, 'metrics': []}
+    
+    manifest = CaseManifest(mesh_subdir)
+    metrics = StageMetrics()
+    written = []
+    skipped = []
+    regenerate = _regenerator(manifest, metrics, force, written, skipped)
+    
+    # Hash the STL contents; with a cache this is only done for changed files
+    with metrics.stage('hash'):
+        stl_hashes = _stl_hashes(stl_files, cache)
+    stl_names = [stl_file.name for stl_file in stl_files]
+    
+    def derived(name, params, compute):
+        # Results other cases of the same surfaces may already have computed
+        if result_cache is None:
+            return compute()
+        return result_cache.get(name, stl_hashes, params, compute)
+    
+    # Check the geometry before anything is staged or computed from it
+    if validate is not None:
+        validation_path = mesh_subdir / 'stl_validation.json'
+        regenerate(
+            validation_path,
+            stl_hashes,
+            {'on_invalid': validate},
+            validate_stl_files,
+            lambda: write_validation(validate_stl_files(stl_files, validate_workers), str(validation_path), validate)
+        )
+        with open(validation_path) as f:
+            validation = json.load(f)
+        if validation['ok']:
+            print(f"Validated {len(stl_files)} STL files: watertight, consistently oriented, no degenerate triangles")
+        check_validation(validation, validate)
+    
+    # Summarise the geometry with bounded memory, however large the surfaces
+    if statistics:
+        statistics_path = mesh_subdir / 'geometry_stats.json'
+        regenerate(
+            statistics_path,
+            stl_hashes,
+            {},
+            geometry_statistics,
+            lambda: write_statistics(geometry_statistics(stl_files), str(statistics_path))
+        )
+        with open(statistics_path) as f:
+            combined = json.load(f)['combined']
+        edges = combined['edge_length']
+        print(f"Geometry: {combined['triangle_count']} triangles, area {combined['surface_area']:.6g}, "
+              f"volume {combined['volume']:.6g}, edge length {edges['min']:.3g}-{edges['max']:.3g} "
+              f"(mean {edges['mean']:.3g})")
+    
+    block_params = {
+        'padding': padding,
+        'cells': cells,
+        'cell_size': cell_size,
+        'cell_budget': cell_budget,
+        'relative_padding': relative_padding,
+    }
+    
+    # The background block is needed by several outputs, but only computed
+    # when one of them is out of date, and then once. With a cache, parsing
+    # the STL files for their metadata is timed apart from combining their
+    # bounding boxes; without one, both happen in a single streaming pass.
+    block = []
+    
+    def compute_block():
+        if cache is not None:
+            with metrics.stage('parse'):
+                for stl_file in stl_files:
+                    cache.get_metadata(stl_file)
+        with metrics.stage('bbox'):
+            return compute_block_mesh(str(geom_subdir), cache=cache, **block_params)
+    
+    def block_mesh():
+        if not block:
+            block.append(derived('block_mesh', block_params, compute_block))
+        return block[0]
+    
+    # Choose refinement levels from the geometry itself
+    feature_levels = None
+    if auto_levels:
+        levels_path = mesh_subdir / 'refinement_levels.json'
+        levels_budget = level_cell_budget if level_cell_budget is not None else max_cells
+        
+        def run_levels():
+            min_coords, max_coords, block_cells = block_mesh()
+            write_refinement_levels(
+                derived('refinement_levels', dict(block_params, level_cell_budget=levels_budget),
+                        lambda: compute_refinement_levels(stl_files, min_coords, max_coords, block_cells, levels_budget)),
+                str(levels_path)
+            )
+        
+        regenerate(levels_path, stl_hashes, dict(block_params, level_cell_budget=levels_budget),
+                   compute_refinement_levels, run_levels)
+        with open(levels_path) as f:
+            levels = json.load(f)
+        surface_levels = {name: tuple(entry['surface']) for name, entry in levels.items()}
+        feature_levels = {name: entry['feature'] for name, entry in levels.items()}
+        for name, entry in levels.items():
+            print(f"Refinement levels for {name}: surface ({entry['surface'][0]} {entry['surface'][1]}), "
+                  f"feature {entry['feature']}")
+    
+    # Decimate the surfaces down to the finest cells that will resolve them
+    decimate_lengths = None
+    merge = 0.0
+    if decimate is not None and surface_dir is None:
+        min_coords, max_coords, block_cells = block_mesh()
+        merge = merge_distance(min_coords, max_coords)
+        if decimate == 'auto':
+            decimate_lengths = target_edge_lengths(stl_files, min_coords, max_coords, block_cells,
+                                                   surface_levels, feature_levels)
+        else:
+            decimate_lengths = {stl_file.name: float(decimate) for stl_file in stl_files}
+    
+    # Stage STL files into constant/triSurface and extract their feature edges,
+    # unless a shared surface directory already holds them
+    if surface_dir is None:
+        bytes_staged = _stage_surfaces(stl_files, stl_hashes, constant_dir, regenerate, staging, to_binary,
+                                       compress, extract_features, included_angle, decimate_lengths, merge,
+                                       feature_workers)
+    else:
+        bytes_staged = _share_surfaces(surface_dir, constant_dir, regenerate)
+    
+    # Generate blockMeshDict
+    blockMeshDict_path = system_dir / 'blockMeshDict'
+    if regenerate(
+        blockMeshDict_path,
+        stl_hashes,
+        block_params,
+        (write_blockMeshDict, write_foam_file),
+        lambda: write_foam_file(str(blockMeshDict_path), 'blockMeshDict', blockMeshDict_body(*block_mesh()))
+    ):
+        print(f"Generated blockMeshDict in {system_dir}")
+    
+    # Generate surfaceFeatureExtractDict
+    surfaceFeatureExtractDict_path = system_dir / 'surfaceFeatureExtractDict'
+    if regenerate(
+        surfaceFeatureExtractDict_path,
+        {},
+        {'stl_names': stl_names, 'included_angle': included_angle},
+        (write_surfaceFeatureExtractDict, write_foam_file),
+        lambda: write_surfaceFeatureExtractDict(
+            output_path=str(surfaceFeatureExtractDict_path),
+            stl_dir=str(geom_subdir),
+            included_angle=included_angle
+        )
+    ):
+        print(f"Generated surfaceFeatureExtractDict in {system_dir}")
+    
+    # Find narrow gaps that need refinement regions
+    refinement_regions = None
+    if detect_gaps:
+        gaps_path = mesh_subdir / 'gap_regions.json'
+        
+        def run_gaps():
+            min_coords, max_coords, block_cells = block_mesh()
+            write_gap_regions(
+                derived('gap_regions', dict(block_params, gap_cells=gap_cells),
+                        lambda: find_gap_regions(stl_files, min_coords, max_coords, block_cells, gap_cells)),
+                str(gaps_path)
+            )
+        
+        regenerate(gaps_path, stl_hashes, dict(block_params, gap_cells=gap_cells), find_gap_regions, run_gaps)
+        with open(gaps_path) as f:
+            gaps = json.load(f)
+        refinement_regions = gap_refinement_regions(gaps, gap_distance_refinement)
+        for region in gaps['regions']:
+            print(f"Gap region {region['name']}: {region['gap']:.6g} wide, refined to level {region['level']}")
+    
+    # Estimate the final mesh size before any OpenFOAM time is spent
+    mesh_estimate = None
+    if estimate or tune_limits or max_cells is not None or max_memory_gb is not None:
+        estimate_path = mesh_subdir / 'mesh_estimate.json'
+        
+        def run_estimate():
+            min_coords, max_coords, block_cells = block_mesh()
+            write_estimate(
+                derived('mesh_estimate', dict(block_params, surface_levels=surface_levels),
+                        lambda: estimate_mesh(stl_files, min_coords, max_coords, block_cells, surface_levels)),
+                str(estimate_path)
+            )
+        
+        regenerate(estimate_path, stl_hashes, dict(block_params, surface_levels=surface_levels),
+                   estimate_mesh, run_estimate)
+        with open(estimate_path) as f:
+            mesh_estimate = json.load(f)
+        print(f"Estimated {mesh_estimate['estimated_cells']} cells and "
+              f"{mesh_estimate['estimated_memory_bytes'] / 2**30:.2f} GiB for snappyHexMesh")
+        check_budget(
+            mesh_estimate,
+            max_cells,
+            max_memory_gb * 2**30 if max_memory_gb is not None else None,
+            on_over_budget
+        )
+    
+    # Decompose the case for parallel meshing
+    n_subdomains = 1
+    if decompose_method is not None:
+        min_coords, max_coords, block_cells = block_mesh()
+        n_cells = mesh_estimate['estimated_cells'] if mesh_estimate is not None else int(block_cells[0] * block_cells[1] * block_cells[2])
+        n_subdomains = choose_subdomains(n_cells, n_procs, cells_per_proc)
+        decompose_params = {
+            'n_subdomains': n_subdomains,
+            'method': decompose_method,
+            'extent': [float(hi - lo) for lo, hi in zip(min_coords, max_coords)],
+            'extract_features': not extract_features,
+        }
+        decomposeParDict_path = system_dir / 'decomposeParDict'
+        if regenerate(
+            decomposeParDict_path,
+            {},
+            decompose_params,
+            (write_decomposeParDict, write_foam_file),
+            lambda: write_decomposeParDict(str(decomposeParDict_path), **decompose_params)
+        ):
+            print(f"Generated decomposeParDict in {system_dir} ({n_subdomains} subdomains, {decompose_method})")
+        if regenerate(
+            mesh_subdir / 'Allrun',
+            {},
+            {'n_subdomains': n_subdomains, 'extract_features': not extract_features},
+            write_allrun,
+            lambda: write_allrun(str(mesh_subdir), n_subdomains, not extract_features)
+        ):
+            print(f"Created Allrun in {mesh_subdir}")
+    
+    # Generate snappyHexMeshDict
+    snappyHexMeshDict_path = system_dir / 'snappyHexMeshDict'
+    max_local_cells, max_global_cells = 100000, 2000000
+    if tune_limits:
+        max_local_cells, max_global_cells = tune_cell_limits(mesh_estimate, n_subdomains)
+    snappy_params = {
+        'surface_levels': surface_levels,
+        'feature_levels': feature_levels,
+        'refinement_regions': refinement_regions,
+        'max_local_cells': max_local_cells,
+        'max_global_cells': max_global_cells,
+    }
+    # A computed locationInMesh depends on the STL contents and the block mesh
+    snappy_inputs = {}
+    if isinstance(location_in_mesh, str):
+        snappy_inputs = stl_hashes
+    
+    def write_snappy():
+        location = location_in_mesh
+        if isinstance(location, str):
+            min_coords, max_coords, block_cells = block_mesh()
+            location = derived('location_in_mesh', dict(block_params, region=location_in_mesh),
+                               lambda: find_location_in_mesh(stl_files, min_coords, max_coords, block_cells,
+                                                             region=location_in_mesh))
+            print(f"Computed locationInMesh ({location[0]:.6g} {location[1]:.6g} {location[2]:.6g})")
+        generate_snappyHexMeshDict(
+            stl_dir=str(geom_subdir),
+            output_path=str(snappyHexMeshDict_path),
+            location_in_mesh=location,
+            **snappy_params
+        )
+    
+    if regenerate(
+        snappyHexMeshDict_path,
+        snappy_inputs,
+        dict(snappy_params, stl_names=stl_names, block=block_params, location_in_mesh=location_in_mesh),
+        (generate_snappyHexMeshDict, write_foam_file),
+        write_snappy
+    ):
+        print(f"Generated snappyHexMeshDict in {system_dir}")
+    
+    # Create the static controlDict, fvSchemes, fvSolution and meshQualityDict
+    for name, create in [
+        ('controlDict', create_controlDict),
+        ('fvSchemes', create_fvSchemes),
+        ('fvSolution', create_fvSolution),
+        ('meshQualityDict', create_meshQualityDict),
+    ]:
+        output_path = system_dir / name
+        if regenerate(output_path, {}, {}, (create, write_foam_file), lambda: create(str(output_path))):
+            print(f"Created {name} in {system_dir}")
+    
+    # Remove outputs of earlier runs that are no longer generated
+    removed = manifest.prune()
+    for key in removed:
+        print(f"Removed stale {key} from {mesh_subdir}")
+    manifest.save()
+    write_case_metrics(mesh_subdir, 'setup', metrics.records)
+    
+    print(f"{len(written)} files written, {len(skipped)} up to date and skipped")
+    for output_path in skipped:
+        print(f"Skipped {output_path}")
+    
+    return {'written': written, 'skipped': skipped, 'removed': removed, 'bytes_staged': bytes_staged,
+            'metrics': metrics.records}
 
-writePrecision  6;
+def stage_shared_surfaces(geom_subdir, surface_dir, cache=None, force=False, staging='copy', to_binary=False,
+                          compress=False, extract_features=False, included_angle=180, decimate=None,
+                          feature_workers=1):
+    """
+    Stage the STL files of a geometry subdirectory into a directory shared by several cases.
+    
+    The directory is tracked by its own manifest, kept in its parent, so it is
+    only updated when the STL files or staging options change. Cases point
+    their constant/triSurface at it with setup_case(..., surface_dir=surface_dir).
+    
+    Args:
+        geom_subdir (str): Path to the geometry subdirectory containing the STL files
+        surface_dir (str): Shared triSurface directory, e.g. meshes/.shared/<case>/triSurface
+        cache (GeometryCache): Optional STL metadata cache, also used for content hashes
+        force (bool): Restage every file even if it is up to date
+        staging (str): 'hardlink', 'reflink', 'symlink' or 'copy'
+        to_binary (bool): Convert the STL files to binary while staging them
+        compress (bool): Gzip-compress the converted STL files
+        extract_features (bool): Also write the '<name>.eMesh' feature edge files
+        included_angle (float): includedAngle for feature edge extraction
+        decimate (float): Clean and decimate the surfaces to this edge length. The
+            'auto' length of setup_case depends on each case's refinement levels
+            and is not available for shared surfaces.
+        feature_workers (int): Processes extracting feature edges in parallel,
+            0 for one per CPU core
+        
+    Returns:
+        dict: Lists of output paths under the keys 'written', 'skipped' and 'removed',
+            the number of STL bytes written under 'bytes_staged' and the stage
+            metrics under 'metrics'
+    """
+    if decimate == 'auto':
+        raise ValueError("Shared surfaces need an explicit decimation edge length")
+    surface_dir = Path(surface_dir)
+    os.makedirs(surface_dir, exist_ok=True)
+    stl_files = sorted(Path(geom_subdir).glob('*.stl'))
+    
+    manifest = CaseManifest(surface_dir.parent)
+    metrics = StageMetrics()
+    written = []
+    skipped = []
+    regenerate = _regenerator(manifest, metrics, force, written, skipped)
+    with metrics.stage('hash'):
+        stl_hashes = _stl_hashes(stl_files, cache)
+    decimate_lengths = None
+    merge = 0.0
+    if decimate is not None:
+        # The geometry's own bounding box stands in for the cases' background blocks
+        with metrics.stage('bbox'):
+            min_coords, max_coords, _ = compute_block_mesh(str(geom_subdir), padding=0.0, cache=cache)
+        merge = merge_distance(min_coords, max_coords)
+        decimate_lengths = {stl_file.name: float(decimate) for stl_file in stl_files}
+    bytes_staged = _stage_surfaces(stl_files, stl_hashes, surface_dir, regenerate, staging, to_binary,
+                                   compress, extract_features, included_angle, decimate_lengths, merge,
+                                   feature_workers)
+    removed = manifest.prune()
+    for key in removed:
+        print(f"Removed stale {key} from {surface_dir.parent}")
+    manifest.save()
+    
+    return {'written': written, 'skipped': skipped, 'removed': removed, 'bytes_staged': bytes_staged,
+            'metrics': metrics.records}
 
-writeCompression uncompressed;
+def _stl_hashes(stl_files, cache):
+    """
+    Identify the contents of each STL file for the manifest.
+    
+    With a cache these are SHA-256 hashes, computed once per file version and
+    kept between runs. Without one, hashing every file in full on every run
+    would cost more than the outputs it spares, so the size and mtime stand in.
+    
+    Returns:
+        dict: STL file name to content hash or signature
+    """
+    if cache is None:
+        return {stl_file.name: file_signature(stl_file) for stl_file in stl_files}
+    return {stl_file.name: cache.get_hash(stl_file) for stl_file in stl_files}
 
-timeFormat      general;
+def _regenerator(manifest, metrics, force, written, skipped):
+    """
+    Build the function that writes an output unless the manifest says it is up to date.
+    
+    The returned regenerate(output_path, inputs, params, generator, write) calls
+    write() and records the output when its inputs, parameters or generator
+    changed, appending the path to written or skipped, and returns whether it wrote.
+    regenerate.is_current(output_path, inputs, params, generator) makes the same
+    check without writing, to start work on out of date outputs ahead of time.
+    generator may also be a tuple of functions whose modules all shape the
+    output, such as a dictionary generator and the renderer it uses.
+    """
+    def with_generator(params, generator):
+        if isinstance(generator, tuple):
+            return dict(params, generator=' '.join(generator_fingerprint(g) for g in generator))
+        if generator is not None:
+            return dict(params, generator=generator_fingerprint(generator))
+        return params
+    
+    def is_current(output_path, inputs, params, generator):
+        return not force and manifest.is_current(output_path, inputs, with_generator(params, generator))
+    
+    def regenerate(output_path, inputs, params, generator, write):
+        params = with_generator(params, generator)
+        if not force and manifest.is_current(output_path, inputs, params):
+            skipped.append(str(output_path))
+            return False
+        with metrics.stage(_stage_name(output_path), Path(output_path).name):
+            write()
+        manifest.record(output_path, inputs, params)
+        written.append(str(output_path))
+        return True
+    
+    regenerate.is_current = is_current
+    return regenerate
 
-timePrecision   6;
+def _stage_surfaces(stl_files, stl_hashes, constant_dir, regenerate, staging, to_binary, compress,
+                    extract_features, included_angle, decimate_lengths=None, merge=0.0, feature_workers=1):
+    """
+    Stage STL files into a triSurface directory and optionally extract their feature edges.
+    
+    With decimate_lengths, a dict of STL file name to target edge length, for
+    all axes or a list per axis, the files are cleaned and decimated into
+    binary STL files, and their feature edges are extracted from the decimated
+    surfaces. Feature edges of the surfaces that need them are extracted by
+    feature_workers processes.
+    
+    Returns:
+        int: Number of STL bytes written
+    """
+    bytes_staged = 0
+    feature_sources = {}
+    for stl_file in stl_files:
+        staged = []
+        if decimate_lengths is not None:
+            staged_path = constant_dir / (stl_file.name + ('.gz' if compress else ''))
+            edge_length = decimate_lengths[stl_file.name]
+            feature_sources[stl_file.name] = staged_path
+            if regenerate(
+                staged_path,
+                {stl_file.name: stl_hashes[stl_file.name]},
+                {'edge_length': edge_length, 'merge_distance': merge, 'compress': compress},
+                decimate_stl,
+                lambda: staged.append(decimate_stl(stl_file, staged_path, edge_length, merge, compress))
+            ):
+                bytes_staged += staged[0]['bytes']
+                lengths = ' '.join(f"{length:.6g}" for length in
+                                   (edge_length if isinstance(edge_length, list) else [edge_length]))
+                print(f"Decimated {stl_file.name} from {staged[0]['triangles_in']} to {staged[0]['triangles_out']} "
+                      f"triangles (edge length {lengths}) into {staged_path}")
+            continue
+        if to_binary:
+            # The file keeps its stem, which the generators use for patch names
+            staged_path = constant_dir / (stl_file.name + ('.gz' if compress else ''))
+            if regenerate(
+                staged_path,
+                {stl_file.name: stl_hashes[stl_file.name]},
+                {'compress': compress},
+                convert_stl_to_binary,
+                lambda: staged.append(convert_stl_to_binary(stl_file, staged_path, compress))
+            ):
+                bytes_staged += staged[0]
+                print(f"Converted {stl_file.name} to binary {staged_path} ({staged[0]} bytes written)")
+            continue
+        if regenerate(
+            constant_dir / stl_file.name,
+            {stl_file.name: stl_hashes[stl_file.name]},
+            {'staging': staging},
+            None,
+            lambda: staged.append(stage_file(stl_file, constant_dir, staging))
+        ):
+            strategy, n_bytes = staged[0]
+            bytes_staged += n_bytes
+            print(f"Staged {stl_file.name} to {constant_dir} ({strategy}, {n_bytes} bytes written)")
+    
+    # Extract feature edges natively instead of running surfaceFeatureExtract
+    if extract_features:
+        generators = (write_surface_features, write_foam_file)
+        jobs = [(
+            constant_dir / f"{stl_file.stem}.eMesh",
+            {stl_file.name: stl_hashes[stl_file.name]},
+            {'included_angle': included_angle, 'decimate': decimate_lengths and decimate_lengths[stl_file.name]},
+            feature_sources.get(stl_file.name, stl_file),
+        ) for stl_file in stl_files]
+        stale = [job for job in jobs if not regenerate.is_current(job[0], job[1], job[2], generators)]
+        with feature_extractor(feature_workers, len(stale)) as extract:
+            # Start every out of date surface first, so they run side by side
+            pending = {output_path: extract(source, constant_dir, included_angle)
+                       for output_path, _, _, source in stale}
+            for output_path, inputs, params, _ in jobs:
+                extracted = []
+                if regenerate(output_path, inputs, params, generators,
+                              lambda: extracted.append(pending[output_path]())):
+                    print(f"Extracted {extracted[0][1]} feature edges to {extracted[0][0]}")
+    
+    return bytes_staged
 
-runTimeModifiable yes;
+def _share_surfaces(surface_dir, constant_dir, regenerate):
+    """
+    Hardlink the files of a shared surface directory into a case's constant/triSurface.
+    
+    The case holds real files rather than a link out of its own directory, so
+    it can be meshed where only the case directory is visible, e.g. mounted
+    into a container. Where a hardlink is not possible, e.g. across devices,
+    the file is reflinked or copied. A link is renewed whenever the shared file
+    is restaged, and links to files no longer shared are pruned with the rest
+    of the case's stale outputs.
+    
+    Returns:
+        int: Number of bytes copied
+    """
+    bytes_copied = 0
+    for shared_file in sorted(Path(surface_dir).iterdir()):
+        if shared_file.name.startswith('.') or not shared_file.is_file():
+            continue
+        copied = []
+        regenerate(
+            Path(constant_dir) / shared_file.name,
+            {shared_file.name: file_signature(shared_file)},
+            {'surface_dir': str(surface_dir)},
+            None,
+            lambda: copied.append(stage_file(shared_file, constant_dir, 'hardlink')[1])
+        )
+        bytes_copied += sum(copied)
+    return bytes_copied
 
+def _stage_name(output_path):
+    """
+    Name the setup stage that produces an output, for the metrics.
+    """
+    output_path = Path(output_path)
+    if output_path.suffix == '.eMesh':
+        return 'feature_edges'
+    if output_path.parent.name == 'triSurface':
+        return 'copy'
+    if output_path.suffix == '.json':
+        return 'analysis'
+    return 'render'
 
-// ************************************************************************* //"""
+def run_case(geom_subdir, meshes_dir, cache_path, hash_contents, case_options, cache=None):
+    """
+    Run setup_case for one geometry subdirectory, capturing its output and any error.
+    
+    This is the unit of work for the process pool. Unless a cache is passed in,
+    it opens its own view of the metadata cache and hands the entries it touched
+    back to the parent.
+    
+    Args:
+        geom_subdir (str): Path to the geometry subdirectory
+        meshes_dir (str): Path to the meshes directory
+        cache_path (str): Path of the STL metadata cache file, or None to disable caching
+        hash_contents (bool): Whether cache entries are also keyed by a content hash
+        case_options (dict): Keyword arguments passed on to setup_case
+        cache (GeometryCache): Already open metadata cache to use instead of cache_path
+        
+    Returns:
+        dict: Result with keys 'case', 'ok', 'output', 'error', 'written', 'skipped',
+            'removed', 'bytes_staged', 'metrics', 'cache_entries', 'cache_hits',
+            'cache_misses', 'hash_hits' and 'hash_misses'
+    """
+    if cache is None and cache_path:
+        cache = GeometryCache(cache_path, hash_contents)
+    counters = ('hits', 'misses', 'hash_hits', 'hash_misses')
+    before = {name: getattr(cache, name) if cache else 0 for name in counters}
+    output = io.StringIO()
+    error = None
+    outputs = {'written': [], 'skipped': [], 'removed': [], 'bytes_staged': 0, 'metrics': []}
+    try:
+        with contextlib.redirect_stdout(output):
+            outputs = setup_case(geom_subdir, meshes_dir, cache, **case_options)
+    except Exception:
+        error = traceback.format_exc()
+    
+    cache_entries = {}
+    if cache is not None:
+        keys = {str(p.resolve()) for p in Path(geom_subdir).glob('*.stl')}
+        cache_entries = {k: v for k, v in cache.entries.items() if k in keys}
     
-    with open(output_path, 'w') as f:
-        f.write(controlDict_content)
+    return {
+        'case': case_options.get('case_name') or Path(geom_subdir).name,
+        'ok': error is None,
+        'output': output.getvalue(),
+        'error': error,
+        **outputs,
+        'cache_entries': cache_entries,
+        'cache_hits': cache.hits - before['hits'] if cache else 0,
+        'cache_misses': cache.misses - before['misses'] if cache else 0,
+        'hash_hits': cache.hash_hits - before['hash_hits'] if cache else 0,
+        'hash_misses': cache.hash_misses - before['hash_misses'] if cache else 0,
+    }
 
-def setup_mesh_directories(geometry_dir='geometry', meshes_dir='meshes'):
+def setup_mesh_directories(geometry_dir='geometry', meshes_dir='meshes', cache_path=None, hash_contents=False, workers=1,
+                           **case_options):
     """
     Set up mesh directories and generate configuration files for each geometry subdirectory.
     
+    Each case's output is printed as a block once the case finishes. A case that
+    fails is reported and does not stop the remaining cases.
+    
     Args:
         geometry_dir (str): Path to the geometry directory
         meshes_dir (str): Path to the meshes directory
+        cache_path (str): Path of the STL metadata cache file, defaults to
+            '.stl_metadata_cache.json' inside geometry_dir. Pass False to disable caching.
+        hash_contents (bool): Whether cache entries are also keyed by a content hash
+        workers (int): Number of worker processes, 0 for one per CPU core. With 1
+            the cases are processed in this process.
+        **case_options: Options passed on to setup_case for every case, e.g.
+            force, staging ('hardlink', 'reflink', 'symlink' or 'copy'),
+            to_binary, compress, cell_size, cell_budget or relative_padding
+        
+    Returns:
+        list: One result dict per case, see run_case
     """
+    start = time.perf_counter()
+    
     # Create main meshes directory if it doesn't exist
     os.makedirs(meshes_dir, exist_ok=True)
     
@@ -190,82 +823,208 @@ def setup_mesh_directories(geometry_dir='geometry', meshes_dir='meshes'):
     if not geometry_path.exists():
         raise ValueError(f"Geometry directory '{geometry_dir}' does not exist")
     
+    geom_subdirs = sorted(str(d) for d in geometry_path.iterdir() if d.is_dir())
+    
+    # Load the STL metadata cache so unchanged geometry is not re-read
+    cache = None
+    if cache_path is not False:
+        cache_path = str(cache_path or geometry_path / DEFAULT_CACHE_NAME)
+        cache = GeometryCache(cache_path, hash_contents)
+    else:
+        cache_path = None
+    
+    if workers == 0:
+        workers = os.cpu_count() or 1
+    workers = min(workers, len(geom_subdirs)) or 1
+    
     # Process each subdirectory in geometry
-    for geom_subdir in geometry_path.iterdir():
-        if not geom_subdir.is_dir():
-            continue
-            
-        print(f"\nProcessing geometry subdirectory: {geom_subdir.name}")
-        
-        # Create corresponding mesh directory structure
-        mesh_subdir = Path(meshes_dir) / geom_subdir.name
-        constant_dir = mesh_subdir / 'constant' / 'triSurface'
-        system_dir = mesh_subdir / 'system'
-        
-        # Create directories
-        os.makedirs(constant_dir, exist_ok=True)
-        os.makedirs(system_dir, exist_ok=True)
-        
-        # Create empty foam.foam file
-        foam_file = mesh_subdir / 'foam.foam'
-        foam_file.touch()
-        print(f"Created foam.foam in {mesh_subdir}")
-        
-        # Copy STL files to constant/triSurface
-        stl_files = list(geom_subdir.glob('*.stl'))
-        if not stl_files:
-            print(f"Warning: No STL files found in {geom_subdir}")
-            continue
-            
-        for stl_file in stl_files:
-            shutil.copy2(stl_file, constant_dir)
-            print(f"Copied {stl_file.name} to {constant_dir}")
-        
-        # Generate blockMeshDict
-        blockMeshDict_path = system_dir / 'blockMeshDict'
-        write_blockMeshDict(
-            output_path=str(blockMeshDict_path),
-            stl_dir=str(geom_subdir),
-            padding=1.0,
-            cells=(20, 20, 30)
-        )
-        print(f"Generated blockMeshDict in {system_dir}")
-        
-        # Generate surfaceFeatureExtractDict
-        surfaceFeatureExtractDict_path = system_dir / 'surfaceFeatureExtractDict'
-        write_surfaceFeatureExtractDict(
-            output_path=str(surfaceFeatureExtractDict_path),
-            stl_dir=str(geom_subdir)
-        )
-        print(f"Generated surfaceFeatureExtractDict in {system_dir}")
-        
-        # Create controlDict
-        controlDict_path = system_dir / 'controlDict'
-        create_controlDict(str(controlDict_path))
-        print(f"Created controlDict in {system_dir}")
-        
-        # Generate snappyHexMeshDict
-        snappyHexMeshDict_path = system_dir / 'snappyHexMeshDict'
-        generate_snappyHexMeshDict(
-            stl_dir=str(geom_subdir),
-            output_path=str(snappyHexMeshDict_path)
-        )
-        print(f"Generated snappyHexMeshDict in {system_dir}")
-        
-        # Create fvSchemes
-        fvSchemes_path = system_dir / 'fvSchemes'
-        create_fvSchemes(str(fvSchemes_path))
-        print(f"Created fvSchemes in {system_dir}")
-        
-        # Create fvSolution
-        fvSolution_path = system_dir / 'fvSolution'
-        create_fvSolution(str(fvSolution_path))
-        print(f"Created fvSolution in {system_dir}")
+    results = []
+    if workers == 1:
+        case_results = (run_case(d, meshes_dir, cache_path, hash_contents, case_options, cache) for d in geom_subdirs)
+        for result in case_results:
+            report_case(result)
+            results.append(result)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(run_case, d, meshes_dir, cache_path, hash_contents, case_options) for d in geom_subdirs]
+            for future in as_completed(futures):
+                result = future.result()
+                report_case(result)
+                results.append(result)
+    
+    # Drop entries for deleted or changed STL files and persist the cache
+    if cache is not None:
+        for result in results:
+            cache.merge(result['cache_entries'])
+        evicted = cache.evict_stale()
+        cache.save()
+        hits = sum(r['cache_hits'] for r in results)
+        misses = sum(r['cache_misses'] for r in results)
+        hash_hits = sum(r['hash_hits'] for r in results)
+        hash_misses = sum(r['hash_misses'] for r in results)
+        print(f"\nGeometry cache: {hits} hits, {misses} misses, hashes {hash_hits} hits, {hash_misses} misses, "
+              f"{evicted} stale entries evicted")
+    
+    failed = [r for r in results if not r['ok']]
+    n_written = sum(len(r['written']) for r in results)
+    n_skipped = sum(len(r['skipped']) for r in results)
+    bytes_staged = sum(r['bytes_staged'] for r in results)
+    print(f"\nSet up {len(results) - len(failed)} of {len(results)} cases "
+          f"({n_written} files written, {n_skipped} up to date, {bytes_staged} STL bytes staged)")
+    for result in failed:
+        print(f"Failed: {result['case']}")
+    
+    # Keep a per-batch summary of where the time went
+    write_batch_summary(
+        meshes_dir,
+        'setup',
+        [case_summary(r['case'], r['ok'], r['metrics']) for r in results],
+        time.perf_counter() - start
+    )
+    
+    return results
+
+def _decimate_value(text):
+    """
+    Parse a --decimate value: 'auto' or an edge length.
+    """
+    return text if text == 'auto' else float(text)
+
+
+def report_case(result):
+    """
+    Print the captured output of a finished case, followed by its error if it failed.
+    
+    Args:
+        result (dict): Result returned by run_case
+    """
+    print(result['output'], end='')
+    if not result['ok']:
+        print(f"Error setting up {result['case']}:\n{result['error']}", end='')
+
+def case_option_parser():
+    """
+    Build a parser for the command line options passed on to setup_case.
+    
+    It is meant as a parent parser, shared with other command line tools that
+    set up cases, and is turned into setup_case keyword arguments by case_options.
+    
+    Returns:
+        argparse.ArgumentParser: Parser without help option
+    """
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument('--staging', choices=STAGING_MODES, default='copy', help="how STL files are staged into constant/triSurface")
+    parser.add_argument('--binary', action='store_true', help="convert STL files to binary in constant/triSurface")
+    parser.add_argument('--gzip', action='store_true', help="gzip-compress the converted binary STL files")
+    parser.add_argument('--cell-size', type=float, help="edge length of cubic background cells")
+    parser.add_argument('--cell-budget', type=int, help="maximum number of cubic background cells, used without --cell-size")
+    parser.add_argument('--padding', type=float, default=1.0, help="absolute padding around the geometry")
+    parser.add_argument('--relative-padding', type=float, help="padding as a fraction of the largest geometry dimension")
+    parser.add_argument('--surface-level', type=int, nargs=2, metavar=('MIN', 'MAX'), help="refinement level of every surface")
+    parser.add_argument('--estimate', action='store_true', help="estimate the final cell count and memory of each case")
+    parser.add_argument('--max-cells', type=int, help="warn (or fail) when the estimated cell count exceeds this")
+    parser.add_argument('--max-memory-gb', type=float, help="warn (or fail) when the estimated memory exceeds this")
+    parser.add_argument('--refuse-over-budget', action='store_true', help="fail cases whose estimate exceeds a budget")
+    parser.add_argument('--tune-cell-limits', action='store_true', help="set maxLocalCells/maxGlobalCells from the estimate")
+    parser.add_argument('--location-in-mesh', nargs=3, type=float, metavar=('X', 'Y', 'Z'),
+                        help="explicit locationInMesh point, instead of computing one for --region")
+    parser.add_argument('--region', choices=('inside', 'outside'), default='outside',
+                        help="compute locationInMesh inside the surfaces (internal flow) or around them (external flow, "
+                             "the default)")
+    parser.add_argument('--extract-features', action='store_true', help="write .eMesh feature edge files without surfaceFeatureExtract")
+    parser.add_argument('--included-angle', type=float, default=180, help="includedAngle for feature edge extraction")
+    parser.add_argument('--feature-workers', type=int, default=1,
+                        help="processes extracting feature edges of a case's surfaces, 0 for one per CPU core")
+    parser.add_argument('--auto-levels', action='store_true', help="compute refinement levels from the geometry of each surface")
+    parser.add_argument('--level-cell-budget', type=int, help="cell budget for --auto-levels, defaults to --max-cells")
+    parser.add_argument('--detect-gaps', action='store_true', help="add refinement regions over narrow gaps between surfaces")
+    parser.add_argument('--gap-cells', type=float, default=3.0, help="gap width threshold in background cells for --detect-gaps")
+    parser.add_argument('--gap-distance-refinement', action='store_true',
+                        help="also refine within the gap width of surfaces on a gap")
+    parser.add_argument('--decompose', choices=('scotch', 'hierarchical', 'simple'),
+                        help="write a decomposeParDict and an Allrun script for parallel meshing")
+    parser.add_argument('--procs', type=int, help="cores available to each case for --decompose, defaults to all CPU cores")
+    parser.add_argument('--cells-per-proc', type=int, default=DEFAULT_CELLS_PER_PROC, help="target cells per subdomain")
+    parser.add_argument('--validate', choices=('warn', 'error'),
+                        help="check the STL files first and warn about defects, or fail cases that have them")
+    parser.add_argument('--validate-workers', type=int, default=1,
+                        help="processes validating the surfaces of a case, 0 for one per CPU core")
+    parser.add_argument('--statistics', action='store_true',
+                        help="write the area, centroid, volume, edge length and normal statistics to geometry_stats.json")
+    parser.add_argument('--decimate', type=_decimate_value, nargs='?', const='auto', metavar='EDGE_LENGTH',
+                        help="clean and decimate the surfaces to this edge length, or without a value to the finest "
+                             "cell size refining each surface")
+    parser.add_argument('--force', action='store_true', help="regenerate all outputs even if their inputs are unchanged")
+    return parser
+
+def case_options(args):
+    """
+    Turn options parsed with case_option_parser into setup_case keyword arguments.
+    
+    Args:
+        args (argparse.Namespace): Parsed arguments
         
-        # Create meshQualityDict
-        meshQualityDict_path = system_dir / 'meshQualityDict'
-        create_meshQualityDict(str(meshQualityDict_path))
-        print(f"Created meshQualityDict in {system_dir}")
+    Returns:
+        dict: Keyword arguments for setup_case
+    """
+    return {
+        'force': args.force,
+        'staging': args.staging,
+        'to_binary': args.binary or args.gzip,
+        'compress': args.gzip,
+        'padding': args.padding,
+        'cell_size': args.cell_size,
+        'cell_budget': args.cell_budget,
+        'relative_padding': args.relative_padding,
+        'surface_levels': tuple(args.surface_level) if args.surface_level else None,
+        'estimate': args.estimate,
+        'max_cells': args.max_cells,
+        'max_memory_gb': args.max_memory_gb,
+        'on_over_budget': 'error' if args.refuse_over_budget else 'warn',
+        'tune_limits': args.tune_cell_limits,
+        'location_in_mesh': tuple(args.location_in_mesh) if args.location_in_mesh else args.region,
+        'extract_features': args.extract_features,
+        'included_angle': args.included_angle,
+        'feature_workers': args.feature_workers,
+        'auto_levels': args.auto_levels,
+        'level_cell_budget': args.level_cell_budget,
+        'detect_gaps': args.detect_gaps,
+        'gap_cells': args.gap_cells,
+        'gap_distance_refinement': args.gap_distance_refinement,
+        'decompose_method': args.decompose,
+        'n_procs': args.procs,
+        'cells_per_proc': args.cells_per_proc,
+        'validate': args.validate,
+        'validate_workers': args.validate_workers,
+        'decimate': args.decimate,
+        'statistics': args.statistics,
+    }
+
+def main(argv=None):
+    """
+    Command line entry point for setting up the mesh directories.
+    
+    Args:
+        argv (list): Command line arguments, defaults to sys.argv[1:]
+    """
+    parser = argparse.ArgumentParser(description="Set up OpenFOAM mesh cases from STL geometry.",
+                                     parents=[case_option_parser()])
+    parser.add_argument('--geometry-dir', default='geometry', help="directory with one subdirectory of STL files per case")
+    parser.add_argument('--meshes-dir', default='meshes', help="directory to create the mesh cases in")
+    parser.add_argument('-j', '--workers', type=int, default=1, help="number of worker processes, 0 for one per CPU core")
+    parser.add_argument('--no-cache', action='store_true', help="do not use the STL metadata cache")
+    parser.add_argument('--hash-contents', action='store_true', help="also key the metadata cache on file content hashes")
+    args = parser.parse_args(argv)
+    
+    results = setup_mesh_directories(
+        geometry_dir=args.geometry_dir,
+        meshes_dir=args.meshes_dir,
+        cache_path=False if args.no_cache else None,
+        hash_contents=args.hash_contents,
+        workers=args.workers,
+        **case_options(args)
+    )
+    return 0 if all(r['ok'] for r in results) else 1
 
 if __name__ == "__main__":
-    setup_mesh_directories() 
\ No newline at end of file
+    sys.exit(main())
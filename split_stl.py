@@ -0,0 +1,342 @@
+import argparse
+import json
+import os
+import re
+import sys
+from pathlib import Path
+import numpy as np
+from convert_stl import write_binary_records
+from geometry_cache import DEFAULT_CACHE_NAME, GeometryCache, triangle_area
+from setup_mesh_dirs import case_option_parser, case_options, report_case, run_case
+from stl_scan import (
+    BINARY_HEADER_SIZE,
+    DEFAULT_ASCII_BLOCK_SIZE,
+    binary_header,
+    is_binary_stl,
+    iter_ascii_blocks,
+    parse_ascii_vertices,
+)
+
+# Index of the patches written by split_stl, kept next to them
+SPLIT_INDEX_NAME = '.split_index.json'
+
+_SOLID_LINE_RE = re.compile(rb'^[ \t]*solid(?:[ \t]+([^\r\n]*))?', re.MULTILINE)
+_ENDSOLID_LINE_RE = re.compile(rb'^([ \t]*)endsolid[^\r\n]*', re.MULTILINE)
+_PATCH_UNSAFE = re.compile(r'[^A-Za-z0-9_.+-]')
+
+
+def patch_name(solid_name, default):
+    """
+    Turn a solid name into a file stem that is also a valid OpenFOAM patch name.
+
+    Args:
+        solid_name (str): Name from the 'solid' line, '' for unnamed solids
+        default (str): Name to use for unnamed solids
+
+    Returns:
+        str: Name with whitespace and other unsafe characters replaced by '_'
+    """
+    name = _PATCH_UNSAFE.sub('_', solid_name.strip())
+    return name.strip('_') or default
+
+
+def iter_ascii_solids(stl_path, block_size=DEFAULT_ASCII_BLOCK_SIZE):
+    """
+    Stream the text of an ASCII STL file split at its 'solid' statements.
+
+    Args:
+        stl_path (str): Path to the ASCII STL file
+        block_size (int): Approximate number of bytes read per block
+
+    Yields:
+        tuple: (solid_name, text) where solid_name is the name of a solid
+            starting with text, or None when text continues the current solid
+            (or, before the first solid, precedes any)
+    """
+    for block in iter_ascii_blocks(stl_path, block_size):
+        matches = list(_SOLID_LINE_RE.finditer(block))
+        start = matches[0].start() if matches else len(block)
+        if start:
+            yield None, block[:start]
+        for i, match in enumerate(matches):
+            end = matches[i + 1].start() if i + 1 < len(matches) else len(block)
+            yield (match.group(1) or b'').strip().decode('utf-8', 'replace'), block[match.start():end]
+
+
+class _PatchWriter:
+    """
+    Accumulate the triangles of one patch into its output file and metadata.
+    """
+
+    def __init__(self, name, path, binary):
+        self.name = name
+        self.path = path
+        self.tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        self.binary = binary
+        self.solids = 0
+        self.triangle_count = 0
+        self.surface_area = 0.0
+        self.min_coords = None
+        self.max_coords = None
+        self.leftover = np.empty((0, 3), dtype=np.float32)
+        self.file = open(self.tmp_path, 'wb')
+        if binary:
+            self.file.write(binary_header(name))
+            self.file.write(b'\x00\x00\x00\x00')
+
+    def reopen(self):
+        self.file = open(self.tmp_path, 'ab')
+
+    def write(self, text, starts_solid):
+        if not self.binary:
+            # Name the solid after its file, as rename_stl does
+            name = self.name.encode('utf-8')
+            if starts_solid:
+                self.solids += 1
+                text = _SOLID_LINE_RE.sub(b'solid ' + name, text, count=1)
+            self.file.write(_ENDSOLID_LINE_RE.sub(rb'\1endsolid ' + name, text))
+
+        vertices = parse_ascii_vertices(text)
+        if len(self.leftover):
+            vertices = np.concatenate([self.leftover, vertices])
+        n_complete = len(vertices) - len(vertices) % 3
+        self.leftover = vertices[n_complete:]
+        if n_complete == 0:
+            return
+        triangles = vertices[:n_complete].reshape(-1, 3, 3)
+        if self.binary:
+            write_binary_records(self.file, triangles)
+        chunk_min = triangles.min(axis=(0, 1))
+        chunk_max = triangles.max(axis=(0, 1))
+        self.min_coords = chunk_min if self.min_coords is None else np.minimum(self.min_coords, chunk_min)
+        self.max_coords = chunk_max if self.max_coords is None else np.maximum(self.max_coords, chunk_max)
+        self.triangle_count += len(triangles)
+        self.surface_area += triangle_area(triangles)
+
+    def close(self):
+        self.file.close()
+        if len(self.leftover):
+            raise ValueError(f"Incomplete facet at the end of solid '{self.name}'")
+
+    def finish(self):
+        """
+        Patch the triangle count into a binary file and move the file into place.
+
+        Returns:
+            dict: Metadata as returned by compute_stl_metadata, plus the 'path'
+        """
+        if self.min_coords is None:
+            raise ValueError(f"No triangles found in solid '{self.name}'")
+        if self.binary:
+            with open(self.tmp_path, 'r+b') as f:
+                f.seek(BINARY_HEADER_SIZE)
+                f.write(np.uint32(self.triangle_count).astype('<u4').tobytes())
+        os.replace(self.tmp_path, self.path)
+        return {
+            'path': str(self.path),
+            'format': 'binary' if self.binary else 'ascii',
+            'triangle_count': self.triangle_count,
+            'bounding_box': [self.min_coords.tolist(), self.max_coords.tolist()],
+            'surface_area': self.surface_area,
+            # A binary header holds one name; ASCII files repeat it per merged solid
+            'solid_names': [self.name] * (1 if self.binary else self.solids),
+        }
+
+    def discard(self):
+        if not self.file.closed:
+            self.file.close()
+        if self.tmp_path.exists():
+            self.tmp_path.unlink()
+
+
+def split_stl(src, out_dir, binary=False, block_size=DEFAULT_ASCII_BLOCK_SIZE):
+    """
+    Split a multi-solid ASCII STL file into one STL file per solid in a streaming pass.
+
+    Each solid is written to '<name>.stl' in out_dir, its name made safe for
+    OpenFOAM, so the generators see one patch per file. Solids sharing a name
+    go into the same file, and unnamed solids are called '<src stem>_<index>'.
+    The bounding box, triangle count and area of each patch are computed while
+    writing. Memory use is bounded by the block size whatever the size of the
+    file, since one solid is written at a time.
+
+    Args:
+        src (str): Path of the ASCII STL file to split
+        out_dir (str): Directory to write the per-solid files to
+        binary (bool): Write binary STL files instead of copying the ASCII text
+        block_size (int): Approximate number of bytes parsed per block
+
+    Returns:
+        dict: Patch name to its metadata as returned by compute_stl_metadata,
+            plus the 'path' of its file, in the order the solids appear
+    """
+    src = Path(src)
+    out_dir = Path(out_dir)
+    if is_binary_stl(src):
+        raise ValueError(f"{src} is a binary STL file, which holds a single solid")
+    os.makedirs(out_dir, exist_ok=True)
+
+    writers = {}
+    current = None
+    unnamed = 0
+    try:
+        for solid_name, text in iter_ascii_solids(src, block_size):
+            if solid_name is not None:
+                if current is not None:
+                    current.close()
+                name = patch_name(solid_name, '')
+                if not name:
+                    unnamed += 1
+                    name = f"{src.stem}_{unnamed}"
+                current = writers.get(name)
+                if current is None:
+                    current = writers[name] = _PatchWriter(name, out_dir / f"{name}.stl", binary)
+                else:
+                    current.reopen()
+            elif current is None:
+                if len(parse_ascii_vertices(text)):
+                    raise ValueError(f"Facets before the first 'solid' statement in {src}")
+                continue
+            current.write(text, solid_name is not None)
+        if current is not None:
+            current.close()
+        if not writers:
+            raise ValueError(f"No solids found in {src}")
+        return {name: writer.finish() for name, writer in writers.items()}
+    except BaseException:
+        for writer in writers.values():
+            writer.discard()
+        raise
+
+
+def _source_key(src, binary):
+    stat = os.stat(src)
+    return {'source': str(Path(src).resolve()), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'binary': binary}
+
+
+def _read_index(index_path):
+    try:
+        with open(index_path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _index_current(index, source_key):
+    """
+    Check whether a split index describes the source and the patch files on disk.
+    """
+    if index is None or index.get('source_key') != source_key:
+        return False
+    for entry in index['patches'].values():
+        try:
+            stat = os.stat(entry['path'])
+        except OSError:
+            return False
+        if (stat.st_size, stat.st_mtime_ns) != (entry['size'], entry['mtime_ns']):
+            return False
+    return True
+
+
+def split_into_geometry(src, out_dir, binary=False, cache=None, force=False, block_size=DEFAULT_ASCII_BLOCK_SIZE):
+    """
+    Split a multi-solid STL file into a geometry subdirectory ready for setup_case.
+
+    The patches and their metadata are listed in '.split_index.json' in
+    out_dir. The split is skipped while the source file and the patch files
+    are unchanged, and patches of an earlier split that no longer exist in the
+    source are removed. The metadata computed during the split is added to the
+    metadata cache, so setting up the case does not scan the patches again.
+
+    Args:
+        src (str): Path of the ASCII STL file to split
+        out_dir (str): Geometry subdirectory to write the per-solid files to
+        binary (bool): Write binary STL files
+        cache (GeometryCache): Optional metadata cache to add the patches to
+        force (bool): Split even if the index is up to date
+        block_size (int): Approximate number of bytes parsed per block
+
+    Returns:
+        tuple: (patches, split) where patches maps each patch name to its
+            metadata and path, and split is False if the split was skipped
+    """
+    out_dir = Path(out_dir)
+    index_path = out_dir / SPLIT_INDEX_NAME
+    source_key = _source_key(src, binary)
+    index = _read_index(index_path)
+    if not force and _index_current(index, source_key):
+        patches = {name: entry['metadata'] for name, entry in index['patches'].items()}
+        return patches, False
+
+    patches = split_stl(src, out_dir, binary, block_size)
+    if index is not None:
+        written = {str(Path(p['path']).resolve()) for p in patches.values()}
+        for entry in index['patches'].values():
+            old_path = Path(entry['path'])
+            if str(old_path.resolve()) not in written and old_path.exists():
+                old_path.unlink()
+
+    entries = {}
+    for name, metadata in patches.items():
+        stat = os.stat(metadata['path'])
+        entries[name] = {'path': metadata['path'], 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns,
+                         'metadata': metadata}
+    if cache is not None:
+        cache.merge({
+            str(Path(entry['path']).resolve()): {
+                'size': entry['size'],
+                'mtime_ns': entry['mtime_ns'],
+                'metadata': {k: v for k, v in entry['metadata'].items() if k != 'path'},
+            }
+            for entry in entries.values()
+        })
+
+    tmp_path = index_path.with_name(f"{index_path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, 'w') as f:
+        json.dump({'source_key': source_key, 'patches': entries}, f, indent=2)
+    os.replace(tmp_path, index_path)
+    return patches, True
+
+
+def main(argv=None):
+    """
+    Command line entry point for splitting a multi-solid STL file and setting up its case.
+
+    Args:
+        argv (list): Command line arguments, defaults to sys.argv[1:]
+    """
+    parser = argparse.ArgumentParser(description="Split a multi-solid ASCII STL file into one STL file per solid, "
+                                                 "optionally setting up its mesh case.",
+                                     parents=[case_option_parser()])
+    parser.add_argument('src', help="ASCII STL file with several solids")
+    parser.add_argument('--name', help="geometry name, defaults to the file name without extension")
+    parser.add_argument('--split-binary', action='store_true', help="write the per-solid files as binary STL")
+    parser.add_argument('--setup', action='store_true', help="set up the mesh case of the split geometry")
+    parser.add_argument('--geometry-dir', default='geometry', help="directory to create the geometry subdirectory in")
+    parser.add_argument('--meshes-dir', default='meshes', help="directory to create the case in")
+    parser.add_argument('--no-cache', action='store_true', help="do not use the STL metadata cache")
+    parser.add_argument('--hash-contents', action='store_true', help="also key the metadata cache on file content hashes")
+    args = parser.parse_args(argv)
+
+    out_dir = Path(args.geometry_dir) / (args.name or Path(args.src).stem)
+    cache_path = None if args.no_cache else str(Path(args.geometry_dir) / DEFAULT_CACHE_NAME)
+    cache = GeometryCache(cache_path, args.hash_contents) if cache_path else None
+
+    patches, split = split_into_geometry(args.src, out_dir, args.split_binary, cache, args.force)
+    print(f"{'Split' if split else 'Already split'} {args.src} into {len(patches)} patches in {out_dir}")
+    for name, metadata in patches.items():
+        (x0, y0, z0), (x1, y1, z1) = metadata['bounding_box']
+        print(f"  {name}: {metadata['triangle_count']} triangles, "
+              f"bounds ({x0:g} {y0:g} {z0:g}) ({x1:g} {y1:g} {z1:g})")
+
+    ok = True
+    if args.setup:
+        result = run_case(str(out_dir), args.meshes_dir, cache_path, args.hash_contents, case_options(args), cache)
+        report_case(result)
+        ok = result['ok']
+    if cache is not None:
+        cache.save()
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
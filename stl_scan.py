@@ -0,0 +1,295 @@
+import gzip
+import os
+import re
+import numpy as np
+
+# Binary STL layout: 80 byte header, uint32 triangle count, then one 50 byte
+# record per triangle (normal, three vertices, attribute byte count)
+BINARY_HEADER_SIZE = 80
+BINARY_RECORD_DTYPE = np.dtype([
+    ('normal', '<f4', (3,)),
+    ('vectors', '<f4', (3, 3)),
+    ('attr', '<u2'),
+])
+
+# Default batch sizes. A binary chunk of 1M triangles is ~50 MB on disk and
+# ~36 MB as float32 vectors; an ASCII block of 16 MB holds roughly 60k facets.
+DEFAULT_CHUNK_TRIANGLES = 1 << 20
+DEFAULT_ASCII_BLOCK_SIZE = 16 << 20
+
+_VERTEX_RE = re.compile(rb'^[ \t]*vertex[ \t]+([^\r\n]+)', re.MULTILINE)
+_SOLID_RE = re.compile(rb'^[ \t]*solid(?:[ \t]+([^\r\n]*))?', re.MULTILINE)
+
+def is_binary_stl(stl_path):
+    """
+    Detect whether an STL file is binary or ASCII without reading it whole.
+
+    A file is treated as binary when its size matches the triangle count stored
+    in the header, unless it also starts with 'solid' and looks like text.
+
+    Args:
+        stl_path (str): Path to the STL file
+
+    Returns:
+        bool: True for binary STL files, False for ASCII ones
+    """
+    size = os.path.getsize(stl_path)
+    with open(stl_path, 'rb') as f:
+        head = f.read(1024)
+
+    if size < BINARY_HEADER_SIZE + 4:
+        return False
+
+    n_triangles = int(np.frombuffer(head[BINARY_HEADER_SIZE:BINARY_HEADER_SIZE + 4], dtype='<u4')[0])
+    size_matches = size == BINARY_HEADER_SIZE + 4 + n_triangles * BINARY_RECORD_DTYPE.itemsize
+
+    if not head.lstrip().startswith(b'solid'):
+        return True
+    if not size_matches:
+        return False
+    # Some exporters write 'solid ...' into binary headers, so also check the
+    # bytes after the header for text
+    return b'\x00' in head or b'facet' not in head
+
+
+def binary_triangle_count(stl_path):
+    """
+    Read the triangle count from the header of a binary STL file.
+
+    Args:
+        stl_path (str): Path to the binary STL file
+
+    Returns:
+        int: Number of triangles stored in the file
+    """
+    with open(stl_path, 'rb') as f:
+        f.seek(BINARY_HEADER_SIZE)
+        return int(np.frombuffer(f.read(4), dtype='<u4')[0])
+
+
+def iter_binary_triangles(stl_path, chunk_triangles=DEFAULT_CHUNK_TRIANGLES):
+    """
+    Iterate over the triangles of a binary STL file in fixed-size chunks.
+
+    The file is memory-mapped and each chunk is copied out before it is
+    yielded, so at most one chunk of vertices is held in memory at a time.
+
+    Args:
+        stl_path (str): Path to the binary STL file
+        chunk_triangles (int): Number of triangles per chunk
+
+    Yields:
+        numpy.ndarray: float32 array of shape (n, 3, 3) with triangle vertices
+    """
+    n_triangles = binary_triangle_count(stl_path)
+    if n_triangles == 0:
+        return
+
+    records = np.memmap(stl_path, dtype=BINARY_RECORD_DTYPE, mode='r',
+                        offset=BINARY_HEADER_SIZE + 4, shape=(n_triangles,))
+    try:
+        for start in range(0, n_triangles, chunk_triangles):
+            yield np.array(records['vectors'][start:start + chunk_triangles])
+    finally:
+        del records
+
+
+def iter_gzip_triangles(stl_path, chunk_triangles=DEFAULT_CHUNK_TRIANGLES):
+    """
+    Iterate over the triangles of a gzip-compressed binary STL file, as staged
+    into constant/triSurface, in fixed-size chunks.
+
+    Args:
+        stl_path (str): Path to the '.stl.gz' file
+        chunk_triangles (int): Number of triangles per chunk
+
+    Yields:
+        numpy.ndarray: float32 array of shape (n, 3, 3) with triangle vertices
+    """
+    with gzip.open(stl_path, 'rb') as f:
+        f.read(BINARY_HEADER_SIZE + 4)
+        while True:
+            data = f.read(chunk_triangles * BINARY_RECORD_DTYPE.itemsize)
+            if len(data) < BINARY_RECORD_DTYPE.itemsize:
+                return
+            n_records = len(data) // BINARY_RECORD_DTYPE.itemsize
+            records = np.frombuffer(data, dtype=BINARY_RECORD_DTYPE, count=n_records)
+            yield np.array(records['vectors'])
+
+
+def iter_ascii_blocks(stl_path, block_size=DEFAULT_ASCII_BLOCK_SIZE):
+    """
+    Read an ASCII STL file in blocks that always end on a line boundary.
+
+    Args:
+        stl_path (str): Path to the ASCII STL file
+        block_size (int): Approximate number of bytes per block
+
+    Yields:
+        bytes: Block of complete lines
+    """
+    carry = b''
+    with open(stl_path, 'rb') as f:
+        while True:
+            data = f.read(block_size)
+            if not data:
+                break
+            data = carry + data
+            cut = data.rfind(b'\n') + 1
+            if cut == 0:
+                carry = data
+                continue
+            carry = data[cut:]
+            yield data[:cut]
+    if carry:
+        yield carry
+
+
+def parse_ascii_vertices(block):
+    """
+    Parse all 'vertex x y z' lines in a block of ASCII STL text.
+
+    Values are parsed as doubles and then stored as float32, which matches
+    how numpy-stl reads ASCII files.
+
+    Args:
+        block (bytes): Block of complete ASCII STL lines
+
+    Returns:
+        numpy.ndarray: float32 array of shape (n, 3) with vertex coordinates
+    """
+    coords = _VERTEX_RE.findall(block)
+    if not coords:
+        return np.empty((0, 3), dtype=np.float32)
+    values = np.array(b' '.join(coords).split(), dtype=np.float64)
+    return values.astype(np.float32).reshape(-1, 3)
+
+
+def parse_ascii_solid_names(block):
+    """
+    Find the names of all 'solid' statements in a block of ASCII STL text.
+
+    Args:
+        block (bytes): Block of complete ASCII STL lines
+
+    Returns:
+        list: Solid names as strings, '' for unnamed solids
+    """
+    return [(name or b'').strip().decode('utf-8', 'replace') for name in _SOLID_RE.findall(block)]
+
+
+def iter_ascii_triangles(stl_path, block_size=DEFAULT_ASCII_BLOCK_SIZE):
+    """
+    Iterate over the triangles of an ASCII STL file in streamed blocks.
+
+    Args:
+        stl_path (str): Path to the ASCII STL file
+        block_size (int): Approximate number of bytes read per block
+
+    Yields:
+        numpy.ndarray: float32 array of shape (n, 3, 3) with triangle vertices
+    """
+    leftover = np.empty((0, 3), dtype=np.float32)
+    for block in iter_ascii_blocks(stl_path, block_size):
+        vertices = parse_ascii_vertices(block)
+        if len(leftover):
+            vertices = np.concatenate([leftover, vertices])
+        n_complete = len(vertices) - len(vertices) % 3
+        leftover = vertices[n_complete:]
+        if n_complete:
+            yield vertices[:n_complete].reshape(-1, 3, 3)
+
+    if len(leftover):
+        raise ValueError(f"Incomplete facet at the end of {stl_path}")
+
+
+def iter_stl_triangles(stl_path, chunk_triangles=DEFAULT_CHUNK_TRIANGLES,
+                       block_size=DEFAULT_ASCII_BLOCK_SIZE):
+    """
+    Iterate over the triangles of a binary or ASCII STL file in batches.
+
+    Files ending in '.gz' are read as gzip-compressed binary STL.
+
+    Args:
+        stl_path (str): Path to the STL file
+        chunk_triangles (int): Number of triangles per chunk for binary files
+        block_size (int): Approximate number of bytes per block for ASCII files
+
+    Yields:
+        numpy.ndarray: float32 array of shape (n, 3, 3) with triangle vertices
+    """
+    if str(stl_path).endswith('.gz'):
+        yield from iter_gzip_triangles(stl_path, chunk_triangles)
+    elif is_binary_stl(stl_path):
+        yield from iter_binary_triangles(stl_path, chunk_triangles)
+    else:
+        yield from iter_ascii_triangles(stl_path, block_size)
+
+
+def scan_stl_bounding_box(stl_path, chunk_triangles=DEFAULT_CHUNK_TRIANGLES,
+                          block_size=DEFAULT_ASCII_BLOCK_SIZE):
+    """
+    Compute the bounding box of a single STL file with bounded memory.
+
+    Args:
+        stl_path (str): Path to the STL file
+        chunk_triangles (int): Number of triangles per chunk for binary files
+        block_size (int): Approximate number of bytes per block for ASCII files
+
+    Returns:
+        tuple: (min_coords, max_coords) where each is a float32 numpy array of [x, y, z]
+    """
+    min_coords = None
+    max_coords = None
+    for triangles in iter_stl_triangles(stl_path, chunk_triangles, block_size):
+        if len(triangles) == 0:
+            continue
+        chunk_min = triangles.min(axis=(0, 1))
+        chunk_max = triangles.max(axis=(0, 1))
+        if min_coords is None:
+            min_coords, max_coords = chunk_min, chunk_max
+        else:
+            min_coords = np.minimum(min_coords, chunk_min)
+            max_coords = np.maximum(max_coords, chunk_max)
+
+    if min_coords is None:
+        raise ValueError(f"No triangles found in {stl_path}")
+
+    return min_coords, max_coords
+
+
+def binary_solid_name(stl_path):
+    """
+    Read the solid name from the 80 byte header of a binary STL file.
+
+    Headers of the form 'solid <name>' yield <name>; any other header text is
+    returned stripped of padding.
+
+    Args:
+        stl_path (str): Path to the binary STL file
+
+    Returns:
+        str: Solid name, '' if the header is blank
+    """
+    with open(stl_path, 'rb') as f:
+        header = f.read(BINARY_HEADER_SIZE)
+    name = header.split(b'\x00', 1)[0].strip()
+    if name.startswith(b'solid'):
+        name = name[len(b'solid'):].strip()
+    return name.decode('utf-8', 'replace')
+
+
+def binary_header(name):
+    """
+    Build an 80 byte binary STL header carrying a solid name.
+
+    The name is written without a leading 'solid', since readers such as
+    OpenFOAM's treat headers starting with 'solid' as ASCII files.
+
+    Args:
+        name (str): Solid name
+
+    Returns:
+        bytes: Header padded with NUL bytes to 80 bytes
+    """
+    return name.encode('utf-8')[:BINARY_HEADER_SIZE].ljust(BINARY_HEADER_SIZE, b'\x00')
@@ -0,0 +1,93 @@
+import os
+import shutil
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+STAGING_MODES = ('hardlink', 'reflink', 'symlink', 'copy')
+
+# Strategies tried, in order, for each requested mode. Every chain ends in a
+# plain copy, which always works.
+FALLBACKS = {
+    'hardlink': ('hardlink', 'reflink', 'copy'),
+    'reflink': ('reflink', 'copy'),
+    'symlink': ('symlink', 'copy'),
+    'copy': ('copy',),
+}
+
+# Linux ioctl that clones a file's extents copy-on-write (btrfs, XFS, ...)
+FICLONE = 0x40049409
+
+
+def _reflink(src, dst):
+    """
+    Clone src to dst copy-on-write, raising OSError where the filesystem can't.
+    """
+    if fcntl is None:
+        raise NotImplementedError("reflinks need fcntl.ioctl")
+    with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+        try:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+        except OSError:
+            fdst.close()
+            os.unlink(dst)
+            raise
+    shutil.copystat(src, dst)
+
+
+def _stage(src, tmp_path, strategy):
+    """
+    Create tmp_path from src with a single strategy.
+
+    Returns:
+        int: Number of file data bytes written
+    """
+    if strategy == 'hardlink':
+        os.link(src, tmp_path)
+        return 0
+    if strategy == 'reflink':
+        _reflink(src, tmp_path)
+        return 0
+    if strategy == 'symlink':
+        os.symlink(os.path.relpath(Path(src).resolve(), Path(tmp_path).parent.resolve()), tmp_path)
+        return 0
+    shutil.copy2(src, tmp_path)
+    return os.path.getsize(tmp_path)
+
+
+def stage_file(src, dst_dir, mode='copy'):
+    """
+    Stage a file into a directory by hardlink, reflink, symlink or copy.
+
+    If the requested strategy is not supported (e.g. a hardlink across devices,
+    or a reflink on a filesystem without copy-on-write), the next strategy in
+    FALLBACKS is tried. The staged file replaces any existing file atomically.
+
+    Args:
+        src (str): Path of the file to stage
+        dst_dir (str): Directory to stage the file into
+        mode (str): One of 'hardlink', 'reflink', 'symlink' or 'copy'
+
+    Returns:
+        tuple: (strategy, bytes_written) with the strategy actually used and the
+            number of file data bytes written, 0 for links and reflinks
+    """
+    if mode not in FALLBACKS:
+        raise ValueError(f"Unknown staging mode '{mode}', expected one of {STAGING_MODES}")
+
+    src = Path(src)
+    dst = Path(dst_dir) / src.name
+    tmp_path = dst.with_name(f".{dst.name}.{os.getpid()}.tmp")
+
+    for strategy in FALLBACKS[mode]:
+        try:
+            bytes_written = _stage(src, tmp_path, strategy)
+        except (OSError, NotImplementedError):
+            if strategy == 'copy':
+                raise
+            continue
+        os.replace(tmp_path, dst)
+        return strategy, bytes_written
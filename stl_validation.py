@@ -0,0 +1,363 @@
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import numpy as np
+from feature_edges import edge_table, unique_rows, weld_stl_files
+
+# Triangles smaller than this fraction of the squared bounding box diagonal are
+# degenerate, i.e. below what float32 coordinates resolve
+DEGENERATE_AREA_RATIO = 1e-12
+
+# Faces whose areas and volume contributions are computed at a time
+FACE_CHUNK = 1 << 20
+
+
+def mesh_checks(points, faces, min_area=None, return_keys=False):
+    """
+    Check an indexed triangle mesh for defects, fully vectorized.
+
+    Edges are hashed with edge_table: an edge on one face is open, one on more
+    than two faces is non-manifold, and one whose two faces run along it in
+    the same direction joins faces with opposite orientation. The signed
+    volume of a closed mesh is positive when its normals point outwards.
+    Areas and volume are computed in double precision over chunks of faces,
+    so float32 points are never converted as a whole.
+
+    Args:
+        points (numpy.ndarray): Array of shape (m, 3) with vertex coordinates
+        faces (numpy.ndarray): Array of shape (n, 3) with vertex indices
+        min_area (float): Triangles with a smaller area are degenerate, defaults
+            to DEGENERATE_AREA_RATIO times the squared bounding box diagonal
+        return_keys (bool): Also return the edge and face hashes that
+            combine_checks matches across surfaces
+
+    Returns:
+        dict: Counts under 'triangles', 'open_edges', 'non_manifold_edges',
+            'inconsistent_edges', 'degenerate_triangles' and 'duplicate_triangles',
+            'closed' and the signed 'volume'. With return_keys, a tuple of that
+            dict and a dict of arrays: 'edges' and 'faces' hold the hashes of
+            the edges and of the distinct faces, 'edge_faces' the number of
+            faces on each edge and 'forward' how many of them run along it
+            towards its end point with the larger hash.
+    """
+    if min_area is None:
+        diagonal = (float(np.linalg.norm(points.max(axis=0).astype(np.float64) - points.min(axis=0)))
+                    if len(points) else 0.0)
+        min_area = DEGENERATE_AREA_RATIO * diagonal ** 2
+
+    collapsed = (faces[:, 0] == faces[:, 1]) | (faces[:, 1] == faces[:, 2]) | (faces[:, 2] == faces[:, 0])
+    degenerate = int(np.count_nonzero(collapsed))
+    volume = 0.0
+    for start in range(0, len(faces), FACE_CHUNK):
+        corners = points[faces[start:start + FACE_CHUNK]].astype(np.float64)
+        cross = np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0])
+        small = 0.5 * np.linalg.norm(cross, axis=1) <= min_area
+        degenerate += int(np.count_nonzero(small & ~collapsed[start:start + FACE_CHUNK]))
+        volume += float(np.einsum('ij,ij->', corners[:, 0], cross) / 6.0)
+
+    unique_faces = unique_rows(np.sort(faces, axis=1))[0] if len(faces) else faces
+
+    # Collapsed faces have no proper edges
+    valid = faces[~collapsed]
+    _, _, counts, half_edges = edge_table(valid, return_half_edges=True)
+    # Two faces with the same orientation run along their shared edge in
+    # opposite directions
+    offsets = np.cumsum(counts) - counts
+    forward = (half_edges[:, 0] < half_edges[:, 1]).astype(np.int64)
+    forward_counts = np.add.reduceat(forward, offsets) if len(offsets) else np.empty(0, dtype=np.int64)
+
+    open_edges = int(np.count_nonzero(counts == 1))
+    non_manifold = int(np.count_nonzero(counts > 2))
+    closed = bool(len(valid)) and open_edges == 0 and non_manifold == 0
+    checks = {
+        'triangles': int(len(faces)),
+        'open_edges': open_edges,
+        'non_manifold_edges': non_manifold,
+        'inconsistent_edges': int(np.count_nonzero((counts == 2) & (forward_counts != 1))),
+        'degenerate_triangles': degenerate,
+        'duplicate_triangles': int(len(faces) - len(unique_faces)),
+        'closed': closed,
+        'volume': volume,
+    }
+    if not return_keys:
+        return checks
+
+    point_hashes = _point_hashes(points)
+    ends = point_hashes[half_edges]
+    first = ends[offsets]
+    forward = (ends[:, 0] < ends[:, 1]).astype(np.int64)
+    keys = {
+        'edges': _hash_columns([first.min(axis=1), first.max(axis=1)]),
+        'edge_faces': np.minimum(counts, 255).astype(np.uint8),
+        'forward': np.minimum(np.add.reduceat(forward, offsets) if len(offsets) else forward, 255).astype(np.uint8),
+    }
+    face_keys = np.sort(_hash_columns(list(np.sort(point_hashes[faces], axis=1).T)))
+    keys['faces'] = face_keys[_group_starts(face_keys)]
+    return checks, keys
+
+
+def _hash_columns(columns):
+    """
+    Hash rows given as a list of integer columns into uint64, vectorized.
+    """
+    h = np.full(len(columns[0]), 0xcbf29ce484222325, dtype=np.uint64)
+    for column in columns:
+        h ^= column.astype(np.uint64)
+        h *= np.uint64(0xbf58476d1ce4e5b9)
+        h ^= h >> np.uint64(31)
+    h *= np.uint64(0x94d049bb133111eb)
+    return h ^ (h >> np.uint64(29))
+
+
+def _point_hashes(points):
+    # Adding zero turns -0.0 into 0.0, which welding treats as equal
+    words = np.ascontiguousarray(points + np.zeros(1, dtype=points.dtype)).view(np.uint32)
+    return _hash_columns(list(words.T))
+
+
+def _group_starts(sorted_values):
+    """
+    Indices where each run of equal values of a sorted array begins.
+    """
+    if not len(sorted_values):
+        return np.empty(0, dtype=np.int64)
+    return np.flatnonzero(np.concatenate([[True], sorted_values[1:] != sorted_values[:-1]]))
+
+
+def combine_checks(results):
+    """
+    Check several surfaces together from the checks of each surface on its own.
+
+    The surfaces are never welded into one mesh. Each surface is summarised
+    by 64-bit hashes of the coordinates of its edges and faces, with the
+    number of faces on each edge and how many run along it in the direction
+    of increasing end point hash. Summing those per edge hash across the
+    surfaces gives the edge counts of the welded surfaces, and hence open,
+    non-manifold and inconsistent edges exactly as mesh_checks would find
+    them, as well as triangles duplicated across surfaces.
+
+    Args:
+        results (list): (checks, keys) per surface, as returned by mesh_checks
+            with return_keys
+
+    Returns:
+        dict: Checks of the surfaces together, as returned by mesh_checks
+    """
+    if not results:
+        return mesh_checks(np.empty((0, 3), dtype=np.float32), np.empty((0, 3), dtype=np.int32))
+    keys = [k for _, k in results]
+    # Sorting beats np.unique on hashes this many
+    edges = np.concatenate([k['edges'] for k in keys])
+    order = np.argsort(edges)
+    starts = _group_starts(edges[order])
+    counts = np.empty(0, dtype=np.int64)
+    forward_counts = counts
+    if len(starts):
+        counts = np.add.reduceat(np.concatenate([k['edge_faces'] for k in keys]).astype(np.int64)[order], starts)
+        forward_counts = np.add.reduceat(np.concatenate([k['forward'] for k in keys]).astype(np.int64)[order],
+                                         starts)
+    face_keys = np.sort(np.concatenate([k['faces'] for k in keys]))
+
+    open_edges = int(np.count_nonzero(counts == 1))
+    non_manifold = int(np.count_nonzero(counts > 2))
+    return {
+        'triangles': sum(checks['triangles'] for checks, _ in results),
+        'open_edges': open_edges,
+        'non_manifold_edges': non_manifold,
+        'inconsistent_edges': int(np.count_nonzero((counts == 2) & (forward_counts != 1))),
+        'degenerate_triangles': sum(checks['degenerate_triangles'] for checks, _ in results),
+        'duplicate_triangles': (sum(checks['duplicate_triangles'] for checks, _ in results)
+                                + len(face_keys) - len(_group_starts(face_keys))),
+        'closed': bool(len(counts)) and open_edges == 0 and non_manifold == 0,
+        'volume': float(sum(checks['volume'] for checks, _ in results)),
+    }
+
+
+def surface_issues(checks):
+    """
+    Describe the defects of a single surface.
+
+    Open edges are not listed: a surface may be one patch of a closed
+    geometry, whose closure is checked with combined_issues.
+
+    Args:
+        checks (dict): Result of mesh_checks
+
+    Returns:
+        list: Messages, empty for a clean surface
+    """
+    issues = []
+    if checks['degenerate_triangles']:
+        issues.append(f"{checks['degenerate_triangles']} degenerate triangles")
+    if checks['duplicate_triangles']:
+        issues.append(f"{checks['duplicate_triangles']} duplicate triangles")
+    if checks['non_manifold_edges']:
+        issues.append(f"{checks['non_manifold_edges']} non-manifold edges")
+    if checks['inconsistent_edges']:
+        issues.append(f"{checks['inconsistent_edges']} edges between triangles with opposite normals")
+    return issues
+
+
+def combined_issues(checks):
+    """
+    Describe the defects of all surfaces of a case welded together.
+
+    Args:
+        checks (dict): Result of mesh_checks for the combined surfaces
+
+    Returns:
+        list: Messages, empty for a watertight, consistently oriented geometry
+    """
+    issues = []
+    if checks['open_edges']:
+        issues.append(f"not watertight, {checks['open_edges']} open edges")
+    if checks['non_manifold_edges']:
+        issues.append(f"{checks['non_manifold_edges']} non-manifold edges")
+    if checks['inconsistent_edges']:
+        issues.append(f"{checks['inconsistent_edges']} edges between triangles with opposite normals")
+    if checks['closed'] and not checks['inconsistent_edges'] and checks['volume'] < 0:
+        issues.append("normals point inwards (negative enclosed volume)")
+    return issues
+
+
+def check_surfaces(stl_files, min_area=None, return_keys=False):
+    """
+    Read and check one or more STL files as a single welded mesh.
+
+    The files are welded chunk by chunk into float32 points, so the triangles
+    are never held in memory as a whole.
+
+    Args:
+        stl_files (list): Paths of the STL files
+        min_area (float): Degenerate triangle area, see mesh_checks
+        return_keys (bool): Also return the hashes for combine_checks, see mesh_checks
+
+    Returns:
+        dict: Result of mesh_checks
+    """
+    points, faces = weld_stl_files(stl_files)
+    return mesh_checks(points, faces, min_area, return_keys)
+
+
+def validate_stl_files(stl_files, workers=1, min_area=None):
+    """
+    Validate the STL files of a case, one process per surface.
+
+    Every surface is checked on its own. Whether all surfaces together enclose
+    a watertight, outward oriented volume is worked out from the edge hashes
+    and volumes of the surfaces (see combine_checks), so no process ever holds
+    the triangles of more than one surface.
+
+    Args:
+        stl_files (list): Paths of the STL files
+        workers (int): Number of worker processes, 0 for one per CPU core
+        min_area (float): Degenerate triangle area, see mesh_checks
+
+    Returns:
+        dict: 'surfaces' maps each file name to its checks and 'issues',
+            'combined' holds the checks and 'issues' of all surfaces together,
+            and 'ok' is True when there are no issues at all
+    """
+    stl_files = [Path(f) for f in stl_files]
+    if workers == 0:
+        workers = os.cpu_count() or 1
+    if workers <= 1 or len(stl_files) <= 1:
+        results = [check_surfaces([f], min_area, return_keys=True) for f in stl_files]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(stl_files))) as pool:
+            futures = [pool.submit(check_surfaces, [f], min_area, True) for f in stl_files]
+            results = [future.result() for future in futures]
+
+    surfaces = {}
+    for stl_file, (checks, _) in zip(stl_files, results):
+        surfaces[stl_file.name] = dict(checks, issues=surface_issues(checks))
+    combined = combine_checks(results)
+    combined = dict(combined, issues=combined_issues(combined))
+    return {
+        'surfaces': surfaces,
+        'combined': combined,
+        'ok': not combined['issues'] and not any(s['issues'] for s in surfaces.values()),
+    }
+
+
+def validation_problems(report):
+    """
+    List every issue of a validation report as '<surface>: <issue>'.
+
+    Args:
+        report (dict): Report returned by validate_stl_files
+
+    Returns:
+        list: Messages
+    """
+    problems = [f"{name}: {issue}" for name, entry in report['surfaces'].items() for issue in entry['issues']]
+    problems += [f"all surfaces: {issue}" for issue in report['combined']['issues']]
+    return problems
+
+
+def check_validation(report, on_invalid='warn'):
+    """
+    Act on the issues of a validation report.
+
+    Args:
+        report (dict): Report returned by validate_stl_files
+        on_invalid (str): 'warn' to print a warning, 'error' to raise ValueError
+
+    Returns:
+        list: Messages describing each issue, empty if the geometry is clean
+    """
+    problems = validation_problems(report)
+    if problems and on_invalid == 'error':
+        raise ValueError("Invalid STL geometry: " + "; ".join(problems))
+    for problem in problems:
+        print(f"Warning: {problem}")
+    return problems
+
+
+def write_validation(report, output_path, on_invalid='warn'):
+    """
+    Write a validation report as JSON.
+
+    The report records whether it blocks the case, i.e. has issues while
+    on_invalid is 'error', so the mesh pipeline can skip the case.
+
+    Args:
+        report (dict): Report returned by validate_stl_files
+        output_path (str): Path of the JSON file
+        on_invalid (str): 'warn' or 'error'
+    """
+    report = dict(report, blocked=not report['ok'] and on_invalid == 'error')
+    with open(output_path, 'w') as f:
+        json.dump(report, f, indent=2)
+
+
+def main(argv=None):
+    """
+    Command line entry point validating STL files.
+
+    Args:
+        argv (list): Command line arguments, defaults to sys.argv[1:]
+    """
+    parser = argparse.ArgumentParser(description="Check STL files for open, non-manifold or flipped edges "
+                                                 "and degenerate or duplicate triangles.")
+    parser.add_argument('stl_files', nargs='+', help="STL files forming one geometry")
+    parser.add_argument('-j', '--workers', type=int, default=1, help="number of worker processes, 0 for one per CPU core")
+    parser.add_argument('--min-area', type=float, help="area below which a triangle is degenerate")
+    parser.add_argument('--output', help="also write the report as JSON to this file")
+    args = parser.parse_args(argv)
+
+    report = validate_stl_files(args.stl_files, args.workers, args.min_area)
+    for name, entry in list(report['surfaces'].items()) + [('all surfaces', report['combined'])]:
+        print(f"{name}: {entry['triangles']} triangles, {entry['open_edges']} open edges, "
+              f"volume {entry['volume']:.6g}" + ("" if entry['issues'] else ", ok"))
+        for issue in entry['issues']:
+            print(f"  {issue}")
+    if args.output:
+        write_validation(report, args.output)
+    return 0 if report['ok'] else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
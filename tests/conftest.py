@@ -0,0 +1,127 @@
+import sys
+from pathlib import Path
+import numpy as np
+import pytest
+
+# The modules live flat in the repository root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmark import write_synthetic_stl  # noqa: E402
+from convert_stl import triangle_normals  # noqa: E402
+from stl_scan import BINARY_RECORD_DTYPE, binary_header  # noqa: E402
+
+
+def box_triangles(lo=(0.0, 0.0, 0.0), hi=(1.0, 1.0, 1.0)):
+    """
+    The 12 outward-oriented triangles of a closed axis-aligned box.
+    """
+    lo = np.asarray(lo, dtype=np.float64)
+    hi = np.asarray(hi, dtype=np.float64)
+    corners = np.array([[hi[i] if (c >> i) & 1 else lo[i] for i in range(3)] for c in range(8)])
+    quads = [(0, 2, 3, 1), (4, 5, 7, 6), (0, 1, 5, 4), (2, 6, 7, 3), (0, 4, 6, 2), (1, 3, 7, 5)]
+    faces = [tri for a, b, c, d in quads for tri in ((a, b, c), (a, c, d))]
+    return corners[np.array(faces)]
+
+
+def write_triangles(path, triangles, binary=True, name=None):
+    """
+    Write an array of shape (n, 3, 3) as a binary or ASCII STL file.
+    """
+    path = Path(path)
+    name = name or path.stem
+    triangles = np.asarray(triangles, dtype=np.float32)
+    normals = triangle_normals(triangles)
+    if binary:
+        records = np.zeros(len(triangles), dtype=BINARY_RECORD_DTYPE)
+        records['normal'] = normals
+        records['vectors'] = triangles
+        path.write_bytes(binary_header(name) + np.uint32(len(triangles)).astype('<u4').tobytes()
+                         + records.tobytes())
+        return path
+    lines = [f"solid {name}"]
+    for normal, triangle in zip(normals, triangles):
+        lines.append("  facet normal {:.7e} {:.7e} {:.7e}".format(*normal))
+        lines.append("    outer loop")
+        lines.extend("      vertex {:.7e} {:.7e} {:.7e}".format(*vertex) for vertex in triangle)
+        lines.append("    endloop")
+        lines.append("  endfacet")
+    lines.append(f"endsolid {name}")
+    path.write_text('\n'.join(lines) + '\n')
+    return path
+
+
+@pytest.fixture
+def torus_stl(tmp_path):
+    """
+    Factory writing a closed torus STL into the test's temporary directory.
+    """
+    def make(name='torus', n_triangles=2000, binary=True, center=(0.0, 0.0, 0.0), directory=None):
+        directory = Path(directory or tmp_path)
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / f'{name}.stl'
+        write_synthetic_stl(path, n_triangles, binary, name, center)
+        return path
+    return make
+
+
+FAKE_OPENFOAM = """#!/bin/sh
+# Stand-in for OpenFOAM, run from the case directory with the command line
+# as arguments. Traces every command, fails where a case asks it to with
+# 'fail.<application>' or 'fail_once.<application>', and otherwise writes
+# stand-ins for the .eMesh files and the mesh and ends its log like OpenFOAM.
+app="$1"
+[ "$app" = mpirun ] && app="$4"
+echo "start $(date +%s.%N) $PWD $*" >> "{trace}"
+sleep {seconds}
+echo "end $(date +%s.%N) $PWD $*" >> "{trace}"
+if [ -e "fail_once.$app" ]; then rm "fail_once.$app"; exit 1; fi
+if [ -e "fail.$app" ]; then exit 1; fi
+if [ "$app" = surfaceFeatureExtract ]; then
+    for stl in constant/triSurface/*.stl*; do
+        name="${{stl##*/}}"
+        echo "()" > "constant/triSurface/${{name%%.*}}.eMesh"
+    done
+fi
+if [ "$app" = snappyHexMesh ]; then
+    mkdir -p constant/polyMesh
+    echo "$PWD" > constant/polyMesh/points
+fi
+echo End
+"""
+
+
+@pytest.fixture
+def fake_openfoam(tmp_path):
+    """
+    Factory writing a stand-in OpenFOAM executable for the fake backend.
+
+    The executable appends 'start|end <time> <case dir> <command>' lines to the
+    file returned by trace(path).
+    """
+    def make(seconds=0.0):
+        path = tmp_path / 'fake_openfoam.sh'
+        path.write_text(FAKE_OPENFOAM.format(trace=trace(path), seconds=seconds))
+        path.chmod(0o755)
+        return path
+    return make
+
+
+def trace(fake_executable):
+    """
+    Path of the trace file of a fake_openfoam executable.
+    """
+    return Path(fake_executable).with_suffix('.trace')
+
+
+def read_trace(fake_executable):
+    """
+    Read the trace of a fake_openfoam executable as (event, time, case name, argv) tuples.
+    """
+    path = trace(fake_executable)
+    if not path.exists():
+        return []
+    events = []
+    for line in path.read_text().splitlines():
+        event, time, case_dir, *argv = line.split()
+        events.append((event, float(time), Path(case_dir).name, argv))
+    return events
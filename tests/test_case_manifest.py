@@ -0,0 +1,49 @@
+import os
+from case_manifest import CaseManifest
+
+
+def _write(path, text):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text)
+    return path
+
+
+def test_is_current_tracks_inputs_params_and_mtime(tmp_path):
+    output = _write(tmp_path / 'system' / 'blockMeshDict', 'v1')
+    manifest = CaseManifest(tmp_path)
+    manifest.record(output, {'a.stl': 'h1'}, {'cells': (20, 20, 30)})
+    manifest.save()
+
+    manifest = CaseManifest(tmp_path)
+    # Tuples and lists compare equal, as the parameters go through JSON
+    assert manifest.is_current(output, {'a.stl': 'h1'}, {'cells': [20, 20, 30]})
+    assert not manifest.is_current(output, {'a.stl': 'h2'}, {'cells': (20, 20, 30)})
+    assert not manifest.is_current(output, {'a.stl': 'h1', 'b.stl': 'h3'}, {'cells': (20, 20, 30)})
+    assert not manifest.is_current(output, {'a.stl': 'h1'}, {'cells': (20, 20, 31)})
+    assert not manifest.is_current(tmp_path / 'system' / 'other', {'a.stl': 'h1'}, {'cells': (20, 20, 30)})
+
+    stat = os.stat(output)
+    os.utime(output, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000))
+    assert not manifest.is_current(output, {'a.stl': 'h1'}, {'cells': (20, 20, 30)})
+    manifest.record(output, {'a.stl': 'h1'}, {'cells': (20, 20, 30)})
+    assert manifest.is_current(output, {'a.stl': 'h1'}, {'cells': (20, 20, 30)})
+
+    output.unlink()
+    assert not manifest.is_current(output, {'a.stl': 'h1'}, {'cells': (20, 20, 30)})
+
+
+def test_prune_removes_only_recorded_outputs_no_longer_produced(tmp_path):
+    kept = _write(tmp_path / 'constant' / 'triSurface' / 'a.stl', 'a')
+    stale = _write(tmp_path / 'constant' / 'triSurface' / 'b.stl', 'b')
+    foreign = _write(tmp_path / 'constant' / 'triSurface' / 'c.stl', 'c')
+    manifest = CaseManifest(tmp_path)
+    manifest.record(kept, {}, {})
+    manifest.record(stale, {}, {})
+    manifest.save()
+
+    manifest = CaseManifest(tmp_path)
+    assert manifest.is_current(kept, {}, {})
+    assert manifest.prune() == ['constant/triSurface/b.stl']
+    assert kept.exists() and not stale.exists() and foreign.exists()
+    manifest.save()
+    assert list(CaseManifest(tmp_path).outputs) == ['constant/triSurface/a.stl']
@@ -0,0 +1,86 @@
+import io
+import pytest
+from container_worker import ShellWorker, docker_shell_argv
+from mesh_pipeline import ContainerBackend
+
+
+def stand_in_docker(tmp_path):
+    """
+    A script taking docker's place that starts a local shell instead of a container.
+    """
+    path = tmp_path / 'docker'
+    path.write_text('#!/bin/sh\nexec sh -s\n')
+    path.chmod(0o755)
+    return str(path)
+
+
+def _run(worker, rel_dir, argv):
+    log = io.BytesIO()
+    returncode = worker.run(rel_dir, argv, log)
+    return returncode, log.getvalue()
+
+
+def test_output_and_exit_codes(tmp_path):
+    (tmp_path / 'case one').mkdir()
+    worker = ShellWorker(['sh', '-s'], cwd=str(tmp_path))
+    try:
+        assert _run(worker, 'case one', ['sh', '-c', 'pwd; echo err >&2']) == (0, f"{tmp_path}/case one\nerr\n".encode())
+        assert _run(worker, '.', ['printf', 'no newline']) == (0, b'no newline')
+        assert _run(worker, '.', ['printf', '']) == (0, b'')
+        assert _run(worker, '.', ['sh', '-c', 'echo "$1"; exit 3', 'sh', "it's a 'quoted' arg"]) == (
+            3, b"it's a 'quoted' arg\n")
+        assert _run(worker, 'missing', ['true'])[0] != 0
+    finally:
+        worker.close()
+    assert worker.commands_run == 5 and not worker.alive
+
+
+def test_shell_is_reused_and_commands_cannot_read_its_input(tmp_path):
+    worker = ShellWorker(['sh', '-s'], cwd=str(tmp_path))
+    try:
+        _, first = _run(worker, '.', ['sh', '-c', 'echo $PPID'])
+        pid = worker.process.pid
+        # A command reading stdin gets nothing, instead of the next commands
+        assert _run(worker, '.', ['cat']) == (0, b'')
+        _, second = _run(worker, '.', ['sh', '-c', 'echo $PPID'])
+        assert worker.process.pid == pid and first == second
+    finally:
+        worker.close()
+
+
+def test_output_resembling_the_marker_is_kept(tmp_path):
+    worker = ShellWorker(['sh', '-s'], cwd=str(tmp_path))
+    try:
+        fake_marker = '__shell_worker_0__ 7'
+        assert _run(worker, '.', ['echo', fake_marker]) == (0, f"{fake_marker}\n".encode())
+    finally:
+        worker.close()
+
+
+def test_dead_shell_is_reported_and_restarted(tmp_path):
+    flag = tmp_path / 'died'
+    # The first shell exits after its first command line, later ones behave
+    launch = ['sh', '-c', f'if [ -e {flag} ]; then exec sh -s; fi; touch {flag}; read line; exit 7']
+    worker = ShellWorker(launch, cwd=str(tmp_path))
+    try:
+        returncode, log = _run(worker, '.', ['echo', 'lost'])
+        assert returncode == 125 and b'Worker shell exited with code 7' in log
+        assert _run(worker, '.', ['echo', 'again']) == (0, b'again\n')
+    finally:
+        worker.close()
+
+
+def test_container_backend_reuses_workers(tmp_path):
+    workspace = tmp_path / 'meshes'
+    for name in ('a', 'b', 'c'):
+        (workspace / name).mkdir(parents=True)
+    backend = ContainerBackend(workspace, docker_shell_argv(workspace, docker=stand_in_docker(tmp_path)),
+                               max_workers=1)
+    for name in ('a', 'b', 'c'):
+        with open(workspace / name / 'log.pwd', 'wb') as log_file:
+            assert backend.run(str(workspace / name), ['pwd'], log_file) == 0
+        assert (workspace / name / 'log.pwd').read_text() == f"{workspace / name}\n"
+    with pytest.raises(ValueError):
+        backend.run(str(tmp_path), ['pwd'], io.BytesIO())
+    backend.close()
+    assert len(backend.workers) == 1 and backend.workers[0].commands_run == 3
@@ -0,0 +1,59 @@
+import gzip
+import numpy as np
+import pytest
+from conftest import box_triangles, write_triangles
+from convert_stl import convert_stl_to_binary, main
+from stl_scan import BINARY_HEADER_SIZE, BINARY_RECORD_DTYPE, binary_header, binary_solid_name, iter_stl_triangles
+
+
+def _read(path):
+    return np.concatenate(list(iter_stl_triangles(str(path))))
+
+
+@pytest.fixture
+def ascii_torus(torus_stl):
+    return torus_stl(name='ring', n_triangles=3000, binary=False)
+
+
+@pytest.mark.parametrize('block_size', [1 << 12, 1 << 24])
+def test_ascii_to_binary(ascii_torus, tmp_path, block_size):
+    dst = tmp_path / 'out' / 'ring.stl'
+    dst.parent.mkdir()
+    n_bytes = convert_stl_to_binary(ascii_torus, dst, block_size=block_size)
+    expected = _read(ascii_torus)
+    data = dst.read_bytes()
+    assert n_bytes == len(data) == BINARY_HEADER_SIZE + 4 + len(expected) * BINARY_RECORD_DTYPE.itemsize
+    assert data[:BINARY_HEADER_SIZE] == binary_header('ring')
+    assert int(np.frombuffer(data, '<u4', 1, BINARY_HEADER_SIZE)[0]) == len(expected)
+    np.testing.assert_array_equal(_read(dst), expected)
+    assert [p.name for p in dst.parent.iterdir()] == ['ring.stl']
+
+
+def test_ascii_to_gzip(ascii_torus, tmp_path):
+    dst = tmp_path / 'ring.stl.gz'
+    convert_stl_to_binary(ascii_torus, dst, compress=True, name='renamed', block_size=1 << 12)
+    data = gzip.decompress(dst.read_bytes())
+    expected = _read(ascii_torus)
+    assert data[:BINARY_HEADER_SIZE] == binary_header('renamed')
+    assert int(np.frombuffer(data, '<u4', 1, BINARY_HEADER_SIZE)[0]) == len(expected)
+    np.testing.assert_array_equal(_read(dst), expected)
+
+
+def test_binary_to_gzip(tmp_path):
+    src = write_triangles(tmp_path / 'box.stl', box_triangles((0, 0, 0), (1, 2, 3)))
+    convert_stl_to_binary(src, tmp_path / 'box.stl.gz', compress=True)
+    assert gzip.decompress((tmp_path / 'box.stl.gz').read_bytes()) == src.read_bytes()
+
+    convert_stl_to_binary(src, tmp_path / 'named.stl', name='wall')
+    assert binary_solid_name(tmp_path / 'named.stl') == 'wall'
+    assert (tmp_path / 'named.stl').read_bytes()[BINARY_HEADER_SIZE:] == src.read_bytes()[BINARY_HEADER_SIZE:]
+
+
+def test_round_trip_through_ascii(tmp_path, capsys):
+    # Coordinates exactly representable in float32 and ASCII survive both ways
+    triangles = box_triangles((-1.5, 0.25, 2), (0.75, 3, 4.5))
+    src = write_triangles(tmp_path / 'box.stl', triangles, binary=False)
+    main([str(src), str(tmp_path / 'box_binary.stl')])
+    assert 'Converted' in capsys.readouterr().out
+    np.testing.assert_array_equal(_read(tmp_path / 'box_binary.stl'), np.asarray(triangles, dtype=np.float32))
+    assert binary_solid_name(tmp_path / 'box_binary.stl') == 'box'
@@ -0,0 +1,68 @@
+import gzip
+import numpy as np
+from conftest import box_triangles, write_triangles
+from decimate_stl import decimate_stl, decimate_surface, target_edge_lengths
+from stl_scan import iter_stl_triangles
+
+
+def _read(path):
+    return np.concatenate(list(iter_stl_triangles(str(path))))
+
+
+def test_torus_is_decimated_to_the_edge_length(torus_stl, tmp_path):
+    stl_file = torus_stl(n_triangles=20000)
+    result = decimate_stl(stl_file, tmp_path / 'coarse.stl', 0.1)
+    assert result['triangles_in'] == len(_read(stl_file))
+    assert 0 < result['triangles_out'] < result['triangles_in'] / 4
+    triangles = _read(tmp_path / 'coarse.stl')
+    assert len(triangles) == result['triangles_out']
+    # Points stay on the torus of major radius 1 and minor radius 0.3
+    points = triangles.reshape(-1, 3)
+    distance = np.hypot(np.hypot(points[:, 0], points[:, 1]) - 1.0, points[:, 2])
+    assert np.all(np.abs(distance - 0.3) < 0.02)
+
+
+def test_box_corners_are_kept():
+    # A finely split box: every face cut into a 10 x 10 grid of squares
+    triangles = []
+    for tri in box_triangles():
+        a, b, c = tri
+        for i in range(10):
+            for j in range(10 - i):
+                p = a + (b - a) * i / 10 + (c - a) * j / 10
+                u, v = (b - a) / 10, (c - a) / 10
+                triangles.append([p, p + u, p + v])
+                if i + j < 9:
+                    triangles.append([p + u, p + u + v, p + v])
+    triangles = np.array(triangles)
+    points, faces = decimate_surface(triangles.reshape(-1, 3), np.arange(3 * len(triangles)).reshape(-1, 3), 0.3)
+    assert len(faces) < len(triangles)
+    corners = box_triangles().reshape(-1, 3)
+    distance = np.linalg.norm(points[:, None] - corners[None], axis=2).min(axis=0)
+    np.testing.assert_allclose(distance, 0, atol=1e-9)
+
+
+def test_per_axis_edge_lengths(tmp_path):
+    stl_files = [tmp_path / 'a.stl', tmp_path / 'b.stl']
+    lengths = target_edge_lengths(stl_files, (0, 0, 0), (4, 2, 1), (4, 4, 4), surface_levels={'b': (1, 2)})
+    assert lengths == {'a.stl': [1.0, 0.5, 0.25], 'b.stl': [0.25, 0.125, 0.0625]}
+
+
+def test_chunks_give_the_single_chunk_result(torus_stl, tmp_path, monkeypatch):
+    import decimate_stl as module
+    stl_file = torus_stl(n_triangles=4000)
+    decimate_stl(stl_file, tmp_path / 'whole.stl', [0.15, 0.1, 0.05])
+    monkeypatch.setattr(module, 'CHUNK_TRIANGLES', 333)
+    decimate_stl(stl_file, tmp_path / 'chunked.stl', [0.15, 0.1, 0.05])
+    np.testing.assert_allclose(_read(tmp_path / 'chunked.stl'), _read(tmp_path / 'whole.stl'), atol=1e-6)
+
+
+def test_cleaning_drops_duplicate_and_degenerate_faces(tmp_path):
+    box = box_triangles()
+    degenerate = [[[0, 0, 0], [0.5, 0, 0], [1, 0, 0]]]
+    stl_file = write_triangles(tmp_path / 'dirty.stl', np.concatenate([box, box[:3, ::-1], degenerate]), binary=False)
+    result = decimate_stl(stl_file, tmp_path / 'clean.stl.gz', compress=True)
+    assert result == {'triangles_in': 16, 'triangles_out': 12, 'bytes': (tmp_path / 'clean.stl.gz').stat().st_size}
+    with gzip.open(tmp_path / 'clean.stl.gz') as f:
+        data = f.read()
+    assert data[:80].rstrip(b'\0 ').endswith(b'dirty') and len(data) == 84 + 50 * 12
@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+from conftest import box_triangles, write_triangles
+from feature_edges import (
+    edge_table,
+    extract_feature_edges,
+    weld_stl_files,
+    weld_vertices,
+    write_case_features,
+    write_surface_features,
+)
+from stl_scan import iter_stl_triangles
+
+
+@pytest.mark.parametrize('tolerance', [0.0, 1e-3])
+def test_chunked_weld_matches_weld_vertices(torus_stl, tolerance):
+    stl_file = torus_stl(n_triangles=5000)
+    triangles = np.concatenate(list(iter_stl_triangles(str(stl_file))))
+    points, faces = weld_stl_files([stl_file], tolerance, chunk_triangles=700)
+    vertices = triangles.reshape(-1, 3)
+    keys = np.floor(vertices / tolerance).astype(np.int64) if tolerance else vertices
+    _, first, inverse = np.unique(keys, axis=0, return_index=True, return_inverse=True)
+    np.testing.assert_array_equal(points, vertices[first])
+    np.testing.assert_array_equal(faces, inverse.reshape(-1, 3))
+    np.testing.assert_array_equal(weld_vertices(triangles, tolerance)[1], faces)
+    assert points.dtype == np.float32 and faces.dtype == np.int32
+
+
+def test_closed_surface_edges_have_two_faces(torus_stl):
+    points, faces = weld_stl_files([torus_stl(n_triangles=3000)])
+    edges, _, counts = edge_table(faces)
+    assert np.all(counts == 2)
+    assert len(points) - len(edges) + len(faces) == 0  # Euler characteristic of a torus
+
+
+@pytest.mark.parametrize('included_angle, n_edges', [(180, 18), (150, 12), (0, 0)])
+def test_box_feature_edges(tmp_path, included_angle, n_edges):
+    stl_file = write_triangles(tmp_path / 'box.stl', box_triangles())
+    points, faces = weld_stl_files([stl_file])
+    assert len(extract_feature_edges(points, faces, included_angle)) == n_edges
+
+
+def test_open_edges_are_always_features():
+    triangles = box_triangles()[:2]
+    points, faces = weld_vertices(triangles)
+    assert len(extract_feature_edges(points, faces, 0)) == 4
+
+
+def test_emesh_file(tmp_path):
+    stl_file = write_triangles(tmp_path / 'box.stl', box_triangles())
+    output_path, n_edges = write_surface_features(stl_file, tmp_path, 150)
+    text = open(output_path).read()
+    assert output_path.endswith('box.eMesh') and n_edges == 12
+    assert 'class       featureEdgeMesh;' in text
+    assert '\n8\n(\n' in text and '\n12\n(\n' in text
+
+
+def test_parallel_extraction_matches_serial(tmp_path, torus_stl):
+    stl_files = [torus_stl(f'part{i}', 1000, center=(3.0 * i, 0, 0)) for i in range(3)]
+    serial_dir, parallel_dir = tmp_path / 'serial', tmp_path / 'parallel'
+    serial_dir.mkdir()
+    parallel_dir.mkdir()
+    serial = write_case_features(stl_files, serial_dir, 120, workers=1)
+    parallel = write_case_features(stl_files, parallel_dir, 120, workers=2)
+    assert [n for _, n in serial] == [n for _, n in parallel]
+    for (a, _), (b, _) in zip(serial, parallel):
+        assert open(a).read() == open(b).read()
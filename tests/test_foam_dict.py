@@ -0,0 +1,152 @@
+from conftest import box_triangles, write_triangles
+import os
+from foam_dict import (FOAM_BANNER, FOAM_FOOTER, Keyword, TerminatedDict, iter_foam_entries, render_foam_file,
+                       write_static_foam_file, write_text)
+from generate_snappyHexMeshDict import generate_snappyHexMeshDict
+from generate_surfaceFeatureExtractDict import generate_surfaceFeatureExtractDict
+
+
+def test_header_variants():
+    text = render_foam_file('controlDict', {'body': None}, location='system')
+    assert text == (FOAM_BANNER + 'FoamFile\n{\n    version     2.0;\n    format      ascii;\n    class       dictionary;\n'
+                    '    location    "system";\n    object      controlDict;\n}\n'
+                    '// * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * //\n'
+                    '\nbody;\n\n' + FOAM_FOOTER)
+    spaced = render_foam_file('snappyHexMeshDict', {}, blank_line=True)
+    assert spaced.endswith('    object      snappyHexMeshDict;\n}\n\n// * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * //\n'
+                           '\n' + FOAM_FOOTER)
+    assert 'location' not in spaced
+
+
+def test_layout_is_explicit_in_the_model():
+    shared = {'// shared': None, 'level': (1, 2)}
+    entries = {
+        '// Comment\n// ~~~~~~~': None,
+        Keyword('snap'): True,
+        'mergeTolerance': '1E-6',
+        '\ngeometry': TerminatedDict({'a.stl': {'type': 'triSurfaceMesh', 'name': 'a'}}),
+        '\n\ncontrols': {
+            '#include': '"meshQualityDict"',
+            Keyword('\nn'): (2, 1, 1),
+            'distance': 1E15,
+            'surfaces': {'a': shared, 'b': shared},
+            'features': [{'file': '"a.eMesh"'}, ('named', {}), (3, 7, 6, 2)],
+        },
+        '\n': None,
+    }
+    assert ''.join(iter_foam_entries(entries)) == """// Comment
+// ~~~~~~~
+snap            true;
+mergeTolerance 1E-6;
+
+geometry
+{
+    a.stl
+    {
+        type triSurfaceMesh;
+        name a;
+    }
+};
+
+
+controls
+{
+    #include "meshQualityDict"
+
+    n           (2 1 1);
+    distance 1e+15;
+    surfaces
+    {
+        a
+        {
+            // shared
+            level (1 2);
+        }
+        b
+        {
+            // shared
+            level (1 2);
+        }
+    }
+    features
+    (
+        {
+            file "a.eMesh";
+        }
+        named
+        {
+        }
+        (3 7 6 2)
+    );
+}
+
+"""
+
+
+def test_static_dictionaries_are_written_as_rendered(tmp_path):
+    entries = {'//Forget this dictionary': None, '\ngradSchemes': {}}
+    write_static_foam_file(tmp_path / 'a' / 'fvSchemes', 'fvSchemes', entries, location='system')
+    assert (tmp_path / 'a' / 'fvSchemes').read_text() == render_foam_file('fvSchemes', entries, location='system')
+    assert (tmp_path / 'a' / 'fvSchemes').read_text().endswith('//Forget this dictionary\n\ngradSchemes\n{\n}\n\n' + FOAM_FOOTER)
+    assert [p.name for p in (tmp_path / 'a').iterdir()] == ['fvSchemes']
+    assert render_foam_file('fvSolution', {}).endswith('* //\n\n' + FOAM_FOOTER)
+
+
+def test_unchanged_files_keep_their_mtime(tmp_path):
+    path = tmp_path / 'Allrun'
+    write_text(path, ['#!/bin/sh\n'])
+    old = os.stat(path)
+    os.utime(path, ns=(old.st_atime_ns, old.st_mtime_ns - 10**9))
+    old = os.stat(path)
+
+    write_text(path, ['#!/bin/sh', '\n'])
+    assert os.stat(path).st_mtime_ns == old.st_mtime_ns
+    # A change in contents or mode replaces the file
+    write_text(path, ['#!/bin/sh\n'], executable=True)
+    assert os.stat(path).st_mtime_ns != old.st_mtime_ns and os.access(path, os.X_OK)
+    write_text(path, ['#!/bin/sh\nset -e\n'], executable=True)
+    assert path.read_text() == '#!/bin/sh\nset -e\n'
+    assert [p.name for p in tmp_path.iterdir()] == ['Allrun']
+
+
+def test_surface_entries(tmp_path):
+    for name in ('inlet', 'wall'):
+        write_triangles(tmp_path / f'{name}.stl', box_triangles())
+    sfe = generate_surfaceFeatureExtractDict(tmp_path, 150)
+    for name in ('inlet', 'wall'):
+        assert f"""
+{name}.stl
+{{
+    extractionMethod    extractFromSurface;
+
+    extractFromSurfaceCoeffs
+    {{
+        includedAngle   150;
+    }}
+
+        writeObj                yes;
+}}
+""" in sfe
+    assert sfe.endswith("}\n\n" + FOAM_FOOTER)
+
+    generate_snappyHexMeshDict(tmp_path, str(tmp_path / 'snappyHexMeshDict'), surface_levels={'wall': (2, 3)},
+                               feature_levels=1, refinement_regions=[
+                                   {'name': 'gap', 'mode': 'inside', 'level': 4, 'min': (0, 0, 0), 'max': (1, 1, 0.5)}])
+    snappy = (tmp_path / 'snappyHexMeshDict').read_text()
+    assert """    gap
+    {
+        type searchableBox;
+        min (0 0 0);
+        max (1 1 0.5);
+    }
+};
+""" in snappy
+    assert """        wall
+        {
+            // Surface-wise min and max refinement level
+            level (2 3);
+        }
+""" in snappy
+    assert 'file "inlet.eMesh";\n            level 1;' in snappy
+    assert 'levels ((1e+15 4));' in snappy
+    assert snappy.endswith('mergeTolerance 1E-6;\n\n' + FOAM_FOOTER)
@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+from generate_blockMeshDict import compute_block_cells
+
+
+def test_per_axis_cells():
+    lo, hi, cells, size = compute_block_cells((0, 0, 0), (1, 2.05, 0.3), cell_size=0.5)
+    # 0.3 rounds up to a single cell, 2.05 to five
+    assert cells == (2, 5, 1) and size == 0.5
+    np.testing.assert_allclose(hi - lo, np.array(cells) * size)
+    # The block grows symmetrically around the requested one
+    np.testing.assert_allclose((lo + hi) / 2, (0.5, 1.025, 0.15))
+
+
+def test_exact_fit_is_not_grown():
+    lo, hi, cells, _ = compute_block_cells((-1, -1, -1), (1, 3, 0), cell_size=0.25)
+    assert cells == (8, 16, 4)
+    np.testing.assert_allclose(lo, (-1, -1, -1))
+    np.testing.assert_allclose(hi, (1, 3, 0))
+
+
+def test_cell_budget():
+    lo, hi, cells, size = compute_block_cells((0, 0, 0), (4, 2, 1), cell_budget=1000)
+    assert np.prod(cells) <= 1000
+    assert cells[0] > cells[1] > cells[2]
+    np.testing.assert_allclose(hi - lo, np.array(cells) * size)
+
+
+def test_flat_block_clamps_to_one_cell():
+    # A zero-thickness extent still gets one cell, from a size or a budget
+    _, _, cells, size = compute_block_cells((0, 0, 0), (1, 1, 0), cell_size=0.1)
+    assert cells == (10, 10, 1)
+    _, _, cells, _ = compute_block_cells((0, 0, 0), (1, 1, 0), cell_budget=100)
+    assert cells[2] == 1 and np.prod(cells) <= 100
+    _, _, cells, _ = compute_block_cells((0, 0, 0), (1, 1, 1), cell_budget=1)
+    assert cells == (1, 1, 1)
+
+
+@pytest.mark.parametrize('cell_size, cell_budget', [(None, None), (None, 0), (0.0, None), (-1.0, 100)])
+def test_invalid_sizes(cell_size, cell_budget):
+    with pytest.raises(ValueError):
+        compute_block_cells((0, 0, 0), (1, 1, 1), cell_size, cell_budget)
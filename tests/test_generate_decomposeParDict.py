@@ -0,0 +1,14 @@
+import os
+from generate_decomposeParDict import write_allrun
+
+
+def test_allrun_is_executable_and_replaced_atomically(tmp_path):
+    write_allrun(str(tmp_path), 4)
+    allrun = tmp_path / 'Allrun'
+    assert os.access(allrun, os.X_OK)
+    assert 'mpirun -np 4 snappyHexMesh -parallel -overwrite > log.snappyHexMesh 2>&1' in allrun.read_text()
+
+    write_allrun(str(tmp_path), 1, extract_features=False)
+    assert os.access(allrun, os.X_OK)
+    assert 'mpirun' not in allrun.read_text() and 'surfaceFeatureExtract' not in allrun.read_text()
+    assert [p.name for p in tmp_path.iterdir()] == ['Allrun']
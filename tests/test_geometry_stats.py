@@ -0,0 +1,78 @@
+import json
+import numpy as np
+import pytest
+from conftest import box_triangles, write_triangles
+from geometry_stats import NORMAL_BANDS, NORMAL_SECTORS, GeometryStats, geometry_statistics, surface_stats
+
+
+def test_box_statistics(tmp_path):
+    stl_file = write_triangles(tmp_path / 'box.stl', box_triangles((1, 2, 3), (3, 3, 4)))
+    stats = surface_stats(stl_file).to_dict()
+    assert stats['triangle_count'] == 12 and stats['degenerate_triangles'] == 0
+    assert stats['bounding_box'] == [[1, 2, 3], [3, 3, 4]]
+    assert stats['surface_area'] == pytest.approx(2 * (2 + 2 + 1))
+    assert stats['volume'] == pytest.approx(2)
+    np.testing.assert_allclose(stats['centroid'], [2, 2.5, 3.5])
+    assert stats['closure'] == pytest.approx(0, abs=1e-12)
+
+    edges = stats['edge_length']
+    assert edges['min'] == 1 and edges['max'] == pytest.approx(np.sqrt(5))
+    # Edges of 1 fall in [1, 2), of 2 and the diagonals of sqrt(2) to sqrt(5) in [2, 4)
+    assert [lower for lower, _, _ in edges['histogram']] == [1, 2]
+    assert sum(count for _, _, count in edges['histogram']) == 36
+
+    # Each face's area lands in the bin of its normal, +x in the middle band facing azimuth 0
+    area = np.array(stats['normals']['area'])
+    assert area.shape == (NORMAL_BANDS, NORMAL_SECTORS)
+    assert area.sum() == pytest.approx(stats['surface_area'])
+    assert area[NORMAL_BANDS // 2, NORMAL_SECTORS // 2] == pytest.approx(1)
+    assert area[-1].sum() == pytest.approx(2) and area[0].sum() == pytest.approx(2)
+
+
+def test_inward_normals_give_negative_volume_and_degenerates_are_counted():
+    stats = GeometryStats()
+    stats.update(box_triangles()[:, ::-1].astype(np.float32))
+    stats.update(np.array([[[0, 0, 0], [1, 1, 1], [2, 2, 2]]], dtype=np.float32))
+    result = stats.to_dict()
+    assert result['volume'] == pytest.approx(-1)
+    assert result['triangle_count'] == 13 and result['degenerate_triangles'] == 1
+    assert np.sum(result['normals']['area']) == pytest.approx(6)
+
+
+def test_batches_files_and_workers_give_the_same_statistics(tmp_path, torus_stl):
+    stl_files = [torus_stl('binary', n_triangles=3000), torus_stl('ascii', n_triangles=1000, binary=False,
+                                                                  center=(3, 0, 0))]
+    whole = geometry_statistics(stl_files)
+    batched = geometry_statistics(stl_files, workers=2, batch_triangles=77, block_size=1000)
+    assert batched['surfaces'].keys() == whole['surfaces'].keys()
+    for name, entry in whole['surfaces'].items():
+        assert _rounded(batched['surfaces'][name]) == _rounded(entry)
+    assert _rounded(batched['combined']) == _rounded(whole['combined'])
+
+    combined = whole['combined']
+    assert combined['triangle_count'] == sum(entry['triangle_count'] for entry in whole['surfaces'].values())
+    assert combined['volume'] == pytest.approx(sum(entry['volume'] for entry in whole['surfaces'].values()))
+    # Two coarse tori of minor radius 0.3 about a major radius of 1
+    assert combined['volume'] == pytest.approx(2 * 2 * np.pi ** 2 * 0.3 ** 2, rel=0.05)
+    # The centroid is weighted by the area of each torus, centred at 0 and at x = 3
+    ascii_share = whole['surfaces']['ascii.stl']['surface_area'] / combined['surface_area']
+    np.testing.assert_allclose(combined['centroid'], [3 * ascii_share, 0, 0], atol=1e-6)
+    json.dumps(whole)
+
+
+def _rounded(value):
+    """
+    Round floats so sums taken in another order compare equal.
+    """
+    if isinstance(value, dict):
+        return {key: _rounded(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_rounded(item) for item in value]
+    if isinstance(value, float):
+        return round(value, 9)
+    return value
+
+
+def test_no_triangles_cannot_be_summarised():
+    with pytest.raises(ValueError):
+        GeometryStats().to_dict()
@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+from conftest import box_triangles, write_triangles
+from location_in_mesh import _crossing_lattice_rays, find_location_in_mesh, ray_parity
+from stl_scan import iter_stl_triangles
+
+
+@pytest.fixture
+def box_stl(tmp_path):
+    return write_triangles(tmp_path / 'box.stl', box_triangles((0.1, 0.05, 0.2), (1.1, 2.05, 0.95)))
+
+
+def _inside_box(point):
+    return 0.1 < point[0] < 1.1 and 0.05 < point[1] < 2.05 and 0.2 < point[2] < 0.95
+
+
+def test_inside_and_outside(box_stl):
+    min_coords, max_coords, cells = (-1.0, -1.0, -1.0), (2.0, 3.0, 2.0), (12, 16, 12)
+    inside = find_location_in_mesh([box_stl], min_coords, max_coords, cells, region='inside')
+    outside = find_location_in_mesh([box_stl], min_coords, max_coords, cells, region='outside')
+    assert _inside_box(inside)
+    assert not _inside_box(outside)
+    assert all(lo < c < hi for c, lo, hi in zip(outside, min_coords, max_coords))
+
+
+def test_point_is_off_cell_faces(box_stl):
+    point = find_location_in_mesh([box_stl], (-1, -1, -1), (2, 3, 2), (6, 8, 6), region='inside')
+    offsets = (np.array(point) + 1) / 0.5 % 1
+    assert np.all(np.abs(offsets - 1 / 3) < 1e-9)
+
+
+def test_torus_interior(torus_stl):
+    stl_file = torus_stl(n_triangles=20000)
+    point = find_location_in_mesh([stl_file], (-2, -2, -1), (2, 2, 1), (40, 40, 20), region='inside')
+    radius = np.hypot(point[0], point[1])
+    assert np.hypot(radius - 1.0, point[2]) < 0.3
+
+
+def test_only_triangles_near_candidate_rays_are_kept(torus_stl):
+    triangles = np.concatenate(list(iter_stl_triangles(str(torus_stl(n_triangles=50000)))))
+    min_coords, cell_size = np.array([-2.0, -2.0, -1.0]), np.array([0.2, 0.2, 0.2])
+    for axis in range(3):
+        assert _crossing_lattice_rays(triangles, axis, min_coords, cell_size).mean() < 0.2
+
+
+def test_ray_parity_per_axis_subsets_match_full_set(box_stl):
+    triangles = np.concatenate(list(iter_stl_triangles(str(box_stl))))
+    points = np.array([[0.3, 0.7, 0.4], [1.5, 0.7, 0.4], [0.2, -0.5, 0.9]])
+    odd, ambiguous = ray_parity(triangles, points)
+    np.testing.assert_array_equal(odd, [True, False, False])
+    assert not ambiguous.any()
+    # Rays along an axis only cross the two faces across it
+    odd_split, ambiguous_split = ray_parity([triangles[8:], triangles[4:8], triangles[:4]], points)
+    np.testing.assert_array_equal(odd_split, odd)
+    assert not ambiguous_split.any()
+
+
+def test_empty_surfaces_are_rejected(tmp_path):
+    stl_file = write_triangles(tmp_path / 'empty.stl', np.empty((0, 3, 3)))
+    with pytest.raises(ValueError):
+        find_location_in_mesh([stl_file], (0, 0, 0), (1, 1, 1), (4, 4, 4))
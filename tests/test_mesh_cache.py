@@ -0,0 +1,58 @@
+from pathlib import Path
+import pytest
+from mesh_cache import MeshCache
+from mesh_pipeline import FakeBackend, run_pipeline
+from setup_mesh_dirs import setup_case
+
+BASIC_BOX = Path(__file__).resolve().parent.parent / 'geometry' / 'basic_box'
+
+
+@pytest.fixture
+def basic_box_case(tmp_path):
+    setup_case(BASIC_BOX, tmp_path / 'meshes')
+    return tmp_path / 'meshes' / 'basic_box'
+
+
+def test_unchanged_case_is_a_hit_on_the_second_run(tmp_path, basic_box_case, fake_openfoam):
+    fake = fake_openfoam()
+    cache = MeshCache(tmp_path / 'cache')
+    [first] = run_pipeline([basic_box_case], FakeBackend(fake), cores=1, mesh_cache=cache, openfoam_version='v1')
+    assert first['ok'] and not first['cached']
+    # surfaceFeatureExtract wrote .eMesh files next to the surfaces
+    assert list((basic_box_case / 'constant' / 'triSurface').glob('*.eMesh'))
+    [entry] = cache.entries()
+    assert not any(name.endswith('.eMesh') for name in entry['inputs'])
+
+    [second] = run_pipeline([basic_box_case], FakeBackend(fake), cores=1, mesh_cache=MeshCache(tmp_path / 'cache'),
+                            openfoam_version='v1')
+    assert second['cached']
+    points = basic_box_case / 'constant' / 'polyMesh' / 'points'
+    assert points.stat().st_nlink == 2
+
+
+def test_changed_inputs_miss(tmp_path, basic_box_case, fake_openfoam):
+    fake = fake_openfoam()
+    cache = MeshCache(tmp_path / 'cache')
+    run_pipeline([basic_box_case], FakeBackend(fake), cores=1, mesh_cache=cache, openfoam_version='v1')
+    key = cache.key(basic_box_case, 'v1')
+    assert cache.key(basic_box_case, 'v2') != key
+
+    snappy_dict = basic_box_case / 'system' / 'snappyHexMeshDict'
+    snappy_dict.write_text(snappy_dict.read_text() + '// edited\n')
+    assert cache.key(basic_box_case, 'v1') != key
+    [result] = run_pipeline([basic_box_case], FakeBackend(fake), cores=1, mesh_cache=cache, openfoam_version='v1')
+    assert result['ok'] and not result['cached']
+    assert len(cache.entries()) == 2
+
+
+def test_store_records_the_inputs_of_the_key(tmp_path, basic_box_case):
+    cache = MeshCache(tmp_path / 'cache')
+    key = cache.key(basic_box_case, 'v1')
+    inputs = cache.inputs(basic_box_case)
+    poly_mesh = basic_box_case / 'constant' / 'polyMesh'
+    poly_mesh.mkdir()
+    (poly_mesh / 'points').write_text('()\n')
+    # A dictionary changed while meshing does not change what the mesh was keyed on
+    (basic_box_case / 'system' / 'controlDict').write_text('// changed\n')
+    assert cache.store(key, basic_box_case, 'v1')
+    assert cache.entries()[0]['inputs'] == inputs
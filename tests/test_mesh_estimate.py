@@ -0,0 +1,55 @@
+import numpy as np
+from conftest import write_triangles
+from mesh_estimate import _KeySet, check_budget, estimate_mesh, surface_cell_keys, tune_cell_limits
+from stl_scan import iter_stl_triangles
+
+
+def _square(z, lo=0.01, hi=0.99):
+    a, b, c, d = (lo, lo, z), (hi, lo, z), (hi, hi, z), (lo, hi, z)
+    return np.array([[a, b, c], [a, c, d]])
+
+
+def test_surface_cell_keys_uses_per_axis_cell_sizes():
+    keys = surface_cell_keys(_square(0.55), np.zeros(3), np.array([0.1, 0.25, 1.0]), (10, 4, 2))
+    ix, iy, iz = keys % 10, (keys // 10) % 4, keys // 40
+    assert len(keys) == 40
+    assert set(ix) == set(range(10)) and set(iy) == set(range(4)) and set(iz) == {0}
+
+
+def test_estimate_mesh_covers_non_cubic_block(torus_stl):
+    stl_file = torus_stl(n_triangles=4000)
+    min_coords, max_coords, cells = np.array([-2.0, -2.0, -1.0]), np.array([2.0, 2.0, 1.0]), (8, 8, 20)
+    estimate = estimate_mesh([stl_file], min_coords, max_coords, cells, surface_levels=(0, 1))
+
+    triangles = np.concatenate(list(iter_stl_triangles(str(stl_file))))
+    keys = surface_cell_keys(triangles, min_coords, (max_coords - min_coords) / cells, cells)
+    assert estimate['surface_cells'] == [len(keys)]
+    # The torus is centred in the block, so the touched cells are symmetric
+    # unless triangles were clipped into the last layer of a too small grid
+    ix = keys % 8
+    assert set(ix) == {7 - i for i in ix}
+    assert estimate['estimated_cells'] == 8 * 8 * 20 + 7 * estimate['refined_cells'][0]
+
+
+def test_estimate_mesh_without_refinement_is_the_background(tmp_path):
+    stl_file = write_triangles(tmp_path / 'square.stl', _square(0.5))
+    estimate = estimate_mesh([stl_file], np.zeros(3), np.ones(3), (4, 4, 4))
+    assert estimate['estimated_cells'] == 64
+    assert estimate['surface_cells'] == [] and estimate['triangles'] == 2
+
+
+def test_key_set_matches_union():
+    rng = np.random.default_rng(0)
+    arrays = [np.unique(rng.integers(0, 5000, 300)) for _ in range(50)]
+    key_set = _KeySet()
+    for keys in arrays:
+        key_set.add(keys)
+    assert len(key_set) == len(np.unique(np.concatenate(arrays)))
+    np.testing.assert_array_equal(key_set.keys, np.unique(np.concatenate(arrays)))
+
+
+def test_budget_and_limits():
+    estimate = {'estimated_cells': 3_000_000, 'estimated_memory_bytes': 4 * 2**30}
+    assert len(check_budget(estimate, max_cells=1_000_000, max_memory_bytes=2**30)) == 2
+    assert check_budget(estimate, max_cells=5_000_000) == []
+    assert tune_cell_limits(estimate, n_procs=4) == (1_000_000, 3_800_000)
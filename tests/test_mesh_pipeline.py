@@ -0,0 +1,160 @@
+import json
+import os
+from pathlib import Path
+import pytest
+from conftest import read_trace
+from mesh_pipeline import DockerBackend, FakeBackend, find_cases, run_pipeline
+
+
+def make_case(meshes_dir, name, n_subdomains=1, extracted=False):
+    """
+    A case directory with just enough for the scheduler to build its steps.
+    """
+    case_dir = Path(meshes_dir) / name
+    (case_dir / 'system').mkdir(parents=True)
+    (case_dir / 'constant' / 'triSurface').mkdir(parents=True)
+    (case_dir / 'system' / 'blockMeshDict').write_text('// blockMeshDict\n')
+    (case_dir / 'constant' / 'triSurface' / 'part.stl').write_text('solid part\nendsolid part\n')
+    if extracted:
+        (case_dir / 'constant' / 'triSurface' / 'part.eMesh').write_text('()\n')
+    if n_subdomains > 1:
+        (case_dir / 'system' / 'decomposeParDict').write_text(f'numberOfSubdomains {n_subdomains};\n')
+    return case_dir
+
+
+def peak_cores(events, budget):
+    """
+    Most cores in use at once, with steps larger than the budget counted as the budget.
+    """
+    in_use, peak = 0, 0
+    for event, _, _, argv in sorted(events, key=lambda e: (e[1], e[0] == 'start')):
+        cores = min(int(argv[2]), budget) if argv[0] == 'mpirun' else 1
+        in_use += cores if event == 'start' else -cores
+        peak = max(peak, in_use)
+    return peak
+
+
+def _statuses(result):
+    return {step['step']: step['status'] for step in result['steps']}
+
+
+def test_steps_share_the_core_budget(tmp_path, fake_openfoam):
+    fake = fake_openfoam(seconds=0.2)
+    for n in range(3):
+        make_case(tmp_path / 'meshes', f'case{n}')
+    make_case(tmp_path / 'meshes', 'parallel', n_subdomains=4)
+    results = run_pipeline(find_cases(tmp_path / 'meshes'), FakeBackend(fake), cores=2)
+
+    assert all(result['ok'] for result in results)
+    events = read_trace(fake)
+    assert len(events) == 2 * (3 * 3 + 5)
+    assert peak_cores(events, 2) == 2
+    # The 4-subdomain snappyHexMesh is capped at the budget and runs alone
+    start, end = [t for event, t, case, argv in events if case == 'parallel' and 'snappyHexMesh' in argv]
+    assert not any(start < t < end for _, t, case, _ in events if case != 'parallel')
+
+
+def test_dependencies_are_respected(tmp_path, fake_openfoam):
+    fake = fake_openfoam(seconds=0.05)
+    make_case(tmp_path / 'meshes', 'case', n_subdomains=2)
+    run_pipeline(find_cases(tmp_path / 'meshes'), FakeBackend(fake), cores=4)
+    times = {(argv[3] if argv[0] == 'mpirun' else argv[0], event): t for event, t, _, argv in read_trace(fake)}
+    assert times['decomposePar', 'start'] >= times['blockMesh', 'end']
+    assert times['snappyHexMesh', 'start'] >= max(times['decomposePar', 'end'], times['surfaceFeatureExtract', 'end'])
+    assert times['reconstructParMesh', 'start'] >= times['snappyHexMesh', 'end']
+
+
+def test_extracted_features_skip_surfaceFeatureExtract(tmp_path, fake_openfoam):
+    fake = fake_openfoam()
+    make_case(tmp_path / 'meshes', 'case', extracted=True)
+    [result] = run_pipeline(find_cases(tmp_path / 'meshes'), FakeBackend(fake), cores=1)
+    assert list(_statuses(result)) == ['blockMesh', 'snappyHexMesh']
+
+
+@pytest.mark.parametrize('retries, status', [(0, 'failed'), (1, 'ok')])
+def test_retries(tmp_path, fake_openfoam, retries, status):
+    fake = fake_openfoam()
+    case_dir = make_case(tmp_path / 'meshes', 'case')
+    (case_dir / 'fail_once.blockMesh').touch()
+    [result] = run_pipeline([case_dir], FakeBackend(fake), cores=2, retries=retries)
+    block_mesh = next(step for step in result['steps'] if step['step'] == 'blockMesh')
+    assert block_mesh['status'] == status
+    assert block_mesh['attempts'] == retries + 1
+    assert result['ok'] == (status == 'ok')
+    assert _statuses(result)['snappyHexMesh'] == ('ok' if result['ok'] else 'skipped')
+
+
+def test_failed_case_is_skipped_while_others_carry_on(tmp_path, fake_openfoam):
+    fake = fake_openfoam()
+    failing = make_case(tmp_path / 'meshes', 'failing')
+    make_case(tmp_path / 'meshes', 'working')
+    (failing / 'fail.surfaceFeatureExtract').touch()
+    results = run_pipeline(find_cases(tmp_path / 'meshes'), FakeBackend(fake), cores=1, retries=2)
+
+    assert [result['ok'] for result in results] == [False, True]
+    assert _statuses(results[0]) == {'surfaceFeatureExtract': 'failed', 'blockMesh': 'skipped', 'snappyHexMesh': 'skipped'}
+    assert results[0]['steps'][0]['attempts'] == 3
+    assert not any(case == 'failing' and 'snappyHexMesh' in argv for _, _, case, argv in read_trace(fake))
+
+
+def test_validation_blocked_case_is_skipped(tmp_path, fake_openfoam):
+    fake = fake_openfoam()
+    case_dir = make_case(tmp_path / 'meshes', 'case')
+    (case_dir / 'stl_validation.json').write_text('{"blocked": true}')
+    [result] = run_pipeline([case_dir], FakeBackend(fake), cores=1)
+    assert not result['ok']
+    assert set(_statuses(result).values()) == {'skipped'}
+    assert read_trace(fake) == []
+
+
+def test_resume_skips_completed_steps(tmp_path, fake_openfoam):
+    fake = fake_openfoam()
+    case_dir = make_case(tmp_path / 'meshes', 'case')
+    (case_dir / 'fail.snappyHexMesh').touch()
+    [result] = run_pipeline([case_dir], FakeBackend(fake), cores=1)
+    assert _statuses(result)['snappyHexMesh'] == 'failed'
+
+    (case_dir / 'fail.snappyHexMesh').unlink()
+    fake.with_suffix('.trace').unlink()
+    [result] = run_pipeline([case_dir], FakeBackend(fake), cores=1, resume=True)
+    assert result['ok']
+    # The .eMesh files are there now, so surfaceFeatureExtract is no longer a step
+    assert _statuses(result) == {'blockMesh': 'resumed', 'snappyHexMesh': 'ok'}
+    assert [argv[0] for event, _, _, argv in read_trace(fake) if event == 'start'] == ['snappyHexMesh']
+
+
+def test_docker_backend_runs_without_a_terminal(tmp_path, monkeypatch):
+    # A stand-in docker reports the options it was started with
+    docker = tmp_path / 'bin' / 'docker'
+    docker.parent.mkdir()
+    docker.write_text('#!/bin/sh\necho "$@"\n')
+    docker.chmod(0o755)
+    script = Path(__file__).resolve().parent.parent / 'openfoam-docker'
+    case_dir = make_case(tmp_path / 'meshes', 'case')
+    monkeypatch.setenv('PATH', f"{docker.parent}{os.pathsep}{os.environ['PATH']}")
+    with open(tmp_path / 'log', 'wb') as log_file:
+        returncode = DockerBackend(script).run(str(case_dir), ['blockMesh'], log_file)
+    argv = (tmp_path / 'log').read_text().split()
+    assert returncode == 0
+    assert argv[:2] == ['run', '--rm'] and '-t' not in argv and '-i' not in argv
+    assert f'--volume={case_dir.resolve()}:/home/openfoam' in argv and argv[-1] == 'blockMesh'
+
+
+def test_metrics_of_steps_that_did_not_run_are_kept(tmp_path, fake_openfoam):
+    fake = fake_openfoam()
+    case_dir = make_case(tmp_path / 'meshes', 'case')
+    run_pipeline([case_dir], FakeBackend(fake), cores=1)
+    metrics_path = case_dir / 'metrics.json'
+    meshed = json.loads(metrics_path.read_text())['mesh']
+    assert [r['stage'] for r in meshed['records']] == ['surfaceFeatureExtract', 'blockMesh', 'snappyHexMesh']
+
+    # Nothing runs on a fully resumed case
+    run_pipeline([case_dir], FakeBackend(fake), cores=1, resume=True)
+    assert json.loads(metrics_path.read_text())['mesh'] == meshed
+
+    # Steps run again replace their records, resumed ones keep theirs
+    (case_dir / 'log.snappyHexMesh').unlink()
+    run_pipeline([case_dir], FakeBackend(fake), cores=1, resume=True)
+    records = json.loads(metrics_path.read_text())['mesh']['records']
+    assert records[0] == meshed['records'][1]
+    assert [r['stage'] for r in records] == ['blockMesh', 'snappyHexMesh']
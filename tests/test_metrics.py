@@ -0,0 +1,53 @@
+import json
+import time
+from metrics import StageMetrics, case_summary, parse_openfoam_log, write_case_metrics
+
+SNAPPY_LOG = """\
+Mesh refined in = 1.5 s.
+Mesh snapped in = 2.25 s.
+Finished meshing in = 4 s.
+Snapped mesh : cells:24000  faces:80000  points:30000
+ExecutionTime = 3.5 s  ClockTime = 4 s
+
+End
+"""
+
+
+def test_nested_stages_are_not_counted_twice():
+    metrics = StageMetrics()
+    with metrics.stage('render', 'blockMeshDict'):
+        time.sleep(0.02)
+        with metrics.stage('bbox'):
+            time.sleep(0.05)
+    inner, outer = metrics.records
+    assert (inner['stage'], outer['stage']) == ('bbox', 'render')
+    assert inner['wall_s'] >= 0.05 and 0.02 <= outer['wall_s'] < 0.05
+    assert set(metrics.totals()) == {'bbox', 'render'}
+
+
+def test_parse_snappy_log(tmp_path):
+    log_path = tmp_path / 'log.snappyHexMesh'
+    log_path.write_text(SNAPPY_LOG)
+    log = parse_openfoam_log(log_path)
+    assert log == {'execution_time_s': 3.5, 'clock_time_s': 4.0, 'cells': 24000,
+                   'phases': {'castellation': 1.5, 'snapping': 2.25, 'total': 4.0}}
+
+
+def _record(stage, wall_s, target=None):
+    return {'section': 'mesh', 'stage': stage, 'target': target, 'wall_s': wall_s, 'cpu_s': None,
+            'peak_rss_bytes': None, 'cells': None}
+
+
+def test_case_metrics_keep_stages(tmp_path):
+    write_case_metrics(tmp_path, 'setup', [dict(_record('hash', 0.5), section='setup')])
+    write_case_metrics(tmp_path, 'mesh', [_record('blockMesh', 1.0), _record('snappyHexMesh', 5.0),
+                                          _record('snappyHexMesh', 2.0, 'castellation')])
+    write_case_metrics(tmp_path, 'mesh', [_record('snappyHexMesh', 6.0)], keep_stages=['blockMesh'])
+
+    data = json.loads((tmp_path / 'metrics.json').read_text())
+    assert [r['wall_s'] for r in data['mesh']['records']] == [1.0, 6.0]
+    assert [r['stage'] for r in data['setup']['records']] == ['hash']
+    assert len((tmp_path / 'metrics.csv').read_text().splitlines()) == 4
+    # Phase records repeat their step's time
+    summary = case_summary('case', True, data['mesh']['records'] + [_record('snappyHexMesh', 2.0, 'layers')])
+    assert summary['wall_s'] == 7.0
@@ -0,0 +1,84 @@
+import os
+import pytest
+import setup_mesh_dirs
+from geometry_cache import ResultCache
+from parameter_sweep import SHARED_DIR, run_sweep
+
+
+@pytest.fixture
+def geometry(tmp_path, torus_stl):
+    geom_dir = tmp_path / 'geometry' / 'tori'
+    for i in range(2):
+        torus_stl(f'part{i}', 1000, center=(3.0 * i, 0, 0), directory=geom_dir)
+    return geom_dir
+
+
+def _count_calls(monkeypatch, name):
+    calls = []
+    original = getattr(setup_mesh_dirs, name)
+
+    def counted(*args, **kwargs):
+        calls.append(args)
+        return original(*args, **kwargs)
+    monkeypatch.setattr(setup_mesh_dirs, name, counted)
+    return calls
+
+
+def test_variants_hold_hardlinks_to_the_shared_surfaces(tmp_path, geometry):
+    meshes_dir = tmp_path / 'meshes'
+    results = run_sweep(geometry, {'cell_size': [0.5, 0.25]}, meshes_dir, extract_features=True)
+    assert all(r['ok'] for r in results)
+    shared_dir = meshes_dir / SHARED_DIR / 'tori' / 'triSurface'
+    shared = sorted(p.name for p in shared_dir.iterdir())
+    assert shared == ['part0.eMesh', 'part0.stl', 'part1.eMesh', 'part1.stl']
+    for case in ('tori_cell_size0.5', 'tori_cell_size0.25'):
+        tri_surface = meshes_dir / case / 'constant' / 'triSurface'
+        assert not tri_surface.is_symlink()
+        for name in shared:
+            assert not (tri_surface / name).is_symlink()
+            assert os.path.samefile(tri_surface / name, shared_dir / name)
+
+    # Nothing changed, so nothing is relinked
+    again = run_sweep(geometry, {'cell_size': [0.5, 0.25]}, meshes_dir, extract_features=True)
+    assert [r['written'] for r in again] == [[], []]
+
+    # A restaged surface is relinked and one that is gone is removed
+    os.unlink(geometry / 'part1.stl')
+    (geometry / 'part0.stl').write_bytes((geometry / 'part0.stl').read_bytes())
+    run_sweep(geometry, {'cell_size': [0.5]}, meshes_dir)
+    tri_surface = meshes_dir / 'tori_cell_size0.5' / 'constant' / 'triSurface'
+    assert sorted(p.name for p in tri_surface.iterdir()) == ['part0.stl']
+    assert os.path.samefile(tri_surface / 'part0.stl', shared_dir / 'part0.stl')
+
+
+def test_analyses_are_shared_between_variants(tmp_path, geometry, monkeypatch):
+    gaps = _count_calls(monkeypatch, 'find_gap_regions')
+    locations = _count_calls(monkeypatch, 'find_location_in_mesh')
+    grid = {'surface_levels': [(1, 2), (2, 3), (3, 4)]}
+    results = run_sweep(geometry, grid, tmp_path / 'meshes', cell_size=0.5, detect_gaps=True)
+    assert all(r['ok'] for r in results)
+    # Neither analysis depends on the surface levels
+    assert len(gaps) == len(locations) == 1
+
+    grid = {'cell_size': [0.5, 0.4]}
+    run_sweep(geometry, grid, tmp_path / 'other', detect_gaps=True)
+    assert len(gaps) == len(locations) == 3
+
+
+def test_result_cache_is_bounded():
+    cache = ResultCache(max_entries=2)
+    computed = []
+
+    def compute(value):
+        computed.append(value)
+        return {'value': value}
+    inputs = {'a.stl': 'hash'}
+    assert cache.get('levels', inputs, {'cell_size': 1}, lambda: compute(1)) == {'value': 1}
+    assert cache.get('levels', inputs, {'cell_size': 1}, lambda: compute(1)) == {'value': 1}
+    cache.get('levels', inputs, {'cell_size': 2}, lambda: compute(2))
+    cache.get('levels', {'a.stl': 'changed'}, {'cell_size': 1}, lambda: compute(3))
+    assert computed == [1, 2, 3]
+    assert (cache.hits, cache.misses, len(cache)) == (1, 3, 2)
+    # The least recently used result was dropped
+    cache.get('levels', inputs, {'cell_size': 1}, lambda: compute(4))
+    assert computed == [1, 2, 3, 4]
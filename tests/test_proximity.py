@@ -0,0 +1,50 @@
+import numpy as np
+from conftest import box_triangles, write_triangles
+from proximity import find_gap_pairs, find_gap_regions, gap_refinement_regions, sample_surface, thin_samples
+
+
+def test_sample_surface_spacing():
+    triangles = box_triangles().astype(np.float32)
+    points, normals = sample_surface(triangles, 0.1)
+    assert points.dtype == np.float32 and normals.dtype == np.float32
+    # Every face is covered, one sample per half-spacing voxel and direction
+    assert len(points) >= 6 * (1 / 0.05) ** 2 * 0.5
+    np.testing.assert_allclose(np.linalg.norm(normals, axis=1), 1, rtol=1e-6)
+
+
+def test_thinning_chunks_matches_thinning_all():
+    triangles = box_triangles().astype(np.float32)
+    points, normals = sample_surface(triangles, 0.1)
+    parts = [sample_surface(triangles[n:n + 2], 0.1) for n in range(0, 12, 2)]
+    chunked = thin_samples(np.concatenate([p for p, _ in parts]), np.concatenate([n for _, n in parts]), 0.1)
+    np.testing.assert_array_equal(chunked[0], points)
+    np.testing.assert_array_equal(chunked[1], normals)
+
+
+def test_facing_plates_pair_but_neighbours_do_not():
+    points = np.array([[0, 0, 0], [0, 0, 0.1], [0.15, 0, 0]], dtype=np.float32)
+    normals = np.array([[0, 0, 1], [0, 0, -1], [0, 0, 1]], dtype=np.float32)
+    i, j, width = find_gap_pairs(points, normals, 0.2)
+    assert list(zip(i, j)) == [(0, 1)]
+    np.testing.assert_allclose(width, [0.1], rtol=1e-6)
+
+
+def test_gap_between_boxes(tmp_path):
+    lower = write_triangles(tmp_path / 'lower.stl', box_triangles((0, 0, 0), (1, 1, 0.5)))
+    upper = write_triangles(tmp_path / 'upper.stl', box_triangles((0, 0, 0.55), (1, 1, 1)), binary=False)
+    gaps = find_gap_regions([lower, upper], (-0.5,) * 3, (1.5,) * 3, (20, 20, 20))
+    assert set(gaps['surfaces']) == {'lower', 'upper'}
+    assert abs(gaps['surfaces']['lower'] - 0.05) < 1e-6
+    [region] = gaps['regions']
+    assert region['min'][2] <= 0.5 and region['max'][2] >= 0.55
+    # 3 cells of 0.1 across a 0.05 gap need level 3
+    assert region['level'] == 3
+
+    entries = gap_refinement_regions(gaps, distance_refinement=True)
+    assert [entry['mode'] for entry in entries] == ['inside', 'distance', 'distance']
+
+
+def test_no_gap_on_a_single_box(tmp_path):
+    box = write_triangles(tmp_path / 'box.stl', box_triangles())
+    gaps = find_gap_regions([box], (-0.5,) * 3, (1.5,) * 3, (20, 20, 20))
+    assert gaps == {'base_size': 0.1, 'regions': [], 'surfaces': {}}
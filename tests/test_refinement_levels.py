@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+from conftest import box_triangles, write_triangles
+from feature_edges import weld_stl_files
+from refinement_levels import assign_refinement_levels, compute_refinement_levels, surface_statistics
+
+
+def test_box_statistics(tmp_path):
+    stl_file = write_triangles(tmp_path / 'box.stl', box_triangles((0, 0, 0), (1, 2, 3)))
+    stats = surface_statistics(*weld_stl_files([stl_file]))
+    assert stats['triangles'] == 12
+    assert stats['area'] == pytest.approx(22.0)
+    assert stats['feature_length'] == pytest.approx(24.0)
+    assert stats['curvature'] == [0.0, 0.0]
+
+
+def test_torus_curvature(torus_stl):
+    stats = surface_statistics(*weld_stl_files([torus_stl(n_triangles=20000)]))
+    # Principal curvatures of the torus are 1/0.3 across the tube and at most
+    # 1/0.7 around it; diagonal edges overestimate a little
+    assert 0.5 < stats['curvature'][0] < stats['curvature'][1] < 2 / 0.3
+    assert stats['area'] == pytest.approx(4 * np.pi ** 2 * 1.0 * 0.3, rel=0.01)
+    assert stats['feature_spacing'] is None
+
+
+def test_budget_lowers_levels():
+    stats = {'part': {'curvature': [5.0, 40.0], 'area': 10.0, 'feature_length': 4.0, 'feature_spacing': 0.01}}
+    free = assign_refinement_levels(stats, 0.5, 1000)
+    tight = assign_refinement_levels(stats, 0.5, 1000, cell_budget=200000)
+    assert free['part']['surface'][1] > tight['part']['surface'][1] or free['part']['feature'] > tight['part']['feature']
+    assert tight['part']['cost'] + 1000 <= 200000 < free['part']['cost'] + 1000
+
+
+def test_compute_refinement_levels(torus_stl):
+    levels = compute_refinement_levels([torus_stl(n_triangles=5000)], (-2, -2, -1), (2, 2, 1), (20, 20, 10))
+    entry = levels['torus']
+    assert entry['surface'][0] <= entry['surface'][1] and entry['surface'][1] > 0
+    assert entry['statistics']['triangles'] > 4000
+
+
+def test_open_edges_are_not_features(tmp_path):
+    # A flat square inlet patch: its rim is open, not a feature line
+    plate = np.array([[[0, 0, 0], [1, 0, 0], [1, 1, 0]], [[0, 0, 0], [1, 1, 0], [0, 1, 0]]], dtype=np.float64)
+    stl_file = write_triangles(tmp_path / 'inlet.stl', plate)
+    stats = surface_statistics(*weld_stl_files([stl_file]))
+    assert stats['feature_length'] == 0.0
+    assert stats['open_length'] == pytest.approx(4.0)
+    assert stats['feature_spacing'] is None
+    levels = compute_refinement_levels([stl_file], (-1, -1, -1), (2, 2, 1), (3, 3, 2))
+    assert levels['inlet']['feature'] == 0
+
+
+def test_levels_use_coarsest_axis(tmp_path):
+    stats = {'part': {'curvature': [0.0, 0.0], 'area': 6.0, 'feature_length': 12.0, 'feature_spacing': 0.5}}
+    stl_file = write_triangles(tmp_path / 'part.stl', box_triangles((0, 0, 0), (1, 1, 1)))
+    # Cells are 0.25 in x and y but 1.0 in z; the feature spacing of 0.25
+    # needs two levels from the 1.0 axis, none from the 0.25 ones
+    levels = compute_refinement_levels([stl_file], (-1, -1, -1), (2, 2, 2), (12, 12, 3))
+    assert levels['part']['feature'] == assign_refinement_levels(stats, 1.0, 432)['part']['feature'] == 2
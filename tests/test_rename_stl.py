@@ -0,0 +1,75 @@
+import os
+import numpy as np
+import pytest
+from conftest import box_triangles, write_triangles
+from rename_stl import rename_stl_file, rename_stl_first_line
+from stl_scan import BINARY_HEADER_SIZE, binary_header, iter_stl_triangles
+
+
+def _read(path):
+    return np.concatenate(list(iter_stl_triangles(str(path))))
+
+
+def test_binary_header(tmp_path):
+    path = write_triangles(tmp_path / 'wing.stl', box_triangles(), name='exported by CAD')
+    before = path.read_bytes()
+    inode = path.stat().st_ino
+    assert rename_stl_file(str(path)) is True
+    after = path.read_bytes()
+    assert after[:BINARY_HEADER_SIZE] == binary_header('wing')
+    assert after[BINARY_HEADER_SIZE:] == before[BINARY_HEADER_SIZE:]
+    assert path.stat().st_ino == inode
+    assert rename_stl_file(str(path)) is False
+
+
+@pytest.mark.parametrize('old_name', ['body', 'a much longer solid name'])
+def test_ascii_solid_lines(tmp_path, old_name):
+    # 'body' patches both lines in place, the longer name rewrites the file
+    path = write_triangles(tmp_path / 'wing.stl', box_triangles(), binary=False, name=old_name)
+    before = path.read_text().splitlines()
+    assert rename_stl_file(str(path)) is True
+    after = path.read_text().splitlines()
+    assert after[0] == 'solid wing' and after[-1] == 'endsolid wing'
+    assert after[1:-1] == before[1:-1]
+    np.testing.assert_array_equal(_read(path), np.asarray(box_triangles(), dtype=np.float32))
+    assert rename_stl_file(str(path)) is False
+    assert sorted(p.name for p in tmp_path.iterdir()) == ['wing.stl']
+
+
+def test_ascii_without_endsolid(tmp_path):
+    path = write_triangles(tmp_path / 'wing.stl', box_triangles(), binary=False, name='x')
+    text = path.read_text()
+    path.write_text(text[:text.rindex('endsolid')])
+    assert rename_stl_file(str(path)) is True
+    lines = path.read_text().splitlines()
+    assert lines[0] == 'solid wing' and lines[-1] == '  endfacet'
+
+
+def test_failed_rewrite_keeps_original(tmp_path, monkeypatch):
+    path = write_triangles(tmp_path / 'wing.stl', box_triangles(), binary=False, name='a much longer solid name')
+    path.chmod(0o640)
+    before = path.read_bytes()
+
+    def fail(*args):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(os, 'replace', fail)
+    with pytest.raises(OSError, match='disk full'):
+        rename_stl_file(str(path))
+    assert path.read_bytes() == before
+    assert [p.name for p in tmp_path.iterdir()] == ['wing.stl']
+
+    monkeypatch.undo()
+    rename_stl_file(str(path))
+    assert path.read_text().startswith('solid wing\n')
+    assert path.stat().st_mode & 0o777 == 0o640
+
+
+def test_rename_directory(tmp_path, capsys):
+    write_triangles(tmp_path / 'a.stl', box_triangles(), name='x')
+    (tmp_path / 'sub').mkdir()
+    write_triangles(tmp_path / 'sub' / 'b.stl', box_triangles(), binary=False, name='b')
+    rename_stl_first_line(str(tmp_path), workers=2)
+    out = capsys.readouterr().out
+    assert f"Processed: {tmp_path / 'a.stl'}" in out
+    assert f"Unchanged: {tmp_path / 'sub' / 'b.stl'}" in out
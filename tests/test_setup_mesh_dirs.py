@@ -0,0 +1,97 @@
+import re
+import numpy as np
+import pytest
+from stl import mesh
+from geometry_cache import GeometryCache
+from location_in_mesh import ray_parity
+from setup_mesh_dirs import case_option_parser, case_options, setup_case, setup_mesh_directories
+
+
+@pytest.fixture
+def geometry(tmp_path, torus_stl):
+    geom_dir = tmp_path / 'geometry' / 'tori'
+    for i in range(3):
+        torus_stl(f'part{i}', 1000, center=(3.0 * i, 0, 0), directory=geom_dir)
+    return geom_dir
+
+
+def test_parallel_feature_extraction_and_rerun(tmp_path, geometry):
+    meshes_dir = tmp_path / 'meshes'
+    first = setup_case(geometry, meshes_dir, extract_features=True, feature_workers=2, cell_size=0.5)
+    tri_surface = meshes_dir / 'tori' / 'constant' / 'triSurface'
+    assert sorted(p.name for p in tri_surface.glob('*.eMesh')) == ['part0.eMesh', 'part1.eMesh', 'part2.eMesh']
+    assert len([p for p in first['written'] if p.endswith('.eMesh')]) == 3
+
+    second = setup_case(geometry, meshes_dir, extract_features=True, feature_workers=2, cell_size=0.5)
+    assert second['written'] == []
+    assert len(second['skipped']) == len(first['written'])
+
+
+def test_stage_metrics(tmp_path, geometry):
+    meshes_dir = tmp_path / 'meshes'
+    cache = GeometryCache(tmp_path / 'cache.json')
+    first = setup_case(geometry, meshes_dir, cache=cache, estimate=True, cell_size=0.5)
+    stages = [record['stage'] for record in first['metrics']]
+    # The block is computed once, although the blockMeshDict and estimate need it
+    assert stages.count('hash') == stages.count('parse') == stages.count('bbox') == 1
+    assert stages.index('hash') < stages.index('parse') < stages.index('bbox')
+    assert all(record['wall_s'] >= 0 for record in first['metrics'])
+
+    second = setup_case(geometry, meshes_dir, cache=cache, estimate=True, cell_size=0.5)
+    assert [record['stage'] for record in second['metrics']] == ['hash']
+
+
+def test_cache_counts_each_file_once(tmp_path, geometry, capsys):
+    cache = GeometryCache(tmp_path / 'cache.json')
+    for stl_file in sorted(geometry.glob('*.stl')):
+        cache.get_hash(stl_file)
+        cache.get_metadata(stl_file)
+        cache.get_metadata(stl_file)
+    assert (cache.hits, cache.misses, cache.hash_hits, cache.hash_misses) == (0, 3, 0, 3)
+
+    options = dict(cache_path=tmp_path / 'run_cache.json', cell_size=0.5)
+    setup_mesh_directories(tmp_path / 'geometry', tmp_path / 'meshes', **options)
+    assert "Geometry cache: 0 hits, 3 misses, hashes 0 hits, 3 misses" in capsys.readouterr().out
+    setup_mesh_directories(tmp_path / 'geometry', tmp_path / 'meshes', **options)
+    assert "Geometry cache: 0 hits, 0 misses, hashes 3 hits, 0 misses" in capsys.readouterr().out
+
+
+def _location_in_mesh(case_dir):
+    text = (case_dir / 'system' / 'snappyHexMeshDict').read_text()
+    return tuple(float(c) for c in re.search(r'locationInMesh \((\S+) (\S+) (\S+)\);', text).groups())
+
+
+def test_location_in_mesh_is_computed_unless_given(tmp_path, geometry):
+    meshes_dir = tmp_path / 'meshes'
+    setup_case(geometry, meshes_dir, cell_size=0.5)
+    point = _location_in_mesh(meshes_dir / 'tori')
+    triangles = np.concatenate([mesh.Mesh.from_file(str(p)).vectors for p in sorted(geometry.glob('*.stl'))])
+    odd, ambiguous = ray_parity(triangles, np.array([point]))
+    assert not odd[0] and not ambiguous[0]
+    assert point != (0, 0, 0)
+
+    setup_case(geometry, meshes_dir, cell_size=0.5, location_in_mesh=(0.5, 0.25, 0.125))
+    assert _location_in_mesh(meshes_dir / 'tori') == (0.5, 0.25, 0.125)
+
+
+def test_case_options_default_to_an_outside_point():
+    parser = case_option_parser()
+    assert case_options(parser.parse_args([]))['location_in_mesh'] == 'outside'
+    assert case_options(parser.parse_args(['--region', 'inside']))['location_in_mesh'] == 'inside'
+    options = case_options(parser.parse_args(['--region', 'inside', '--location-in-mesh', '1', '2', '3']))
+    assert options['location_in_mesh'] == (1.0, 2.0, 3.0)
+
+
+def test_regenerated_dictionaries_keep_their_mtime_when_unchanged(tmp_path, geometry):
+    meshes_dir = tmp_path / 'meshes'
+    setup_case(geometry, meshes_dir, cell_size=0.5, decompose_method='scotch', n_procs=2)
+    system_dir = meshes_dir / 'tori' / 'system'
+    paths = sorted(system_dir.iterdir()) + [meshes_dir / 'tori' / 'Allrun']
+    mtimes = {p: p.stat().st_mtime_ns for p in paths}
+
+    # As after editing a generator: everything is regenerated, nothing changes
+    forced = setup_case(geometry, meshes_dir, cell_size=0.5, decompose_method='scotch', n_procs=2, force=True)
+    assert {str(p) for p in paths} <= set(forced['written'])
+    assert {p: p.stat().st_mtime_ns for p in paths} == mtimes
+    again = setup_case(geometry, meshes_dir, cell_size=0.5, decompose_method='scotch', n_procs=2)
+    assert again['written'] == []
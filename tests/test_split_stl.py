@@ -0,0 +1,102 @@
+import numpy as np
+import pytest
+from conftest import box_triangles, write_triangles
+from geometry_cache import GeometryCache, compute_stl_metadata
+from split_stl import SPLIT_INDEX_NAME, patch_name, split_into_geometry, split_stl
+from stl_scan import iter_stl_triangles
+
+
+def _multi_solid(path, solids):
+    """
+    Write (name, triangles) pairs as the solids of one ASCII STL file.
+    """
+    parts = []
+    for i, (name, triangles) in enumerate(solids):
+        part = write_triangles(path.with_name(f'part{i}.stl'), triangles, binary=False, name=name or ' ')
+        text = part.read_text()
+        # An unnamed solid is just 'solid' on its own line
+        parts.append(text.replace('solid  \n', 'solid\n', 1) if not name else text)
+        part.unlink()
+    path.write_text(''.join(parts))
+    return path
+
+
+@pytest.fixture
+def assembly(tmp_path):
+    return _multi_solid(tmp_path / 'assembly.stl', [
+        ('inlet', box_triangles((0, 0, 0), (1, 1, 1))[:4]),
+        ('wall body', box_triangles((0, 0, 0), (1, 2, 3))),
+        ('inlet', box_triangles((0, 0, 0), (1, 1, 1))[4:6]),
+        ('', box_triangles((5, 5, 5), (6, 6, 6))),
+    ])
+
+
+def _read(path):
+    return np.concatenate(list(iter_stl_triangles(str(path))))
+
+
+def test_patch_names():
+    assert patch_name('wall body', 'x') == 'wall_body'
+    assert patch_name('  in/let#2 ', 'x') == 'in_let_2'
+    assert patch_name('', 'x') == patch_name('***', 'x') == 'x'
+
+
+@pytest.mark.parametrize('binary', [False, True])
+def test_one_file_per_solid_with_its_metadata(assembly, tmp_path, binary):
+    patches = split_stl(assembly, tmp_path / 'out', binary=binary)
+    assert list(patches) == ['inlet', 'wall_body', 'assembly_1']
+    assert [patches[name]['triangle_count'] for name in patches] == [6, 12, 12]
+    # Solids sharing a name are written into one file, in order
+    np.testing.assert_array_equal(_read(tmp_path / 'out' / 'inlet.stl'), box_triangles()[:6])
+    np.testing.assert_array_equal(_read(tmp_path / 'out' / 'wall_body.stl'), box_triangles((0, 0, 0), (1, 2, 3)))
+    for name, metadata in patches.items():
+        assert metadata['path'] == str(tmp_path / 'out' / f'{name}.stl')
+        scanned = compute_stl_metadata(metadata['path'])
+        assert metadata['format'] == scanned['format'] == ('binary' if binary else 'ascii')
+        assert metadata['bounding_box'] == scanned['bounding_box']
+        assert metadata['solid_names'] == scanned['solid_names']
+        assert metadata['surface_area'] == pytest.approx(scanned['surface_area'])
+    assert patches['wall_body']['bounding_box'] == [[0, 0, 0], [1, 2, 3]]
+    assert patches['inlet']['solid_names'] == ['inlet'] * (1 if binary else 2)
+
+
+def test_small_blocks_split_the_same(assembly, tmp_path):
+    whole = split_stl(assembly, tmp_path / 'whole')
+    blocks = split_stl(assembly, tmp_path / 'blocks', block_size=97)
+    for name in whole:
+        assert (tmp_path / 'blocks' / f'{name}.stl').read_bytes() == (tmp_path / 'whole' / f'{name}.stl').read_bytes()
+        assert {k: v for k, v in blocks[name].items() if k != 'path'} == \
+            {k: v for k, v in whole[name].items() if k != 'path'}
+
+
+def test_bad_inputs_leave_no_files(tmp_path):
+    with pytest.raises(ValueError, match='binary'):
+        split_stl(write_triangles(tmp_path / 'binary.stl', box_triangles()), tmp_path / 'out')
+
+    truncated = _multi_solid(tmp_path / 'truncated.stl', [('a', box_triangles()), ('b', box_triangles())])
+    text = truncated.read_text()
+    cut = text.index('endloop', text.index('solid b'))
+    truncated.write_text(text[:text.rindex('vertex', 0, cut)] + 'endloop\nendfacet\nendsolid b\n')
+    with pytest.raises(ValueError, match="Incomplete facet at the end of solid 'b'"):
+        split_stl(truncated, tmp_path / 'out')
+    assert list((tmp_path / 'out').iterdir()) == []
+
+
+def test_split_into_geometry_is_skipped_until_the_source_changes(assembly, tmp_path):
+    cache = GeometryCache(tmp_path / 'cache.json')
+    out_dir = tmp_path / 'geometry' / 'assembly'
+    patches, split = split_into_geometry(assembly, out_dir, cache=cache)
+    assert split and (out_dir / SPLIT_INDEX_NAME).exists()
+    # The cache already holds the metadata of every patch
+    for metadata in patches.values():
+        assert cache.get_metadata(metadata['path']) == {k: v for k, v in metadata.items() if k != 'path'}
+    assert (cache.hits, cache.misses) == (3, 0)
+
+    again, split = split_into_geometry(assembly, out_dir, cache=cache)
+    assert not split and again == patches
+
+    # A solid removed from the source disappears from the geometry
+    _multi_solid(assembly, [('inlet', box_triangles())])
+    patches, split = split_into_geometry(assembly, out_dir, cache=cache)
+    assert split and list(patches) == ['inlet']
+    assert sorted(path.name for path in out_dir.iterdir()) == [SPLIT_INDEX_NAME, 'inlet.stl']
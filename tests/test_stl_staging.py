@@ -0,0 +1,97 @@
+import errno
+import os
+import pytest
+import stl_staging
+from stl_staging import stage_file
+
+
+@pytest.fixture
+def src(tmp_path):
+    path = tmp_path / 'src' / 'part.stl'
+    path.parent.mkdir()
+    path.write_bytes(b'solid part\nendsolid part\n')
+    return path
+
+
+@pytest.fixture
+def dst_dir(tmp_path):
+    path = tmp_path / 'dst'
+    path.mkdir()
+    return path
+
+
+def _cross_device(*args):
+    raise OSError(errno.EXDEV, "Invalid cross-device link")
+
+
+def _no_reflink(src, dst):
+    raise OSError(errno.EOPNOTSUPP, "Operation not supported")
+
+
+def test_hardlink(src, dst_dir):
+    assert stage_file(src, dst_dir, 'hardlink') == ('hardlink', 0)
+    staged = dst_dir / 'part.stl'
+    assert os.path.samefile(staged, src) and not staged.is_symlink()
+
+
+def test_hardlink_falls_back_to_reflink(src, dst_dir, monkeypatch):
+    cloned = []
+
+    def fake_reflink(source, dst):
+        cloned.append(source)
+        dst.write_bytes(source.read_bytes())
+
+    monkeypatch.setattr(os, 'link', _cross_device)
+    monkeypatch.setattr(stl_staging, '_reflink', fake_reflink)
+    assert stage_file(src, dst_dir, 'hardlink') == ('reflink', 0)
+    assert cloned == [src]
+    assert (dst_dir / 'part.stl').read_bytes() == src.read_bytes()
+
+
+def test_hardlink_falls_back_to_copy(src, dst_dir, monkeypatch):
+    monkeypatch.setattr(os, 'link', _cross_device)
+    monkeypatch.setattr(stl_staging, '_reflink', _no_reflink)
+    assert stage_file(src, dst_dir, 'hardlink') == ('copy', src.stat().st_size)
+    staged = dst_dir / 'part.stl'
+    assert staged.read_bytes() == src.read_bytes()
+    assert not staged.is_symlink() and not os.path.samefile(staged, src)
+
+
+def test_reflink_or_copy(src, dst_dir):
+    # tmpfs and ext4 can't clone, btrfs and XFS can; either way the data match
+    strategy, bytes_written = stage_file(src, dst_dir, 'reflink')
+    assert (strategy, bytes_written) in (('reflink', 0), ('copy', src.stat().st_size))
+    staged = dst_dir / 'part.stl'
+    assert staged.read_bytes() == src.read_bytes() and not os.path.samefile(staged, src)
+    assert list(dst_dir.iterdir()) == [staged]
+
+
+def test_symlink(src, dst_dir):
+    assert stage_file(src, dst_dir, 'symlink') == ('symlink', 0)
+    staged = dst_dir / 'part.stl'
+    assert staged.is_symlink() and os.readlink(staged) == os.path.join('..', 'src', 'part.stl')
+    assert staged.read_bytes() == src.read_bytes()
+
+
+def test_symlink_falls_back_to_copy(src, dst_dir, monkeypatch):
+    monkeypatch.setattr(os, 'symlink', _cross_device)
+    assert stage_file(src, dst_dir, 'symlink') == ('copy', src.stat().st_size)
+    staged = dst_dir / 'part.stl'
+    assert not staged.is_symlink() and staged.read_bytes() == src.read_bytes()
+
+
+def test_replaces_existing_file(src, dst_dir):
+    (dst_dir / 'part.stl').write_text('stale')
+    stage_file(src, dst_dir, 'symlink')
+    assert (dst_dir / 'part.stl').is_symlink()
+    stage_file(src, dst_dir, 'copy')
+    assert not (dst_dir / 'part.stl').is_symlink()
+    assert [p.name for p in dst_dir.iterdir()] == ['part.stl']
+
+
+def test_failed_copy_raises(src, dst_dir):
+    with pytest.raises(OSError):
+        stage_file(src.with_name('missing.stl'), dst_dir, 'hardlink')
+    assert list(dst_dir.iterdir()) == []
+    with pytest.raises(ValueError, match='Unknown staging mode'):
+        stage_file(src, dst_dir, 'move')
@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+from conftest import box_triangles, write_triangles
+from feature_edges import weld_vertices
+from stl_scan import iter_stl_triangles
+from stl_validation import check_validation, mesh_checks, validate_stl_files
+
+
+def _write_parts(directory, parts):
+    return [write_triangles(directory / f'part{i}.stl', part) for i, part in enumerate(parts)]
+
+
+def test_closed_box_split_over_surfaces(tmp_path):
+    box = box_triangles()
+    report = validate_stl_files(_write_parts(tmp_path, [box[:4], box[4:8], box[8:]]), workers=2)
+    # Each part is open on its own, but that is not an issue of a single surface
+    assert all(entry['open_edges'] and not entry['issues'] for entry in report['surfaces'].values())
+    combined = report['combined']
+    assert combined['closed'] and combined['triangles'] == 12 and combined['open_edges'] == 0
+    assert combined['volume'] == pytest.approx(1.0)
+    assert report['ok']
+
+
+@pytest.mark.parametrize('parts, issue', [
+    (lambda box: [box[:4], box[4:10]], 'not watertight, 4 open edges'),
+    (lambda box: [box[:4, ::-1], box[4:, ::-1]], 'normals point inwards'),
+    (lambda box: [box[:6], box[6:, ::-1]], 'edges between triangles with opposite normals'),
+    (lambda box: [box[:4], box[4:], box[:2]], 'non-manifold edges'),
+])
+def test_combined_issues(tmp_path, parts, issue):
+    report = validate_stl_files(_write_parts(tmp_path, parts(box_triangles())))
+    assert not report['ok']
+    assert any(issue in message for message in report['combined']['issues'])
+
+
+def test_combined_matches_welding_all_surfaces(tmp_path, torus_stl):
+    # Two coincident tori share every edge and triangle, a third overlaps them
+    files = [torus_stl('a', 2000), torus_stl('b', 2000), torus_stl('c', 2000, center=(0.5, 0, 0))]
+    triangles = np.concatenate([t for f in files for t in iter_stl_triangles(str(f))])
+    expected = mesh_checks(*weld_vertices(triangles))
+    combined = validate_stl_files(files)['combined']
+    assert {k: combined[k] for k in expected if k != 'volume'} == {k: v for k, v in expected.items() if k != 'volume'}
+    assert combined['volume'] == pytest.approx(expected['volume'])
+
+
+def test_surface_defects(tmp_path):
+    box = box_triangles()
+    degenerate = np.array([[[0, 0, 0], [1, 0, 0], [2, 0, 0]]])
+    stl_file = write_triangles(tmp_path / 'bad.stl', np.concatenate([box, box[:1], degenerate]))
+    report = validate_stl_files([stl_file])
+    checks = report['surfaces']['bad.stl']
+    assert checks['duplicate_triangles'] == 1 and checks['degenerate_triangles'] == 1
+    # The edges of the duplicate, and the box edge the degenerate triangle lies on
+    assert checks['non_manifold_edges'] == 4
+    with pytest.raises(ValueError):
+        check_validation(report, 'error')